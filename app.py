@@ -2,10 +2,12 @@ import os
 from flask import Flask
 from config import Config
 from database.models import init_db
+from database.cache_usuarios import aquecer_cache_usuarios
+from log_estruturado import obter_logger
 from rotas.web_rotas import web_bp
-from rotas.api_rotas import api_bp
-from rotas.webhook_rotas import webhook_bp
-from datetime import datetime, timedelta
+from rotas.api_rotas import api_bp, obter_processador_importacoes
+from rotas.webhook_rotas import webhook_bp, obter_processador_fila
+from datetime import datetime
 
 # Criação do aplicativo Flask
 app = Flask(__name__)
@@ -14,11 +16,26 @@ app.config.from_object(Config)
 # Inicializa o banco de dados
 init_db(app.config['DATABASE'])
 
+# Pré-carrega os usuários ativos no cache de remetentes do webhook
+try:
+    aquecer_cache_usuarios(app.config['DATABASE'])
+except Exception:
+    obter_logger('web').excecao('erro_aquecer_cache_usuarios')
+
 # Registra os blueprints
 app.register_blueprint(web_bp)
 app.register_blueprint(api_bp, url_prefix='/api')
 app.register_blueprint(webhook_bp)
 
+# Modo assíncrono: o processador da fila sobe com o worker e retoma as
+# mensagens pendentes (ou com reserva expirada) sem esperar uma mensagem nova
+if Config.WEBHOOK_ASSINCRONO:
+    obter_processador_fila()
+
+# Importações de extrato: o processador também sobe com o worker, para
+# retomar as que ficaram pendentes ou interrompidas por um reinício
+obter_processador_importacoes()
+
 # Registrar filtros personalizados para Jinja2
 @app.template_filter('format_date')
 def format_date(date_str):
@@ -0,0 +1,95 @@
+"""
+Benchmark de alocações por mensagem processada pelo TextProcessor.
+
+Compara o fluxo antigo do webhook (um ``TextProcessor()`` novo por mensagem,
+que remontava as tabelas de categorias/estabelecimentos, e o dicionário de
+emojis recriado em cada ``get_categoria_emoji``) com a instância
+compartilhada ``processador_texto``.
+
+Para cada mensagem mede, com ``tracemalloc``, o pico de memória alocada
+durante o processamento e o tempo.
+
+Uso:
+    python benchmarks/benchmark_alocacoes.py [--mensagens 2000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.models import (  # noqa: E402
+    TextProcessor, processador_texto, CATEGORIAS_PALAVRAS, ESTABELECIMENTOS, SERVICOS_STREAMING, EMOJIS_CATEGORIA
+)
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus_categorizacao.jsonl')
+
+
+class ProcessadorPorMensagem(TextProcessor):
+    """Reproduz o custo antigo: tabelas montadas no construtor e emojis por chamada"""
+
+    def __init__(self):
+        self.categorias = {nome: list(palavras) for nome, palavras in CATEGORIAS_PALAVRAS.items()}
+        self.servicos_streaming = list(SERVICOS_STREAMING)
+        self.estabelecimentos = dict(ESTABELECIMENTOS)
+
+    def get_categoria_emoji(self, categoria):
+        emojis = dict(EMOJIS_CATEGORIA)
+        return emojis.get(categoria, "📦")
+
+
+def fluxo_antigo(texto):
+    processador = ProcessadorPorMensagem()
+    dados = processador.extrair_informacoes_despesa(texto)
+    if dados:
+        ProcessadorPorMensagem().get_categoria_emoji(dados['categoria'])
+
+
+def fluxo_compartilhado(texto):
+    dados = processador_texto.extrair_informacoes_despesa(texto)
+    if dados:
+        processador_texto.get_categoria_emoji(dados['categoria'])
+
+
+def medir(nome, funcao, textos):
+    # Aquece a memória do casador para medir só o custo por mensagem
+    for texto in textos:
+        funcao(texto)
+
+    picos = []
+    tracemalloc.start()
+    for texto in textos:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        funcao(texto)
+        picos.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    inicio = time.perf_counter()
+    for texto in textos:
+        funcao(texto)
+    tempo = (time.perf_counter() - inicio) * 1e6 / len(textos)
+
+    picos.sort()
+    media = sum(picos) / len(picos)
+    print(f"{nome:<14} pico médio: {media / 1024:6.1f} KiB   "
+          f"p95: {picos[int(len(picos) * 0.95) - 1] / 1024:6.1f} KiB   tempo: {tempo:6.1f} us/mensagem")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mensagens', type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(CORPUS, encoding='utf-8') as arquivo:
+        textos = [json.loads(linha)['texto'] for linha in arquivo if linha.strip()][:args.mensagens]
+
+    medir('antes', fluxo_antigo, textos)
+    medir('compartilhado', fluxo_compartilhado, textos)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""
+Benchmark e corpus de referência da categorização do TextProcessor.
+
+1. Confere ``extrair_informacoes_despesa`` contra o corpus de referência
+   (``corpus_categorizacao.jsonl``: valor, categoria, descrição e forma de
+   pagamento da implementação anterior, com as palavras-chave casadas como
+   palavras inteiras). Termina com código 1 se algum resultado mudar.
+2. Confere ``TextProcessor._categorizar`` contra os laços originais
+   (estabelecimentos, categorias, streaming e salário) com a busca por
+   palavra inteira, em todas as mensagens do corpus.
+3. Confere ``extrair_itens_despesa`` (várias despesas numa mensagem) nos
+   casos de ``CASOS_ITENS``: (valor, forma de pagamento) de cada item.
+4. Compara o tempo por mensagem dos laços originais (``palavra in texto``)
+   com ``_categorizar``, que usa o ``CasadorPalavras``.
+
+Uso:
+    python benchmarks/benchmark_categorizacao.py [--repeticoes 20]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.models import PALAVRAS_CONTEXTO_STREAMING, TextProcessor, _categorizacoes  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus_categorizacao.jsonl')
+CAMPOS = ('valor', 'categoria', 'descricao', 'forma_pagamento')
+
+# Mensagem -> (valor, forma_pagamento) de cada item
+CASOS_ITENS = [
+    ("almoço 35, uber 22 e mercado 140,50", [(35.0, None), (22.0, None), (140.5, None)]),
+    ("R$ 30 almoço + R$ 12 café", [(30.0, None), (12.0, None)]),
+    ("2 pizzas 80 e refri 10", [(80.0, None), (10.0, None)]),
+    # Forma de pagamento de cada trecho, sem copiar para os outros
+    ("almoço 35 no pix; uber 20", [(35.0, 'PIX'), (20.0, None)]),
+    ("paguei 45,90 em 3x e 20 no débito", [(45.9, None), (20.0, 'Débito')]),
+    # Trecho sem valor próprio: a mensagem é uma despesa só
+    ("café e pão 12", [(12.0, None)]),
+    ("uber 20 e mercado", [(20.0, None)]),
+    ("almoço 35 e uber 20 e mercado", [(35.0, None)]),
+    # Quantidades não são valores
+    ("comprei 3 camisas e 2 calças por 200", [(200.0, None)]),
+    # Salário não é despesa
+    ("salário 5000 e aluguel 1200", []),
+]
+
+
+def carregar_corpus():
+    with open(CORPUS, encoding='utf-8') as arquivo:
+        return [json.loads(linha) for linha in arquivo if linha.strip()]
+
+
+def conferir_itens(processador):
+    divergencias = []
+    for texto, esperado in CASOS_ITENS:
+        obtido = [(dados['valor'], dados['forma_pagamento']) for dados in processador.extrair_itens_despesa(texto)]
+        if obtido != esperado:
+            divergencias.append((texto, esperado, obtido))
+    return divergencias
+
+
+def conferir(processador, corpus):
+    divergencias = []
+    for item in corpus:
+        resultado = processador.extrair_informacoes_despesa(item['texto'])
+        obtido = None if resultado is None else {campo: resultado[campo] for campo in CAMPOS}
+        if obtido != item['esperado']:
+            divergencias.append((item['texto'], item['esperado'], obtido))
+    return divergencias
+
+
+_PADROES_INTEIROS = {}
+
+
+def contem_inteira(palavra, texto):
+    """``palavra in texto``, mas só como palavra inteira"""
+    padrao = _PADROES_INTEIROS.get(palavra)
+    if padrao is None:
+        padrao = _PADROES_INTEIROS[palavra] = re.compile(r'(?<!\w)' + re.escape(palavra) + r'(?!\w)')
+    return padrao.search(texto) is not None
+
+
+def streaming_original(processador, texto):
+    """``detectar_servico_streaming`` como era antes (chamado com o texto já em minúsculas)"""
+    texto_lower = texto.lower()
+    if isinstance(texto, _TextoInteiro):
+        texto_lower = _TextoInteiro(texto_lower)
+
+    for servico in processador.servicos_streaming:
+        if servico in texto_lower:
+            return True
+
+    # Mesma lista de contexto do TextProcessor (com os plurais da busca por palavra inteira)
+    if "assinatura" in texto_lower and any(palavra in texto_lower for palavra in PALAVRAS_CONTEXTO_STREAMING):
+        return True
+
+    return False
+
+
+def busca_original(processador, texto_lower, inteiras=False):
+    """Busca de palavras-chave como era feita antes (um ``in`` por palavra, nos laços originais).
+
+    Com ``inteiras=True`` cada ``palavra in texto`` vira ``contem_inteira``: é
+    a referência para o ``CasadorPalavras``.
+    """
+    if inteiras:
+        # Texto que casa só palavras inteiras com o operador ``in``
+        texto_lower = _TextoInteiro(texto_lower)
+    categoria = None
+    descricao = None
+
+    if streaming_original(processador, texto_lower):
+        categoria = "lazer"
+
+    if any(palavra in texto_lower for palavra in ["salario", "salário", "pagamento", "remuneração",
+                                                  "remuneracao", "provento", "contracheque"]):
+        return None
+
+    for estabelecimento, categoria_estabelecimento in processador.estabelecimentos.items():
+        if estabelecimento in texto_lower:
+            categoria = categoria_estabelecimento
+            descricao = estabelecimento
+            break
+
+    if not categoria:
+        for nome, palavras_chave in processador.categorias.items():
+            for palavra in palavras_chave:
+                if palavra in texto_lower:
+                    categoria = nome
+                    break
+            if categoria:
+                break
+
+    if not categoria:
+        if "assinatura" in texto_lower or "mensalidade" in texto_lower or "anuidade" in texto_lower:
+            if "academia" in texto_lower or "gym" in texto_lower:
+                categoria = "saúde"
+            elif "escola" in texto_lower or "faculdade" in texto_lower or "curso" in texto_lower:
+                categoria = "educação"
+            elif "internet" in texto_lower or "celular" in texto_lower or "telefone" in texto_lower:
+                categoria = "moradia"
+
+    if not categoria:
+        categoria = "outros"
+
+    if descricao is None:
+        for estabelecimento, categoria_estabelecimento in processador.estabelecimentos.items():
+            if categoria_estabelecimento == categoria and estabelecimento in texto_lower:
+                descricao = estabelecimento
+                break
+
+    return categoria, descricao
+
+
+class _TextoInteiro(str):
+    """``palavra in texto`` só vale para palavras inteiras"""
+
+    def __contains__(self, palavra):
+        return contem_inteira(palavra, self)
+
+
+def medir(funcoes, textos, repeticoes):
+    """Melhor tempo por mensagem de cada função, em us.
+
+    As funções são medidas alternadas em cada repetição, para que uma
+    oscilação da máquina atinja todas igualmente. O memo de categorizações
+    é esvaziado antes de cada medição: sem isso, a partir da segunda
+    repetição o corpus inteiro vira acerto no memo.
+    """
+    melhores = [float('inf')] * len(funcoes)
+    for _ in range(repeticoes):
+        for posicao, funcao in enumerate(funcoes):
+            _categorizacoes.clear()
+            inicio = time.perf_counter()
+            for texto in textos:
+                funcao(texto)
+            melhores[posicao] = min(melhores[posicao], time.perf_counter() - inicio)
+    return [melhor * 1e6 / len(textos) for melhor in melhores]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeticoes', type=int, default=20)
+    args = parser.parse_args()
+
+    processador = TextProcessor()
+    corpus = carregar_corpus()
+
+    divergencias = conferir(processador, corpus)
+    print(f"Corpus de referência: {len(corpus)} mensagens, {len(divergencias)} divergências")
+    for texto, esperado, obtido in divergencias[:20]:
+        print(f"  {texto!r}: esperado {esperado}, obtido {obtido}")
+
+    divergencias_itens = conferir_itens(processador)
+    print(f"Mensagens com vários itens: {len(CASOS_ITENS)} casos, {len(divergencias_itens)} divergências")
+    for texto, esperado, obtido in divergencias_itens:
+        print(f"  {texto!r}: esperado {esperado}, obtido {obtido}")
+
+    textos = [item['texto'].lower() for item in corpus]
+    for texto in textos:
+        assert busca_original(processador, texto, inteiras=True) == processador._categorizar(texto), texto
+
+    original, casador = medir([lambda texto: busca_original(processador, texto), processador._categorizar],
+                              textos, args.repeticoes)
+    completo, = medir([processador.extrair_informacoes_despesa], [item['texto'] for item in corpus], args.repeticoes)
+
+    print(f"Busca de palavras-chave  antes: {original:7.2f} us/mensagem   "
+          f"depois: {casador:6.2f} us/mensagem   ({original / casador:.1f}x)")
+    print(f"extrair_informacoes_despesa completo: {completo:.2f} us/mensagem")
+
+    return 1 if divergencias or divergencias_itens else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
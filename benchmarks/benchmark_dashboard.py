@@ -0,0 +1,123 @@
+"""
+Benchmark do carregamento do dashboard.
+
+Compara a sequência original de chamadas dos modelos feita pela rota
+``/dashboard`` (uma conexão por chamada e ``calcular_gasto_atual`` por
+orçamento) com ``carregar_dashboard``, para um usuário com muitas transações.
+
+Uso:
+    python benchmarks/benchmark_dashboard.py [--transacoes 50000] [--repeticoes 200]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.models import (  # noqa: E402
+    init_db, Usuario, Despesa, Receita, Lembrete, Orcamento, MetaFinanceira, Divida
+)
+from database.dashboard import carregar_dashboard  # noqa: E402
+from database.resumos import reconstruir_resumo  # noqa: E402
+
+CATEGORIAS = ['alimentação', 'transporte', 'moradia', 'saúde', 'educação', 'lazer', 'vestuário', 'outros']
+
+
+def popular(db_path, transacoes):
+    usuario_id = Usuario(db_path).criar('+5500000000003', 'Benchmark')
+    hoje = datetime.now()
+    agora = hoje.strftime("%Y-%m-%d %H:%M:%S")
+
+    # Carga direta no banco (os modelos gravariam uma linha por transação)
+    conn = sqlite3.connect(db_path)
+    for tabela in ('despesas', 'receitas'):
+        linhas = []
+        for _ in range(transacoes // 2):
+            data = (hoje - timedelta(days=random.randint(0, 730))).strftime("%Y-%m-%d")
+            linhas.append((usuario_id, round(random.uniform(5, 500), 2), random.choice(CATEGORIAS),
+                           'benchmark', data, agora, 'pessoal'))
+        conn.executemany(f'''
+        INSERT INTO {tabela} (usuario_id, valor, categoria, descricao, data, data_criacao, tipo_perfil)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', linhas)
+    conn.commit()
+    conn.close()
+    reconstruir_resumo(db_path, usuario_id)
+
+    orcamento = Orcamento(db_path)
+    for i, categoria in enumerate(CATEGORIAS):
+        orcamento.criar(usuario_id, categoria, 1000, ('mensal', 'semanal', 'anual')[i % 3])
+    for i in range(5):
+        MetaFinanceira(db_path).criar(usuario_id, f'Meta {i}', 5000, (hoje + timedelta(days=90)).strftime("%Y-%m-%d"))
+        Divida(db_path).criar(usuario_id, f'Dívida {i}', 3000, hoje.strftime("%Y-%m-%d"))
+        Lembrete(db_path).criar(usuario_id, f'Lembrete {i}', (hoje + timedelta(days=i)).strftime("%Y-%m-%d"))
+
+    return usuario_id
+
+
+def dashboard_original(db_path, usuario_id):
+    """Chamadas feitas pela rota antes do ``carregar_dashboard``"""
+    Usuario(db_path).buscar_por_id(usuario_id)
+    sorted(Lembrete(db_path).buscar(usuario_id=usuario_id, concluido=0), key=lambda x: x['data'])[:3]
+
+    orcamento_model = Orcamento(db_path)
+    for orcamento in orcamento_model.buscar(usuario_id=usuario_id, tipo_perfil='pessoal'):
+        orcamento['gasto_atual'] = orcamento_model.calcular_gasto_atual(orcamento_id=orcamento['id'])
+
+    MetaFinanceira(db_path).buscar(usuario_id=usuario_id, tipo_perfil='pessoal')
+    Divida(db_path).buscar(usuario_id=usuario_id, tipo_perfil='pessoal')
+
+    hoje = datetime.now()
+    data_inicio = (hoje - timedelta(days=30)).strftime("%Y-%m-%d")
+    data_fim = hoje.strftime("%Y-%m-%d")
+    despesa_model = Despesa(db_path)
+    receita_model = Receita(db_path)
+    despesa_model.buscar(usuario_id=usuario_id, data_inicio=data_inicio, data_fim=data_fim, limit=10)
+    receita_model.buscar(usuario_id=usuario_id, data_inicio=data_inicio, data_fim=data_fim, limit=10)
+
+    data_inicio_mes = f"{hoje.year}-{hoje.month:02d}-01"
+    despesa_model.total_periodo(usuario_id, data_inicio_mes, data_fim, 'pessoal')
+    receita_model.total_periodo(usuario_id, data_inicio_mes, data_fim, 'pessoal')
+
+
+def medir(nome, funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    p50 = tempos[len(tempos) // 2]
+    p95 = tempos[int(len(tempos) * 0.95) - 1]
+    print(f"{nome:<10} p50: {p50:>7.2f} ms   p95: {p95:>7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--transacoes', type=int, default=50000)
+    parser.add_argument('--repeticoes', type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(42)
+    db_path = os.path.join(tempfile.mkdtemp(), 'dashboard.db')
+    init_db(db_path)
+    usuario_id = popular(db_path, args.transacoes)
+
+    # Confere se os gastos dos orçamentos batem com o cálculo original
+    orcamento_model = Orcamento(db_path)
+    snapshot = carregar_dashboard(db_path, usuario_id)
+    for orcamento in snapshot.orcamentos:
+        esperado = orcamento_model.calcular_gasto_atual(orcamento['id'])
+        assert abs(orcamento['gasto_atual'] - esperado) < 0.01, (orcamento, esperado)
+
+    medir('antes', lambda: dashboard_original(db_path, usuario_id), args.repeticoes)
+    medir('depois', lambda: carregar_dashboard(db_path, usuario_id), args.repeticoes)
+
+
+if __name__ == '__main__':
+    main()
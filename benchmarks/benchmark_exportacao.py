@@ -0,0 +1,138 @@
+"""
+Benchmark de memória da exportação de despesas (CSV e XLSX).
+
+Compara o pico de memória (RSS máximo do processo) de:
+
+* ``antes``: ``Despesa.buscar`` carregando tudo, CSV montado numa string e
+  copiado para um ``BytesIO`` (com pandas, se instalado, como a rota fazia;
+  sem pandas, a mesma cadeia de cópias em Python puro);
+* ``streaming``: ``exportar_csv``, lendo o cursor com ``fetchmany`` e
+  gerando blocos codificados;
+* ``xlsx``: ``exportar_xlsx`` (xlsxwriter em ``constant_memory``), se o
+  xlsxwriter estiver instalado.
+
+Cada modo roda num subprocesso novo para que o pico de um não contamine o
+outro. O banco é gerado uma vez (``criar_em_lote``) e reaproveitado.
+
+Uso:
+    python benchmarks/benchmark_exportacao.py [--linhas 1000000] [--db caminho.db]
+"""
+import argparse
+import csv
+import importlib.util
+import io
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.models import init_db, Despesa  # noqa: E402
+
+CATEGORIAS = ('alimentação', 'transporte', 'moradia', 'lazer', 'saúde', 'outros')
+USUARIO_ID = 1
+LOTE_CARGA = 50000
+
+
+def popular(db_path, linhas):
+    init_db(db_path)
+    despesa = Despesa(db_path)
+    hoje = datetime.now()
+    random.seed(42)
+    for inicio in range(0, linhas, LOTE_CARGA):
+        despesa.criar_em_lote([
+            {
+                'usuario_id': USUARIO_ID,
+                'valor': round(random.uniform(1, 500), 2),
+                'categoria': random.choice(CATEGORIAS),
+                'descricao': f"Compra número {i} no mercado do bairro",
+                'data': (hoje - timedelta(days=random.randrange(3650))).strftime("%Y-%m-%d"),
+                'forma_pagamento': 'pix',
+                'mensagem_original': f"gastei {i} reais no mercado",
+            }
+            for i in range(inicio, min(inicio + LOTE_CARGA, linhas))
+        ])
+
+
+def pico_rss_mb():
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KiB, macOS em bytes
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+
+def exportar_antes(db_path):
+    despesas = Despesa(db_path).buscar(USUARIO_ID)
+    try:
+        import pandas as pd
+    except ImportError:
+        pd = None
+
+    if pd is not None:
+        df = pd.DataFrame(despesas)
+        df['data'] = pd.to_datetime(df['data']).dt.strftime('%d/%m/%Y')
+        df['data_criacao'] = pd.to_datetime(df['data_criacao']).dt.strftime('%d/%m/%Y %H:%M:%S')
+        csv_data = df.to_csv(index=False)
+    else:
+        buffer = io.StringIO()
+        escritor = csv.DictWriter(buffer, fieldnames=list(despesas[0]), lineterminator='\n')
+        escritor.writeheader()
+        escritor.writerows(despesas)
+        csv_data = buffer.getvalue()
+    return len(io.BytesIO(csv_data.encode()).getvalue())
+
+
+def exportar_streaming(db_path):
+    from database.exportacao import exportar_csv
+    return sum(len(bloco) for bloco in exportar_csv(db_path, 'despesas', USUARIO_ID))
+
+
+def exportar_xlsx(db_path):
+    from database.exportacao import exportar_xlsx as exportar
+    blocos, _ = exportar(db_path, 'despesas', USUARIO_ID)
+    return sum(len(bloco) for bloco in blocos)
+
+
+MODOS = {'antes': exportar_antes, 'streaming': exportar_streaming, 'xlsx': exportar_xlsx}
+
+
+def executar_modo(modo, db_path):
+    base = pico_rss_mb()
+    inicio = time.perf_counter()
+    tamanho = MODOS[modo](db_path)
+    segundos = time.perf_counter() - inicio
+    print(f"{modo:<10} {segundos:8.2f} s   pico RSS {pico_rss_mb():8.1f} MB "
+          f"(+{pico_rss_mb() - base:.1f} MB)   {tamanho / 1024 / 1024:8.1f} MB gerados")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=1000000)
+    parser.add_argument('--db', help="banco já populado (senão um temporário é criado)")
+    parser.add_argument('--modo', choices=tuple(MODOS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.modo:
+        executar_modo(args.modo, args.db)
+        return
+
+    db_path = args.db
+    if not db_path:
+        db_path = os.path.join(tempfile.mkdtemp(), 'exportacao.db')
+        inicio = time.perf_counter()
+        popular(db_path, args.linhas)
+        print(f"{args.linhas} despesas geradas em {time.perf_counter() - inicio:.1f} s")
+
+    modos = ['antes', 'streaming']
+    if importlib.util.find_spec('xlsxwriter'):
+        modos.append('xlsx')
+    for modo in modos:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--modo', modo, '--db', db_path], check=True)
+
+
+if __name__ == '__main__':
+    main()
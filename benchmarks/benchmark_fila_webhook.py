@@ -0,0 +1,99 @@
+"""
+Benchmark do webhook assíncrono (fila ``webhook_mensagens``).
+
+Simula uma rajada de mensagens de vários remetentes:
+
+* ``síncrono``: cada requisição processa a mensagem antes de responder
+  (como a rota ``/webhook`` sem ``WEBHOOK_ASSINCRONO``);
+* ``assíncrono``: a requisição só grava na fila; o ``ProcessadorWebhook``
+  processa em segundo plano e as respostas vão para um ``EnviadorMemoria``.
+
+Mede o tempo de resposta da requisição e confere que as respostas de cada
+remetente saem na ordem de chegada.
+
+Uso:
+    python benchmarks/benchmark_fila_webhook.py [--mensagens 400] [--remetentes 40] [--custo-ms 20]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.models import init_db  # noqa: E402
+from database.fila_webhook import FilaWebhook, ProcessadorWebhook, EnviadorMemoria  # noqa: E402
+
+
+def percentis(tempos):
+    tempos = sorted(tempos)
+    return tempos[len(tempos) // 2], tempos[int(len(tempos) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mensagens', type=int, default=400)
+    parser.add_argument('--remetentes', type=int, default=40)
+    parser.add_argument('--custo-ms', type=float, default=20,
+                        help='tempo simulado de processamento (usuário, parser, gravação, relatório)')
+    parser.add_argument('--trabalhadores', type=int, default=4)
+    args = parser.parse_args()
+
+    random.seed(42)
+    db_path = os.path.join(tempfile.mkdtemp(), 'webhook.db')
+    init_db(db_path)
+
+    rajada = [(f"whatsapp:+55119{random.randrange(args.remetentes):08d}", f"mensagem {i}")
+              for i in range(args.mensagens)]
+
+    def processar(mensagem, remetente, profile_name=None, mensagem_id=None):
+        time.sleep(args.custo_ms / 1000)
+        return f"ok: {mensagem}"
+
+    # Síncrono: a requisição espera o processamento
+    tempos = []
+    for remetente, mensagem in rajada[:min(len(rajada), 50)]:
+        inicio = time.perf_counter()
+        processar(mensagem, remetente)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    p50, p95 = percentis(tempos)
+    print(f"síncrono    resposta p50: {p50:7.2f} ms   p95: {p95:7.2f} ms")
+
+    # Assíncrono: a requisição só grava na fila
+    fila = FilaWebhook(db_path)
+    enviador = EnviadorMemoria()
+    processador = ProcessadorWebhook(fila, processar, enviador, trabalhadores=args.trabalhadores, intervalo=0.05)
+    processador.iniciar()
+
+    tempos = []
+    inicio_rajada = time.perf_counter()
+    for remetente, mensagem in rajada:
+        inicio = time.perf_counter()
+        fila.enfileirar(remetente, mensagem)
+        processador.notificar()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    p50, p95 = percentis(tempos)
+    print(f"assíncrono  resposta p50: {p50:7.2f} ms   p95: {p95:7.2f} ms")
+
+    while len(enviador.enviadas) < len(rajada):
+        time.sleep(0.01)
+    duracao = time.perf_counter() - inicio_rajada
+    processador.parar()
+    print(f"rajada de {len(rajada)} mensagens respondida em {duracao:.2f} s "
+          f"({args.trabalhadores} trabalhadores; sequencial levaria {len(rajada) * args.custo_ms / 1000:.2f} s)")
+
+    # Ordem por remetente
+    esperado = {}
+    for remetente, mensagem in rajada:
+        esperado.setdefault(remetente, []).append(f"ok: {mensagem}")
+    obtido = {}
+    for remetente, texto in enviador.enviadas:
+        obtido.setdefault(remetente, []).append(texto)
+    assert obtido == esperado, "respostas fora de ordem para algum remetente"
+    print("ordem por remetente preservada")
+
+
+if __name__ == '__main__':
+    main()
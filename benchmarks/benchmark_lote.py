@@ -0,0 +1,65 @@
+"""
+Benchmark do processamento em lote de mensagens (``TextProcessor.parse_many``).
+
+Simula o reprocessamento de mensagens arquivadas após uma mudança no parser:
+compara ``extrair_informacoes_despesa`` chamado mensagem a mensagem com
+``parse_many`` no processo atual e com um pool de processos. O ``parse_many``
+tira e formata o ``agora`` uma vez por lote; mensagem a mensagem isso se
+repete em cada chamada. Cada modo é medido ``--repeticoes`` vezes e vale o
+melhor tempo.
+
+Uso:
+    python benchmarks/benchmark_lote.py [--mensagens 50000] [--processos 4] [--repeticoes 3]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from database.models import processador_texto  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus_categorizacao.jsonl')
+
+
+def medir(nome, funcao, total, repeticoes):
+    segundos = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        segundos = min(segundos, time.perf_counter() - inicio)
+    print(f"{nome:<22} {segundos:7.3f} s   {total / segundos:10.0f} mensagens/s")
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mensagens', type=int, default=50000)
+    parser.add_argument('--processos', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    with open(CORPUS, encoding='utf-8') as arquivo:
+        corpus = [json.loads(linha)['texto'] for linha in arquivo if linha.strip()]
+    textos = (corpus * (args.mensagens // len(corpus) + 1))[:args.mensagens]
+    agora = datetime.now()
+
+    um_a_um = medir('uma por vez', lambda: [processador_texto.extrair_informacoes_despesa(t) for t in textos],
+                    len(textos), args.repeticoes)
+    lote = medir('parse_many', lambda: processador_texto.parse_many(textos, agora=agora, processos=0), len(textos),
+                 args.repeticoes)
+
+    Config.PARSER_LOTE_MINIMO_PROCESSOS = 0
+    paralelo = medir(f'parse_many ({args.processos} proc.)',
+                     lambda: processador_texto.parse_many(textos, agora=agora, processos=args.processos),
+                     len(textos), args.repeticoes)
+
+    assert um_a_um == lote == paralelo, "resultados divergentes entre os modos"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark da previsão de despesas e receitas (``database.previsao``).
+
+Preenche o ``resumo_mensal`` de um banco temporário com ``--anos`` anos de
+``--categorias`` categorias (tendência + sazonalidade anual + ruído) e mede:
+
+* ``matrizes``: montagem das matrizes categoria x mês a partir das linhas;
+* ``ajuste``: ajuste de todas as séries e previsão com faixa de confiança;
+* ``prever``: a chamada completa, da consulta ao dicionário da resposta.
+
+Também confere se o ajuste recupera a tendência gerada.
+
+Uso:
+    python benchmarks/benchmark_previsao.py [--anos 10] [--categorias 30] [--repeticoes 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.conexao import conectar  # noqa: E402
+from database.models import init_db  # noqa: E402
+from database.previsao import ajustar, carregar_series, montar_matrizes, nome_mes, prever  # noqa: E402
+
+USUARIO_ID = 1
+
+
+def popular(db_path, meses, categorias, atual):
+    """Séries sintéticas: base + tendência + sazonalidade + ruído, por categoria"""
+    init_db(db_path)
+    gerador = np.random.default_rng(42)
+    inicio = atual - meses
+    t = np.arange(meses + 1)
+    base = gerador.uniform(100, 2000, size=(categorias, 1))
+    tendencia = gerador.uniform(-2, 10, size=(categorias, 1))
+    amplitude = gerador.uniform(0, 300, size=(categorias, 1))
+    despesas = base + tendencia * t + amplitude * np.sin(2 * np.pi * ((inicio + t) % 12) / 12)
+    despesas += gerador.normal(0, 30, size=despesas.shape)
+    receitas = np.zeros_like(despesas)
+    receitas[0] = 8000 + 20 * t
+
+    conn = conectar(db_path)
+    try:
+        conn.executemany(
+            '''
+            INSERT INTO resumo_mensal (usuario_id, tipo_perfil, mes, categoria,
+                                       total_despesas, qtd_despesas, total_receitas, qtd_receitas)
+            VALUES (?, 'pessoal', ?, ?, ?, 10, ?, 1)
+            ''',
+            [
+                (USUARIO_ID, nome_mes(inicio + j), f"categoria {i:02d}",
+                 float(max(despesas[i, j], 0)), float(receitas[i, j]))
+                for i in range(categorias) for j in range(meses + 1)
+            ]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return tendencia.ravel()
+
+
+def medir(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        resultado = funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1000, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--anos', type=int, default=10)
+    parser.add_argument('--categorias', type=int, default=30)
+    parser.add_argument('--previsao', type=int, default=12, help="meses previstos")
+    parser.add_argument('--repeticoes', type=int, default=50)
+    args = parser.parse_args()
+
+    hoje = datetime.now()
+    atual = hoje.year * 12 + hoje.month - 1
+    meses = args.anos * 12
+    db_path = os.path.join(tempfile.mkdtemp(), 'previsao.db')
+    tendencia = popular(db_path, meses, args.categorias, atual)
+
+    conn = conectar(db_path)
+    try:
+        linhas = carregar_series(conn.cursor(), USUARIO_ID, nome_mes(atual - meses), nome_mes(atual))
+    finally:
+        conn.close()
+    print(f"{len(linhas)} linhas ({args.anos} anos x {args.categorias} categorias)")
+
+    ms, (_, despesas, _, receitas) = medir(lambda: montar_matrizes(linhas, atual - meses, meses + 1),
+                                           args.repeticoes)
+    print(f"matrizes {ms:8.2f} ms")
+
+    series = np.vstack([despesas, receitas, despesas.sum(axis=0), receitas.sum(axis=0)])[:, :meses]
+    indices = np.arange(atual + 1, atual + 1 + args.previsao)
+    ms, (previsao, _, sazonal) = medir(lambda: ajustar(series, atual - meses, indices), args.repeticoes)
+    print(f"ajuste   {ms:8.2f} ms   ({len(series)} séries, sazonal={sazonal})")
+
+    ms, _ = medir(lambda: prever(db_path, USUARIO_ID, meses, args.previsao, 'pessoal', hoje), args.repeticoes)
+    print(f"prever   {ms:8.2f} ms")
+
+    # Inclinação estimada (diferença entre meses previstos consecutivos, sem sazonalidade
+    # quando a distância é de 12 meses) contra a gerada
+    if args.previsao > 12:
+        estimada = (previsao[:args.categorias, 12] - previsao[:args.categorias, 0]) / 12
+        erro = np.abs(estimada - tendencia).max()
+        print(f"erro máximo da tendência: {erro:.3f} por mês")
+
+
+if __name__ == '__main__':
+    main()
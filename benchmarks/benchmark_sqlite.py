@@ -0,0 +1,120 @@
+"""
+Benchmark de vazão de leitura/escrita do SQLite.
+
+Compara o acesso original (sqlite3.connect por operação, journal padrão)
+com a configuração atual (pool, WAL, pragmas e fila de escrita), usando
+várias threads gravando despesas enquanto outras leem totais do período.
+
+Uso:
+    python benchmarks/benchmark_sqlite.py [--threads 8] [--segundos 5]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.models import init_db, Usuario, Despesa  # noqa: E402
+from database.conexao import fechar_pools  # noqa: E402
+
+INSERT = '''
+INSERT INTO despesas (usuario_id, valor, categoria, descricao, data, data_criacao, tipo_perfil)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+TOTAL = "SELECT SUM(valor) FROM despesas WHERE usuario_id = ? AND data >= ? AND data <= ?"
+
+
+def escrita_original(db_path, usuario_id):
+    conn = sqlite3.connect(db_path)
+    agora = datetime.now()
+    conn.execute(INSERT, (usuario_id, 12.5, 'alimentação', 'benchmark',
+                          agora.strftime("%Y-%m-%d"), agora.strftime("%Y-%m-%d %H:%M:%S"), 'pessoal'))
+    conn.commit()
+    conn.close()
+
+
+def leitura_original(db_path, usuario_id):
+    conn = sqlite3.connect(db_path)
+    conn.execute(TOTAL, (usuario_id, '2000-01-01', '2100-01-01')).fetchone()
+    conn.close()
+
+
+def executar(nome, escrever, ler, threads, segundos):
+    contadores = {'escritas': 0, 'leituras': 0, 'erros': 0}
+    lock = threading.Lock()
+    fim = time.perf_counter() + segundos
+
+    def trabalhador(escritor):
+        while time.perf_counter() < fim:
+            try:
+                if escritor:
+                    escrever()
+                    chave = 'escritas'
+                else:
+                    ler()
+                    chave = 'leituras'
+            except sqlite3.OperationalError:
+                chave = 'erros'
+            with lock:
+                contadores[chave] += 1
+
+    # Metade das threads grava (webhook), metade lê (dashboard)
+    lista = [threading.Thread(target=trabalhador, args=(i % 2 == 0,)) for i in range(threads)]
+    for t in lista:
+        t.start()
+    for t in lista:
+        t.join()
+
+    print(f"{nome:<10} escritas/s: {contadores['escritas'] / segundos:>9.1f}   "
+          f"leituras/s: {contadores['leituras'] / segundos:>9.1f}   "
+          f"erros 'database is locked': {contadores['erros']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--segundos', type=float, default=5)
+    args = parser.parse_args()
+
+    # Banco original: journal padrão, sem pool
+    pasta = tempfile.mkdtemp()
+    db_original = os.path.join(pasta, 'original.db')
+    init_db(db_original)
+    fechar_pools()
+    conn = sqlite3.connect(db_original)
+    conn.execute("PRAGMA journal_mode = DELETE")
+    usuario_original = conn.execute(
+        "INSERT INTO usuarios (celular, nome, data_criacao) VALUES (?, ?, ?)",
+        ('+5500000000001', 'Benchmark', datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    ).lastrowid
+    conn.commit()
+    conn.close()
+
+    executar(
+        'antes',
+        lambda: escrita_original(db_original, usuario_original),
+        lambda: leitura_original(db_original, usuario_original),
+        args.threads, args.segundos
+    )
+
+    # Banco novo: pool, WAL, pragmas e fila de escrita
+    db_novo = os.path.join(pasta, 'novo.db')
+    init_db(db_novo)
+    usuario_novo = Usuario(db_novo).criar('+5500000000002', 'Benchmark')
+    despesa_model = Despesa(db_novo)
+
+    executar(
+        'depois',
+        lambda: despesa_model.criar(usuario_novo, 12.5, 'alimentação', 'benchmark'),
+        lambda: despesa_model.total_periodo(usuario_novo, '2000-01-01', '2100-01-01'),
+        args.threads, args.segundos
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -7,7 +7,96 @@ class Config:
     
     # Banco de dados
     DATABASE = os.environ.get('DATABASE_PATH', 'database/financas.db')
+
+    # Pool de conexões (por processo/worker do gunicorn)
+    DB_POOL_TAMANHO = int(os.environ.get('DB_POOL_TAMANHO', 10))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 5))
+
+    # Armazenamento SQLite (pragmas aplicados em cada conexão nova)
+    DB_JOURNAL_MODE = os.environ.get('DB_JOURNAL_MODE', 'WAL')
+    DB_SYNCHRONOUS = os.environ.get('DB_SYNCHRONOUS', 'NORMAL')
+    DB_BUSY_TIMEOUT = int(os.environ.get('DB_BUSY_TIMEOUT', 5000))  # ms
+    DB_CACHE_SIZE = int(os.environ.get('DB_CACHE_SIZE', -16000))  # negativo = KiB (16 MB)
+    DB_MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', 64 * 1024 * 1024))  # bytes
+
+    # Fila de escrita: serializa as gravações do worker em uma única thread/conexão
+    DB_FILA_ESCRITA = os.environ.get('DB_FILA_ESCRITA', 'True') == 'True'
+    DB_FILA_ESCRITA_LOTE = int(os.environ.get('DB_FILA_ESCRITA_LOTE', 64))
+    DB_FILA_ESCRITA_TIMEOUT = float(os.environ.get('DB_FILA_ESCRITA_TIMEOUT', 30))  # segundos
+
+    # Cache dos resumos financeiros (backend 'local' ou 'compartilhado')
+    CACHE_RESUMO_ATIVO = os.environ.get('CACHE_RESUMO_ATIVO', 'True') == 'True'
+    CACHE_RESUMO_BACKEND = os.environ.get('CACHE_RESUMO_BACKEND', 'local')
+    CACHE_RESUMO_URL = os.environ.get('CACHE_RESUMO_URL')  # ex.: redis://localhost:6379/0
+    CACHE_RESUMO_TTL = int(os.environ.get('CACHE_RESUMO_TTL', 60))  # segundos
+    CACHE_RESUMO_MAX_ITENS = int(os.environ.get('CACHE_RESUMO_MAX_ITENS', 2000))
+
+    # Cache dos usuários por celular (remetente do webhook), por processo
+    CACHE_USUARIO_ATIVO = os.environ.get('CACHE_USUARIO_ATIVO', 'True') == 'True'
+    CACHE_USUARIO_TTL = int(os.environ.get('CACHE_USUARIO_TTL', 300))  # segundos
+    CACHE_USUARIO_MAX_ITENS = int(os.environ.get('CACHE_USUARIO_MAX_ITENS', 5000))
+    # Intervalo da consulta a MAX(usuarios.revisao) que detecta gravações de outros workers
+    CACHE_USUARIO_INTERVALO_REVISAO = float(os.environ.get('CACHE_USUARIO_INTERVALO_REVISAO', 5))  # segundos
+    CACHE_USUARIO_AQUECER_DIAS = int(os.environ.get('CACHE_USUARIO_AQUECER_DIAS', 7))
+    CACHE_USUARIO_AQUECER_LIMITE = int(os.environ.get('CACHE_USUARIO_AQUECER_LIMITE', 2000))
+
+    # TextProcessor.parse_many: processos para lotes grandes (0 = tudo no processo atual)
+    PARSER_PROCESSOS = int(os.environ.get('PARSER_PROCESSOS', 0))
+    PARSER_LOTE_MINIMO_PROCESSOS = int(os.environ.get('PARSER_LOTE_MINIMO_PROCESSOS', 5000))
+
+    # Webhook assíncrono: grava a mensagem na fila (SQLite) e responde na hora;
+    # as respostas saem depois pela API REST da Twilio (ou 'memoria' em testes)
+    WEBHOOK_ASSINCRONO = os.environ.get('WEBHOOK_ASSINCRONO', 'False') == 'True'
+    WEBHOOK_TRABALHADORES = int(os.environ.get('WEBHOOK_TRABALHADORES', 4))
+    WEBHOOK_ENVIADOR = os.environ.get('WEBHOOK_ENVIADOR', 'twilio')
+    WEBHOOK_MAX_TENTATIVAS = int(os.environ.get('WEBHOOK_MAX_TENTATIVAS', 5))
+    WEBHOOK_TIMEOUT_RESERVA = int(os.environ.get('WEBHOOK_TIMEOUT_RESERVA', 300))  # segundos
+    WEBHOOK_RETENCAO_DIAS = int(os.environ.get('WEBHOOK_RETENCAO_DIAS', 7))
+
+    # Reentregas da Twilio (mesmo MessageSid) devolvem a resposta já gerada
+    WEBHOOK_DEDUP_RETENCAO_HORAS = int(os.environ.get('WEBHOOK_DEDUP_RETENCAO_HORAS', 48))
+    WEBHOOK_DEDUP_ESPERA = float(os.environ.get('WEBHOOK_DEDUP_ESPERA', 10))  # segundos
     
+    # Importação de extratos (CSV/OFX): arquivos guardados fora de static/
+    IMPORTACAO_PASTA = os.environ.get('IMPORTACAO_PASTA', os.path.join(os.path.dirname(DATABASE), 'importacoes'))
+    IMPORTACAO_LOTE = int(os.environ.get('IMPORTACAO_LOTE', 1000))  # linhas por transação
+    IMPORTACAO_TAMANHO_MAXIMO = int(os.environ.get('IMPORTACAO_TAMANHO_MAXIMO', 50 * 1024 * 1024))  # bytes
+    IMPORTACAO_TIMEOUT_RESERVA = int(os.environ.get('IMPORTACAO_TIMEOUT_RESERVA', 300))  # segundos
+    IMPORTACAO_TRABALHADORES = int(os.environ.get('IMPORTACAO_TRABALHADORES', 1))  # por worker web
+
+    # Exportações: linhas lidas do cursor por vez (fetchmany)
+    EXPORTACAO_LOTE = int(os.environ.get('EXPORTACAO_LOTE', 2000))
+    # XLSX maiores que isto (bytes) são montados em arquivo temporário, não na memória
+    EXPORTACAO_MEMORIA_MAXIMA = int(os.environ.get('EXPORTACAO_MEMORIA_MAXIMA', 1024 * 1024))
+
+    # Exportações em segundo plano (CSV/XLSX/Parquet): arquivos guardados fora de static/
+    EXPORTACAO_PASTA = os.environ.get('EXPORTACAO_PASTA', os.path.join(os.path.dirname(DATABASE), 'exportacoes'))
+    EXPORTACAO_TRABALHADORES = int(os.environ.get('EXPORTACAO_TRABALHADORES', 2))
+    EXPORTACAO_VALIDADE_DIAS = int(os.environ.get('EXPORTACAO_VALIDADE_DIAS', 7))
+    EXPORTACAO_TIMEOUT_RESERVA = int(os.environ.get('EXPORTACAO_TIMEOUT_RESERVA', 1800))  # segundos
+    # False quando a fila roda em processo próprio (python -m database.fila_exportacao)
+    EXPORTACAO_PROCESSAR_NA_WEB = os.environ.get('EXPORTACAO_PROCESSAR_NA_WEB', 'True') == 'True'
+
+    # Cache em disco das imagens de gráfico (PNG/SVG), por conteúdo, com LRU por tamanho
+    GRAFICOS_CACHE_ATIVO = os.environ.get('GRAFICOS_CACHE_ATIVO', 'True') == 'True'
+    GRAFICOS_CACHE_PASTA = os.environ.get('GRAFICOS_CACHE_PASTA', os.path.join(os.path.dirname(DATABASE), 'graficos'))
+    GRAFICOS_CACHE_MAX_BYTES = int(os.environ.get('GRAFICOS_CACHE_MAX_BYTES', 100 * 1024 * 1024))
+    GRAFICOS_CACHE_FRACAO_APOS_LIMPEZA = float(os.environ.get('GRAFICOS_CACHE_FRACAO_APOS_LIMPEZA', 0.8))
+
+    # Renderização dos gráficos em processos separados (0 = na thread da requisição)
+    GRAFICOS_PROCESSOS = int(os.environ.get('GRAFICOS_PROCESSOS', 2))
+    GRAFICOS_MAX_PENDENTES = int(os.environ.get('GRAFICOS_MAX_PENDENTES', 4))  # por worker; acima disso, SVG simples
+    GRAFICOS_TIMEOUT = float(os.environ.get('GRAFICOS_TIMEOUT', 10))  # segundos
+
+    # Consultas analíticas (database.planejador) mais lentas que isto são registradas no log
+    CONSULTA_LENTA_MS = float(os.environ.get('CONSULTA_LENTA_MS', 200))
+
+    # Logs estruturados (JSON em stderr, escritos por uma thread a partir de uma fila)
+    LOG_NIVEL = os.environ.get('LOG_NIVEL', 'INFO')
+    LOG_AMOSTRAGEM = os.environ.get('LOG_AMOSTRAGEM', 'webhook:0.1')  # rota:taxa para DEBUG/INFO
+    LOG_MASCARAR = os.environ.get('LOG_MASCARAR', 'True') == 'True'  # telefones e conteúdo das mensagens
+    LOG_FILA_MAXIMA = int(os.environ.get('LOG_FILA_MAXIMA', 10000))
+
     # Configurações da Twilio
     TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID', 'AC44f80c30e4bb518bd8c4a0e48ce0e5cb')
     TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN', 'cd4ee54cc121bc56cbe4e0b50b71c426')
@@ -0,0 +1,278 @@
+"""
+Cache dos resumos financeiros por usuário.
+
+As chaves são ``(usuario_id, periodo, tipo_perfil)``. Cada usuário tem uma
+geração que faz parte da chave: as gravações de ``Despesa``, ``Receita``,
+``Divida`` e ``MetaFinanceira`` chamam ``invalidar_resumo(usuario_id)``, que
+avança a geração e torna inalcançáveis as entradas antigas. Assim um resumo
+calculado durante uma gravação nunca é lido depois dela.
+
+Backends:
+
+* ``CacheLocal``: em memória no processo, com LRU e TTL. Cada worker do
+  gunicorn tem o seu; a invalidação vale só no processo que gravou e o TTL
+  limita quanto tempo os outros podem ver um valor antigo.
+* ``CacheCompartilhado``: usa um cliente com a API do redis-py
+  (``get``/``setex``/``incr``), compartilhado entre os workers. O LRU fica a
+  cargo do servidor (``maxmemory-policy allkeys-lru``). ``ClienteMemoria``
+  implementa a mesma API localmente e pode substituir o servidor em
+  desenvolvimento.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+from log_estruturado import obter_logger
+
+_AUSENTE = object()
+
+log = obter_logger('cache')
+
+
+class CacheLocal:
+    """Cache LRU com expiração (TTL) em memória"""
+
+    def __init__(self, max_itens=2000, ttl=60):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._geracoes = {}
+        self._lock = threading.Lock()
+        self.expirados = 0
+        self.removidos_lru = 0
+
+    def obter(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return _AUSENTE
+            expira_em, valor = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                self.expirados += 1
+                return _AUSENTE
+            self._itens.move_to_end(chave)
+            return valor
+
+    def definir(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + self.ttl, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+                self.removidos_lru += 1
+
+    def geracao(self, usuario_id):
+        return self._geracoes.get(usuario_id, 0)
+
+    def invalidar(self, usuario_id):
+        with self._lock:
+            self._geracoes[usuario_id] = self._geracoes.get(usuario_id, 0) + 1
+            # Libera já as entradas do usuário em vez de esperar o LRU/TTL
+            prefixo = f"{usuario_id}:"
+            for chave in [chave for chave in self._itens if chave.startswith(prefixo)]:
+                del self._itens[chave]
+
+    def estatisticas(self):
+        return {
+            'backend': 'local',
+            'itens': len(self._itens),
+            'max_itens': self.max_itens,
+            'ttl': self.ttl,
+            'expirados': self.expirados,
+            'removidos_lru': self.removidos_lru
+        }
+
+
+class ClienteMemoria:
+    """Substituto local de um cliente redis (get/setex/incr)"""
+
+    def __init__(self):
+        self._dados = {}
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None:
+                return None
+            valor, expira_em = item
+            if expira_em is not None and expira_em < time.monotonic():
+                del self._dados[chave]
+                return None
+            return valor
+
+    def setex(self, chave, segundos, valor):
+        with self._lock:
+            self._dados[chave] = (valor, time.monotonic() + segundos)
+        return True
+
+    def incr(self, chave):
+        with self._lock:
+            valor, expira_em = self._dados.get(chave, (0, None))
+            valor = int(valor) + 1
+            self._dados[chave] = (valor, expira_em)
+            return valor
+
+
+class CacheCompartilhado:
+    """Cache em um servidor compartilhado (redis ou ``ClienteMemoria``)"""
+
+    def __init__(self, cliente, ttl=60, prefixo='despezap:resumo'):
+        self.cliente = cliente
+        self.ttl = ttl
+        self.prefixo = prefixo
+
+    def obter(self, chave):
+        valor = self.cliente.get(f"{self.prefixo}:{chave}")
+        if valor is None:
+            return _AUSENTE
+        return json.loads(valor)
+
+    def definir(self, chave, valor):
+        self.cliente.setex(f"{self.prefixo}:{chave}", self.ttl, json.dumps(valor))
+
+    def geracao(self, usuario_id):
+        return int(self.cliente.get(f"{self.prefixo}:geracao:{usuario_id}") or 0)
+
+    def invalidar(self, usuario_id):
+        # As entradas da geração anterior expiram pelo TTL
+        self.cliente.incr(f"{self.prefixo}:geracao:{usuario_id}")
+
+    def estatisticas(self):
+        return {
+            'backend': 'compartilhado',
+            'cliente': type(self.cliente).__name__,
+            'ttl': self.ttl
+        }
+
+
+class CacheResumo:
+    """Resumos por (usuario_id, periodo, tipo_perfil) com contadores de acerto"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.acertos = 0
+        self.falhas = 0
+        self.invalidacoes = 0
+        self.erros = 0
+
+    def obter_ou_calcular(self, usuario_id, periodo, tipo_perfil, calcular):
+        """Retorna o resumo do cache ou ``calcular()`` (e guarda o resultado).
+
+        O valor devolvido é compartilhado com outras requisições: não altere.
+        """
+        try:
+            chave = f"{usuario_id}:{self.backend.geracao(usuario_id)}:{periodo}:{tipo_perfil or ''}"
+            valor = self.backend.obter(chave)
+        except Exception:
+            # Cache fora do ar não pode derrubar a requisição
+            log.excecao('erro_leitura_cache_resumo', usuario_id=usuario_id)
+            self.erros += 1
+            return calcular()
+
+        if valor is not _AUSENTE:
+            self.acertos += 1
+            return valor
+
+        self.falhas += 1
+        valor = calcular()
+
+        try:
+            self.backend.definir(chave, valor)
+        except Exception:
+            log.excecao('erro_gravacao_cache_resumo', usuario_id=usuario_id)
+            self.erros += 1
+
+        return valor
+
+    def invalidar(self, usuario_id):
+        try:
+            self.backend.invalidar(usuario_id)
+            self.invalidacoes += 1
+        except Exception:
+            log.excecao('erro_invalidacao_cache_resumo', usuario_id=usuario_id)
+            self.erros += 1
+
+    def estatisticas(self):
+        consultas = self.acertos + self.falhas
+        estatisticas = {
+            'acertos': self.acertos,
+            'falhas': self.falhas,
+            'taxa_acerto': round(self.acertos / consultas, 3) if consultas else 0.0,
+            'invalidacoes': self.invalidacoes,
+            'erros': self.erros
+        }
+        estatisticas.update(self.backend.estatisticas())
+        return estatisticas
+
+
+class _SemCache:
+    """Backend usado com ``CACHE_RESUMO_ATIVO`` desligado"""
+
+    def obter(self, chave):
+        return _AUSENTE
+
+    def definir(self, chave, valor):
+        pass
+
+    def geracao(self, usuario_id):
+        return 0
+
+    def invalidar(self, usuario_id):
+        pass
+
+    def estatisticas(self):
+        return {'backend': 'desligado'}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _criar_backend():
+    if not Config.CACHE_RESUMO_ATIVO:
+        return _SemCache()
+
+    if Config.CACHE_RESUMO_BACKEND == 'compartilhado':
+        if Config.CACHE_RESUMO_URL:
+            try:
+                import redis
+                cliente = redis.Redis.from_url(Config.CACHE_RESUMO_URL)
+                return CacheCompartilhado(cliente, ttl=Config.CACHE_RESUMO_TTL)
+            except ImportError:
+                log.aviso('redis_indisponivel', backend='local')
+        else:
+            return CacheCompartilhado(ClienteMemoria(), ttl=Config.CACHE_RESUMO_TTL)
+
+    return CacheLocal(max_itens=Config.CACHE_RESUMO_MAX_ITENS, ttl=Config.CACHE_RESUMO_TTL)
+
+
+def obter_cache():
+    """Retorna o cache de resumos do processo (criado conforme o Config)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CacheResumo(_criar_backend())
+    return _cache
+
+
+def definir_cache(cache):
+    """Substitui o cache de resumos (ex.: ``CacheResumo(CacheCompartilhado(ClienteMemoria()))``)"""
+    global _cache
+    with _cache_lock:
+        _cache = cache
+
+
+def invalidar_resumo(usuario_id):
+    """Descarta os resumos em cache do usuário (chamado após as gravações)"""
+    if usuario_id is not None:
+        obter_cache().invalidar(usuario_id)
+
+
+def estatisticas_cache():
+    """Contadores de acerto/falha do cache de resumos"""
+    return obter_cache().estatisticas()
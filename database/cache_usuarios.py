@@ -0,0 +1,283 @@
+"""
+Cache dos usuários por número de celular.
+
+Toda mensagem do WhatsApp começa resolvendo o remetente
+(``Usuario.buscar_por_celular``). Com este cache, para os usuários ativos
+isso vira uma consulta a um dicionário em memória, sem ir ao banco.
+
+* LRU com expiração (TTL), por processo: cada worker do gunicorn tem o seu.
+* Gravações feitas em outro worker: todo UPDATE em ``usuarios`` leva a
+  linha para ``MAX(revisao) + 1`` (trigger da migração 012). No máximo uma
+  vez por ``CACHE_USUARIO_INTERVALO_REVISAO`` segundos, por processo,
+  ``sincronizar_revisoes`` busca as linhas com revisão maior que a última
+  vista (pelo índice) e descarta esses usuários. Fora dessa consulta os
+  acertos não tocam o banco.
+* As gravações em ``usuarios`` feitas pelo ``Usuario`` (``atualizar``,
+  ``registrar_acesso``, ``definir_admin``, e por consequência ``mudar_plano``
+  e ``cancelar_assinatura``) chamam ``invalidar_usuario``.
+* Cada invalidação avança a versão do cache; um registro lido do banco antes
+  dela não é mais guardado, então uma leitura concorrente com a gravação não
+  deixa o valor antigo no cache.
+* ``aquecer_cache_usuarios`` carrega na inicialização os usuários com
+  lançamentos recentes.
+
+As chaves incluem o ``db_path``, então bancos diferentes no mesmo processo
+(ex.: ``verificar_indices``) não se misturam.
+"""
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from config import Config
+from database.conexao import conectar
+
+
+class CacheUsuarios:
+    """Usuários por (db_path, celular), com LRU e TTL"""
+
+    def __init__(self, max_itens=5000, ttl=300, intervalo_revisao=5.0):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self.intervalo_revisao = intervalo_revisao
+        self._itens = OrderedDict()
+        self._celulares = {}  # (db_path, usuario_id) -> celular
+        self._revisoes = {}  # db_path -> (última revisão vista ou None, próxima verificação)
+        self._versao = 0
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.invalidacoes = 0
+        self.expirados = 0
+        self.desatualizados = 0
+        self.removidos_lru = 0
+
+    def obter(self, db_path, celular):
+        """Retorna uma cópia do usuário em cache ou None"""
+        chave = (db_path, celular)
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.falhas += 1
+                return None
+            expira_em, usuario = item
+            if expira_em < time.monotonic():
+                self._remover(chave)
+                self.expirados += 1
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+        return dict(usuario)
+
+    def versao(self):
+        """Versão atual; passe-a para ``definir`` junto com o registro lido depois"""
+        return self._versao
+
+    def definir(self, db_path, usuario, versao):
+        """Guarda o usuário, salvo se houve invalidação desde ``versao``"""
+        celular = usuario.get('celular')
+        if not celular:
+            return
+        chave = (db_path, celular)
+        with self._lock:
+            if versao != self._versao:
+                return
+            self._itens[chave] = (time.monotonic() + self.ttl, dict(usuario))
+            self._itens.move_to_end(chave)
+            self._celulares[(db_path, usuario['id'])] = celular
+            while len(self._itens) > self.max_itens:
+                antiga, (_, removido) = self._itens.popitem(last=False)
+                self._descartar_indice(antiga, removido)
+                self.removidos_lru += 1
+
+    def invalidar(self, db_path, usuario_id):
+        with self._lock:
+            self._versao += 1
+            self.invalidacoes += 1
+            celular = self._celulares.get((db_path, usuario_id))
+            if celular is not None:
+                self._remover((db_path, celular))
+
+    def revisao_a_verificar(self, db_path):
+        """``(True, última revisão vista)`` se é hora de consultar o banco, senão ``(False, None)``"""
+        agora = time.monotonic()
+        with self._lock:
+            vista, proxima = self._revisoes.get(db_path, (None, 0.0))
+            if agora < proxima:
+                return False, None
+            self._revisoes[db_path] = (vista, agora + self.intervalo_revisao)
+            return True, vista
+
+    def registrar_revisao(self, db_path, revisao):
+        """Define a revisão de partida (lida antes de carregar usuários do banco)"""
+        with self._lock:
+            vista, proxima = self._revisoes.get(db_path, (None, 0.0))
+            if vista is None:
+                self._revisoes[db_path] = (revisao, proxima)
+
+    def aplicar_revisoes(self, db_path, revisao, usuario_ids):
+        """Descarta os usuários gravados por outros processos e avança a revisão vista"""
+        with self._lock:
+            vista, proxima = self._revisoes.get(db_path, (None, 0.0))
+            # Leituras em andamento podem ser anteriores à gravação: não entram
+            self._versao += 1
+            if vista is None:
+                # Sem revisão de partida não se sabe o que mudou: descarta o banco todo
+                for chave in [chave for chave in self._itens if chave[0] == db_path]:
+                    self._remover(chave)
+            for usuario_id in usuario_ids:
+                celular = self._celulares.get((db_path, usuario_id))
+                if celular is not None:
+                    self._remover((db_path, celular))
+                    self.desatualizados += 1
+            self._revisoes[db_path] = (max(revisao, vista or 0), proxima)
+
+    def limpar(self):
+        with self._lock:
+            self._versao += 1
+            self._itens.clear()
+            self._celulares.clear()
+
+    def _remover(self, chave):
+        item = self._itens.pop(chave, None)
+        if item is not None:
+            self._descartar_indice(chave, item[1])
+
+    def _descartar_indice(self, chave, usuario):
+        db_path, celular = chave
+        indice = (db_path, usuario['id'])
+        if self._celulares.get(indice) == celular:
+            del self._celulares[indice]
+
+    def estatisticas(self):
+        consultas = self.acertos + self.falhas
+        return {
+            'itens': len(self._itens),
+            'max_itens': self.max_itens,
+            'ttl': self.ttl,
+            'acertos': self.acertos,
+            'falhas': self.falhas,
+            'taxa_acerto': round(self.acertos / consultas, 3) if consultas else 0.0,
+            'invalidacoes': self.invalidacoes,
+            'expirados': self.expirados,
+            'desatualizados': self.desatualizados,
+            'removidos_lru': self.removidos_lru
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def obter_cache_usuarios():
+    """Retorna o cache de usuários do processo (criado conforme o Config)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                # Com o cache desligado nada fica guardado (max_itens = 0)
+                max_itens = Config.CACHE_USUARIO_MAX_ITENS if Config.CACHE_USUARIO_ATIVO else 0
+                _cache = CacheUsuarios(max_itens=max_itens, ttl=Config.CACHE_USUARIO_TTL,
+                                       intervalo_revisao=Config.CACHE_USUARIO_INTERVALO_REVISAO)
+    return _cache
+
+
+def invalidar_usuario(db_path, usuario_id):
+    """Descarta o usuário do cache (chamado após as gravações em ``usuarios``)"""
+    if usuario_id is not None:
+        obter_cache_usuarios().invalidar(db_path, usuario_id)
+
+
+def sincronizar_revisoes(db_path):
+    """Descarta do cache os usuários alterados por outros processos.
+
+    Consulta o banco no máximo uma vez por ``intervalo_revisao`` segundos;
+    nas demais chamadas não faz nada.
+    """
+    cache = obter_cache_usuarios()
+    if cache.max_itens <= 0:
+        return
+    verificar, vista = cache.revisao_a_verificar(db_path)
+    if not verificar:
+        return
+
+    conn = conectar(db_path)
+    try:
+        cursor = conn.cursor()
+        if vista is None:
+            cursor.execute("SELECT COALESCE(MAX(revisao), 0) FROM usuarios")
+            revisao, usuario_ids = cursor.fetchone()[0], []
+        else:
+            cursor.execute("SELECT id, revisao FROM usuarios WHERE revisao > ?", (vista,))
+            linhas = cursor.fetchall()
+            revisao = max((linha[1] for linha in linhas), default=vista)
+            usuario_ids = [linha[0] for linha in linhas]
+    finally:
+        conn.close()
+
+    if vista is None or usuario_ids:
+        cache.aplicar_revisoes(db_path, revisao, usuario_ids)
+
+
+def aquecer_cache_usuarios(db_path, dias=None, limite=None):
+    """Carrega no cache os usuários com despesas/receitas nos últimos ``dias``
+
+    Retorna quantos usuários foram carregados.
+    """
+    cache = obter_cache_usuarios()
+    if dias is None:
+        dias = Config.CACHE_USUARIO_AQUECER_DIAS
+    if limite is None:
+        limite = Config.CACHE_USUARIO_AQUECER_LIMITE
+    limite = min(limite, cache.max_itens)
+    if limite <= 0:
+        return 0
+
+    desde = (datetime.now() - timedelta(days=dias)).strftime("%Y-%m-%d")
+    versao = cache.versao()
+
+    conn = conectar(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    # Revisão de partida: gravações posteriores a ela são vistas pelo sincronizar_revisoes
+    cursor.execute("SELECT COALESCE(MAX(revisao), 0) FROM usuarios")
+    cache.registrar_revisao(db_path, cursor.fetchone()[0])
+
+    cursor.execute("""
+        SELECT usuario_id, MAX(data) AS ultima FROM (
+            SELECT usuario_id, data FROM despesas WHERE data >= ?
+            UNION ALL
+            SELECT usuario_id, data FROM receitas WHERE data >= ?
+        )
+        GROUP BY usuario_id
+        ORDER BY ultima DESC
+        LIMIT ?
+    """, (desde, desde, limite))
+    ativos = [linha['usuario_id'] for linha in cursor.fetchall()]
+
+    usuarios = {}
+    for inicio in range(0, len(ativos), 500):
+        lote = ativos[inicio:inicio + 500]
+        cursor.execute(
+            f"SELECT * FROM usuarios WHERE id IN ({', '.join('?' * len(lote))}) AND celular IS NOT NULL",
+            lote
+        )
+        for usuario in cursor.fetchall():
+            usuarios[usuario['id']] = dict(usuario)
+
+    conn.close()
+
+    # Mais recentes por último: o LRU mantém os mais ativos
+    carregados = [usuarios[usuario_id] for usuario_id in reversed(ativos) if usuario_id in usuarios]
+    for usuario in carregados:
+        cache.definir(db_path, usuario, versao)
+
+    return len(carregados)
+
+
+def estatisticas_cache_usuarios():
+    """Contadores de acerto/falha do cache de usuários"""
+    return obter_cache_usuarios().estatisticas()
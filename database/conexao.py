@@ -0,0 +1,276 @@
+"""
+Pool de conexões SQLite compartilhado pelos modelos do DespeZap.
+
+Cada processo (worker do gunicorn) mantém um pool por arquivo de banco.
+Os modelos pegam uma conexão emprestada com ``conectar(db_path)`` e a
+devolvem com o ``conn.close()`` de sempre.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from config import Config
+
+
+# Callback opcional que recebe todo SQL executado (ver database/verificar_indices.py)
+_rastreador_sql = None
+
+
+def definir_rastreador_sql(callback):
+    """Registra um callback de rastreamento para as conexões abertas a partir de agora"""
+    global _rastreador_sql
+    _rastreador_sql = callback
+
+
+def pragmas_configurados():
+    """Pragmas aplicados uma única vez, quando a conexão é aberta"""
+    return (
+        ('journal_mode', Config.DB_JOURNAL_MODE),
+        ('synchronous', Config.DB_SYNCHRONOUS),
+        ('busy_timeout', Config.DB_BUSY_TIMEOUT),
+        ('cache_size', Config.DB_CACHE_SIZE),
+        ('mmap_size', Config.DB_MMAP_SIZE),
+        ('temp_store', 'MEMORY'),
+    )
+
+
+def abrir_conexao(db_path, pragmas=None):
+    """Abre uma conexão física já configurada com os pragmas de armazenamento"""
+    if pragmas is None:
+        pragmas = pragmas_configurados()
+    conn = sqlite3.connect(
+        db_path,
+        timeout=Config.DB_BUSY_TIMEOUT / 1000,
+        check_same_thread=False
+    )
+    for nome, valor in pragmas:
+        conn.execute(f"PRAGMA {nome} = {valor}")
+    if _rastreador_sql is not None:
+        conn.set_trace_callback(_rastreador_sql)
+    return conn
+
+
+class ConexaoEmprestada:
+    """Conexão emprestada do pool.
+
+    Repassa atributos e métodos para a conexão sqlite3 real, de forma que o
+    código existente (``row_factory``, ``cursor()``, ``commit()``...) continua
+    funcionando. ``close()`` devolve a conexão ao pool em vez de fechá-la.
+    """
+
+    def __init__(self, pool, conn, descartavel=False):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_descartavel', descartavel)
+
+    def __getattr__(self, nome):
+        conn = object.__getattribute__(self, '_conn')
+        if conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(conn, nome)
+
+    def __setattr__(self, nome, valor):
+        conn = object.__getattribute__(self, '_conn')
+        if conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        setattr(conn, nome, valor)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    def close(self):
+        """Devolve a conexão ao pool"""
+        conn = object.__getattribute__(self, '_conn')
+        if conn is None:
+            return
+        object.__setattr__(self, '_conn', None)
+        self._pool.devolver(conn, self._descartavel)
+
+    def __del__(self):
+        # Rede de segurança para métodos que retornam antes do close()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class PoolSQLite:
+    """Pool de conexões thread-safe para um arquivo SQLite"""
+
+    def __init__(self, db_path, tamanho=10, timeout=5.0, pragmas=None):
+        self.db_path = db_path
+        self.tamanho = tamanho
+        self.timeout = timeout
+        self.pragmas = tuple(pragmas) if pragmas is not None else pragmas_configurados()
+        self.pid = os.getpid()
+
+        self._livres = deque()
+        self._abertas = 0
+        self._cond = threading.Condition(threading.Lock())
+
+        # Métricas
+        self._checkouts = 0
+        self._esperas = 0
+        self._tempo_espera_total = 0.0
+        self._tempo_espera_max = 0.0
+        self._overflow = 0
+        self._criadas = 0
+
+    def _nova_conexao(self):
+        """Abre uma conexão e aplica os pragmas"""
+        return abrir_conexao(self.db_path, self.pragmas)
+
+    def obter(self):
+        """Empresta uma conexão, aguardando até ``timeout`` segundos se o pool estiver cheio"""
+        inicio = time.perf_counter()
+        conn = None
+        abrir = False
+        descartavel = False
+        esperou = False
+
+        with self._cond:
+            limite = inicio + self.timeout
+            while True:
+                if self._livres:
+                    conn = self._livres.pop()
+                    break
+                if self._abertas < self.tamanho:
+                    self._abertas += 1
+                    abrir = True
+                    break
+                restante = limite - time.perf_counter()
+                if restante <= 0:
+                    # Pool esgotado: abre uma conexão avulsa em vez de falhar
+                    self._overflow += 1
+                    abrir = True
+                    descartavel = True
+                    break
+                esperou = True
+                self._cond.wait(restante)
+
+            espera = time.perf_counter() - inicio
+            self._checkouts += 1
+            if esperou:
+                self._esperas += 1
+                self._tempo_espera_total += espera
+                self._tempo_espera_max = max(self._tempo_espera_max, espera)
+
+        if abrir:
+            try:
+                conn = self._nova_conexao()
+            except Exception:
+                if not descartavel:
+                    with self._cond:
+                        self._abertas -= 1
+                        self._cond.notify()
+                raise
+            with self._cond:
+                self._criadas += 1
+
+        return ConexaoEmprestada(self, conn, descartavel)
+
+    def devolver(self, conn, descartavel=False):
+        """Recebe a conexão de volta, limpando o estado deixado pelo chamador"""
+        invalida = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+        except sqlite3.Error:
+            invalida = True
+
+        if descartavel or invalida:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            if not descartavel:
+                # Conexão do pool inutilizável: libera a vaga para uma nova
+                with self._cond:
+                    self._abertas -= 1
+                    self._cond.notify()
+            return
+
+        with self._cond:
+            self._livres.append(conn)
+            self._cond.notify()
+
+    def fechar(self):
+        """Fecha todas as conexões livres do pool"""
+        with self._cond:
+            while self._livres:
+                conn = self._livres.pop()
+                self._abertas -= 1
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+
+    def estatisticas(self):
+        """Retorna as métricas do pool"""
+        with self._cond:
+            livres = len(self._livres)
+            return {
+                'db_path': self.db_path,
+                'tamanho': self.tamanho,
+                'abertas': self._abertas,
+                'livres': livres,
+                'em_uso': self._abertas - livres,
+                'checkouts': self._checkouts,
+                'esperas': self._esperas,
+                'tempo_espera_total_ms': round(self._tempo_espera_total * 1000, 3),
+                'tempo_espera_max_ms': round(self._tempo_espera_max * 1000, 3),
+                'tempo_espera_medio_ms': round(self._tempo_espera_total * 1000 / self._esperas, 3) if self._esperas else 0.0,
+                'overflow': self._overflow,
+                'conexoes_criadas': self._criadas
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def obter_pool(db_path):
+    """Retorna o pool do processo atual para o banco informado"""
+    chave = os.path.abspath(db_path)
+    pool = _pools.get(chave)
+
+    # Após um fork (gunicorn --preload) as conexões herdadas não podem ser reutilizadas
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+
+    with _pools_lock:
+        pool = _pools.get(chave)
+        if pool is None or pool.pid != os.getpid():
+            pool = PoolSQLite(
+                db_path,
+                tamanho=Config.DB_POOL_TAMANHO,
+                timeout=Config.DB_POOL_TIMEOUT
+            )
+            _pools[chave] = pool
+        return pool
+
+
+def conectar(db_path):
+    """Empresta uma conexão do pool compartilhado (substitui ``sqlite3.connect``)"""
+    return obter_pool(db_path).obter()
+
+
+def estatisticas_pool():
+    """Métricas de todos os pools do processo atual"""
+    return [pool.estatisticas() for pool in list(_pools.values()) if pool.pid == os.getpid()]
+
+
+def fechar_pools():
+    """Fecha as conexões livres de todos os pools"""
+    with _pools_lock:
+        for pool in _pools.values():
+            if pool.pid == os.getpid():
+                pool.fechar()
+        _pools.clear()
@@ -0,0 +1,183 @@
+"""
+Carregamento dos dados do dashboard em uma única conexão.
+
+A página ``/dashboard`` chamava cerca de dez métodos dos modelos, cada um
+com sua conexão, e ``Orcamento.calcular_gasto_atual`` uma vez por orçamento
+(N+1). ``carregar_dashboard`` busca tudo com poucas consultas em conjunto:
+o gasto de todos os orçamentos sai de um único ``GROUP BY``.
+"""
+import calendar
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from database.conexao import conectar
+from database.resumos import dividir_periodo, resumo_financeiro
+
+
+@dataclass
+class DashboardSnapshot:
+    """Dados exibidos no dashboard do usuário"""
+    usuario: Optional[dict]
+    lembretes: List[dict] = field(default_factory=list)
+    orcamentos: List[dict] = field(default_factory=list)
+    metas: List[dict] = field(default_factory=list)
+    dividas: List[dict] = field(default_factory=list)
+    transacoes: List[dict] = field(default_factory=list)
+    total_despesas_mes: float = 0
+    total_receitas_mes: float = 0
+
+    @property
+    def saldo_mes(self):
+        return self.total_receitas_mes - self.total_despesas_mes
+
+
+def periodo_orcamento(periodicidade, hoje):
+    """Retorna (data_inicio, data_fim) do período atual do orçamento ou None"""
+    if periodicidade == 'mensal':
+        ultimo_dia = calendar.monthrange(hoje.year, hoje.month)[1]
+        return f"{hoje.year}-{hoje.month:02d}-01", f"{hoje.year}-{hoje.month:02d}-{ultimo_dia:02d}"
+
+    if periodicidade == 'semanal':
+        # Segunda-feira a domingo
+        return (
+            (hoje - timedelta(days=hoje.weekday())).strftime("%Y-%m-%d"),
+            (hoje + timedelta(days=6 - hoje.weekday())).strftime("%Y-%m-%d")
+        )
+
+    if periodicidade == 'anual':
+        return f"{hoje.year}-01-01", f"{hoje.year}-12-31"
+
+    return None
+
+
+def _percentual(parte, total):
+    return (parte / total) * 100 if total and total > 0 else 0
+
+
+def _gastos_orcamentos(cursor, usuario_id, tipo_perfil, orcamentos, hoje):
+    """Preenche gasto_atual/percentual de todos os orçamentos com um GROUP BY.
+
+    Os meses completos de cada período (mensal e anual) vêm do resumo
+    mensal; só os trechos parciais (semana) leem a tabela de despesas.
+    """
+    periodos = {}
+    for orcamento in orcamentos:
+        periodo = periodo_orcamento(orcamento['periodicidade'], hoje)
+        if periodo:
+            periodos[orcamento['periodicidade']] = periodo
+
+    gastos = {}
+    if periodos:
+        categorias = sorted({orcamento['categoria'] for orcamento in orcamentos})
+        filtro_categorias = f"categoria IN ({', '.join('?' * len(categorias))})"
+        partes = []
+        params = []
+
+        for periodicidade, (inicio, fim) in periodos.items():
+            meses, parciais = dividir_periodo(inicio, fim)
+            if meses is not None:
+                partes.append(f'''
+                SELECT ? AS periodicidade, categoria, SUM(total_despesas) AS total FROM resumo_mensal
+                WHERE usuario_id = ? AND tipo_perfil = ? AND mes >= ? AND mes <= ? AND {filtro_categorias}
+                GROUP BY categoria
+                ''')
+                params.extend([periodicidade, usuario_id, tipo_perfil, meses[0], meses[1]])
+                params.extend(categorias)
+            for parcial_inicio, parcial_fim in parciais:
+                partes.append(f'''
+                SELECT ? AS periodicidade, categoria, SUM(valor) AS total FROM despesas
+                WHERE usuario_id = ? AND tipo_perfil = ? AND data >= ? AND data <= ? AND {filtro_categorias}
+                GROUP BY categoria
+                ''')
+                params.extend([periodicidade, usuario_id, tipo_perfil, parcial_inicio, parcial_fim])
+                params.extend(categorias)
+
+        cursor.execute(f'''
+        SELECT periodicidade, categoria, SUM(total) AS total
+        FROM ({' UNION ALL '.join(partes)})
+        GROUP BY periodicidade, categoria
+        ''', params)
+
+        for row in cursor.fetchall():
+            gastos[(row['periodicidade'], row['categoria'])] = row['total'] or 0
+
+    for orcamento in orcamentos:
+        orcamento['gasto_atual'] = gastos.get((orcamento['periodicidade'], orcamento['categoria']), 0)
+        orcamento['percentual'] = _percentual(orcamento['gasto_atual'], orcamento['valor_limite'])
+
+
+def carregar_dashboard(db_path, usuario_id, tipo_perfil='pessoal', hoje=None):
+    """Carrega um ``DashboardSnapshot`` do usuário usando uma só conexão"""
+    hoje = hoje or datetime.now()
+    data_inicio = (hoje - timedelta(days=30)).strftime("%Y-%m-%d")
+    data_fim = hoje.strftime("%Y-%m-%d")
+    data_inicio_mes = f"{hoje.year}-{hoje.month:02d}-01"
+
+    conn = conectar(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT * FROM usuarios WHERE id = ?", (usuario_id,))
+        usuario = cursor.fetchone()
+        snapshot = DashboardSnapshot(usuario=dict(usuario) if usuario else None)
+
+        # Próximos 3 lembretes pendentes
+        cursor.execute('''
+        SELECT * FROM lembretes WHERE usuario_id = ? AND concluido = 0
+        ORDER BY data ASC LIMIT 3
+        ''', (usuario_id,))
+        snapshot.lembretes = [dict(row) for row in cursor.fetchall()]
+
+        cursor.execute('''
+        SELECT * FROM orcamentos WHERE usuario_id = ? AND ativo = 1 AND tipo_perfil = ?
+        ORDER BY categoria ASC
+        ''', (usuario_id, tipo_perfil))
+        snapshot.orcamentos = [dict(row) for row in cursor.fetchall()]
+        _gastos_orcamentos(cursor, usuario_id, tipo_perfil, snapshot.orcamentos, hoje)
+
+        cursor.execute('''
+        SELECT * FROM metas_financeiras WHERE usuario_id = ? AND tipo_perfil = ?
+        ORDER BY data_alvo ASC
+        ''', (usuario_id, tipo_perfil))
+        snapshot.metas = [dict(row) for row in cursor.fetchall()]
+        for meta in snapshot.metas:
+            meta['percentual'] = _percentual(meta['valor_atual'], meta['valor_alvo'])
+
+        cursor.execute('''
+        SELECT * FROM dividas WHERE usuario_id = ? AND tipo_perfil = ?
+        ORDER BY data_fim ASC
+        ''', (usuario_id, tipo_perfil))
+        snapshot.dividas = [dict(row) for row in cursor.fetchall()]
+        for divida in snapshot.dividas:
+            divida['percentual_pago'] = _percentual(divida['valor_pago'], divida['valor_total'])
+
+        # 10 despesas e 10 receitas mais recentes dos últimos 30 dias,
+        # ordenadas juntas pela data de criação
+        cursor.execute('''
+        SELECT * FROM (
+            SELECT * FROM (
+                SELECT id, 'despesa' AS tipo, valor, descricao, categoria, data, data_criacao
+                FROM despesas WHERE usuario_id = ? AND data >= ? AND data <= ?
+                ORDER BY data DESC LIMIT 10
+            )
+            UNION ALL
+            SELECT * FROM (
+                SELECT id, 'receita' AS tipo, valor, descricao, categoria, data, data_criacao
+                FROM receitas WHERE usuario_id = ? AND data >= ? AND data <= ?
+                ORDER BY data DESC LIMIT 10
+            )
+        )
+        ORDER BY data_criacao DESC LIMIT 10
+        ''', (usuario_id, data_inicio, data_fim, usuario_id, data_inicio, data_fim))
+        snapshot.transacoes = [dict(row) for row in cursor.fetchall()]
+
+        totais = resumo_financeiro(db_path, usuario_id, data_inicio_mes, data_fim, tipo_perfil, cursor=cursor)
+        snapshot.total_despesas_mes = totais['total_despesas']
+        snapshot.total_receitas_mes = totais['total_receitas']
+    finally:
+        conn.close()
+
+    return snapshot
@@ -0,0 +1,267 @@
+"""
+Fila de escrita do SQLite.
+
+O SQLite aceita um único escritor por vez. Em vez de cada thread do worker
+disputar o lock do banco (e receber ``database is locked``), as gravações
+são enfileiradas e executadas por uma única thread com conexão própria.
+Tarefas que chegam juntas são gravadas na mesma transação (commit em grupo),
+cada uma isolada em um SAVEPOINT. Entre processos diferentes, a transação
+``BEGIN IMMEDIATE`` e o ``busy_timeout`` fazem os workers aguardarem a vez
+em vez de falharem no meio da escrita.
+
+Uma falha do próprio lote (conexão, COMMIT ou ROLLBACK) é devolvida a todas
+as tarefas do lote e a thread segue atendendo a fila. Quem enfileira espera
+no máximo ``DB_FILA_ESCRITA_TIMEOUT`` segundos e recebe
+``sqlite3.OperationalError`` se a fila não responder; nesse caso a gravação
+não acontece (a tarefa é desfeita no SAVEPOINT mesmo que já tenha rodado).
+Se o tempo esgota depois que a tarefa já foi aceita no lote, quem enfileirou
+aguarda o COMMIT e recebe o resultado real.
+
+Uso nos modelos::
+
+    def _inserir(cursor):
+        cursor.execute("INSERT ...", params)
+        return cursor.lastrowid
+
+    despesa_id = executar_escrita(self.db_path, _inserir)
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from config import Config
+from database.conexao import abrir_conexao, conectar
+from log_estruturado import obter_logger
+
+log = obter_logger('banco')
+
+
+class _Tarefa:
+    """Gravação pendente na fila"""
+    __slots__ = ('funcao', 'args', 'resultado', 'erro', 'concluida', 'cancelada', 'aceita')
+
+    def __init__(self, funcao, args):
+        self.funcao = funcao
+        self.args = args
+        self.resultado = None
+        self.erro = None
+        self.concluida = threading.Event()
+        # Quem enfileirou desistiu (tempo esgotado): a tarefa não é gravada
+        self.cancelada = False
+        # A thread de escrita liberou o SAVEPOINT: já não pode ser cancelada
+        self.aceita = False
+
+
+class FilaEscrita:
+    """Thread única que executa as gravações de um banco"""
+
+    def __init__(self, db_path, lote_maximo=64, timeout=30.0):
+        self.db_path = db_path
+        self.lote_maximo = lote_maximo
+        self.timeout = timeout
+        self.pid = os.getpid()
+
+        self._fila = queue.Queue()
+        self._thread = None
+        self._conn = None
+        self._lock = threading.Lock()
+        # Decide entre cancelar (quem enfileirou) e aceitar (thread de escrita)
+        self._lock_tarefas = threading.Lock()
+
+        # Métricas
+        self._tarefas = 0
+        self._lotes = 0
+        self._erros = 0
+        self._tempo_total = 0.0
+
+    def _iniciar(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._executar_loop,
+                    name='fila-escrita-sqlite',
+                    daemon=True
+                )
+                self._thread.start()
+
+    def executar(self, funcao, *args):
+        """Enfileira ``funcao(cursor, *args)`` e aguarda o resultado"""
+        if threading.current_thread() is self._thread:
+            # Chamada feita de dentro de outra gravação: já estamos na transação
+            return funcao(self._conn.cursor(), *args)
+
+        if self._thread is None:
+            self._iniciar()
+
+        tarefa = _Tarefa(funcao, args)
+        self._fila.put(tarefa)
+        if not tarefa.concluida.wait(self.timeout):
+            with self._lock_tarefas:
+                tarefa.cancelada = not tarefa.aceita
+            if tarefa.cancelada:
+                raise sqlite3.OperationalError(
+                    f"Fila de escrita sem resposta em {self.timeout:g}s ({self._fila.qsize()} pendentes)"
+                )
+            # Já aceita no lote: o resultado depende só do COMMIT, que está em andamento
+            tarefa.concluida.wait()
+
+        if tarefa.erro is not None:
+            raise tarefa.erro
+        return tarefa.resultado
+
+    def _conexao(self):
+        if self._conn is None:
+            conn = abrir_conexao(self.db_path)
+            # Transações controladas manualmente
+            conn.isolation_level = None
+            conn.row_factory = sqlite3.Row
+            self._conn = conn
+        return self._conn
+
+    def _descartar_conexao(self):
+        """Fecha a conexão em estado incerto; o próximo lote abre outra"""
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def _executar_loop(self):
+        while True:
+            lote = [self._fila.get()]
+            while len(lote) < self.lote_maximo:
+                try:
+                    lote.append(self._fila.get_nowait())
+                except queue.Empty:
+                    break
+
+            inicio = time.perf_counter()
+            try:
+                self._gravar_lote(lote)
+            except Exception as e:
+                # Falha fora das tarefas (abrir a conexão, BEGIN, COMMIT, ROLLBACK):
+                # o lote inteiro falha, mas a thread segue atendendo a fila
+                log.excecao('erro_fila_escrita', db_path=self.db_path, tarefas=len(lote))
+                self._descartar_conexao()
+                for tarefa in lote:
+                    if tarefa.erro is None:
+                        tarefa.erro = e
+                        self._erros += 1
+            finally:
+                self._tarefas += len(lote)
+                self._lotes += 1
+                self._tempo_total += time.perf_counter() - inicio
+
+                for tarefa in lote:
+                    tarefa.concluida.set()
+
+    def _gravar_lote(self, lote):
+        conn = self._conexao()
+        resultados = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for tarefa in lote:
+                if tarefa.cancelada:
+                    resultados.append(None)
+                    continue
+                conn.execute("SAVEPOINT tarefa")
+                try:
+                    resultado = tarefa.funcao(conn.cursor(), *tarefa.args)
+                    with self._lock_tarefas:
+                        tarefa.aceita = not tarefa.cancelada
+                    if not tarefa.aceita:
+                        # Cancelada durante a execução: quem enfileirou já recebeu o erro
+                        conn.execute("ROLLBACK TO tarefa")
+                        conn.execute("RELEASE tarefa")
+                        resultados.append(None)
+                        continue
+                    conn.execute("RELEASE tarefa")
+                    resultados.append(resultado)
+                except Exception as e:
+                    tarefa.erro = e
+                    self._erros += 1
+                    # Desfaz apenas a tarefa com erro; as demais seguem no lote.
+                    # Se nem isso funcionar, o lote todo é desfeito abaixo.
+                    conn.execute("ROLLBACK TO tarefa")
+                    conn.execute("RELEASE tarefa")
+                    resultados.append(None)
+            conn.execute("COMMIT")
+        except Exception as e:
+            log.excecao('erro_lote_escrita', db_path=self.db_path, tarefas=len(lote))
+            try:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                log.excecao('erro_rollback_escrita', db_path=self.db_path)
+                self._descartar_conexao()
+            for tarefa in lote:
+                if tarefa.erro is None:
+                    tarefa.erro = e
+                    self._erros += 1
+            return
+
+        for tarefa, resultado in zip(lote, resultados):
+            tarefa.resultado = resultado
+
+    def estatisticas(self):
+        """Retorna as métricas da fila"""
+        return {
+            'db_path': self.db_path,
+            'pendentes': self._fila.qsize(),
+            'tarefas': self._tarefas,
+            'lotes': self._lotes,
+            'erros': self._erros,
+            'tarefas_por_lote': round(self._tarefas / self._lotes, 2) if self._lotes else 0.0,
+            'tempo_medio_lote_ms': round(self._tempo_total * 1000 / self._lotes, 3) if self._lotes else 0.0
+        }
+
+
+_filas = {}
+_filas_lock = threading.Lock()
+
+
+def obter_fila(db_path):
+    """Retorna a fila de escrita do processo atual para o banco informado"""
+    chave = os.path.abspath(db_path)
+    fila = _filas.get(chave)
+    if fila is not None and fila.pid == os.getpid():
+        return fila
+
+    with _filas_lock:
+        fila = _filas.get(chave)
+        if fila is None or fila.pid != os.getpid():
+            fila = FilaEscrita(db_path, lote_maximo=Config.DB_FILA_ESCRITA_LOTE,
+                               timeout=Config.DB_FILA_ESCRITA_TIMEOUT)
+            _filas[chave] = fila
+        return fila
+
+
+def executar_escrita(db_path, funcao, *args):
+    """Executa ``funcao(cursor, *args)`` dentro de uma transação de escrita.
+
+    Com ``DB_FILA_ESCRITA`` ativo a gravação passa pela fila do processo;
+    caso contrário usa uma conexão do pool com ``BEGIN IMMEDIATE``.
+    """
+    if Config.DB_FILA_ESCRITA:
+        return obter_fila(db_path).executar(funcao, *args)
+
+    conn = conectar(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        resultado = funcao(conn.cursor(), *args)
+        conn.commit()
+        return resultado
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def estatisticas_escrita():
+    """Métricas das filas de escrita do processo atual"""
+    return [fila.estatisticas() for fila in list(_filas.values()) if fila.pid == os.getpid()]
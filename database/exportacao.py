@@ -0,0 +1,271 @@
+"""
+Exportação de lançamentos em streaming.
+
+Em vez de carregar todos os registros (``buscar``), montar um DataFrame e
+gerar o arquivo inteiro na memória, as exportações percorrem o cursor com
+``fetchmany``. A memória usada fica limitada a um lote de
+``EXPORTACAO_LOTE`` linhas, qualquer que seja o tamanho do histórico.
+
+* ``exportar_csv`` gera o CSV em blocos já codificados, prontos para uma
+  resposta em streaming do Flask.
+* ``exportar_xlsx`` grava uma planilha por entidade com o xlsxwriter em modo
+  ``constant_memory`` (cada linha é descarregada para disco assim que a
+  seguinte começa) num arquivo temporário, que depois é enviado em blocos e
+  apagado.
+* ``gravar_csv``, ``gravar_xlsx`` e ``gravar_parquet`` gravam direto em um
+  arquivo; são usados pelas exportações em segundo plano
+  (``database.fila_exportacao``).
+
+As colunas e os cabeçalhos de despesas e receitas são os mesmos da
+exportação anterior (com pandas): as colunas conhecidas traduzidas, as
+demais com o nome original, e as datas no formato dd/mm/aaaa.
+"""
+import csv
+import io
+import tempfile
+
+from config import Config
+from database.conexao import conectar
+
+# Colunas exportadas por tabela (na ordem da tabela) e os cabeçalhos
+COLUNAS = {
+    'despesas': (
+        ('id', 'ID'), ('usuario_id', 'ID do Usuário'), ('valor', 'Valor'), ('categoria', 'Categoria'),
+        ('descricao', 'Descrição'), ('data', 'Data'), ('forma_pagamento', 'Forma de Pagamento'),
+        ('parcelado', 'Parcelado'), ('num_parcelas', 'Número de Parcelas'),
+        ('data_criacao', 'Data de Criação'), ('mensagem_original', 'Mensagem Original'),
+        ('tipo_perfil', 'tipo_perfil'), ('foto_url', 'foto_url'), ('audio_url', 'audio_url'),
+        ('ocr_data', 'ocr_data'),
+    ),
+    'receitas': (
+        ('id', 'ID'), ('usuario_id', 'ID do Usuário'), ('valor', 'Valor'), ('categoria', 'Categoria'),
+        ('descricao', 'Descrição'), ('data', 'Data'), ('data_criacao', 'Data de Criação'),
+        ('recorrente', 'Recorrente'), ('periodicidade', 'Periodicidade'),
+        ('tipo_perfil', 'tipo_perfil'), ('foto_url', 'foto_url'), ('audio_url', 'audio_url'),
+    ),
+    'dividas': (
+        ('id', 'ID'), ('nome', 'Nome'), ('valor_total', 'Valor Total'), ('valor_pago', 'Valor Pago'),
+        ('data_inicio', 'Data de Início'), ('data_fim', 'Data de Término'), ('taxa_juros', 'Taxa de Juros'),
+        ('parcelas_total', 'Parcelas'), ('parcelas_pagas', 'Parcelas Pagas'), ('status', 'Status'),
+        ('credor', 'Credor'), ('tipo', 'Tipo'), ('tipo_perfil', 'Perfil'), ('data_criacao', 'Data de Criação'),
+    ),
+    'metas_financeiras': (
+        ('id', 'ID'), ('titulo', 'Título'), ('valor_alvo', 'Valor Alvo'), ('valor_atual', 'Valor Atual'),
+        ('data_alvo', 'Data Alvo'), ('valor_automatico', 'Contribuição Automática'),
+        ('periodicidade_contribuicao', 'Periodicidade'), ('concluida', 'Concluída'),
+        ('tipo_perfil', 'Perfil'), ('data_criacao', 'Data de Criação'),
+    ),
+}
+
+# Coluna usada no filtro de período (None: exporta tudo) e ordenação, por tabela
+CONSULTAS = {
+    'despesas': ('data', 'data DESC'),
+    'receitas': ('data', 'data DESC'),
+    'dividas': (None, 'data_fim ASC'),
+    'metas_financeiras': (None, 'data_alvo ASC'),
+}
+
+# Entidades da rota /api/exportar/<entidade>.xlsx: tabelas e nomes das abas
+ENTIDADES = {
+    'despesas': (('despesas', 'Despesas'),),
+    'receitas': (('receitas', 'Receitas'),),
+    'dividas': (('dividas', 'Dívidas'),),
+    'metas': (('metas_financeiras', 'Metas'),),
+}
+ENTIDADES['completo'] = tuple(aba for entidade in ENTIDADES.values() for aba in entidade)
+
+# Linhas por aba, contando o cabeçalho (limite do formato XLSX)
+LINHAS_POR_ABA = 1048576
+
+MIMETYPE_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def formatar_data(valor):
+    """'2024-05-10' -> '10/05/2024' e '2024-05-10 14:30:00' -> '10/05/2024 14:30:00'"""
+    if not valor or len(valor) < 10 or valor[4] != '-' or valor[7] != '-':
+        return valor
+    return f"{valor[8:10]}/{valor[5:7]}/{valor[:4]}{valor[10:]}"
+
+
+def _consulta(tabela, usuario_id, data_inicio=None, data_fim=None):
+    colunas = ', '.join(coluna for coluna, _ in COLUNAS[tabela])
+    coluna_data, ordem = CONSULTAS[tabela]
+    sql = f"SELECT {colunas} FROM {tabela} WHERE usuario_id = ?"
+    params = [usuario_id]
+    if coluna_data and data_inicio:
+        sql += f" AND {coluna_data} >= ?"
+        params.append(data_inicio)
+    if coluna_data and data_fim:
+        sql += f" AND {coluna_data} <= ?"
+        params.append(data_fim)
+    return sql + f" ORDER BY {ordem}", params
+
+
+def iterar_lotes(db_path, tabela, usuario_id, data_inicio=None, data_fim=None, lote=None, formatar_datas=True):
+    """Gera listas de até ``lote`` linhas (tuplas com as colunas de ``COLUNAS``), com as datas formatadas"""
+    lote = lote or Config.EXPORTACAO_LOTE
+    indices_data = [posicao for posicao, (coluna, _) in enumerate(COLUNAS[tabela])
+                    if formatar_datas and coluna.startswith('data')]
+    sql, params = _consulta(tabela, usuario_id, data_inicio, data_fim)
+
+    conn = conectar(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        while True:
+            linhas = cursor.fetchmany(lote)
+            if not linhas:
+                return
+            if indices_data:
+                linhas = [list(linha) for linha in linhas]
+                for linha in linhas:
+                    for posicao in indices_data:
+                        linha[posicao] = formatar_data(linha[posicao])
+            yield linhas
+    finally:
+        # Também quando o cliente desconecta no meio do download
+        conn.close()
+
+
+def exportar_csv(db_path, tabela, usuario_id, data_inicio=None, data_fim=None, lote=None):
+    """Retorna um gerador de blocos CSV (bytes) ou None se não houver registros"""
+    lotes = iterar_lotes(db_path, tabela, usuario_id, data_inicio, data_fim, lote)
+    primeiro = next(lotes, None)
+    if primeiro is None:
+        return None
+
+    def gerar():
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer, lineterminator='\n')
+        escritor.writerow([cabecalho for _, cabecalho in COLUNAS[tabela]])
+        escritor.writerows(primeiro)
+        yield buffer.getvalue().encode('utf-8')
+
+        for linhas in lotes:
+            buffer.seek(0)
+            buffer.truncate()
+            escritor.writerows(linhas)
+            yield buffer.getvalue().encode('utf-8')
+
+    return gerar()
+
+
+def gravar_csv(caminho, db_path, tabela, usuario_id, data_inicio=None, data_fim=None, lote=None):
+    """Grava o CSV em ``caminho`` (só o cabeçalho se não houver registros); retorna o total de linhas"""
+    total = 0
+    with open(caminho, 'w', encoding='utf-8', newline='') as arquivo:
+        escritor = csv.writer(arquivo, lineterminator='\n')
+        escritor.writerow([cabecalho for _, cabecalho in COLUNAS[tabela]])
+        for linhas in iterar_lotes(db_path, tabela, usuario_id, data_inicio, data_fim, lote):
+            escritor.writerows(linhas)
+            total += len(linhas)
+    return total
+
+
+def _tipos_parquet(db_path, tabela):
+    """Tipo Arrow de cada coluna exportada, a partir do tipo declarado no SQLite"""
+    import pyarrow as pa
+
+    conn = conectar(db_path)
+    try:
+        declarados = {linha[1]: (linha[2] or '').upper() for linha in conn.execute(f"PRAGMA table_info({tabela})")}
+    finally:
+        conn.close()
+
+    tipos = []
+    for coluna, _ in COLUNAS[tabela]:
+        declarado = declarados.get(coluna, '')
+        if 'INT' in declarado:
+            tipos.append(pa.field(coluna, pa.int64()))
+        elif 'REAL' in declarado or 'FLOA' in declarado or 'DOUB' in declarado:
+            tipos.append(pa.field(coluna, pa.float64()))
+        else:
+            tipos.append(pa.field(coluna, pa.string()))
+    return pa.schema(tipos)
+
+
+def gravar_parquet(caminho, db_path, tabela, usuario_id, data_inicio=None, data_fim=None, lote=None):
+    """Grava um Parquet em ``caminho``, um row group por lote; retorna o total de linhas
+
+    Ao contrário do CSV e do XLSX, usa os nomes das colunas e as datas
+    (AAAA-MM-DD) como estão no banco, mais fáceis de consumir em análises.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = _tipos_parquet(db_path, tabela)
+    total = 0
+    escritor = pq.ParquetWriter(caminho, esquema)
+    try:
+        for linhas in iterar_lotes(db_path, tabela, usuario_id, data_inicio, data_fim, lote, formatar_datas=False):
+            colunas = [pa.array(valores, type=campo.type) for valores, campo in zip(zip(*linhas), esquema)]
+            escritor.write_table(pa.Table.from_arrays(colunas, schema=esquema))
+            total += len(linhas)
+    finally:
+        escritor.close()
+    return total
+
+
+def gravar_xlsx(destino, db_path, entidade, usuario_id, data_inicio=None, data_fim=None, lote=None):
+    """Grava as abas da entidade em ``destino`` (caminho ou arquivo); retorna o total de linhas exportadas"""
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(destino, {
+        # Cada linha é descarregada assim que a próxima começa
+        'constant_memory': True,
+        # Descrições vêm do usuário: "=..." não vira fórmula nem "http..." vira link
+        'strings_to_formulas': False,
+        'strings_to_urls': False,
+    })
+    negrito = workbook.add_format({'bold': True})
+    total = 0
+    try:
+        for tabela, nome_aba in ENTIDADES[entidade]:
+            cabecalhos = [cabecalho for _, cabecalho in COLUNAS[tabela]]
+            planilha, linha_atual, partes = None, LINHAS_POR_ABA, 0
+            for linhas in iterar_lotes(db_path, tabela, usuario_id, data_inicio, data_fim, lote):
+                for linha in linhas:
+                    if linha_atual == LINHAS_POR_ABA:
+                        # Limite do Excel: o restante continua em "Despesas (2)"...
+                        partes += 1
+                        planilha = workbook.add_worksheet(nome_aba if partes == 1 else f"{nome_aba} ({partes})")
+                        planilha.write_row(0, 0, cabecalhos, negrito)
+                        planilha.freeze_panes(1, 0)
+                        linha_atual = 1
+                    planilha.write_row(linha_atual, 0, linha)
+                    linha_atual += 1
+                    total += 1
+            if planilha is None:
+                planilha = workbook.add_worksheet(nome_aba)
+                planilha.write_row(0, 0, cabecalhos, negrito)
+    finally:
+        workbook.close()
+    return total
+
+
+def _ler_em_blocos(arquivo, tamanho=64 * 1024):
+    with arquivo:
+        while True:
+            bloco = arquivo.read(tamanho)
+            if not bloco:
+                return
+            yield bloco
+
+
+def exportar_xlsx(db_path, entidade, usuario_id, data_inicio=None, data_fim=None, lote=None):
+    """Retorna (gerador de blocos, tamanho em bytes) do XLSX ou None se não houver registros"""
+    # Arquivos pequenos ficam na memória; acima do limite vão para um temporário
+    # anônimo em disco, apagado quando o gerador termina ou é descartado
+    arquivo = tempfile.SpooledTemporaryFile(max_size=Config.EXPORTACAO_MEMORIA_MAXIMA)
+    try:
+        total = gravar_xlsx(arquivo, db_path, entidade, usuario_id, data_inicio, data_fim, lote)
+    except Exception:
+        arquivo.close()
+        raise
+
+    if not total:
+        arquivo.close()
+        return None
+    tamanho = arquivo.tell()
+    arquivo.seek(0)
+    return _ler_em_blocos(arquivo), tamanho
@@ -0,0 +1,394 @@
+"""
+Exportações em segundo plano (CSV, XLSX e Parquet).
+
+Exportações grandes não rodam mais na thread da requisição: a rota grava um
+pedido na tabela ``exportacoes`` e responde 202; um
+``ProcessadorExportacoes`` reserva os pedidos e gera os arquivos em um pool
+de threads. O cliente acompanha o status e baixa o arquivo quando estiver
+``concluida``.
+
+* Agrupamento: um pedido igual (mesma entidade, formato e período) de um
+  usuário que já tem um em aberto (``pendente`` ou ``processando``) devolve o
+  pedido existente em vez de criar outro. A verificação e a inserção ficam
+  na mesma transação de escrita, então vale também entre workers.
+* Reserva: como na fila do webhook, um pedido ``processando`` cujo worker
+  morreu volta para a fila após ``EXPORTACAO_TIMEOUT_RESERVA`` segundos.
+  Enquanto o arquivo é gerado a reserva é renovada a cada terço desse
+  tempo, para que uma exportação longa não seja reservada de novo. Cada
+  tentativa grava em um temporário próprio, que só vira o arquivo final
+  quando completo.
+* Validade: os arquivos ficam em ``EXPORTACAO_PASTA`` por
+  ``EXPORTACAO_VALIDADE_DIAS`` dias; depois são apagados e o pedido passa a
+  ``expirada``.
+
+Estados: ``pendente`` -> ``processando`` -> ``concluida`` (ou ``erro``) ->
+``expirada``.
+
+O processador pode rodar nos próprios workers web (``EXPORTACAO_PROCESSAR_NA_WEB``)
+ou em um processo separado:
+    python -m database.fila_exportacao [--trabalhadores 2]
+"""
+import argparse
+import importlib.util
+import os
+import signal
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from config import Config
+from database.conexao import conectar
+from database.escrita import executar_escrita
+from database.exportacao import ENTIDADES, MIMETYPE_XLSX, gravar_csv, gravar_parquet, gravar_xlsx
+from log_estruturado import obter_logger
+
+FORMATOS = ('csv', 'xlsx', 'parquet')
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'xlsx': MIMETYPE_XLSX,
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# Bibliotecas opcionais de cada formato
+DEPENDENCIAS = {
+    'xlsx': 'xlsxwriter',
+    'parquet': 'pyarrow',
+}
+
+ABERTOS = ('pendente', 'processando')
+
+log = obter_logger('exportacao')
+
+
+def _agora():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def chave_exportacao(entidade, formato, data_inicio=None, data_fim=None):
+    """Identifica pedidos iguais: 'despesas|csv|2024-01-01|2024-01-31'"""
+    return f"{entidade}|{formato}|{data_inicio or ''}|{data_fim or ''}"
+
+
+class FilaExportacao:
+    """Pedidos de exportação e os arquivos gerados (tabela ``exportacoes``)"""
+    def __init__(self, db_path, pasta=None):
+        self.db_path = db_path
+        self.pasta = pasta or Config.EXPORTACAO_PASTA
+
+    def enfileirar(self, usuario_id, entidade, formato, data_inicio=None, data_fim=None):
+        """Cria o pedido ou reaproveita um igual em aberto; retorna (id, novo)"""
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato não suportado: {formato}")
+        if formato in DEPENDENCIAS and importlib.util.find_spec(DEPENDENCIAS[formato]) is None:
+            raise ValueError(f"Formato {formato} indisponível neste servidor")
+        if entidade not in ENTIDADES:
+            raise ValueError(f"Entidade inválida: {entidade}")
+        if formato != 'xlsx' and len(ENTIDADES[entidade]) > 1:
+            raise ValueError(f"O formato {formato} exporta uma entidade por vez")
+        chave = chave_exportacao(entidade, formato, data_inicio, data_fim)
+
+        def _enfileirar(cursor):
+            cursor.execute(f'''
+            SELECT id FROM exportacoes
+            WHERE usuario_id = ? AND chave = ? AND status IN ({', '.join('?' * len(ABERTOS))})
+            ORDER BY id DESC LIMIT 1
+            ''', (usuario_id, chave) + ABERTOS)
+            existente = cursor.fetchone()
+            if existente:
+                return existente[0], False
+
+            agora = _agora()
+            cursor.execute('''
+            INSERT INTO exportacoes
+            (usuario_id, entidade, formato, data_inicio, data_fim, chave, data_criacao, atualizado_em)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (usuario_id, entidade, formato, data_inicio, data_fim, chave, agora, agora))
+            return cursor.lastrowid, True
+
+        return executar_escrita(self.db_path, _enfileirar)
+
+    def buscar_por_id(self, exportacao_id):
+        conn = conectar(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT * FROM exportacoes WHERE id = ?", (exportacao_id,))
+        exportacao = cursor.fetchone()
+
+        conn.close()
+        return dict(exportacao) if exportacao else None
+
+    def listar(self, usuario_id, limit=20):
+        conn = conectar(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+
+        cursor.execute(
+            "SELECT * FROM exportacoes WHERE usuario_id = ? ORDER BY id DESC LIMIT ?",
+            (usuario_id, limit)
+        )
+        exportacoes = [dict(row) for row in cursor.fetchall()]
+
+        conn.close()
+        return exportacoes
+
+    def reservar(self, limite, timeout_reserva=None):
+        """Reserva até ``limite`` pedidos pendentes, do mais antigo para o mais novo"""
+        if timeout_reserva is None:
+            timeout_reserva = Config.EXPORTACAO_TIMEOUT_RESERVA
+        agora = _agora()
+        expiracao = (datetime.now() - timedelta(seconds=timeout_reserva)).strftime("%Y-%m-%d %H:%M:%S")
+
+        def _reservar(cursor):
+            # Reservas abandonadas (worker reiniciado) voltam para a fila
+            cursor.execute('''
+            UPDATE exportacoes SET status = 'pendente', reservado_em = NULL
+            WHERE status = 'processando' AND reservado_em < ?
+            ''', (expiracao,))
+
+            cursor.execute('''
+            SELECT * FROM exportacoes WHERE status = 'pendente' ORDER BY id ASC LIMIT ?
+            ''', (limite,))
+            exportacoes = [dict(row) for row in cursor.fetchall()]
+
+            for exportacao in exportacoes:
+                cursor.execute('''
+                UPDATE exportacoes SET status = 'processando', reservado_em = ?, atualizado_em = ?
+                WHERE id = ?
+                ''', (agora, agora, exportacao['id']))
+                exportacao['status'] = 'processando'
+
+            return exportacoes
+
+        return executar_escrita(self.db_path, _reservar)
+
+    def renovar(self, exportacao_id):
+        """Adia a expiração da reserva de um pedido em processamento"""
+        def _renovar(cursor):
+            cursor.execute('''
+            UPDATE exportacoes SET reservado_em = ? WHERE id = ? AND status = 'processando'
+            ''', (_agora(), exportacao_id))
+        executar_escrita(self.db_path, _renovar)
+
+    def _manter_reserva(self, exportacao_id, concluido):
+        intervalo = max(Config.EXPORTACAO_TIMEOUT_RESERVA / 3, 1)
+        while not concluido.wait(intervalo):
+            try:
+                self.renovar(exportacao_id)
+            except Exception:
+                # Tenta de novo no próximo intervalo; se a reserva expirar, o
+                # temporário próprio evita que outra tentativa corrompa o arquivo
+                log.excecao('erro_renovar_reserva_exportacao', exportacao_id=exportacao_id)
+
+    def caminho_arquivo(self, exportacao):
+        return os.path.join(self.pasta, str(exportacao['usuario_id']),
+                            f"exportacao_{exportacao['id']}.{exportacao['formato']}")
+
+    def gerar(self, exportacao):
+        """Gera o arquivo do pedido e o marca como concluído"""
+        caminho = self.caminho_arquivo(exportacao)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        # Temporário único por tentativa: uma reserva expirada não faz duas
+        # tentativas escreverem no mesmo arquivo
+        descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho), suffix='.tmp',
+                                                 prefix=f"exportacao_{exportacao['id']}_")
+        os.close(descritor)
+        tabelas = ENTIDADES[exportacao['entidade']]
+        args = (exportacao['usuario_id'], exportacao['data_inicio'], exportacao['data_fim'])
+
+        concluido = threading.Event()
+        threading.Thread(target=self._manter_reserva, args=(exportacao['id'], concluido),
+                         name=f"exportacao-reserva-{exportacao['id']}", daemon=True).start()
+        try:
+            if exportacao['formato'] == 'xlsx':
+                linhas = gravar_xlsx(temporario, self.db_path, exportacao['entidade'], *args)
+            elif exportacao['formato'] == 'parquet':
+                linhas = gravar_parquet(temporario, self.db_path, tabelas[0][0], *args)
+            else:
+                linhas = gravar_csv(temporario, self.db_path, tabelas[0][0], *args)
+            # Só um arquivo completo aparece com o nome final
+            os.replace(temporario, caminho)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+        finally:
+            concluido.set()
+
+        agora = datetime.now()
+        expira_em = agora + timedelta(days=Config.EXPORTACAO_VALIDADE_DIAS)
+
+        def _atualizar(cursor):
+            cursor.execute('''
+            UPDATE exportacoes
+            SET status = 'concluida', arquivo = ?, tamanho = ?, linhas = ?, erro = NULL,
+                reservado_em = NULL, atualizado_em = ?, expira_em = ?
+            WHERE id = ?
+            ''', (caminho, os.path.getsize(caminho), linhas, agora.strftime("%Y-%m-%d %H:%M:%S"),
+                  expira_em.strftime("%Y-%m-%d %H:%M:%S"), exportacao['id']))
+
+        executar_escrita(self.db_path, _atualizar)
+        return caminho
+
+    def falhar(self, exportacao_id, erro):
+        def _atualizar(cursor):
+            cursor.execute('''
+            UPDATE exportacoes SET status = 'erro', erro = ?, reservado_em = NULL, atualizado_em = ?
+            WHERE id = ?
+            ''', (str(erro)[:500], _agora(), exportacao_id))
+        executar_escrita(self.db_path, _atualizar)
+
+    def expirar(self):
+        """Apaga os arquivos vencidos e marca os pedidos como expirados; retorna quantos"""
+        agora = _agora()
+
+        def _expirar(cursor):
+            cursor.execute('''
+            SELECT id, arquivo FROM exportacoes WHERE status = 'concluida' AND expira_em < ?
+            ''', (agora,))
+            vencidas = cursor.fetchall()
+            cursor.executemany('''
+            UPDATE exportacoes SET status = 'expirada', arquivo = NULL, atualizado_em = ? WHERE id = ?
+            ''', [(agora, linha[0]) for linha in vencidas])
+            return [linha[1] for linha in vencidas]
+
+        arquivos = executar_escrita(self.db_path, _expirar)
+        # Os arquivos só são apagados depois que o banco já não aponta para eles
+        for arquivo in arquivos:
+            try:
+                if arquivo and os.path.exists(arquivo):
+                    os.remove(arquivo)
+            except OSError:
+                log.excecao('erro_apagar_exportacao_expirada', arquivo=arquivo)
+        return len(arquivos)
+
+    def estatisticas(self):
+        conn = conectar(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(f'''
+        SELECT status, COUNT(*) FROM exportacoes
+        WHERE status IN ({', '.join('?' * len(ABERTOS))}) GROUP BY status
+        ''', ABERTOS)
+        por_status = dict(cursor.fetchall())
+        conn.close()
+        return {status: por_status.get(status, 0) for status in ABERTOS}
+
+
+class ProcessadorExportacoes:
+    """Reserva os pedidos de exportação e gera os arquivos em um pool de threads"""
+    def __init__(self, fila, trabalhadores=2, intervalo=2.0):
+        self.fila = fila
+        self.trabalhadores = trabalhadores
+        self.intervalo = intervalo
+
+        self._pool = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = False
+        self._em_andamento = 0
+        self._ultima_limpeza = None
+
+        # Métricas
+        self.concluidas = 0
+        self.falhas = 0
+
+    def iniciar(self):
+        with self._lock:
+            if self._thread is None:
+                self._parar = False
+                self._pool = ThreadPoolExecutor(max_workers=self.trabalhadores,
+                                                thread_name_prefix='exportacao-trabalhador')
+                self._thread = threading.Thread(target=self._despachar_loop,
+                                                name='exportacao-despachante', daemon=True)
+                self._thread.start()
+
+    def parar(self, aguardar=True):
+        """Interrompe o despacho; os pedidos não reservados ficam na fila"""
+        self._parar = True
+        self._acordar.set()
+        if self._thread is not None and aguardar:
+            self._thread.join()
+            self._pool.shutdown(wait=True)
+        self._thread = None
+
+    def notificar(self):
+        """Avisa que há pedido novo (os de outros workers são vistos no próximo intervalo)"""
+        self._acordar.set()
+
+    def _despachar_loop(self):
+        while not self._parar:
+            self._acordar.clear()
+            try:
+                livres = self.trabalhadores - self._em_andamento
+                exportacoes = self.fila.reservar(livres) if livres > 0 else []
+                for exportacao in exportacoes:
+                    with self._lock:
+                        self._em_andamento += 1
+                    self._pool.submit(self._executar, exportacao)
+                self._limpar_periodicamente()
+            except Exception:
+                log.excecao('erro_leitura_fila_exportacao')
+                exportacoes = []
+
+            if not exportacoes or self._em_andamento >= self.trabalhadores:
+                self._acordar.wait(self.intervalo)
+
+    def _executar(self, exportacao):
+        try:
+            try:
+                self.fila.gerar(exportacao)
+                self.concluidas += 1
+                log.info('exportacao_concluida', exportacao_id=exportacao['id'],
+                         formato=exportacao['formato'])
+            except Exception as e:
+                log.excecao('erro_exportacao', exportacao_id=exportacao['id'], formato=exportacao['formato'])
+                self.fila.falhar(exportacao['id'], e)
+                self.falhas += 1
+        except Exception:
+            # Falha ao gravar o status: a reserva expira e o pedido volta
+            log.excecao('erro_atualizacao_fila_exportacao', exportacao_id=exportacao['id'])
+        finally:
+            with self._lock:
+                self._em_andamento -= 1
+            self._acordar.set()
+
+    def _limpar_periodicamente(self):
+        agora = datetime.now()
+        if self._ultima_limpeza is None or agora - self._ultima_limpeza > timedelta(hours=1):
+            self._ultima_limpeza = agora
+            self.fila.expirar()
+
+    def estatisticas(self):
+        estatisticas = {
+            'trabalhadores': self.trabalhadores,
+            'em_andamento': self._em_andamento,
+            'concluidas': self.concluidas,
+            'falhas': self.falhas
+        }
+        estatisticas.update(self.fila.estatisticas())
+        return estatisticas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Processa a fila de exportações fora dos workers web")
+    parser.add_argument('--trabalhadores', type=int, default=Config.EXPORTACAO_TRABALHADORES)
+    parser.add_argument('--db', default=Config.DATABASE)
+    args = parser.parse_args(argv)
+
+    processador = ProcessadorExportacoes(FilaExportacao(args.db), trabalhadores=args.trabalhadores)
+    parar = threading.Event()
+    for sinal in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sinal, lambda *_: parar.set())
+
+    processador.iniciar()
+    print(f"Processando exportações com {args.trabalhadores} trabalhadores (Ctrl+C para sair)")
+    parar.wait()
+    processador.parar()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,423 @@
+"""
+Processamento assíncrono das mensagens do webhook do WhatsApp.
+
+Com ``WEBHOOK_ASSINCRONO`` ativo, a rota ``/webhook`` só valida a assinatura,
+grava a mensagem na tabela ``webhook_mensagens`` e responde 200 na hora. Um
+``ProcessadorWebhook`` em cada worker lê a fila, processa as mensagens em um
+pool de threads e envia a resposta pela API REST da Twilio.
+
+Ordem por remetente: só é reservada a mensagem mais antiga em aberto de cada
+remetente, e só quando nenhuma outra dele está em processamento. A reserva é
+feita em uma transação de escrita, então vale também entre os workers do
+gunicorn. Uma reserva cujo worker morreu volta para a fila após
+``WEBHOOK_TIMEOUT_RESERVA`` segundos.
+
+Estados: ``pendente`` -> ``processando`` -> ``concluida`` (ou ``erro`` após
+``WEBHOOK_MAX_TENTATIVAS`` falhas de envio). A resposta é gravada antes do
+envio: uma nova tentativa só reenvia, sem processar a mensagem de novo. Se o
+worker cair entre gravar a despesa e gravar a resposta, a mensagem é
+processada outra vez; a despesa leva o id da mensagem
+(``despesas.webhook_mensagem_id``, gravado na mesma transação) e não é
+duplicada.
+
+``RespostasWebhook`` guarda a resposta de cada ``MessageSid`` (tabela
+``webhook_respostas``, podada após ``WEBHOOK_DEDUP_RETENCAO_HORAS``). Quando a
+Twilio reenvia uma requisição lenta, a reentrega recebe a resposta já gerada
+em vez de processar (e gravar a despesa) de novo.
+"""
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from config import Config
+from database.conexao import conectar
+from database.escrita import executar_escrita
+from log_estruturado import obter_logger
+
+log = obter_logger('webhook')
+
+MENSAGEM_ERRO = (
+    "Ops! Encontramos um problema ao processar sua mensagem. "
+    "Por favor, tente novamente ou envie 'ajuda' para ver os comandos disponíveis."
+)
+
+
+def _agora():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class FilaWebhook:
+    """Mensagens recebidas pelo webhook aguardando processamento"""
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def enfileirar(self, remetente, mensagem, profile_name=None, message_sid=None):
+        """Grava a mensagem na fila e retorna o id"""
+        def _inserir(cursor):
+            cursor.execute('''
+            INSERT INTO webhook_mensagens (remetente, mensagem, profile_name, message_sid, data_criacao)
+            VALUES (?, ?, ?, ?, ?)
+            ''', (remetente, mensagem, profile_name, message_sid, _agora()))
+            return cursor.lastrowid
+
+        return executar_escrita(self.db_path, _inserir)
+
+    def reservar(self, limite, timeout_reserva=None):
+        """Reserva até ``limite`` mensagens, no máximo uma por remetente"""
+        if timeout_reserva is None:
+            timeout_reserva = Config.WEBHOOK_TIMEOUT_RESERVA
+        agora = _agora()
+        expiracao = (datetime.now() - timedelta(seconds=timeout_reserva)).strftime("%Y-%m-%d %H:%M:%S")
+
+        def _reservar(cursor):
+            # Reservas abandonadas (worker reiniciado) voltam para a fila
+            cursor.execute('''
+            UPDATE webhook_mensagens SET status = 'pendente', reservado_em = NULL
+            WHERE status = 'processando' AND reservado_em < ?
+            ''', (expiracao,))
+
+            # Primeira mensagem em aberto de cada remetente, desde que nenhuma
+            # outra dele esteja em processamento
+            cursor.execute('''
+            SELECT * FROM webhook_mensagens AS m
+            WHERE m.status = 'pendente' AND NOT EXISTS (
+                SELECT 1 FROM webhook_mensagens AS outra
+                WHERE outra.remetente = m.remetente AND outra.status IN ('pendente', 'processando')
+                AND (outra.id < m.id OR outra.status = 'processando')
+            )
+            ORDER BY m.id ASC LIMIT ?
+            ''', (limite,))
+            mensagens = [dict(row) for row in cursor.fetchall()]
+
+            for mensagem in mensagens:
+                cursor.execute('''
+                UPDATE webhook_mensagens
+                SET status = 'processando', reservado_em = ?, tentativas = tentativas + 1
+                WHERE id = ?
+                ''', (agora, mensagem['id']))
+                mensagem['status'] = 'processando'
+                mensagem['tentativas'] += 1
+
+            return mensagens
+
+        return executar_escrita(self.db_path, _reservar)
+
+    def registrar_resposta(self, mensagem_id, resposta):
+        """Guarda a resposta já calculada (uma nova tentativa só reenvia)"""
+        def _atualizar(cursor):
+            cursor.execute("UPDATE webhook_mensagens SET resposta = ? WHERE id = ?", (resposta, mensagem_id))
+
+        executar_escrita(self.db_path, _atualizar)
+
+    def concluir(self, mensagem_id):
+        """Marca a mensagem como respondida"""
+        def _atualizar(cursor):
+            cursor.execute('''
+            UPDATE webhook_mensagens
+            SET status = 'concluida', reservado_em = NULL, erro = NULL, data_processamento = ?
+            WHERE id = ?
+            ''', (_agora(), mensagem_id))
+
+        executar_escrita(self.db_path, _atualizar)
+
+    def falhar(self, mensagem_id, erro, max_tentativas=None):
+        """Devolve a mensagem à fila ou, esgotadas as tentativas, marca como erro"""
+        if max_tentativas is None:
+            max_tentativas = Config.WEBHOOK_MAX_TENTATIVAS
+
+        def _atualizar(cursor):
+            cursor.execute('''
+            UPDATE webhook_mensagens
+            SET status = CASE WHEN tentativas >= ? THEN 'erro' ELSE 'pendente' END,
+                reservado_em = NULL, erro = ?, data_processamento = ?
+            WHERE id = ?
+            ''', (max_tentativas, str(erro), _agora(), mensagem_id))
+
+        executar_escrita(self.db_path, _atualizar)
+
+    def limpar(self, dias=None):
+        """Remove as mensagens concluídas há mais de ``dias`` dias"""
+        if dias is None:
+            dias = Config.WEBHOOK_RETENCAO_DIAS
+        limite = (datetime.now() - timedelta(days=dias)).strftime("%Y-%m-%d %H:%M:%S")
+
+        def _remover(cursor):
+            cursor.execute('''
+            DELETE FROM webhook_mensagens WHERE status = 'concluida' AND data_processamento < ?
+            ''', (limite,))
+            return cursor.rowcount
+
+        return executar_escrita(self.db_path, _remover)
+
+    def estatisticas(self):
+        """Quantidade de mensagens por status"""
+        conn = conectar(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+            SELECT status, COUNT(*) AS total FROM webhook_mensagens
+            WHERE status IN ('pendente', 'processando', 'erro') GROUP BY status
+            ''')
+            return {row['status']: row['total'] for row in cursor.fetchall()}
+        finally:
+            conn.close()
+
+
+class RespostasWebhook:
+    """Respostas já geradas por MessageSid (idempotência do webhook)"""
+    # Última poda da tabela neste processo
+    _ultima_limpeza = 0.0
+    _limpeza_lock = threading.Lock()
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def reservar(self, message_sid, timeout_reserva=None):
+        """Registra o MessageSid. Retorna (nova, resposta).
+
+        ``nova`` é True quando esta entrega deve processar a mensagem; caso
+        contrário ``resposta`` é a resposta gravada (None se a primeira entrega
+        ainda está processando ou a resposta sai pela fila).
+        """
+        if timeout_reserva is None:
+            timeout_reserva = Config.WEBHOOK_TIMEOUT_RESERVA
+        agora = _agora()
+        expiracao = (datetime.now() - timedelta(seconds=timeout_reserva)).strftime("%Y-%m-%d %H:%M:%S")
+        self._limpar_periodicamente()
+
+        def _reservar(cursor):
+            cursor.execute('''
+            INSERT OR IGNORE INTO webhook_respostas (message_sid, status, data_criacao, atualizado_em)
+            VALUES (?, 'processando', ?, ?)
+            ''', (message_sid, agora, agora))
+            if cursor.rowcount:
+                return True, None
+
+            # Entrega repetida; assume o processamento se a primeira travou
+            cursor.execute('''
+            UPDATE webhook_respostas SET atualizado_em = ?
+            WHERE message_sid = ? AND status = 'processando' AND atualizado_em < ?
+            ''', (agora, message_sid, expiracao))
+            if cursor.rowcount:
+                return True, None
+
+            cursor.execute("SELECT resposta FROM webhook_respostas WHERE message_sid = ?", (message_sid,))
+            linha = cursor.fetchone()
+            return False, linha['resposta'] if linha else None
+
+        return executar_escrita(self.db_path, _reservar)
+
+    def concluir(self, message_sid, resposta=None):
+        """Grava a resposta da mensagem (None quando ela sai pela fila)"""
+        def _atualizar(cursor):
+            cursor.execute('''
+            UPDATE webhook_respostas SET status = 'concluida', resposta = ?, atualizado_em = ?
+            WHERE message_sid = ?
+            ''', (resposta, _agora(), message_sid))
+
+        executar_escrita(self.db_path, _atualizar)
+
+    def liberar(self, message_sid):
+        """Esquece o MessageSid após uma falha, para a reentrega tentar de novo"""
+        def _remover(cursor):
+            cursor.execute('''
+            DELETE FROM webhook_respostas WHERE message_sid = ? AND status = 'processando'
+            ''', (message_sid,))
+
+        executar_escrita(self.db_path, _remover)
+
+    def aguardar_resposta(self, message_sid, timeout=None, intervalo=0.1):
+        """Espera a primeira entrega concluir e retorna a resposta (ou None)"""
+        if timeout is None:
+            timeout = Config.WEBHOOK_DEDUP_ESPERA
+        limite = time.monotonic() + timeout
+
+        conn = conectar(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        try:
+            while True:
+                cursor.execute(
+                    "SELECT status, resposta FROM webhook_respostas WHERE message_sid = ?",
+                    (message_sid,)
+                )
+                linha = cursor.fetchone()
+                if linha is None or linha['status'] == 'concluida':
+                    return linha['resposta'] if linha else None
+                if time.monotonic() >= limite:
+                    return None
+                time.sleep(intervalo)
+        finally:
+            conn.close()
+
+    def limpar(self, horas=None):
+        """Remove os MessageSid mais antigos que a janela de retenção"""
+        if horas is None:
+            horas = Config.WEBHOOK_DEDUP_RETENCAO_HORAS
+        limite = (datetime.now() - timedelta(hours=horas)).strftime("%Y-%m-%d %H:%M:%S")
+
+        def _remover(cursor):
+            cursor.execute("DELETE FROM webhook_respostas WHERE data_criacao < ?", (limite,))
+            return cursor.rowcount
+
+        return executar_escrita(self.db_path, _remover)
+
+    def _limpar_periodicamente(self):
+        # No máximo uma poda por hora em cada processo
+        agora = time.monotonic()
+        with RespostasWebhook._limpeza_lock:
+            if RespostasWebhook._ultima_limpeza and agora - RespostasWebhook._ultima_limpeza < 3600:
+                return
+            RespostasWebhook._ultima_limpeza = agora
+        try:
+            self.limpar()
+        except Exception:
+            log.excecao('erro_limpeza_respostas')
+
+
+class EnviadorTwilio:
+    """Envia as respostas pela API REST da Twilio"""
+    def __init__(self, account_sid=None, auth_token=None, numero=None):
+        from twilio.rest import Client
+
+        self.client = Client(account_sid or Config.TWILIO_ACCOUNT_SID, auth_token or Config.TWILIO_AUTH_TOKEN)
+        self.numero = numero or Config.TWILIO_PHONE_NUMBER
+
+    def enviar(self, para, texto):
+        self.client.messages.create(body=texto, from_=self.numero, to=para)
+
+
+class EnviadorMemoria:
+    """Substituto local do envio (testes/desenvolvimento): guarda as respostas"""
+    def __init__(self):
+        self.enviadas = []
+        self._lock = threading.Lock()
+
+    def enviar(self, para, texto):
+        with self._lock:
+            self.enviadas.append((para, texto))
+
+
+def criar_enviador():
+    """Enviador configurado em ``WEBHOOK_ENVIADOR``"""
+    if Config.WEBHOOK_ENVIADOR == 'memoria':
+        return EnviadorMemoria()
+    return EnviadorTwilio()
+
+
+class ProcessadorWebhook:
+    """Lê a fila e processa as mensagens em um pool de threads.
+
+    ``processar(mensagem, remetente, profile_name, mensagem_id=...)`` retorna
+    o texto da resposta e não deve gravar duas vezes a mesma ``mensagem_id``;
+    ``enviador.enviar(remetente, texto)`` entrega a resposta.
+    """
+    def __init__(self, fila, processar, enviador, trabalhadores=4, intervalo=1.0):
+        self.fila = fila
+        self.processar = processar
+        self.enviador = enviador
+        self.trabalhadores = trabalhadores
+        self.intervalo = intervalo
+
+        self._pool = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = False
+        self._em_andamento = 0
+        self._ultima_limpeza = None
+
+        # Métricas
+        self.processadas = 0
+        self.falhas = 0
+
+    def iniciar(self):
+        with self._lock:
+            if self._thread is None:
+                self._parar = False
+                self._pool = ThreadPoolExecutor(max_workers=self.trabalhadores,
+                                                thread_name_prefix='webhook-trabalhador')
+                self._thread = threading.Thread(target=self._despachar_loop,
+                                                name='webhook-despachante', daemon=True)
+                self._thread.start()
+
+    def parar(self, aguardar=True):
+        """Interrompe o despacho; as mensagens não reservadas ficam na fila"""
+        self._parar = True
+        self._acordar.set()
+        if self._thread is not None and aguardar:
+            self._thread.join()
+            self._pool.shutdown(wait=True)
+        self._thread = None
+
+    def notificar(self):
+        """Avisa que há mensagem nova (as de outros workers são vistas no próximo intervalo)"""
+        self._acordar.set()
+
+    def _despachar_loop(self):
+        while not self._parar:
+            self._acordar.clear()
+            try:
+                livres = self.trabalhadores - self._em_andamento
+                mensagens = self.fila.reservar(livres) if livres > 0 else []
+                for mensagem in mensagens:
+                    with self._lock:
+                        self._em_andamento += 1
+                    self._pool.submit(self._executar, mensagem)
+                self._limpar_periodicamente()
+            except Exception:
+                log.excecao('erro_leitura_fila')
+                mensagens = []
+
+            # Com trabalhadores livres e fila cheia, volta a reservar na hora
+            if not mensagens or self._em_andamento >= self.trabalhadores:
+                self._acordar.wait(self.intervalo)
+
+    def _executar(self, mensagem):
+        try:
+            resposta = mensagem.get('resposta')
+            if resposta is None:
+                try:
+                    resposta = self.processar(mensagem['mensagem'], mensagem['remetente'], mensagem['profile_name'],
+                                              mensagem_id=mensagem['id'])
+                except Exception:
+                    log.excecao('erro_processamento_fila', mensagem_id=mensagem['id'],
+                                remetente=mensagem['remetente'])
+                    resposta = MENSAGEM_ERRO
+                self.fila.registrar_resposta(mensagem['id'], resposta)
+
+            try:
+                self.enviador.enviar(mensagem['remetente'], resposta)
+                self.fila.concluir(mensagem['id'])
+                self.processadas += 1
+            except Exception as e:
+                log.excecao('erro_envio_resposta', mensagem_id=mensagem['id'])
+                self.fila.falhar(mensagem['id'], e)
+                self.falhas += 1
+        except Exception:
+            # Falha ao gravar na fila: a reserva expira e a mensagem volta
+            log.excecao('erro_atualizacao_fila', mensagem_id=mensagem['id'])
+        finally:
+            with self._lock:
+                self._em_andamento -= 1
+            # A próxima mensagem do mesmo remetente pode ser reservada
+            self._acordar.set()
+
+    def _limpar_periodicamente(self):
+        agora = datetime.now()
+        if self._ultima_limpeza is None or agora - self._ultima_limpeza > timedelta(hours=1):
+            self._ultima_limpeza = agora
+            self.fila.limpar()
+
+    def estatisticas(self):
+        estatisticas = {
+            'trabalhadores': self.trabalhadores,
+            'em_andamento': self._em_andamento,
+            'processadas': self.processadas,
+            'falhas': self.falhas
+        }
+        estatisticas.update(self.fila.estatisticas())
+        return estatisticas
@@ -0,0 +1,667 @@
+"""
+Importação de extratos bancários (CSV e OFX).
+
+O arquivo é lido em streaming (linha a linha no CSV, em blocos no OFX), sem
+carregá-lo inteiro na memória. A cada ``IMPORTACAO_LOTE`` linhas:
+
+* cada lançamento é categorizado pelo ``TextProcessor`` (valores negativos
+  viram despesas e positivos receitas; ``inverter_sinal`` para faturas de
+  cartão, que listam as compras como positivas);
+* duplicados são descartados pela ``chave_dedup`` — hash de (data, valor,
+  descrição normalizada), indexada por (usuario_id, chave_dedup) em
+  ``despesas`` e ``receitas``. A k-ésima ocorrência de uma chave no arquivo só
+  é duplicada se o banco já tinha pelo menos k lançamentos com ela (duas
+  compras iguais no mesmo dia continuam sendo duas);
+* os lançamentos novos são gravados com ``inserir_lancamentos`` e o progresso
+  (``importacoes.linhas_processadas``) é atualizado na mesma transação.
+
+Se o processo cair no meio, ``executar`` retoma do último lote gravado: as
+linhas já processadas são relidas só para contar as ocorrências.
+
+Nos workers web as importações rodam no ``ProcessadorImportacoes``: um pool
+limitado (``IMPORTACAO_TRABALHADORES``) que reserva as importações
+``pendente`` e também as ``processando`` sem progresso há mais de
+``IMPORTACAO_TIMEOUT_RESERVA`` segundos (worker reiniciado no meio).
+
+Uso:
+    python -m database.importacao <arquivo> <usuario_id> [--formato csv|ofx] [--cartao] [--perfil pessoal]
+    python -m database.importacao --retomar <importacao_id>
+"""
+import argparse
+import csv
+import hashlib
+import html
+import os
+import re
+import sqlite3
+import sys
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from config import Config
+from database.cache import invalidar_resumo
+from database.conexao import conectar
+from database.escrita import executar_escrita
+from database.lote import normalizar_lancamentos, inserir_lancamentos
+from log_estruturado import obter_logger
+
+FORMATOS = ('csv', 'ofx')
+
+# Cabeçalhos de CSV reconhecidos (normalizados: minúsculas, sem acentos)
+COLUNAS_DATA = ('data', 'date', 'dt', 'data lancamento', 'data do lancamento', 'data da transacao', 'data movimento')
+COLUNAS_VALOR = ('valor', 'value', 'amount', 'quantia', 'valor r', 'valor rs', 'montante')
+COLUNAS_DESCRICAO = ('descricao', 'description', 'historico', 'memo', 'lancamento', 'title', 'titulo',
+                     'estabelecimento', 'detalhes', 'identificacao')
+COLUNAS_CREDITO = ('credito', 'entrada', 'entradas', 'credit')
+COLUNAS_DEBITO = ('debito', 'saida', 'saidas', 'debit')
+COLUNAS_TIPO = ('tipo', 'type', 'natureza', 'c d', 'd c')
+
+FORMATOS_DATA = ('%d/%m/%Y', '%Y-%m-%d', '%d/%m/%y', '%d-%m-%Y', '%d.%m.%Y', '%Y/%m/%d')
+
+PADRAO_MILHAR = re.compile(r'\d{1,3}(\.\d{3})+')
+PADRAO_TAG_OFX = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+PADRAO_NAO_PALAVRA = re.compile(r'[^a-z0-9]+')
+
+TAMANHO_BLOCO = 64 * 1024
+
+log = obter_logger('importacao')
+
+
+def normalizar_texto(texto):
+    """Minúsculas, sem acentos e com um espaço entre as palavras"""
+    texto = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode('ascii')
+    return PADRAO_NAO_PALAVRA.sub(' ', texto.lower()).strip()
+
+
+def chave_dedup(data, valor, descricao):
+    """Hash de (data, valor, descrição normalizada) usado para achar duplicados"""
+    base = f"{data}|{abs(valor):.2f}|{normalizar_texto(descricao)}"
+    return hashlib.sha1(base.encode('utf-8')).hexdigest()[:20]
+
+
+def converter_valor(texto):
+    """'R$ -1.234,56', '1,234.56', '(50,00)', '50,00 D' -> float com sinal"""
+    texto = (texto or '').strip().upper().replace('R$', '').replace(' ', '')
+    if not texto:
+        raise ValueError("valor vazio")
+
+    negativo = False
+    if texto.startswith('(') and texto.endswith(')'):
+        negativo, texto = True, texto[1:-1]
+    if texto[-1:] in ('D', 'C'):
+        negativo, texto = texto[-1] == 'D' or negativo, texto[:-1]
+    if texto.endswith('-'):
+        negativo, texto = True, texto[:-1]
+    if texto.startswith('-'):
+        negativo, texto = not negativo, texto[1:]
+    elif texto.startswith('+'):
+        texto = texto[1:]
+
+    if ',' in texto and '.' in texto:
+        # O último separador é o decimal
+        if texto.rfind(',') > texto.rfind('.'):
+            texto = texto.replace('.', '').replace(',', '.')
+        else:
+            texto = texto.replace(',', '')
+    elif ',' in texto:
+        texto = texto.replace(',', '.')
+    elif PADRAO_MILHAR.fullmatch(texto):
+        texto = texto.replace('.', '')
+
+    valor = float(texto)
+    return -valor if negativo else valor
+
+
+class _ConversorData:
+    """Converte datas dos extratos para AAAA-MM-DD, lembrando o formato e as datas já vistas"""
+
+    def __init__(self):
+        self.formatos = list(FORMATOS_DATA)
+        self.convertidas = {}
+
+    def __call__(self, texto):
+        texto = (texto or '').strip()
+        data = self.convertidas.get(texto)
+        if data is not None:
+            return data
+        for posicao, formato in enumerate(self.formatos):
+            try:
+                data = datetime.strptime(texto, formato).strftime("%Y-%m-%d")
+            except ValueError:
+                continue
+            if posicao:
+                # O formato que funcionou passa a ser testado primeiro
+                self.formatos.insert(0, self.formatos.pop(posicao))
+            if len(self.convertidas) < 10000:
+                self.convertidas[texto] = data
+            return data
+        raise ValueError(f"data inválida: {texto!r}")
+
+
+def _codificacao(caminho):
+    """utf-8 (com ou sem BOM) ou, se o início do arquivo não for utf-8, cp1252"""
+    with open(caminho, 'rb') as arquivo:
+        inicio = arquivo.read(TAMANHO_BLOCO)
+    try:
+        inicio.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # Caractere cortado no fim do bloco não conta
+        if e.start < len(inicio) - 3:
+            return 'cp1252'
+    return 'utf-8-sig'
+
+
+def detectar_formato(caminho, nome=None):
+    """'ofx' ou 'csv', pela extensão ou pelo conteúdo"""
+    extensao = os.path.splitext(nome or caminho)[1].lower().lstrip('.')
+    if extensao in FORMATOS:
+        return extensao
+    with open(caminho, 'rb') as arquivo:
+        inicio = arquivo.read(4096).upper()
+    return 'ofx' if b'OFXHEADER' in inicio or b'<OFX>' in inicio else 'csv'
+
+
+def _coluna(cabecalho, nomes):
+    for posicao, nome in enumerate(cabecalho):
+        if nome in nomes:
+            return posicao
+    return None
+
+
+def ler_csv(caminho):
+    """Gera (data, valor com sinal, descrição) por linha do CSV; None para linhas inválidas"""
+    with open(caminho, encoding=_codificacao(caminho), newline='') as arquivo:
+        amostra = arquivo.read(TAMANHO_BLOCO)
+        arquivo.seek(0)
+        try:
+            dialeto = csv.Sniffer().sniff(amostra, delimiters=';,\t|')
+        except csv.Error:
+            dialeto = csv.excel
+
+        leitor = csv.reader(arquivo, dialeto)
+        cabecalho = [normalizar_texto(nome) for nome in next(leitor, [])]
+
+        data = _coluna(cabecalho, COLUNAS_DATA)
+        valor = _coluna(cabecalho, COLUNAS_VALOR)
+        credito = _coluna(cabecalho, COLUNAS_CREDITO)
+        debito = _coluna(cabecalho, COLUNAS_DEBITO)
+        descricao = _coluna(cabecalho, COLUNAS_DESCRICAO)
+        tipo = _coluna(cabecalho, COLUNAS_TIPO)
+        if data is None or (valor is None and credito is None and debito is None):
+            raise ValueError("CSV sem colunas de data e valor reconhecidas")
+
+        converter_data = _ConversorData()
+        for linha in leitor:
+            if not any(campo.strip() for campo in linha):
+                continue
+            try:
+                if valor is not None:
+                    quantia = converter_valor(linha[valor])
+                    if tipo is not None and linha[tipo].strip().upper()[:1] == 'D':
+                        quantia = -abs(quantia)
+                else:
+                    # Colunas separadas de crédito e débito
+                    entrada = linha[credito].strip() if credito is not None else ''
+                    saida = linha[debito].strip() if debito is not None else ''
+                    quantia = converter_valor(entrada) if entrada else -abs(converter_valor(saida))
+                texto = linha[descricao].strip() if descricao is not None else ''
+                yield converter_data(linha[data]), quantia, texto
+            except (IndexError, ValueError):
+                yield None
+
+
+def _tags_ofx(caminho):
+    """Gera (fechamento, tag, texto) do OFX lendo o arquivo em blocos (SGML ou XML)"""
+    with open(caminho, encoding=_codificacao(caminho), errors='replace') as arquivo:
+        resto = ''
+        while True:
+            bloco = arquivo.read(TAMANHO_BLOCO)
+            texto = resto + bloco
+            if not bloco:
+                corte = len(texto)
+            else:
+                # A última tag pode estar incompleta: fica para o próximo bloco
+                corte = texto.rfind('<')
+                if corte <= 0:
+                    resto = texto
+                    continue
+            for encontrado in PADRAO_TAG_OFX.finditer(texto, 0, corte):
+                yield encontrado.group(1) == '/', encontrado.group(2).upper(), encontrado.group(3).strip()
+            resto = texto[corte:]
+            if not bloco:
+                return
+
+
+def ler_ofx(caminho):
+    """Gera (data, valor com sinal, descrição) por <STMTTRN> do OFX; None para transações inválidas"""
+    transacao = None
+    for fechamento, tag, texto in _tags_ofx(caminho):
+        if tag == 'STMTTRN':
+            if not fechamento:
+                transacao = {}
+                continue
+            if transacao is None:
+                continue
+            try:
+                data = transacao.get('DTPOSTED', '')[:8]
+                data = f"{data[:4]}-{data[4:6]}-{data[6:8]}"
+                datetime.strptime(data, "%Y-%m-%d")
+                quantia = converter_valor(transacao.get('TRNAMT'))
+                descricao = transacao.get('MEMO') or transacao.get('NAME') or ''
+                yield data, quantia, descricao
+            except (TypeError, ValueError):
+                yield None
+            transacao = None
+        elif transacao is not None and not fechamento and texto:
+            transacao[tag] = html.unescape(texto)
+
+
+def ler_extrato(caminho, formato):
+    if formato == 'ofx':
+        return ler_ofx(caminho)
+    if formato == 'csv':
+        return ler_csv(caminho)
+    raise ValueError(f"Formato não suportado: {formato}")
+
+
+class ImportacaoExtrato:
+    """Importações de extrato e o seu progresso (tabela ``importacoes``)"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def criar(self, usuario_id, arquivo, formato, nome_original=None, tipo_perfil='pessoal', inverter_sinal=False):
+        """Registra uma importação pendente do arquivo (já salvo em disco)"""
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato não suportado: {formato}")
+        agora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        def _inserir(cursor):
+            cursor.execute('''
+            INSERT INTO importacoes
+            (usuario_id, arquivo, nome_original, formato, tipo_perfil, inverter_sinal, data_criacao, atualizado_em)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (usuario_id, arquivo, nome_original, formato, tipo_perfil, 1 if inverter_sinal else 0, agora, agora))
+            return cursor.lastrowid
+
+        return executar_escrita(self.db_path, _inserir)
+
+    def buscar_por_id(self, importacao_id):
+        conn = conectar(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT * FROM importacoes WHERE id = ?", (importacao_id,))
+        importacao = cursor.fetchone()
+
+        conn.close()
+        return dict(importacao) if importacao else None
+
+    def listar(self, usuario_id, limit=20):
+        conn = conectar(self.db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+
+        cursor.execute(
+            "SELECT * FROM importacoes WHERE usuario_id = ? ORDER BY id DESC LIMIT ?",
+            (usuario_id, limit)
+        )
+        importacoes = [dict(row) for row in cursor.fetchall()]
+
+        conn.close()
+        return importacoes
+
+    def reservar(self, importacao_id):
+        """Marca a importação como 'processando'; False se outro processo já a está executando"""
+        agora = datetime.now()
+        limite = (agora - timedelta(seconds=Config.IMPORTACAO_TIMEOUT_RESERVA)).strftime("%Y-%m-%d %H:%M:%S")
+
+        def _reservar(cursor):
+            cursor.execute('''
+            UPDATE importacoes SET status = 'processando', erro = NULL, atualizado_em = ?
+            WHERE id = ? AND (status IN ('pendente', 'erro') OR (status = 'processando' AND atualizado_em < ?))
+            ''', (agora.strftime("%Y-%m-%d %H:%M:%S"), importacao_id, limite))
+            return cursor.rowcount == 1
+
+        return executar_escrita(self.db_path, _reservar)
+
+    def reservar_pendentes(self, limite):
+        """Reserva até ``limite`` importações pendentes ou abandonadas; retorna os ids"""
+        agora = datetime.now()
+        expiracao = (agora - timedelta(seconds=Config.IMPORTACAO_TIMEOUT_RESERVA)).strftime("%Y-%m-%d %H:%M:%S")
+        agora = agora.strftime("%Y-%m-%d %H:%M:%S")
+
+        def _reservar(cursor):
+            # 'processando' sem progresso desde a expiração: o worker caiu no meio
+            cursor.execute('''
+            SELECT id FROM importacoes
+            WHERE status = 'pendente' OR (status = 'processando' AND atualizado_em < ?)
+            ORDER BY id ASC LIMIT ?
+            ''', (expiracao, limite))
+            ids = [linha[0] for linha in cursor.fetchall()]
+            cursor.executemany(
+                "UPDATE importacoes SET status = 'processando', erro = NULL, atualizado_em = ? WHERE id = ?",
+                [(agora, importacao_id) for importacao_id in ids]
+            )
+            return ids
+
+        return executar_escrita(self.db_path, _reservar)
+
+    def reabrir(self, importacao_id):
+        """Devolve uma importação com erro para a fila; False se ela não estava com erro"""
+        def _reabrir(cursor):
+            cursor.execute(
+                "UPDATE importacoes SET status = 'pendente', erro = NULL, atualizado_em = ? "
+                "WHERE id = ? AND status = 'erro'",
+                (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), importacao_id)
+            )
+            return cursor.rowcount == 1
+
+        return executar_escrita(self.db_path, _reabrir)
+
+    def _finalizar(self, importacao_id, status, erro=None):
+        def _atualizar(cursor):
+            cursor.execute(
+                "UPDATE importacoes SET status = ?, erro = ?, atualizado_em = ? WHERE id = ?",
+                (status, erro, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), importacao_id)
+            )
+        executar_escrita(self.db_path, _atualizar)
+
+    def preparar_chaves(self, usuario_id, lote=5000):
+        """Calcula a chave_dedup dos lançamentos do usuário que ainda não a têm"""
+        for tabela in ('despesas', 'receitas'):
+            while True:
+                conn = conectar(self.db_path)
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"SELECT id, data, valor, descricao FROM {tabela} "
+                    f"WHERE usuario_id = ? AND chave_dedup IS NULL LIMIT ?",
+                    (usuario_id, lote)
+                )
+                registros = cursor.fetchall()
+                conn.close()
+                if not registros:
+                    break
+
+                chaves = [(chave_dedup(data, valor or 0, descricao), registro_id)
+                          for registro_id, data, valor, descricao in registros]
+
+                def _atualizar(cursor, tabela=tabela, chaves=chaves):
+                    cursor.executemany(f"UPDATE {tabela} SET chave_dedup = ? WHERE id = ?", chaves)
+
+                executar_escrita(self.db_path, _atualizar)
+
+    def _contar_existentes(self, usuario_id, chaves_por_tabela):
+        """{(tabela, chave): quantidade de lançamentos do usuário com a chave}"""
+        existentes = {}
+        conn = conectar(self.db_path)
+        cursor = conn.cursor()
+        for tabela, chaves in chaves_por_tabela.items():
+            chaves = list(chaves)
+            for inicio in range(0, len(chaves), 500):
+                parte = chaves[inicio:inicio + 500]
+                cursor.execute(
+                    f"SELECT chave_dedup, COUNT(*) FROM {tabela} "
+                    f"WHERE usuario_id = ? AND chave_dedup IN ({', '.join('?' * len(parte))}) "
+                    f"GROUP BY chave_dedup",
+                    [usuario_id] + parte
+                )
+                for chave, quantidade in cursor.fetchall():
+                    existentes[(tabela, chave)] = quantidade
+            for chave in chaves:
+                existentes.setdefault((tabela, chave), 0)
+        conn.close()
+        return existentes
+
+    def executar(self, importacao_id, processador=None, reservada=False):
+        """Executa (ou retoma) a importação. Retorna o registro atualizado
+
+        ``reservada``: a importação já foi marcada como 'processando' por
+        ``reservar_pendentes``.
+        """
+        if processador is None:
+            from database.models import processador_texto as processador
+
+        importacao = self.buscar_por_id(importacao_id)
+        if importacao is None:
+            raise ValueError(f"Importação {importacao_id} não encontrada")
+        if importacao['status'] == 'concluida':
+            return importacao
+        if not reservada and not self.reservar(importacao_id):
+            raise RuntimeError(f"Importação {importacao_id} já está em andamento")
+
+        usuario_id = importacao['usuario_id']
+        ja_processadas = importacao['linhas_processadas']
+        sinal = -1 if importacao['inverter_sinal'] else 1
+
+        try:
+            self.preparar_chaves(usuario_id)
+
+            ocorrencias = {}
+            existentes = {}
+            linhas = 0
+            pendentes = []
+
+            for item in ler_extrato(importacao['arquivo'], importacao['formato']):
+                linhas += 1
+                if linhas <= ja_processadas:
+                    # Já gravada antes da queda: só conta a ocorrência
+                    if item is not None and item[1]:
+                        chave = self._chave(item, sinal)
+                        ocorrencias[chave] = ocorrencias.get(chave, 0) + 1
+                    continue
+
+                pendentes.append(item)
+                if len(pendentes) >= Config.IMPORTACAO_LOTE:
+                    self._gravar_lote(importacao, pendentes, linhas, sinal, ocorrencias, existentes, processador)
+                    pendentes = []
+
+            self._gravar_lote(importacao, pendentes, linhas, sinal, ocorrencias, existentes, processador)
+            self._finalizar(importacao_id, 'concluida')
+        except Exception as e:
+            log.excecao('erro_importacao', importacao_id=importacao_id)
+            self._finalizar(importacao_id, 'erro', str(e))
+            raise
+        finally:
+            invalidar_resumo(usuario_id)
+
+        return self.buscar_por_id(importacao_id)
+
+    @staticmethod
+    def _chave(item, sinal):
+        data, quantia, descricao = item
+        tabela = 'despesas' if quantia * sinal < 0 else 'receitas'
+        return tabela, chave_dedup(data, quantia, descricao)
+
+    def _gravar_lote(self, importacao, itens, linhas, sinal, ocorrencias, existentes, processador):
+        usuario_id = importacao['usuario_id']
+        validos = [(item, self._chave(item, sinal)) for item in itens if item is not None and item[1]]
+        invalidas = len(itens) - len(validos)
+
+        # Quantidade no banco das chaves ainda não vistas nesta importação
+        novas = {}
+        for _, (tabela, chave) in validos:
+            if (tabela, chave) not in existentes:
+                novas.setdefault(tabela, set()).add(chave)
+        if novas:
+            existentes.update(self._contar_existentes(usuario_id, novas))
+
+        registros = {'despesas': [], 'receitas': []}
+        duplicadas = 0
+        for (data, quantia, descricao), (tabela, chave) in validos:
+            ocorrencia = ocorrencias.get((tabela, chave), 0) + 1
+            ocorrencias[(tabela, chave)] = ocorrencia
+            if ocorrencia <= existentes[(tabela, chave)]:
+                duplicadas += 1
+                continue
+
+            descricao = descricao or "Lançamento importado"
+            categoria = processador.categorizar(descricao)
+            if tabela == 'receitas':
+                # Categorias padrão de receita criadas no cadastro
+                categoria = 'Salário' if categoria is None else 'Outros Ganhos'
+            registros[tabela].append({
+                'usuario_id': usuario_id,
+                'valor': abs(quantia),
+                'categoria': categoria or 'outros',
+                'descricao': descricao,
+                'data': data,
+                'tipo_perfil': importacao['tipo_perfil'],
+                'chave_dedup': chave,
+            })
+
+        linhas_despesas = normalizar_lancamentos('despesas', registros['despesas'])
+        linhas_receitas = normalizar_lancamentos('receitas', registros['receitas'])
+        inseridas = len(linhas_despesas) + len(linhas_receitas)
+
+        def _gravar(cursor):
+            inserir_lancamentos(cursor, 'despesas', linhas_despesas)
+            inserir_lancamentos(cursor, 'receitas', linhas_receitas)
+            # Progresso na mesma transação: retomar nunca grava um lote duas vezes
+            cursor.execute('''
+            UPDATE importacoes SET
+                linhas_processadas = ?, inseridas = inseridas + ?, duplicadas = duplicadas + ?,
+                invalidas = invalidas + ?, atualizado_em = ?
+            WHERE id = ?
+            ''', (linhas, inseridas, duplicadas, invalidas,
+                  datetime.now().strftime("%Y-%m-%d %H:%M:%S"), importacao['id']))
+
+        executar_escrita(self.db_path, _gravar)
+
+
+class ProcessadorImportacoes:
+    """Reserva as importações pendentes e as executa em um pool de threads"""
+    def __init__(self, importacoes, trabalhadores=1, intervalo=5.0):
+        self.importacoes = importacoes
+        self.trabalhadores = trabalhadores
+        self.intervalo = intervalo
+
+        self._pool = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = False
+        self._em_andamento = 0
+
+        # Métricas
+        self.concluidas = 0
+        self.falhas = 0
+
+    def iniciar(self):
+        with self._lock:
+            if self._thread is None:
+                self._parar = False
+                self._pool = ThreadPoolExecutor(max_workers=self.trabalhadores,
+                                                thread_name_prefix='importacao-trabalhador')
+                self._thread = threading.Thread(target=self._despachar_loop,
+                                                name='importacao-despachante', daemon=True)
+                self._thread.start()
+
+    def parar(self, aguardar=True):
+        """Interrompe o despacho; as importações não reservadas ficam na fila"""
+        self._parar = True
+        self._acordar.set()
+        if self._thread is not None and aguardar:
+            self._thread.join()
+            self._pool.shutdown(wait=True)
+        self._thread = None
+
+    def notificar(self):
+        """Avisa que há importação nova (as de outros workers são vistas no próximo intervalo)"""
+        self._acordar.set()
+
+    def _despachar_loop(self):
+        while not self._parar:
+            self._acordar.clear()
+            try:
+                livres = self.trabalhadores - self._em_andamento
+                ids = self.importacoes.reservar_pendentes(livres) if livres > 0 else []
+                for importacao_id in ids:
+                    with self._lock:
+                        self._em_andamento += 1
+                    self._pool.submit(self._executar, importacao_id)
+            except Exception:
+                log.excecao('erro_fila_importacao')
+                ids = []
+
+            if not ids or self._em_andamento >= self.trabalhadores:
+                self._acordar.wait(self.intervalo)
+
+    def _executar(self, importacao_id):
+        try:
+            self.importacoes.executar(importacao_id, reservada=True)
+            self.concluidas += 1
+        except Exception:
+            # Já registrada (e marcada como 'erro') pelo executar
+            self.falhas += 1
+        finally:
+            with self._lock:
+                self._em_andamento -= 1
+            self._acordar.set()
+
+    def estatisticas(self):
+        return {
+            'trabalhadores': self.trabalhadores,
+            'em_andamento': self._em_andamento,
+            'concluidas': self.concluidas,
+            'falhas': self.falhas
+        }
+
+
+def salvar_arquivo(origem, nome_original, usuario_id):
+    """Copia o upload (objeto com ``read``) para ``IMPORTACAO_PASTA`` em blocos; retorna o caminho"""
+    os.makedirs(Config.IMPORTACAO_PASTA, exist_ok=True)
+    extensao = os.path.splitext(nome_original or '')[1].lower()[:5]
+    nome = f"{usuario_id}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}{extensao}"
+    caminho = os.path.join(Config.IMPORTACAO_PASTA, nome)
+
+    tamanho = 0
+    with open(caminho, 'wb') as destino:
+        while True:
+            bloco = origem.read(TAMANHO_BLOCO)
+            if not bloco:
+                break
+            tamanho += len(bloco)
+            if tamanho > Config.IMPORTACAO_TAMANHO_MAXIMO:
+                destino.close()
+                os.remove(caminho)
+                raise ValueError("Arquivo maior que o limite de importação")
+            destino.write(bloco)
+    return caminho
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa um extrato bancário (CSV/OFX)")
+    parser.add_argument('arquivo', nargs='?')
+    parser.add_argument('usuario_id', nargs='?', type=int)
+    parser.add_argument('--formato', choices=FORMATOS)
+    parser.add_argument('--cartao', action='store_true', help='fatura de cartão: valores positivos são despesas')
+    parser.add_argument('--perfil', default='pessoal')
+    parser.add_argument('--retomar', type=int, metavar='IMPORTACAO_ID')
+    parser.add_argument('--banco', default=Config.DATABASE)
+    args = parser.parse_args(argv)
+
+    importacoes = ImportacaoExtrato(args.banco)
+    if args.retomar:
+        importacao_id = args.retomar
+    else:
+        if not args.arquivo or args.usuario_id is None:
+            parser.error("informe o arquivo e o usuario_id (ou --retomar)")
+        with open(args.arquivo, 'rb') as origem:
+            caminho = salvar_arquivo(origem, args.arquivo, args.usuario_id)
+        formato = args.formato or detectar_formato(caminho, args.arquivo)
+        importacao_id = importacoes.criar(
+            args.usuario_id, caminho, formato, os.path.basename(args.arquivo), args.perfil, args.cartao
+        )
+
+    resultado = importacoes.executar(importacao_id)
+    print(f"Importação {importacao_id}: {resultado['linhas_processadas']} linhas, "
+          f"{resultado['inseridas']} inseridas, {resultado['duplicadas']} duplicadas, "
+          f"{resultado['invalidas']} inválidas")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Gravação em lote de despesas e receitas.
+
+``Despesa.criar_em_lote`` e ``Receita.criar_em_lote`` recebem listas de
+dicionários (os mesmos campos de ``criar``) e:
+
+1. validam e normalizam tudo numa única passada, antes de abrir a transação
+   (valor "12,50" -> 12.5, datas ``date``/``datetime`` -> "AAAA-MM-DD",
+   valores padrão de ``criar``); um erro aponta a posição do registro e
+   nada é gravado;
+2. gravam com um ``executemany`` dentro de uma única tarefa da fila de
+   escrita (uma transação), ajustando o ``resumo_mensal`` na mesma transação
+   com um UPDATE por (usuário, perfil, mês, categoria);
+3. retornam os IDs na ordem dos registros.
+"""
+import json
+import math
+import re
+from datetime import date, datetime
+
+from database.resumos import ajustar_resumo_lote
+
+_OBRIGATORIO = object()
+
+# Colunas na ordem do INSERT e o valor padrão de cada uma (como em ``criar``)
+COLUNAS = {
+    'despesas': (
+        ('usuario_id', _OBRIGATORIO), ('valor', _OBRIGATORIO), ('categoria', 'outros'),
+        ('descricao', 'Despesa sem descrição'), ('data', None), ('forma_pagamento', None),
+        ('parcelado', 0), ('num_parcelas', 1), ('data_criacao', None),
+        ('mensagem_original', None), ('tipo_perfil', 'pessoal'), ('foto_url', None),
+        ('audio_url', None), ('ocr_data', None), ('chave_dedup', None),
+        ('webhook_mensagem_id', None),
+    ),
+    'receitas': (
+        ('usuario_id', _OBRIGATORIO), ('valor', _OBRIGATORIO), ('categoria', _OBRIGATORIO),
+        ('descricao', 'Receita sem descrição'), ('data', None), ('data_criacao', None),
+        ('recorrente', 0), ('periodicidade', None), ('tipo_perfil', 'pessoal'),
+        ('foto_url', None), ('audio_url', None), ('chave_dedup', None),
+    ),
+}
+
+PADRAO_DATA = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+def _normalizar_valor(valor):
+    if isinstance(valor, str):
+        texto = valor.strip().replace('R$', '').replace(' ', '')
+        if ',' in texto:
+            # Formato brasileiro: 1.234,56
+            texto = texto.replace('.', '').replace(',', '.')
+        valor = float(texto)
+    elif not isinstance(valor, (int, float)) or isinstance(valor, bool):
+        raise ValueError(f"valor inválido: {valor!r}")
+    valor = float(valor)
+    if not math.isfinite(valor) or valor <= 0:
+        raise ValueError(f"valor deve ser positivo: {valor!r}")
+    return valor
+
+
+def _normalizar_data(data, datas_validas):
+    if isinstance(data, datetime):
+        return data.strftime("%Y-%m-%d")
+    if isinstance(data, date):
+        return data.isoformat()
+    if data in datas_validas:
+        return data
+    if not isinstance(data, str) or not PADRAO_DATA.fullmatch(data):
+        raise ValueError(f"data inválida (use AAAA-MM-DD): {data!r}")
+    datetime.strptime(data, "%Y-%m-%d")
+    datas_validas.add(data)
+    return data
+
+
+def normalizar_lancamentos(tabela, registros, agora=None):
+    """Valida os registros e retorna as tuplas na ordem de ``COLUNAS[tabela]``"""
+    agora = agora or datetime.now()
+    hoje = agora.strftime("%Y-%m-%d")
+    data_criacao = agora.strftime("%Y-%m-%d %H:%M:%S")
+    colunas = COLUNAS[tabela]
+    campos = {nome for nome, _ in colunas}
+
+    # As mesmas datas se repetem muito nos lotes: cada uma é validada uma vez
+    datas_validas = set()
+    linhas = []
+    for posicao, registro in enumerate(registros):
+        try:
+            desconhecidas = registro.keys() - campos
+            if desconhecidas:
+                raise ValueError(f"campos desconhecidos: {', '.join(sorted(desconhecidas))}")
+
+            linha = []
+            for nome, padrao in colunas:
+                valor = registro.get(nome)
+                if valor is None or valor == '':
+                    if padrao is _OBRIGATORIO:
+                        raise ValueError(f"campo obrigatório ausente: {nome}")
+                    valor = padrao
+                linha.append(valor)
+
+            # usuario_id, valor, categoria, descricao e data abrem as duas tabelas
+            linha[0] = int(linha[0])
+            linha[1] = _normalizar_valor(linha[1])
+            linha[4] = _normalizar_data(linha[4] or hoje, datas_validas)
+            linhas.append(linha)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{tabela}[{posicao}]: {e}") from None
+
+    # Colunas preenchidas pelo sistema
+    indice_criacao = _indice(tabela, 'data_criacao')
+    indice_ocr = _indice(tabela, 'ocr_data')
+    for linha in linhas:
+        linha[indice_criacao] = data_criacao
+        if indice_ocr is not None and isinstance(linha[indice_ocr], dict):
+            linha[indice_ocr] = json.dumps(linha[indice_ocr])
+
+    return [tuple(linha) for linha in linhas]
+
+
+def _indice(tabela, coluna):
+    for posicao, (nome, _) in enumerate(COLUNAS[tabela]):
+        if nome == coluna:
+            return posicao
+    return None
+
+
+def inserir_lancamentos(cursor, tabela, linhas):
+    """Insere as linhas normalizadas e ajusta o resumo; retorna os IDs (dentro da fila de escrita)"""
+    if not linhas:
+        return []
+
+    nomes = [nome for nome, _ in COLUNAS[tabela]]
+    cursor.executemany(
+        f"INSERT INTO {tabela} ({', '.join(nomes)}) VALUES ({', '.join('?' * len(nomes))})",
+        linhas
+    )
+    # Gravador único: os IDs do AUTOINCREMENT desta transação são consecutivos
+    ultimo_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+
+    perfil = nomes.index('tipo_perfil')
+    ajustar_resumo_lote(cursor, tabela, (
+        (linha[0], linha[perfil], linha[4], linha[2], linha[1]) for linha in linhas
+    ))
+    return list(range(ultimo_id - len(linhas) + 1, ultimo_id + 1))
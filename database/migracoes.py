@@ -0,0 +1,763 @@
+"""
+Migrações versionadas do banco de dados do DespeZap.
+
+Cada migração tem um número sequencial e é aplicada uma única vez, dentro de
+uma transação, registrando a versão na tabela ``schema_version``. O
+``init_db`` aplica as pendentes na inicialização; nenhum modelo executa DDL
+durante as requisições.
+
+Uso:
+    python -m database.migracoes            # mostra a versão atual e as pendentes
+    python -m database.migracoes migrar     # aplica as migrações pendentes
+"""
+import sys
+from datetime import datetime
+
+from database.conexao import abrir_conexao
+
+
+def _colunas(cursor, tabela):
+    cursor.execute(f"PRAGMA table_info({tabela})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def _coluna_existe(cursor, tabela, coluna):
+    return coluna in _colunas(cursor, tabela)
+
+
+def _m001_esquema_inicial(cursor):
+    """Tabelas criadas originalmente pelo init_db.
+
+    Mantém a primeira definição de ``metas_financeiras`` (a que de fato era
+    criada, com ``contribuicao_automatica``); a 003 corrige a coluna. As
+    verificações de coluna permitem rodar sobre bancos anteriores às migrações.
+    """
+    # Tabela de usuários
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS usuarios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        celular TEXT UNIQUE,
+        nome TEXT,
+        email TEXT UNIQUE,
+        senha TEXT,
+        data_criacao TEXT,
+        ultimo_acesso TEXT,
+        plano TEXT DEFAULT 'gratuito',
+        data_assinatura TEXT,
+        data_vencimento TEXT,
+        ativo INTEGER DEFAULT 1,
+        admin INTEGER DEFAULT 0
+    )
+    ''')
+    
+    # Tabela de despesas
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS despesas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        valor REAL NOT NULL,
+        categoria TEXT,
+        descricao TEXT,
+        data TEXT,
+        forma_pagamento TEXT,
+        parcelado INTEGER DEFAULT 0,
+        num_parcelas INTEGER DEFAULT 1,
+        data_criacao TEXT,
+        mensagem_original TEXT,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+    )
+    ''')
+    
+    # Tabela de receitas
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS receitas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        valor REAL NOT NULL,
+        categoria TEXT,
+        descricao TEXT,
+        data TEXT,
+        data_criacao TEXT,
+        recorrente INTEGER DEFAULT 0,
+        periodicidade TEXT,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+    )
+    ''')
+    
+    # Tabela de categorias personalizadas
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS categorias (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        nome TEXT NOT NULL,
+        tipo TEXT NOT NULL, -- 'despesa' ou 'receita'
+        icone TEXT,
+        cor TEXT,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+    )
+    ''')
+    
+    # Tabela de assinaturas
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS assinaturas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        plano TEXT NOT NULL,
+        data_inicio TEXT,
+        data_fim TEXT,
+        valor REAL,
+        status TEXT,
+        forma_pagamento TEXT,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+    )
+    ''')
+    
+    # Tabela de tokens de recuperação de senha
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS tokens_recuperacao (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        token TEXT NOT NULL,
+        data_criacao TEXT,
+        data_expiracao TEXT,
+        utilizado INTEGER DEFAULT 0,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+    )
+    ''')
+    
+    # Tabela de sessões
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sessoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        token TEXT NOT NULL,
+        data_criacao TEXT,
+        data_expiracao TEXT,
+        ip_address TEXT,
+        user_agent TEXT,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+    )
+    ''')
+
+    # Tabela para rastreamento de origem (referral)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS usuario_referral (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        origem TEXT NOT NULL,
+        data_registro TEXT,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+    )
+    ''')
+
+    # Tabela para cupons de desconto
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS cupons (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        codigo TEXT NOT NULL UNIQUE,
+        tipo TEXT NOT NULL,
+        valor REAL NOT NULL,
+        data_inicio TEXT NOT NULL,
+        data_fim TEXT,
+        limite_usos INTEGER,
+        usos_atuais INTEGER DEFAULT 0,
+        ativo INTEGER DEFAULT 1,
+        data_criacao TEXT
+    )
+    ''')
+
+    # Tabela para uso de cupons
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS cupom_usos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        cupom_id INTEGER NOT NULL,
+        usuario_id INTEGER NOT NULL,
+        data_uso TEXT NOT NULL,
+        FOREIGN KEY (cupom_id) REFERENCES cupons (id),
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+    )
+    ''')
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS lembretes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        titulo TEXT NOT NULL,
+        descricao TEXT,
+        data TEXT NOT NULL,
+        valor REAL,
+        notificacao INTEGER DEFAULT 0,
+        recorrente INTEGER DEFAULT 0,
+        periodicidade TEXT,
+        tipo_perfil TEXT DEFAULT 'pessoal',
+        concluido INTEGER DEFAULT 0,
+        data_criacao TEXT,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+    )
+    ''')
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS categorias_personalizadas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        nome TEXT NOT NULL,
+        nome_slug TEXT NOT NULL,
+        icone TEXT,
+        cor TEXT,
+        tipo TEXT NOT NULL,
+        tipo_perfil TEXT DEFAULT 'pessoal',
+        data_criacao TEXT,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+    )
+    ''')
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS membros (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        nome TEXT NOT NULL,
+        email TEXT NOT NULL,
+        celular TEXT,
+        permissao TEXT NOT NULL,
+        tipo_grupo TEXT NOT NULL,
+        convite_aceito INTEGER DEFAULT 0,
+        usuario_principal INTEGER DEFAULT 0,
+        data_criacao TEXT,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+    )
+    ''')
+    
+    # Adiciona colunas adicionais às tabelas existentes, verificando primeiro se já existem
+    # Adiciona coluna tipo_perfil e outras colunas se não existirem
+    if not _coluna_existe(cursor, 'despesas', 'tipo_perfil'):
+        cursor.execute('ALTER TABLE despesas ADD COLUMN tipo_perfil TEXT DEFAULT "pessoal"')
+    
+    if not _coluna_existe(cursor, 'despesas', 'foto_url'):
+        cursor.execute('ALTER TABLE despesas ADD COLUMN foto_url TEXT DEFAULT NULL')
+    
+    if not _coluna_existe(cursor, 'despesas', 'audio_url'):
+        cursor.execute('ALTER TABLE despesas ADD COLUMN audio_url TEXT DEFAULT NULL')
+    
+    if not _coluna_existe(cursor, 'despesas', 'ocr_data'):
+        cursor.execute('ALTER TABLE despesas ADD COLUMN ocr_data TEXT DEFAULT NULL')
+    
+    if not _coluna_existe(cursor, 'receitas', 'tipo_perfil'):
+        cursor.execute('ALTER TABLE receitas ADD COLUMN tipo_perfil TEXT DEFAULT "pessoal"')
+    
+    if not _coluna_existe(cursor, 'receitas', 'foto_url'):
+        cursor.execute('ALTER TABLE receitas ADD COLUMN foto_url TEXT DEFAULT NULL')
+    
+    if not _coluna_existe(cursor, 'receitas', 'audio_url'):
+        cursor.execute('ALTER TABLE receitas ADD COLUMN audio_url TEXT DEFAULT NULL')
+    
+    # Tabela de pagamentos fixos
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS pagamentos_fixos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        descricao TEXT NOT NULL,
+        valor REAL NOT NULL,
+        dia_vencimento INTEGER NOT NULL,
+        categoria TEXT,
+        forma_pagamento TEXT,
+        tipo_perfil TEXT DEFAULT 'pessoal',
+        ativo INTEGER DEFAULT 1,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+    )
+    ''')
+    
+    # Tabela de orçamentos
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS orcamentos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        categoria TEXT NOT NULL,
+        valor_limite REAL NOT NULL,
+        periodicidade TEXT NOT NULL,
+        porcentagem_alerta INTEGER DEFAULT 80,
+        tipo_perfil TEXT DEFAULT 'pessoal',
+        ativo INTEGER DEFAULT 1,
+        data_criacao TEXT,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+    )
+    ''')
+    
+    # Tabela de metas financeiras
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS metas_financeiras (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        titulo TEXT NOT NULL,
+        valor_alvo REAL NOT NULL,
+        valor_atual REAL DEFAULT 0,
+        data_alvo TEXT NOT NULL,
+        icone TEXT,
+        contribuicao_automatica REAL DEFAULT 0,
+        periodicidade_contribuicao TEXT,
+        tipo_perfil TEXT DEFAULT 'pessoal',
+        concluida INTEGER DEFAULT 0,
+        data_criacao TEXT,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+    )
+    ''')
+    
+    # Contribuições das metas financeiras
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS meta_contribuicoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        meta_id INTEGER NOT NULL,
+        valor REAL NOT NULL,
+        data TEXT NOT NULL,
+        observacao TEXT,
+        data_criacao TEXT,
+        FOREIGN KEY (meta_id) REFERENCES metas_financeiras (id)
+     )
+    ''')
+
+
+def _m002_tabelas_dos_modelos(cursor):
+    """Tabelas e colunas que os modelos criavam sob demanda (criar_tabela)"""
+    # Colunas adicionadas por Usuario.criar_tabela
+    colunas_usuarios = _colunas(cursor, 'usuarios')
+    if 'renda' not in colunas_usuarios:
+        cursor.execute('ALTER TABLE usuarios ADD COLUMN renda REAL')
+    if 'admin' not in colunas_usuarios:
+        cursor.execute('ALTER TABLE usuarios ADD COLUMN admin INTEGER DEFAULT 0')
+    if 'origens' not in colunas_usuarios:
+        cursor.execute('ALTER TABLE usuarios ADD COLUMN origens TEXT')
+    
+    # Dívidas (Divida.criar_tabela)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS dividas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        nome TEXT NOT NULL,
+        valor_total REAL NOT NULL,
+        valor_pago REAL DEFAULT 0,
+        data_inicio TEXT,
+        data_fim TEXT,
+        taxa_juros REAL,
+        parcelas_total INTEGER,
+        parcelas_pagas INTEGER DEFAULT 0,
+        status TEXT DEFAULT 'em_dia',
+        credor TEXT,
+        tipo TEXT DEFAULT 'outros',
+        tipo_perfil TEXT DEFAULT 'pessoal',
+        data_criacao TEXT,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+    )
+    ''')
+    
+    if not _coluna_existe(cursor, 'dividas', 'tipo'):
+        cursor.execute('ALTER TABLE dividas ADD COLUMN tipo TEXT DEFAULT "outros"')
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS divida_pagamentos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        divida_id INTEGER NOT NULL,
+        valor REAL NOT NULL,
+        data TEXT NOT NULL,
+        tipo TEXT DEFAULT 'parcela',
+        observacao TEXT,
+        data_criacao TEXT,
+        FOREIGN KEY (divida_id) REFERENCES dividas (id)
+    )
+    ''')
+    
+    if not _coluna_existe(cursor, 'divida_pagamentos', 'tipo'):
+        cursor.execute('ALTER TABLE divida_pagamentos ADD COLUMN tipo TEXT DEFAULT "parcela"')
+    
+    # Notificações (Notificacao.criar_tabela)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS notificacoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        type TEXT NOT NULL,
+        title TEXT NOT NULL,
+        description TEXT,
+        icon TEXT,
+        icon_color TEXT,
+        icon_bg TEXT,
+        action_url TEXT,
+        action_text TEXT,
+        metadata TEXT DEFAULT '{}',
+        is_read INTEGER DEFAULT 0,
+        created_at TEXT NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES usuarios (id)
+    )
+    ''')
+
+
+def _m003_metas_valor_automatico(cursor):
+    """Reconcilia as duas definições de metas_financeiras.
+
+    O init_db declarava a tabela duas vezes; a primeira (contribuicao_automatica)
+    vencia, mas MetaFinanceira grava em valor_automatico.
+    """
+    colunas = _colunas(cursor, 'metas_financeiras')
+    if 'valor_automatico' in colunas:
+        return
+    if 'contribuicao_automatica' in colunas:
+        cursor.execute('ALTER TABLE metas_financeiras RENAME COLUMN contribuicao_automatica TO valor_automatico')
+    else:
+        cursor.execute('ALTER TABLE metas_financeiras ADD COLUMN valor_automatico REAL DEFAULT 0')
+
+
+def _m004_sessoes_fk(cursor):
+    """Recria sessoes com ON DELETE CASCADE, descartando sessões órfãs.
+
+    A FK original não tinha ação de exclusão, então sessões de usuários
+    removidos ficavam apontando para ids inexistentes.
+    """
+    cursor.execute('''
+    CREATE TABLE sessoes_nova (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        token TEXT NOT NULL,
+        data_criacao TEXT,
+        data_expiracao TEXT,
+        ip_address TEXT,
+        user_agent TEXT,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id) ON DELETE CASCADE
+    )
+    ''')
+    cursor.execute('''
+    INSERT INTO sessoes_nova (id, usuario_id, token, data_criacao, data_expiracao, ip_address, user_agent)
+    SELECT id, usuario_id, token, data_criacao, data_expiracao, ip_address, user_agent
+    FROM sessoes
+    WHERE usuario_id IN (SELECT id FROM usuarios)
+    ''')
+    cursor.execute('DROP TABLE sessoes')
+    cursor.execute('ALTER TABLE sessoes_nova RENAME TO sessoes')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessoes_usuario ON sessoes (usuario_id)')
+
+
+# Índices das consultas dos modelos. Os de despesas/receitas terminam em
+# (categoria, valor) para que SUM/GROUP BY sejam respondidos só pelo índice.
+INDICES = [
+    'CREATE INDEX IF NOT EXISTS idx_despesas_usuario_data ON despesas (usuario_id, data, tipo_perfil, categoria, valor)',
+    'CREATE INDEX IF NOT EXISTS idx_despesas_categoria ON despesas (categoria)',
+    'CREATE INDEX IF NOT EXISTS idx_receitas_usuario_data ON receitas (usuario_id, data, tipo_perfil, categoria, valor)',
+    'CREATE INDEX IF NOT EXISTS idx_receitas_categoria ON receitas (categoria)',
+    'CREATE INDEX IF NOT EXISTS idx_lembretes_usuario_data ON lembretes (usuario_id, data)',
+    'CREATE INDEX IF NOT EXISTS idx_lembretes_concluido_data ON lembretes (concluido, data)',
+    'CREATE INDEX IF NOT EXISTS idx_usuarios_admin ON usuarios (admin) WHERE admin = 1',
+    'CREATE INDEX IF NOT EXISTS idx_orcamentos_usuario ON orcamentos (usuario_id, categoria)',
+    'CREATE INDEX IF NOT EXISTS idx_metas_usuario ON metas_financeiras (usuario_id, data_alvo)',
+    'CREATE INDEX IF NOT EXISTS idx_meta_contribuicoes_meta ON meta_contribuicoes (meta_id, data)',
+    'CREATE INDEX IF NOT EXISTS idx_pagamentos_fixos_usuario ON pagamentos_fixos (usuario_id, dia_vencimento)',
+    'CREATE INDEX IF NOT EXISTS idx_membros_usuario ON membros (usuario_id)',
+    'CREATE INDEX IF NOT EXISTS idx_membros_email ON membros (email)',
+    'CREATE INDEX IF NOT EXISTS idx_categorias_personalizadas_usuario ON categorias_personalizadas (usuario_id, nome)',
+    'CREATE INDEX IF NOT EXISTS idx_assinaturas_usuario ON assinaturas (usuario_id, status)',
+    'CREATE INDEX IF NOT EXISTS idx_cupons_ativo ON cupons (ativo, data_criacao)',
+    'CREATE INDEX IF NOT EXISTS idx_cupom_usos_cupom_usuario ON cupom_usos (cupom_id, usuario_id)',
+    'CREATE INDEX IF NOT EXISTS idx_dividas_usuario ON dividas (usuario_id, data_fim)',
+    'CREATE INDEX IF NOT EXISTS idx_divida_pagamentos_divida ON divida_pagamentos (divida_id, data)',
+    'CREATE INDEX IF NOT EXISTS idx_notificacoes_usuario_data ON notificacoes (user_id, created_at)',
+]
+
+
+def _m005_indices(cursor):
+    """Índices compostos/cobrindo das consultas dos modelos"""
+    for indice in INDICES:
+        cursor.execute(indice)
+
+
+def _m006_resumo_mensal(cursor):
+    """Resumo mensal de despesas/receitas por usuário, perfil, mês e categoria"""
+    from database.resumos import _reconstruir
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS resumo_mensal (
+        usuario_id INTEGER NOT NULL,
+        tipo_perfil TEXT NOT NULL DEFAULT '',
+        mes TEXT NOT NULL,
+        categoria TEXT NOT NULL DEFAULT '',
+        total_despesas REAL NOT NULL DEFAULT 0,
+        qtd_despesas INTEGER NOT NULL DEFAULT 0,
+        total_receitas REAL NOT NULL DEFAULT 0,
+        qtd_receitas INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (usuario_id, tipo_perfil, mes, categoria)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_resumo_mensal_usuario_mes ON resumo_mensal (usuario_id, mes)')
+    
+    # Preenche com o histórico existente
+    _reconstruir(cursor)
+
+
+def _m007_webhook_mensagens(cursor):
+    """Fila (outbox) das mensagens do webhook processadas em segundo plano"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS webhook_mensagens (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        remetente TEXT NOT NULL,
+        mensagem TEXT NOT NULL DEFAULT '',
+        profile_name TEXT,
+        message_sid TEXT,
+        status TEXT NOT NULL DEFAULT 'pendente',
+        tentativas INTEGER NOT NULL DEFAULT 0,
+        reservado_em TEXT,
+        resposta TEXT,
+        erro TEXT,
+        data_criacao TEXT NOT NULL,
+        data_processamento TEXT
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_webhook_mensagens_status ON webhook_mensagens (status, id)
+    ''')
+    # Só as mensagens em aberto: usado para achar a primeira de cada remetente
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_webhook_mensagens_abertas ON webhook_mensagens (remetente, id)
+    WHERE status IN ('pendente', 'processando')
+    ''')
+
+
+def _m008_webhook_respostas(cursor):
+    """Respostas por MessageSid, para ignorar reentregas da Twilio"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS webhook_respostas (
+        message_sid TEXT PRIMARY KEY,
+        status TEXT NOT NULL DEFAULT 'processando',
+        resposta TEXT,
+        data_criacao TEXT NOT NULL,
+        atualizado_em TEXT NOT NULL
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_webhook_respostas_data ON webhook_respostas (data_criacao)
+    ''')
+
+
+def _m009_importacoes(cursor):
+    """Importação de extratos: chave de duplicidade dos lançamentos e progresso"""
+    # Hash de (data, valor, descrição normalizada); NULL até a primeira
+    # importação do usuário calcular as chaves dos lançamentos existentes
+    for tabela in ('despesas', 'receitas'):
+        if 'chave_dedup' not in _colunas(cursor, tabela):
+            cursor.execute(f'ALTER TABLE {tabela} ADD COLUMN chave_dedup TEXT')
+        cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS idx_{tabela}_chave_dedup ON {tabela} (usuario_id, chave_dedup)
+        ''')
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS importacoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        arquivo TEXT NOT NULL,
+        nome_original TEXT,
+        formato TEXT NOT NULL,
+        tipo_perfil TEXT NOT NULL DEFAULT 'pessoal',
+        inverter_sinal INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL DEFAULT 'pendente',
+        linhas_processadas INTEGER NOT NULL DEFAULT 0,
+        inseridas INTEGER NOT NULL DEFAULT 0,
+        duplicadas INTEGER NOT NULL DEFAULT 0,
+        invalidas INTEGER NOT NULL DEFAULT 0,
+        erro TEXT,
+        data_criacao TEXT NOT NULL,
+        atualizado_em TEXT NOT NULL,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id) ON DELETE CASCADE
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_importacoes_usuario ON importacoes (usuario_id, id)
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_importacoes_status ON importacoes (status)
+    ''')
+
+
+def _m010_exportacoes(cursor):
+    """Exportações em segundo plano e os arquivos gerados"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS exportacoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        usuario_id INTEGER NOT NULL,
+        entidade TEXT NOT NULL,
+        formato TEXT NOT NULL,
+        data_inicio TEXT,
+        data_fim TEXT,
+        chave TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pendente',
+        arquivo TEXT,
+        tamanho INTEGER,
+        linhas INTEGER,
+        erro TEXT,
+        reservado_em TEXT,
+        data_criacao TEXT NOT NULL,
+        atualizado_em TEXT NOT NULL,
+        expira_em TEXT,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios (id) ON DELETE CASCADE
+    )
+    ''')
+    # Pedidos iguais do mesmo usuário em aberto são agrupados pela chave
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_exportacoes_usuario ON exportacoes (usuario_id, chave)
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_exportacoes_status ON exportacoes (status, expira_em)
+    ''')
+
+
+def _m011_usuarios_revisao(cursor):
+    """Revisão do cadastro, para o cache de usuários detectar gravações de outros workers"""
+    if 'revisao' not in _colunas(cursor, 'usuarios'):
+        cursor.execute('ALTER TABLE usuarios ADD COLUMN revisao INTEGER NOT NULL DEFAULT 0')
+    # Qualquer UPDATE em usuarios avança a revisão, inclusive os feitos fora do Usuario
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_usuarios_revisao AFTER UPDATE ON usuarios
+    FOR EACH ROW WHEN NEW.revisao = OLD.revisao
+    BEGIN
+        UPDATE usuarios SET revisao = OLD.revisao + 1 WHERE id = NEW.id;
+    END
+    ''')
+
+
+def _m012_usuarios_revisao_global(cursor):
+    """Revisão global dos usuários: ``MAX(revisao)`` avança a cada gravação"""
+    # O cache de usuários consulta MAX(revisao) periodicamente e relê só as
+    # linhas com revisão maior que a última vista (índice abaixo)
+    cursor.execute('DROP TRIGGER IF EXISTS trg_usuarios_revisao')
+    cursor.execute('''
+    CREATE TRIGGER trg_usuarios_revisao AFTER UPDATE ON usuarios
+    FOR EACH ROW WHEN NEW.revisao = OLD.revisao
+    BEGIN
+        UPDATE usuarios SET revisao = (SELECT MAX(revisao) FROM usuarios) + 1 WHERE id = NEW.id;
+    END
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_usuarios_revisao ON usuarios (revisao)
+    ''')
+
+
+def _m013_despesas_mensagem_webhook(cursor):
+    """Mensagem da fila do webhook que gerou a despesa, para não gravá-la duas vezes"""
+    if 'webhook_mensagem_id' not in _colunas(cursor, 'despesas'):
+        cursor.execute('ALTER TABLE despesas ADD COLUMN webhook_mensagem_id INTEGER')
+    # Parcial: só as despesas vindas da fila assíncrona têm a coluna preenchida
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_despesas_webhook_mensagem ON despesas (webhook_mensagem_id)
+    WHERE webhook_mensagem_id IS NOT NULL
+    ''')
+
+
+# (versão, descrição, função) — sempre acrescente no final, nunca renumere
+MIGRACOES = [
+    (1, 'Esquema inicial', _m001_esquema_inicial),
+    (2, 'Tabelas criadas sob demanda pelos modelos', _m002_tabelas_dos_modelos),
+    (3, 'metas_financeiras.contribuicao_automatica -> valor_automatico', _m003_metas_valor_automatico),
+    (4, 'sessoes com FK ON DELETE CASCADE', _m004_sessoes_fk),
+    (5, 'Índices das consultas dos modelos', _m005_indices),
+    (6, 'Resumo mensal de despesas e receitas', _m006_resumo_mensal),
+    (7, 'Fila de mensagens do webhook', _m007_webhook_mensagens),
+    (8, 'Respostas do webhook por MessageSid', _m008_webhook_respostas),
+    (9, 'Importação de extratos (CSV/OFX)', _m009_importacoes),
+    (10, 'Exportações em segundo plano', _m010_exportacoes),
+    (11, 'Revisão do cadastro de usuários', _m011_usuarios_revisao),
+    (12, 'Revisão global dos usuários, consultada pelo cache', _m012_usuarios_revisao_global),
+    (13, 'Mensagem do webhook que gerou cada despesa', _m013_despesas_mensagem_webhook),
+]
+
+
+def _criar_tabela_versao(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        versao INTEGER PRIMARY KEY,
+        descricao TEXT NOT NULL,
+        aplicada_em TEXT NOT NULL
+    )
+    ''')
+
+
+def versao_atual(conn):
+    """Maior versão aplicada (0 para banco sem migrações)"""
+    resultado = conn.execute("SELECT MAX(versao) FROM schema_version").fetchone()
+    return resultado[0] or 0
+
+
+def migrar(db_path, ate=None):
+    """Aplica as migrações pendentes e retorna as versões aplicadas"""
+    conn = abrir_conexao(db_path)
+    # Transações explícitas: no modo padrão o sqlite3 não envolve DDL em transação
+    conn.isolation_level = None
+    aplicadas = []
+    
+    try:
+        _criar_tabela_versao(conn)
+        ultima = MIGRACOES[-1][0] if ate is None else ate
+        if versao_atual(conn) >= ultima:
+            return aplicadas
+        
+        for versao, descricao, funcao in MIGRACOES:
+            if versao > ultima:
+                break
+            
+            # BEGIN IMMEDIATE serializa workers do gunicorn iniciando juntos;
+            # a versão é relida dentro da transação
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if versao <= versao_atual(conn):
+                    conn.execute("ROLLBACK")
+                    continue
+                
+                funcao(conn.cursor())
+                conn.execute(
+                    "INSERT INTO schema_version (versao, descricao, aplicada_em) VALUES (?, ?, ?)",
+                    (versao, descricao, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            
+            aplicadas.append(versao)
+            print(f"Migração {versao:03d} aplicada: {descricao}")
+    finally:
+        conn.close()
+    
+    return aplicadas
+
+
+def pendentes(db_path):
+    """Lista as migrações ainda não aplicadas"""
+    conn = abrir_conexao(db_path)
+    try:
+        _criar_tabela_versao(conn)
+        atual = versao_atual(conn)
+    finally:
+        conn.close()
+    return [(versao, descricao) for versao, descricao, _ in MIGRACOES if versao > atual]
+
+
+def main(argv=None):
+    from config import Config
+    
+    argv = sys.argv[1:] if argv is None else argv
+    comando = argv[0] if argv else 'status'
+    db_path = argv[1] if len(argv) > 1 else Config.DATABASE
+    
+    if comando == 'migrar':
+        aplicadas = migrar(db_path)
+        if not aplicadas:
+            print("Banco de dados já está atualizado.")
+        return 0
+    
+    if comando == 'status':
+        lista = pendentes(db_path)
+        print(f"Banco: {db_path}")
+        print(f"Versão mais recente: {MIGRACOES[-1][0]}")
+        if not lista:
+            print("Nenhuma migração pendente.")
+        for versao, descricao in lista:
+            print(f"  pendente {versao:03d}: {descricao}")
+        return 0
+    
+    print(f"Comando desconhecido: {comando} (use 'status' ou 'migrar')")
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,342 +1,40 @@
 import os
 import sqlite3
+import json
+import multiprocessing
+import threading
 from datetime import datetime, timedelta
 import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from types import MappingProxyType
+from config import Config
+from database.conexao import conectar
+from database.escrita import executar_escrita
+from database.migracoes import migrar
+from database.resumos import ajustar_resumo, ajustar_resumo_registro, consultar_totais
+from database.lote import COLUNAS as COLUNAS_LANCAMENTOS, normalizar_lancamentos, inserir_lancamentos
+from database.dashboard import periodo_orcamento
+from database.cache import invalidar_resumo
+from database.cache_usuarios import obter_cache_usuarios, invalidar_usuario, sincronizar_revisoes
+from database.palavras_chave import CasadorPalavras
 
 # Ensure the database directory exists
 def init_db(db_path):
-    """Inicializa o banco de dados"""
+    """Inicializa o banco de dados aplicando as migrações pendentes"""
     # Garante que o diretório existe
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
     
-    # Conecta ao banco de dados
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Função auxiliar para verificar se uma coluna existe
-    def column_exists(cursor, table, column):
-        cursor.execute(f"PRAGMA table_info({table})")
-        return any(row[1] == column for row in cursor.fetchall())
-    
-    # Cria as tabelas se não existirem
-    
-    # Tabela de usuários
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS usuarios (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        celular TEXT UNIQUE,
-        nome TEXT,
-        email TEXT UNIQUE,
-        senha TEXT,
-        data_criacao TEXT,
-        ultimo_acesso TEXT,
-        plano TEXT DEFAULT 'gratuito',
-        data_assinatura TEXT,
-        data_vencimento TEXT,
-        ativo INTEGER DEFAULT 1,
-        admin INTEGER DEFAULT 0
-    )
-    ''')
-    
-    # Tabela de despesas
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS despesas (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        usuario_id INTEGER NOT NULL,
-        valor REAL NOT NULL,
-        categoria TEXT,
-        descricao TEXT,
-        data TEXT,
-        forma_pagamento TEXT,
-        parcelado INTEGER DEFAULT 0,
-        num_parcelas INTEGER DEFAULT 1,
-        data_criacao TEXT,
-        mensagem_original TEXT,
-        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-    )
-    ''')
-    
-    # Tabela de receitas
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS receitas (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        usuario_id INTEGER NOT NULL,
-        valor REAL NOT NULL,
-        categoria TEXT,
-        descricao TEXT,
-        data TEXT,
-        data_criacao TEXT,
-        recorrente INTEGER DEFAULT 0,
-        periodicidade TEXT,
-        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-    )
-    ''')
-    
-    # Tabela de categorias personalizadas
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS categorias (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        usuario_id INTEGER NOT NULL,
-        nome TEXT NOT NULL,
-        tipo TEXT NOT NULL, -- 'despesa' ou 'receita'
-        icone TEXT,
-        cor TEXT,
-        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-    )
-    ''')
-    
-    # Tabela de assinaturas
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS assinaturas (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        usuario_id INTEGER NOT NULL,
-        plano TEXT NOT NULL,
-        data_inicio TEXT,
-        data_fim TEXT,
-        valor REAL,
-        status TEXT,
-        forma_pagamento TEXT,
-        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-    )
-    ''')
-    
-    # Tabela de tokens de recuperação de senha
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS tokens_recuperacao (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        usuario_id INTEGER NOT NULL,
-        token TEXT NOT NULL,
-        data_criacao TEXT,
-        data_expiracao TEXT,
-        utilizado INTEGER DEFAULT 0,
-        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-    )
-    ''')
-    
-    # Tabela de sessões
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS sessoes (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        usuario_id INTEGER NOT NULL,
-        token TEXT NOT NULL,
-        data_criacao TEXT,
-        data_expiracao TEXT,
-        ip_address TEXT,
-        user_agent TEXT,
-        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-    )
-    ''')
-
-    # Tabela para rastreamento de origem (referral)
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS usuario_referral (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        usuario_id INTEGER NOT NULL,
-        origem TEXT NOT NULL,
-        data_registro TEXT,
-        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-    )
-    ''')
-
-    # Tabela para cupons de desconto
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS cupons (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        codigo TEXT NOT NULL UNIQUE,
-        tipo TEXT NOT NULL,
-        valor REAL NOT NULL,
-        data_inicio TEXT NOT NULL,
-        data_fim TEXT,
-        limite_usos INTEGER,
-        usos_atuais INTEGER DEFAULT 0,
-        ativo INTEGER DEFAULT 1,
-        data_criacao TEXT
-    )
-    ''')
-
-    # Tabela para uso de cupons
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS cupom_usos (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        cupom_id INTEGER NOT NULL,
-        usuario_id INTEGER NOT NULL,
-        data_uso TEXT NOT NULL,
-        FOREIGN KEY (cupom_id) REFERENCES cupons (id),
-        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-    )
-    ''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS lembretes (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        usuario_id INTEGER NOT NULL,
-        titulo TEXT NOT NULL,
-        descricao TEXT,
-        data TEXT NOT NULL,
-        valor REAL,
-        notificacao INTEGER DEFAULT 0,
-        recorrente INTEGER DEFAULT 0,
-        periodicidade TEXT,
-        tipo_perfil TEXT DEFAULT 'pessoal',
-        concluido INTEGER DEFAULT 0,
-        data_criacao TEXT,
-        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-    )
-    ''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS categorias_personalizadas (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        usuario_id INTEGER NOT NULL,
-        nome TEXT NOT NULL,
-        nome_slug TEXT NOT NULL,
-        icone TEXT,
-        cor TEXT,
-        tipo TEXT NOT NULL,
-        tipo_perfil TEXT DEFAULT 'pessoal',
-        data_criacao TEXT,
-        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-    )
-    ''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS membros (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        usuario_id INTEGER NOT NULL,
-        nome TEXT NOT NULL,
-        email TEXT NOT NULL,
-        celular TEXT,
-        permissao TEXT NOT NULL,
-        tipo_grupo TEXT NOT NULL,
-        convite_aceito INTEGER DEFAULT 0,
-        usuario_principal INTEGER DEFAULT 0,
-        data_criacao TEXT,
-        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-    )
-    ''')
-    
-    # Adiciona colunas adicionais às tabelas existentes, verificando primeiro se já existem
-    # Adiciona coluna tipo_perfil e outras colunas se não existirem
-    if not column_exists(cursor, 'despesas', 'tipo_perfil'):
-        cursor.execute('ALTER TABLE despesas ADD COLUMN tipo_perfil TEXT DEFAULT "pessoal"')
-    
-    if not column_exists(cursor, 'despesas', 'foto_url'):
-        cursor.execute('ALTER TABLE despesas ADD COLUMN foto_url TEXT DEFAULT NULL')
-    
-    if not column_exists(cursor, 'despesas', 'audio_url'):
-        cursor.execute('ALTER TABLE despesas ADD COLUMN audio_url TEXT DEFAULT NULL')
-    
-    if not column_exists(cursor, 'despesas', 'ocr_data'):
-        cursor.execute('ALTER TABLE despesas ADD COLUMN ocr_data TEXT DEFAULT NULL')
-    
-    if not column_exists(cursor, 'receitas', 'tipo_perfil'):
-        cursor.execute('ALTER TABLE receitas ADD COLUMN tipo_perfil TEXT DEFAULT "pessoal"')
-    
-    if not column_exists(cursor, 'receitas', 'foto_url'):
-        cursor.execute('ALTER TABLE receitas ADD COLUMN foto_url TEXT DEFAULT NULL')
-    
-    if not column_exists(cursor, 'receitas', 'audio_url'):
-        cursor.execute('ALTER TABLE receitas ADD COLUMN audio_url TEXT DEFAULT NULL')
-    
-    # Tabela de pagamentos fixos
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS pagamentos_fixos (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        usuario_id INTEGER NOT NULL,
-        descricao TEXT NOT NULL,
-        valor REAL NOT NULL,
-        dia_vencimento INTEGER NOT NULL,
-        categoria TEXT,
-        forma_pagamento TEXT,
-        tipo_perfil TEXT DEFAULT 'pessoal',
-        ativo INTEGER DEFAULT 1,
-        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-    )
-    ''')
-    
-    # Tabela de orçamentos
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS orcamentos (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        usuario_id INTEGER NOT NULL,
-        categoria TEXT NOT NULL,
-        valor_limite REAL NOT NULL,
-        periodicidade TEXT NOT NULL,
-        porcentagem_alerta INTEGER DEFAULT 80,
-        tipo_perfil TEXT DEFAULT 'pessoal',
-        ativo INTEGER DEFAULT 1,
-        data_criacao TEXT,
-        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-    )
-    ''')
-    
-    # Tabela de metas financeiras
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS metas_financeiras (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        usuario_id INTEGER NOT NULL,
-        titulo TEXT NOT NULL,
-        valor_alvo REAL NOT NULL,
-        valor_atual REAL DEFAULT 0,
-        data_alvo TEXT NOT NULL,
-        icone TEXT,
-        contribuicao_automatica REAL DEFAULT 0,
-        periodicidade_contribuicao TEXT,
-        tipo_perfil TEXT DEFAULT 'pessoal',
-        concluida INTEGER DEFAULT 0,
-        data_criacao TEXT,
-        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-    )
-    ''')
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS orcamentos (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        usuario_id INTEGER NOT NULL,
-        categoria TEXT NOT NULL,
-        valor_limite REAL NOT NULL,
-        periodicidade TEXT NOT NULL,
-        porcentagem_alerta INTEGER DEFAULT 80,
-        tipo_perfil TEXT DEFAULT 'pessoal',
-        ativo INTEGER DEFAULT 1,
-        data_criacao TEXT,
-        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-    )
-    ''')
-
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS metas_financeiras (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        usuario_id INTEGER NOT NULL,
-        titulo TEXT NOT NULL,
-        valor_alvo REAL NOT NULL,
-        valor_atual REAL DEFAULT 0,
-        data_alvo TEXT NOT NULL,
-        icone TEXT,
-        valor_automatico REAL DEFAULT 0,
-        periodicidade_contribuicao TEXT,
-        tipo_perfil TEXT DEFAULT 'pessoal',
-        concluida INTEGER DEFAULT 0,
-        data_criacao TEXT,
-        FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-    )
-    ''')
-
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS meta_contribuicoes (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        meta_id INTEGER NOT NULL,
-        valor REAL NOT NULL,
-        data TEXT NOT NULL,
-        observacao TEXT,
-        data_criacao TEXT,
-        FOREIGN KEY (meta_id) REFERENCES metas_financeiras (id)
-     )
-    ''')  
-    conn.commit()
-    conn.close()
+    migrar(db_path)
     
     print(f"Banco de dados inicializado em: {db_path}")
 
+def _usuario_do_registro(cursor, tabela, registro_id):
+    """Retorna o usuario_id dono do registro (para invalidar o cache de resumos)"""
+    cursor.execute(f"SELECT usuario_id FROM {tabela} WHERE id = ?", (registro_id,))
+    linha = cursor.fetchone()
+    return linha[0] if linha else None
+
 class Orcamento:
     """Classe para manipulação de orçamentos"""
     def __init__(self, db_path):
@@ -345,7 +43,7 @@ class Orcamento:
     def criar(self, usuario_id, categoria, valor_limite, periodicidade='mensal', 
               porcentagem_alerta=80, tipo_perfil='pessoal'):
         """Cria um novo orçamento"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         data_criacao = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -367,7 +65,7 @@ class Orcamento:
     
     def buscar(self, usuario_id, tipo_perfil=None):
         """Busca orçamentos do usuário com filtros opcionais"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -388,7 +86,7 @@ class Orcamento:
     
     def calcular_gasto_atual(self, orcamento_id):
         """Calcula quanto já foi gasto no orçamento no período atual"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         # Busca dados do orçamento
@@ -400,30 +98,11 @@ class Orcamento:
             return 0
         
         # Define o período com base na periodicidade
-        hoje = datetime.now()
-        
-        if orcamento[3] == 'mensal':  # periodicidade
-            data_inicio = f"{hoje.year}-{hoje.month:02d}-01"
-            # Último dia do mês
-            if hoje.month == 12:
-                proximo_mes = 1
-                proximo_ano = hoje.year + 1
-            else:
-                proximo_mes = hoje.month + 1
-                proximo_ano = hoje.year
-            
-            ultimo_dia = (datetime(proximo_ano, proximo_mes, 1) - timedelta(days=1)).day
-            data_fim = f"{hoje.year}-{hoje.month:02d}-{ultimo_dia:02d}"
-        
-        elif orcamento[3] == 'semanal':
-            # Início da semana (segunda-feira)
-            data_inicio = (hoje - timedelta(days=hoje.weekday())).strftime("%Y-%m-%d")
-            # Fim da semana (domingo)
-            data_fim = (hoje + timedelta(days=6-hoje.weekday())).strftime("%Y-%m-%d")
-        
-        elif orcamento[3] == 'anual':
-            data_inicio = f"{hoje.year}-01-01"
-            data_fim = f"{hoje.year}-12-31"
+        periodo = periodo_orcamento(orcamento[4], datetime.now())
+        if periodo is None:
+            conn.close()
+            return 0
+        data_inicio, data_fim = periodo
         
         # Calcula o gasto total na categoria durante o período
         cursor.execute("""
@@ -448,51 +127,9 @@ class Usuario:
     def __init__(self, db_path):
         self.db_path = db_path
     
-    def criar_tabela(self):
-        """Cria a tabela de usuários se não existir"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Cria a tabela com todas as colunas necessárias
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            celular TEXT UNIQUE NOT NULL,
-            nome TEXT,
-            email TEXT,
-            senha TEXT,
-            plano TEXT DEFAULT 'gratuito',
-            origens TEXT,
-            renda REAL,
-            admin INTEGER DEFAULT 0,
-            data_criacao TEXT,
-            ultimo_acesso TEXT
-        )
-        ''')
-        
-        # Verifica se todas as colunas necessárias existem e adiciona se necessário
-        cursor.execute("PRAGMA table_info(usuarios)")
-        colunas_existentes = [row[1] for row in cursor.fetchall()]
-        
-        # Adiciona colunas que não existem
-        if 'renda' not in colunas_existentes:
-            cursor.execute('ALTER TABLE usuarios ADD COLUMN renda REAL')
-        
-        if 'admin' not in colunas_existentes:
-            cursor.execute('ALTER TABLE usuarios ADD COLUMN admin INTEGER DEFAULT 0')
-        
-        if 'origens' not in colunas_existentes:
-            cursor.execute('ALTER TABLE usuarios ADD COLUMN origens TEXT')
-        
-        conn.commit()
-        conn.close()
-    
     def criar(self, celular, nome=None, email=None, senha=None):
         """Cria um novo usuário"""
-        # Garante que a tabela existe
-        self.criar_tabela()
-        
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         data_criacao = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -509,11 +146,16 @@ class Usuario:
         return usuario_id
     
     def buscar_por_celular(self, celular):
-        """Busca um usuário pelo número de celular"""
-        # Garante que a tabela existe
-        self.criar_tabela()
-        
-        conn = sqlite3.connect(self.db_path)
+        """Busca um usuário pelo número de celular (usando o cache de usuários)"""
+        # Gravações de outros workers (no máximo uma consulta por intervalo)
+        sincronizar_revisoes(self.db_path)
+        cache = obter_cache_usuarios()
+        usuario = cache.obter(self.db_path, celular)
+        if usuario is not None:
+            return usuario
+        versao = cache.versao()
+        
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -522,14 +164,16 @@ class Usuario:
         
         conn.close()
         
-        return dict(usuario) if usuario else None
+        if not usuario:
+            return None
+        
+        usuario = dict(usuario)
+        cache.definir(self.db_path, usuario, versao)
+        return usuario
     
     def buscar_por_id(self, usuario_id):
         """Busca um usuário pelo ID"""
-        # Garante que a tabela existe
-        self.criar_tabela()
-        
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -542,10 +186,7 @@ class Usuario:
     
     def buscar_por_email(self, email):
         """Busca um usuário pelo email"""
-        # Garante que a tabela existe
-        self.criar_tabela()
-        
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -558,7 +199,7 @@ class Usuario:
     
     def atualizar(self, usuario_id, nome=None, email=None, senha=None, plano=None, renda=None):
         """Atualiza os dados de um usuário"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         # Constrói a consulta dinamicamente com base nos campos fornecidos
@@ -594,10 +235,13 @@ class Usuario:
             conn.commit()
         
         conn.close()
+        
+        if campos:
+            invalidar_usuario(self.db_path, usuario_id)
     
     def registrar_acesso(self, usuario_id):
         """Registra o último acesso do usuário"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         ultimo_acesso = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -609,6 +253,7 @@ class Usuario:
         
         conn.commit()
         conn.close()
+        invalidar_usuario(self.db_path, usuario_id)
     
     def validar_credenciais(self, email, senha):
         """Valida as credenciais do usuário"""
@@ -625,7 +270,7 @@ class Usuario:
     
     def criar_sessao(self, usuario_id, ip_address=None, user_agent=None):
         """Cria uma nova sessão para o usuário"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         import secrets
@@ -656,7 +301,7 @@ class Usuario:
         Returns:
             bool: True se bem-sucedido
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         cursor.execute(
@@ -666,6 +311,7 @@ class Usuario:
         
         conn.commit()
         conn.close()
+        invalidar_usuario(self.db_path, usuario_id)
         
         return True
 
@@ -676,10 +322,7 @@ class Usuario:
         Returns:
             list: Lista de usuários administradores
         """
-        # Garante que a tabela existe
-        self.criar_tabela()
-        
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -700,7 +343,7 @@ class Usuario:
         Returns:
             bool: True se for admin, False caso contrário
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         cursor.execute("SELECT admin FROM usuarios WHERE id = ?", (usuario_id,))
@@ -720,7 +363,7 @@ class Usuario:
         Returns:
             float: Valor da renda ou None se não informada
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         cursor.execute("SELECT renda FROM usuarios WHERE id = ?", (usuario_id,))
@@ -748,38 +391,12 @@ class PagamentoFixo:
     def __init__(self, db_path):
         self.db_path = db_path
     
-    def criar_tabela(self):
-        """Cria a tabela pagamentos_fixos se não existir"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS pagamentos_fixos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            usuario_id INTEGER NOT NULL,
-            descricao TEXT NOT NULL,
-            valor REAL NOT NULL,
-            dia_vencimento INTEGER NOT NULL,
-            categoria TEXT,
-            forma_pagamento TEXT,
-            tipo_perfil TEXT DEFAULT 'pessoal',
-            ativo INTEGER DEFAULT 1,
-            FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-        )
-        ''')
-        
-        conn.commit()
-        conn.close()
-    
     def criar(self, usuario_id, descricao, valor, dia_vencimento, categoria=None, 
              forma_pagamento=None, tipo_perfil='pessoal'):
         """Cria um novo pagamento fixo"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
-        # Cria a tabela se não existir
-        self.criar_tabela()
-        
         cursor.execute('''
         INSERT INTO pagamentos_fixos
         (usuario_id, descricao, valor, dia_vencimento, categoria, forma_pagamento, tipo_perfil)
@@ -797,13 +414,10 @@ class PagamentoFixo:
     
     def buscar(self, usuario_id, tipo_perfil=None, ativo=1):
         """Busca pagamentos fixos"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        # Cria a tabela se não existir
-        self.criar_tabela()
-        
         query = "SELECT * FROM pagamentos_fixos WHERE usuario_id = ? AND ativo = ?"
         params = [usuario_id, ativo]
         
@@ -821,13 +435,10 @@ class PagamentoFixo:
     
     def buscar_vencimentos_proximos(self, usuario_id, dias=5):
         """Busca pagamentos com vencimento próximo"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        # Cria a tabela se não existir
-        self.criar_tabela()
-        
         # Obtém o dia atual
         hoje = datetime.now().day
         
@@ -858,7 +469,7 @@ class PagamentoFixo:
     
     def atualizar(self, pagamento_id, **kwargs):
         """Atualiza um pagamento fixo"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         campos_permitidos = [
@@ -887,7 +498,7 @@ class PagamentoFixo:
     
     def excluir(self, pagamento_id):
         """Exclui um pagamento fixo (ou desativa)"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         # Desativa em vez de excluir
@@ -950,7 +561,7 @@ class Membro:
     
     def criar(self, usuario_id, nome, email, tipo_grupo, permissao='visualizador', celular=None, usuario_principal=0):
         """Cria um novo membro"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         data_criacao = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -971,7 +582,7 @@ class Membro:
     
     def buscar(self, usuario_id, tipo_grupo=None):
         """Busca membros do usuário com filtros opcionais"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -992,7 +603,7 @@ class Membro:
     
     def buscar_por_id(self, membro_id):
         """Busca um membro pelo ID"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -1005,7 +616,7 @@ class Membro:
     
     def buscar_por_email(self, email, tipo_grupo=None):
         """Busca um membro pelo email"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -1025,7 +636,7 @@ class Membro:
     
     def atualizar(self, membro_id, **kwargs):
         """Atualiza os dados de um membro"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         campos_permitidos = [
@@ -1053,7 +664,7 @@ class Membro:
     
     def excluir(self, membro_id):
         """Exclui um membro"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         # Verifica se é o usuário principal
@@ -1074,7 +685,7 @@ class Membro:
     
     def criar_usuario_principal(self, usuario_id):
         """Cria o registro do usuário principal"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         # Busca os dados do usuário
@@ -1129,6 +740,38 @@ class Membro:
         
         return True, "Convite enviado com sucesso."
     
+def _despesas_das_mensagens(cursor, mensagem_ids):
+    """{webhook_mensagem_id: [ids das despesas já gravadas]} (dentro da fila de escrita)"""
+    mensagem_ids = list(mensagem_ids)
+    cursor.execute(
+        f"SELECT webhook_mensagem_id, id FROM despesas "
+        f"WHERE webhook_mensagem_id IN ({', '.join('?' * len(mensagem_ids))}) ORDER BY id",
+        mensagem_ids
+    )
+    gravadas = {}
+    for mensagem_id, despesa_id in cursor.fetchall():
+        gravadas.setdefault(mensagem_id, []).append(despesa_id)
+    return gravadas
+
+_INDICE_MENSAGEM_WEBHOOK = [nome for nome, _ in COLUNAS_LANCAMENTOS['despesas']].index('webhook_mensagem_id')
+
+def _inserir_despesas_webhook(cursor, linhas):
+    """``inserir_lancamentos`` sem repetir as despesas de mensagens do webhook já gravadas"""
+    mensagens = {linha[_INDICE_MENSAGEM_WEBHOOK] for linha in linhas} - {None}
+    gravadas = _despesas_das_mensagens(cursor, mensagens) if mensagens else {}
+    if not gravadas:
+        return inserir_lancamentos(cursor, 'despesas', linhas)
+    
+    novas = iter(inserir_lancamentos(
+        cursor, 'despesas', [linha for linha in linhas if linha[_INDICE_MENSAGEM_WEBHOOK] not in gravadas]
+    ))
+    existentes = {mensagem_id: iter(ids) for mensagem_id, ids in gravadas.items()}
+    return [
+        next(existentes[linha[_INDICE_MENSAGEM_WEBHOOK]], None)
+        if linha[_INDICE_MENSAGEM_WEBHOOK] in existentes else next(novas)
+        for linha in linhas
+    ]
+
 class Despesa:
     """Classe para manipulação de despesas"""
     def __init__(self, db_path):
@@ -1136,11 +779,14 @@ class Despesa:
     
     def criar(self, usuario_id, valor, categoria=None, descricao=None, data=None, 
              forma_pagamento=None, parcelado=0, num_parcelas=1, mensagem_original=None, 
-             tipo_perfil='pessoal', foto_url=None, audio_url=None, ocr_data=None):
-        """Cria uma nova despesa"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+             tipo_perfil='pessoal', foto_url=None, audio_url=None, ocr_data=None,
+             webhook_mensagem_id=None):
+        """Cria uma nova despesa.
         
+        ``webhook_mensagem_id``: mensagem da fila do webhook que originou a
+        despesa. Se ela já gerou uma despesa (processamento repetido após uma
+        queda), retorna o id existente sem gravar outra.
+        """
         # Define valores padrão
         if data is None:
             data = datetime.now().strftime("%Y-%m-%d")
@@ -1157,26 +803,52 @@ class Despesa:
         if ocr_data is not None and isinstance(ocr_data, dict):
             ocr_data = json.dumps(ocr_data)
         
-        cursor.execute('''
-        INSERT INTO despesas 
-        (usuario_id, valor, categoria, descricao, data, forma_pagamento, parcelado, 
-        num_parcelas, data_criacao, mensagem_original, tipo_perfil, foto_url, audio_url, ocr_data)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            usuario_id, valor, categoria, descricao, data, forma_pagamento, 
-            parcelado, num_parcelas, data_criacao, mensagem_original, tipo_perfil, 
-            foto_url, audio_url, ocr_data
-        ))
-        
-        conn.commit()
-        despesa_id = cursor.lastrowid
-        conn.close()
+        def _inserir(cursor):
+            if webhook_mensagem_id is not None:
+                gravadas = _despesas_das_mensagens(cursor, [webhook_mensagem_id])
+                if gravadas:
+                    return gravadas[webhook_mensagem_id][0]
+            cursor.execute('''
+            INSERT INTO despesas 
+            (usuario_id, valor, categoria, descricao, data, forma_pagamento, parcelado, 
+            num_parcelas, data_criacao, mensagem_original, tipo_perfil, foto_url, audio_url, ocr_data,
+            webhook_mensagem_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                usuario_id, valor, categoria, descricao, data, forma_pagamento, 
+                parcelado, num_parcelas, data_criacao, mensagem_original, tipo_perfil, 
+                foto_url, audio_url, ocr_data, webhook_mensagem_id
+            ))
+            despesa_id = cursor.lastrowid
+            ajustar_resumo(cursor, 'despesas', usuario_id, tipo_perfil, data, categoria, valor)
+            return despesa_id
         
+        despesa_id = executar_escrita(self.db_path, _inserir)
+        invalidar_resumo(usuario_id)
         return despesa_id
     
+    def criar_em_lote(self, despesas):
+        """Cria várias despesas numa única transação.
+        
+        ``despesas`` é uma lista de dicionários com os campos de ``criar``
+        (``usuario_id`` e ``valor`` obrigatórios). Valida tudo antes de gravar
+        (``ValueError`` indica o registro inválido) e retorna os IDs na mesma ordem.
+        
+        Registros com ``webhook_mensagem_id`` de uma mensagem que já gerou
+        despesas não são gravados de novo: no lugar deles vêm os IDs existentes.
+        """
+        linhas = normalizar_lancamentos('despesas', despesas)
+        if not linhas:
+            return []
+        
+        ids = executar_escrita(self.db_path, _inserir_despesas_webhook, linhas)
+        for usuario_id in {linha[0] for linha in linhas}:
+            invalidar_resumo(usuario_id)
+        return ids
+    
     def buscar(self, usuario_id, data_inicio=None, data_fim=None, categoria=None, limit=None):
         """Busca despesas do usuário com filtros opcionais"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -1209,7 +881,7 @@ class Despesa:
     
     def buscar_por_id(self, despesa_id):
         """Busca uma despesa pelo ID"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -1222,9 +894,6 @@ class Despesa:
     
     def atualizar(self, despesa_id, **kwargs):
         """Atualiza os dados de uma despesa"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         campos_permitidos = [
             'valor', 'categoria', 'descricao', 'data', 
             'forma_pagamento', 'parcelado', 'num_parcelas'
@@ -1244,60 +913,45 @@ class Despesa:
         
         if campos:
             query = f"UPDATE despesas SET {', '.join(campos)} WHERE id = ?"
-            cursor.execute(query, tuple(valores))
-            conn.commit()
-        
-        conn.close()
+            
+            def _atualizar(cursor):
+                # Retira o valor antigo do resumo e soma o novo
+                usuario_id = ajustar_resumo_registro(cursor, 'despesas', despesa_id, -1)
+                if usuario_id is not None:
+                    cursor.execute(query, tuple(valores))
+                    ajustar_resumo_registro(cursor, 'despesas', despesa_id, 1)
+                return usuario_id
+            
+            usuario_id = executar_escrita(self.db_path, _atualizar)
+            invalidar_resumo(usuario_id)
     
     def excluir(self, despesa_id):
         """Exclui uma despesa"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        def _excluir(cursor):
+            usuario_id = ajustar_resumo_registro(cursor, 'despesas', despesa_id, -1)
+            cursor.execute("DELETE FROM despesas WHERE id = ?", (despesa_id,))
+            return cursor.rowcount, usuario_id
         
-        cursor.execute("DELETE FROM despesas WHERE id = ?", (despesa_id,))
-        
-        conn.commit()
-        rows_affected = cursor.rowcount
-        conn.close()
+        rows_affected, usuario_id = executar_escrita(self.db_path, _excluir)
+        invalidar_resumo(usuario_id)
         
         return rows_affected > 0
     
     def total_por_categoria(self, usuario_id, data_inicio=None, data_fim=None, tipo_perfil=None):
         """Retorna o total de despesas agrupadas por categoria"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
-        query = """
-        SELECT categoria, SUM(valor) as total
-        FROM despesas
-        WHERE usuario_id = ?
-        """
-        params = [usuario_id]
-        
-        if data_inicio:
-            query += " AND data >= ?"
-            params.append(data_inicio)
-        
-        if data_fim:
-            query += " AND data <= ?"
-            params.append(data_fim)
-            
-        if tipo_perfil:
-            query += " AND (tipo_perfil = ? OR tipo_perfil IS NULL)"
-            params.append(tipo_perfil)
-        
-        query += " GROUP BY categoria ORDER BY total DESC"
-        
-        cursor.execute(query, params)
-        resultado = [dict(row) for row in cursor.fetchall()]
+        # Meses completos vêm do resumo mensal; só as pontas do período leem os lançamentos
+        linhas = consultar_totais(cursor, 'despesas', usuario_id, data_inicio, data_fim, tipo_perfil, agrupar='categoria')
+        resultado = [{'categoria': categoria, 'total': total} for categoria, total in linhas]
         
         conn.close()
         return resultado
     
     def total_por_dia(self, usuario_id, data_inicio=None, data_fim=None, tipo_perfil=None):
         """Retorna o total de despesas agrupadas por dia"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -1330,33 +984,24 @@ class Despesa:
     
     def total_periodo(self, usuario_id, data_inicio=None, data_fim=None, tipo_perfil=None):
         """Retorna o total de despesas no período"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
-        query = """
-        SELECT SUM(valor) as total
-        FROM despesas
-        WHERE usuario_id = ?
-        """
-        params = [usuario_id]
+        linhas = consultar_totais(cursor, 'despesas', usuario_id, data_inicio, data_fim, tipo_perfil)
         
-        if data_inicio:
-            query += " AND data >= ?"
-            params.append(data_inicio)
-        
-        if data_fim:
-            query += " AND data <= ?"
-            params.append(data_fim)
-            
-        if tipo_perfil:
-            query += " AND (tipo_perfil = ? OR tipo_perfil IS NULL)"
-            params.append(tipo_perfil)
+        conn.close()
+        return linhas[0][1] if linhas and linhas[0][1] else 0
+    
+    def total_por_mes(self, usuario_id, data_inicio=None, data_fim=None, tipo_perfil=None):
+        """Retorna o total de despesas agrupadas por mês (AAAA-MM)"""
+        conn = conectar(self.db_path)
+        cursor = conn.cursor()
         
-        cursor.execute(query, params)
-        resultado = cursor.fetchone()
+        linhas = consultar_totais(cursor, 'despesas', usuario_id, data_inicio, data_fim, tipo_perfil, agrupar='mes')
+        resultado = [{'mes': mes, 'total': total} for mes, total in linhas]
         
         conn.close()
-        return resultado[0] if resultado and resultado[0] else 0
+        return resultado
 
     
 class CategoriaPersonalizada:
@@ -1366,7 +1011,7 @@ class CategoriaPersonalizada:
     
     def criar(self, usuario_id, nome, tipo, icone='📦', cor='#28a745', tipo_perfil='pessoal'):
         """Cria uma nova categoria personalizada"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         # Cria um slug para o nome (para usar em classes CSS)
@@ -1390,7 +1035,7 @@ class CategoriaPersonalizada:
     
     def buscar(self, usuario_id, tipo=None, tipo_perfil=None):
         """Busca categorias do usuário com filtros opcionais"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -1415,7 +1060,7 @@ class CategoriaPersonalizada:
     
     def buscar_por_id(self, categoria_id):
         """Busca uma categoria pelo ID"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -1428,7 +1073,7 @@ class CategoriaPersonalizada:
     
     def atualizar(self, categoria_id, **kwargs):
         """Atualiza os dados de uma categoria"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         campos_permitidos = [
@@ -1460,7 +1105,7 @@ class CategoriaPersonalizada:
     
     def excluir(self, categoria_id):
         """Exclui uma categoria"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         # Primeiro verifica se existem transações usando esta categoria
@@ -1514,7 +1159,7 @@ class Lembrete:
     def criar(self, usuario_id, titulo, data, notificacao=0, descricao=None, valor=None, 
              recorrente=0, periodicidade=None, tipo_perfil='pessoal'):
         """Cria um novo lembrete"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         data_criacao = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -1536,7 +1181,7 @@ class Lembrete:
     
     def buscar(self, usuario_id, data_inicio=None, data_fim=None, tipo_perfil=None, concluido=None):
         """Busca lembretes do usuário com filtros opcionais"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -1569,7 +1214,7 @@ class Lembrete:
     
     def buscar_por_id(self, lembrete_id):
         """Busca um lembrete pelo ID"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -1582,7 +1227,7 @@ class Lembrete:
     
     def atualizar(self, lembrete_id, **kwargs):
         """Atualiza os dados de um lembrete"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         campos_permitidos = [
@@ -1611,7 +1256,7 @@ class Lembrete:
     
     def excluir(self, lembrete_id):
         """Exclui um lembrete"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         cursor.execute("DELETE FROM lembretes WHERE id = ?", (lembrete_id,))
@@ -1624,7 +1269,7 @@ class Lembrete:
     
     def marcar_como_concluido(self, lembrete_id, concluido=1):
         """Marca um lembrete como concluído ou não concluído"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         cursor.execute(
@@ -1691,7 +1336,7 @@ class Lembrete:
     
     def lembretes_vencidos_hoje(self, usuario_id=None):
         """Retorna os lembretes que vencem hoje"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -1715,7 +1360,7 @@ class Lembrete:
     
     def criar_notificacoes(self):
         """Cria notificações para lembretes com base no campo 'notificacao'"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -1765,9 +1410,6 @@ class Receita:
              recorrente=0, periodicidade=None, tipo_perfil='pessoal', 
              foto_url=None, audio_url=None):
         """Cria uma nova receita"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         # Define valores padrão
         if data is None:
             data = datetime.now().strftime("%Y-%m-%d")
@@ -1777,26 +1419,45 @@ class Receita:
         
         data_criacao = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        cursor.execute('''
-        INSERT INTO receitas 
-        (usuario_id, valor, categoria, descricao, data, data_criacao, recorrente, 
-        periodicidade, tipo_perfil, foto_url, audio_url)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            usuario_id, valor, categoria, descricao, data, 
-            data_criacao, recorrente, periodicidade, tipo_perfil, 
-            foto_url, audio_url
-        ))
-        
-        conn.commit()
-        receita_id = cursor.lastrowid
-        conn.close()
+        def _inserir(cursor):
+            cursor.execute('''
+            INSERT INTO receitas 
+            (usuario_id, valor, categoria, descricao, data, data_criacao, recorrente, 
+            periodicidade, tipo_perfil, foto_url, audio_url)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                usuario_id, valor, categoria, descricao, data, 
+                data_criacao, recorrente, periodicidade, tipo_perfil, 
+                foto_url, audio_url
+            ))
+            receita_id = cursor.lastrowid
+            ajustar_resumo(cursor, 'receitas', usuario_id, tipo_perfil, data, categoria, valor)
+            return receita_id
         
+        receita_id = executar_escrita(self.db_path, _inserir)
+        invalidar_resumo(usuario_id)
         return receita_id
     
+    def criar_em_lote(self, receitas):
+        """Cria várias receitas numa única transação.
+        
+        ``receitas`` é uma lista de dicionários com os campos de ``criar``
+        (``usuario_id``, ``valor`` e ``categoria`` obrigatórios). Valida tudo
+        antes de gravar (``ValueError`` indica o registro inválido) e retorna
+        os IDs na mesma ordem.
+        """
+        linhas = normalizar_lancamentos('receitas', receitas)
+        if not linhas:
+            return []
+        
+        ids = executar_escrita(self.db_path, inserir_lancamentos, 'receitas', linhas)
+        for usuario_id in {linha[0] for linha in linhas}:
+            invalidar_resumo(usuario_id)
+        return ids
+    
     def buscar(self, usuario_id, data_inicio=None, data_fim=None, categoria=None, limit=None, tipo_perfil=None):
         """Busca receitas do usuário com filtros opcionais"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -1833,7 +1494,7 @@ class Receita:
     
     def buscar_por_id(self, receita_id):
         """Busca uma receita pelo ID"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -1846,9 +1507,6 @@ class Receita:
     
     def atualizar(self, receita_id, **kwargs):
         """Atualiza os dados de uma receita"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         campos_permitidos = [
             'valor', 'categoria', 'descricao', 'data', 
             'recorrente', 'periodicidade', 'tipo_perfil'
@@ -1868,60 +1526,45 @@ class Receita:
         
         if campos:
             query = f"UPDATE receitas SET {', '.join(campos)} WHERE id = ?"
-            cursor.execute(query, tuple(valores))
-            conn.commit()
-        
-        conn.close()
+            
+            def _atualizar(cursor):
+                # Retira o valor antigo do resumo e soma o novo
+                usuario_id = ajustar_resumo_registro(cursor, 'receitas', receita_id, -1)
+                if usuario_id is not None:
+                    cursor.execute(query, tuple(valores))
+                    ajustar_resumo_registro(cursor, 'receitas', receita_id, 1)
+                return usuario_id
+            
+            usuario_id = executar_escrita(self.db_path, _atualizar)
+            invalidar_resumo(usuario_id)
     
     def excluir(self, receita_id):
         """Exclui uma receita"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        def _excluir(cursor):
+            usuario_id = ajustar_resumo_registro(cursor, 'receitas', receita_id, -1)
+            cursor.execute("DELETE FROM receitas WHERE id = ?", (receita_id,))
+            return cursor.rowcount, usuario_id
         
-        cursor.execute("DELETE FROM receitas WHERE id = ?", (receita_id,))
-        
-        conn.commit()
-        rows_affected = cursor.rowcount
-        conn.close()
+        rows_affected, usuario_id = executar_escrita(self.db_path, _excluir)
+        invalidar_resumo(usuario_id)
         
         return rows_affected > 0
     
     def total_por_categoria(self, usuario_id, data_inicio=None, data_fim=None, tipo_perfil=None):
         """Retorna o total de receitas agrupadas por categoria"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
-        query = """
-        SELECT categoria, SUM(valor) as total
-        FROM receitas
-        WHERE usuario_id = ?
-        """
-        params = [usuario_id]
-        
-        if data_inicio:
-            query += " AND data >= ?"
-            params.append(data_inicio)
-        
-        if data_fim:
-            query += " AND data <= ?"
-            params.append(data_fim)
-            
-        if tipo_perfil:
-            query += " AND (tipo_perfil = ? OR tipo_perfil IS NULL)"
-            params.append(tipo_perfil)
-        
-        query += " GROUP BY categoria ORDER BY total DESC"
-        
-        cursor.execute(query, params)
-        resultado = [dict(row) for row in cursor.fetchall()]
+        # Meses completos vêm do resumo mensal; só as pontas do período leem os lançamentos
+        linhas = consultar_totais(cursor, 'receitas', usuario_id, data_inicio, data_fim, tipo_perfil, agrupar='categoria')
+        resultado = [{'categoria': categoria, 'total': total} for categoria, total in linhas]
         
         conn.close()
         return resultado
     
     def total_por_dia(self, usuario_id, data_inicio=None, data_fim=None, tipo_perfil=None):
         """Retorna o total de receitas agrupadas por dia"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -1954,33 +1597,24 @@ class Receita:
     
     def total_periodo(self, usuario_id, data_inicio=None, data_fim=None, tipo_perfil=None):
         """Retorna o total de receitas no período"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
-        query = """
-        SELECT SUM(valor) as total
-        FROM receitas
-        WHERE usuario_id = ?
-        """
-        params = [usuario_id]
-        
-        if data_inicio:
-            query += " AND data >= ?"
-            params.append(data_inicio)
+        linhas = consultar_totais(cursor, 'receitas', usuario_id, data_inicio, data_fim, tipo_perfil)
         
-        if data_fim:
-            query += " AND data <= ?"
-            params.append(data_fim)
-            
-        if tipo_perfil:
-            query += " AND (tipo_perfil = ? OR tipo_perfil IS NULL)"
-            params.append(tipo_perfil)
+        conn.close()
+        return linhas[0][1] if linhas and linhas[0][1] else 0
+    
+    def total_por_mes(self, usuario_id, data_inicio=None, data_fim=None, tipo_perfil=None):
+        """Retorna o total de receitas agrupadas por mês (AAAA-MM)"""
+        conn = conectar(self.db_path)
+        cursor = conn.cursor()
         
-        cursor.execute(query, params)
-        resultado = cursor.fetchone()
+        linhas = consultar_totais(cursor, 'receitas', usuario_id, data_inicio, data_fim, tipo_perfil, agrupar='mes')
+        resultado = [{'mes': mes, 'total': total} for mes, total in linhas]
         
         conn.close()
-        return resultado[0] if resultado and resultado[0] else 0
+        return resultado
 
     class Cupom:
         """Classe para gerenciar cupons de desconto"""
@@ -2002,7 +1636,7 @@ class Receita:
             Returns:
                 int: ID do cupom criado ou None se falhar
             """
-            conn = sqlite3.connect(self.db_path)
+            conn = conectar(self.db_path)
             cursor = conn.cursor()
             
             data_criacao = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -2037,7 +1671,7 @@ class Receita:
             Returns:
                 dict: Dados do cupom se válido, None caso contrário
             """
-            conn = sqlite3.connect(self.db_path)
+            conn = conectar(self.db_path)
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
@@ -2078,7 +1712,7 @@ class Receita:
             Returns:
                 bool: True se aplicado com sucesso, False caso contrário
             """
-            conn = sqlite3.connect(self.db_path)
+            conn = conectar(self.db_path)
             cursor = conn.cursor()
             
             # Verifica se o usuário já usou este cupom
@@ -2154,7 +1788,7 @@ class Receita:
             Returns:
                 list: Lista de cupons ativos
             """
-            conn = sqlite3.connect(self.db_path)
+            conn = conectar(self.db_path)
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
@@ -2186,7 +1820,7 @@ class Receita:
             Returns:
                 bool: True se desativado com sucesso
             """
-            conn = sqlite3.connect(self.db_path)
+            conn = conectar(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute(
@@ -2199,155 +1833,6 @@ class Receita:
             
             return True
     
-class TextProcessor:
-    """Classe para processamento de texto e extração de informações de despesas"""
-    def __init__(self):
-        # Categorias e palavras-chave
-        self.categorias = {
-            "alimentação": ["comida", "almoço", "jantar", "lanche", "restaurante", "mercado", "supermercado"],
-            "transporte": ["uber", "99", "táxi", "taxi", "ônibus", "onibus", "metrô", "metro", "combustível", "combustivel", "gasolina"],
-            "moradia": ["aluguel", "condomínio", "condominio", "luz", "água", "agua", "gás", "gas", "internet"],
-            "lazer": ["cinema", "teatro", "show", "netflix", "spotify", "streaming", "viagem"],
-            "saúde": ["remédio", "remedio", "consulta", "médico", "medico", "hospital", "farmácia", "farmacia"],
-            "educação": ["curso", "livro", "escola", "faculdade", "mensalidade"],
-            "vestuário": ["roupa", "calçado", "calcado", "sapato", "tênis", "tenis"]
-        }
-    
-    def extrair_informacoes_despesa(self, texto):
-        """Extrai informações de despesa a partir de um texto"""
-        from datetime import datetime, timedelta
-        
-        # Inicializa os dados da despesa
-        dados_despesa = {
-            "valor": None,
-            "categoria": None,
-            "descricao": texto,
-            "data": datetime.now().strftime("%Y-%m-%d"),
-            "forma_pagamento": None
-        }
-        
-        # Converte para minúsculas
-        texto_lower = texto.lower()
-        
-        # Extrai o valor monetário
-        padroes_valor = [
-            r'r\$\s*(\d+[.,]?\d*)',                    # R$ 50 ou R$50 ou R$ 50,90
-            r'(\d+[.,]?\d*)\s*(?:reais|real)',         # 50 reais ou 50,90 reais
-            r'(\d+[.,]?\d*)\s*(?:rs|r\$)',             # 50 rs ou 50,90 r$
-            r'(?:valor|custo|preço|preco|paguei|gastei)\s*(?:de|:)?\s*(?:r\$)?\s*(\d+[.,]?\d*)', # valor de 50, paguei 50
-            r'(\d+[.,]?\d*)',                          # Só um número (50 ou 50,90)
-        ]
-        
-        for padrao in padroes_valor:
-            matches = re.findall(padrao, texto_lower)
-            if matches:
-                try:
-                    valor_str = matches[0].replace(',', '.')
-                    dados_despesa["valor"] = float(valor_str)
-                    break
-                except (ValueError, IndexError):
-                    continue
-        
-        # Se não encontrou valor, retorna None
-        if dados_despesa["valor"] is None:
-            return None
-        
-        # Extrai categoria baseada em palavras-chave
-        for categoria, palavras_chave in self.categorias.items():
-            for palavra in palavras_chave:
-                if palavra in texto_lower:
-                    dados_despesa["categoria"] = categoria
-                    break
-            if dados_despesa["categoria"]:
-                break
-        
-        # Se não encontrou categoria, usa "outros"
-        if not dados_despesa["categoria"]:
-            dados_despesa["categoria"] = "outros"
-        
-        # Extrai data
-        padroes_data = [
-            r'(\d{1,2})[/-](\d{1,2})(?:[/-](\d{2,4}))?',  # 10/05 ou 10/05/2023
-            r'(?:hoje|ontem|amanhã|amanha)'              # hoje, ontem, amanhã
-        ]
-        
-        for padrao in padroes_data:
-            matches = re.findall(padrao, texto_lower)
-            if matches:
-                if isinstance(matches[0], tuple) and len(matches[0]) >= 2:
-                    try:
-                        dia, mes, ano = matches[0]
-                        if not ano:
-                            ano = datetime.now().year
-                        elif len(ano) == 2:
-                            ano = f"20{ano}"
-                        
-                        data_obj = datetime(int(ano), int(mes), int(dia))
-                        dados_despesa["data"] = data_obj.strftime("%Y-%m-%d")
-                        break
-                    except (ValueError, IndexError):
-                        continue
-                elif isinstance(matches[0], str) or (isinstance(matches[0], tuple) and len(matches[0]) == 1):
-                    data_palavra = matches[0] if isinstance(matches[0], str) else matches[0][0]
-                    if data_palavra in ['hoje', 'today']:
-                        dados_despesa["data"] = datetime.now().strftime("%Y-%m-%d")
-                    elif data_palavra in ['ontem', 'yesterday']:
-                        ontem = datetime.now() - timedelta(days=1)
-                        dados_despesa["data"] = ontem.strftime("%Y-%m-%d")
-                    elif data_palavra in ['amanhã', 'amanha', 'tomorrow']:
-                        amanha = datetime.now() + timedelta(days=1)
-                        dados_despesa["data"] = amanha.strftime("%Y-%m-%d")
-                    break
-        
-        # Se "hoje" estiver no texto, define a data como hoje
-        if "hoje" in texto_lower:
-            dados_despesa["data"] = datetime.now().strftime("%Y-%m-%d")
-        
-        # Extrai forma de pagamento
-        padroes_pagamento = [
-            r'(?:pag(?:amento|uei|ar|o)|comprei)(?:\s+(?:com|no|usando|via|por|pelo))?\s+(cartão|cartao|crédito|credito|débito|debito|dinheiro|pix|boleto)',
-            r'(?:no|com|usando|via|por|pelo)\s+(cartão|cartao|crédito|credito|débito|debito|dinheiro|pix|boleto)'
-        ]
-        
-        for padrao in padroes_pagamento:
-            matches = re.findall(padrao, texto_lower)
-            if matches:
-                forma = matches[0].lower()
-                if forma in ['cartão', 'cartao']:
-                    dados_despesa["forma_pagamento"] = "Cartão"
-                elif forma in ['crédito', 'credito']:
-                    dados_despesa["forma_pagamento"] = "Crédito"
-                elif forma in ['débito', 'debito']:
-                    dados_despesa["forma_pagamento"] = "Débito"
-                elif forma == 'dinheiro':
-                    dados_despesa["forma_pagamento"] = "Dinheiro"
-                elif forma == 'pix':
-                    dados_despesa["forma_pagamento"] = "PIX"
-                elif forma == 'boleto':
-                    dados_despesa["forma_pagamento"] = "Boleto"
-                break
-        
-        return dados_despesa
-    
-    def get_categoria_emoji(self, categoria):
-        """Retorna um emoji para cada categoria"""
-        emojis = {
-            "alimentação": "🍽️",
-            "transporte": "🚗",
-            "moradia": "🏠",
-            "saúde": "⚕️",
-            "educação": "📚",
-            "lazer": "🎭",
-            "vestuário": "👕",
-            "salario": "💰",
-            "freelance": "💼",
-            "investimento": "📈",
-            "presente": "🎁",
-            "outros": "📦"
-        }
-        
-        return emojis.get(categoria, "📦")
-    
     # Métodos a serem adicionados à classe Usuario no arquivo models.py
 
 def mudar_plano(self, usuario_id, plano, periodo='mensal', valor=0.0, forma_pagamento=None):
@@ -2364,7 +1849,7 @@ def mudar_plano(self, usuario_id, plano, periodo='mensal', valor=0.0, forma_paga
     Returns:
         int: ID da assinatura criada ou None se for plano gratuito
     """
-    conn = sqlite3.connect(self.db_path)
+    conn = conectar(self.db_path)
     cursor = conn.cursor()
     
     # Atualiza o plano do usuário
@@ -2426,7 +1911,7 @@ def cancelar_assinatura(self, usuario_id):
     Returns:
         bool: True se o cancelamento foi bem-sucedido, False caso contrário
     """
-    conn = sqlite3.connect(self.db_path)
+    conn = conectar(self.db_path)
     cursor = conn.cursor()
     
     # Verifica se existe uma assinatura ativa
@@ -2464,7 +1949,7 @@ def obter_assinatura_ativa(self, usuario_id):
     Returns:
         dict: Dados da assinatura ativa ou None se não houver
     """
-    conn = sqlite3.connect(self.db_path)
+    conn = conectar(self.db_path)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
@@ -2478,303 +1963,438 @@ def obter_assinatura_ativa(self, usuario_id):
     
     return dict(assinatura) if assinatura else None
 
+# Padrões do TextProcessor, compilados uma vez na importação
+PADROES_VALOR = [re.compile(padrao) for padrao in (
+    # Formatos comuns de preços e valores
+    r'r\$\s*(\d+[.,]?\d*)',                    # R$ 50 ou R$50 ou R$ 50,90
+    r'(\d+[.,]?\d*)\s*(?:reais|real)',         # 50 reais ou 50,90 reais
+    r'(\d+[.,]?\d*)\s*(?:rs|r\$)',             # 50 rs ou 50,90 r$
+    
+    # Palavras-chave que indicam valores
+    r'(?:valor|custo|preço|preco|paguei|gastei|comprei por)\s*(?:de|:)?\s*(?:r\$)?\s*(\d+[.,]?\d*)', 
+    
+    # Valores com vírgulas ou pontos em formatos específicos
+    r'valor:?\s*(\d+[.,]\d{2})',               # valor: 50,90 ou valor 50.90
+    r'total:?\s*(\d+[.,]\d{2})',               # total: 50,90 ou total 50.90
+    
+    # Extração de valor do texto de recibos e notas fiscais
+    r'(?:total|valor total|vlr total|a pagar):?\s*(?:r\$)?\s*(\d+[.,]\d{2})',
+    
+    # Último recurso: qualquer número isolado que pareça um valor monetário
+    r'(?:^|\s)(\d+[.,]\d{2})(?:\s|$)',         # 50,90 ou 50.90 isolado
+    r'(?:^|\s)(\d+)(?:\s|$)'                   # Só um número isolado (50)
+)]
+
+PADROES_DATA = [re.compile(padrao) for padrao in (
+    # Formatos de datas
+    r'(\d{1,2})[/-](\d{1,2})(?:[/-](\d{2,4}))?',  # 10/05 ou 10/05/2023 ou 10-05-2023
+    r'(\d{1,2})\s+(?:de\s+)?(\w+)(?:\s+(?:de\s+)?(\d{2,4}))?', # 10 de maio ou 10 maio de 2023
+    
+    # Palavras-chave temporais
+    r'(?:hoje|ontem|amanhã|amanha)',
+    
+    # Datas em contexto
+    r'(?:dia|data|em)\s+(\d{1,2})[/-](\d{1,2})',  # dia 10/05 ou data 10-05
+    r'(?:dia|data|em)\s+(\d{1,2})\s+(?:de\s+)?(\w+)' # dia 10 de maio
+)]
+
+PADROES_PAGAMENTO = [re.compile(padrao) for padrao in (
+    # Formas de pagamento explícitas
+    r'(?:pag(?:amento|uei|ar|o)|comprei)(?:\s+(?:com|no|usando|via|por|pelo))?\s+(cartão|cartao|crédito|credito|débito|debito|dinheiro|pix|boleto)',
+    r'(?:no|com|usando|via|por|pelo)\s+(cartão|cartao|crédito|credito|débito|debito|dinheiro|pix|boleto)',
+    
+    # Palavras-chave específicas
+    r'(?:visa|master(?:card)?|elo|american express|amex|nubank|banco)\b',
+    
+    # Formatos comuns em recibos
+    r'forma(?:\s+de)?\s+pagamento:?\s+([\w\s]+)',
+    r'(?:pago|pagamento):?\s+([\w\s]+)'
+)]
+
+PADRAO_CARACTERES_ESPECIAIS = re.compile(r'[^\w\s.,/:;$%]')
+PADRAO_SENTENCAS = re.compile(r'[.!?]\s+')
+# Separadores de itens numa mesma mensagem: "almoço 35, uber 22 e mercado 140,50"
+# (a vírgula só separa quando seguida de espaço, para não quebrar "140,50")
+PADRAO_ITENS = re.compile(r'(\s*(?:\n|;|,\s+|\s+\+\s+|\s+e\s+)\s*)', re.IGNORECASE)
+# Valor explícito num item: moeda ("r$ 20", "20 reais") ou decimal ("45,90")
+PADRAO_VALOR_EXPLICITO = re.compile(r'r\$\s*\d|\d\s*(?:reais|real|rs)\b|\d[.,]\d')
+# Número inteiro isolado (não "3x", "10/05" nem parte de decimal) e a palavra logo depois dele
+PADRAO_NUMERO_ITEM = re.compile(r'(?<![\w/])(?<!\d[.,])\d+(?![\w/]|[.,]\d)\s*([^\W\d_]+)?')
+# Palavras que podem vir depois de um valor; qualquer outra indica quantidade ("3 camisas")
+PALAVRAS_APOS_VALOR = frozenset([
+    "no", "na", "nos", "nas", "num", "numa", "de", "do", "da", "dos", "das", "em", "com", "pelo", "pela",
+    "por", "para", "pra", "via", "a", "o", "à", "ao", "mil", "conto", "contos", "pila", "hoje", "ontem",
+    "amanhã", "amanha", "cartão", "cartao", "crédito", "credito", "débito", "debito", "dinheiro", "pix",
+    "boleto"
+])
+
+MESES = {
+    'janeiro': 1, 'jan': 1, 'fevereiro': 2, 'fev': 2, 'março': 3, 'mar': 3,
+    'abril': 4, 'abr': 4, 'maio': 5, 'mai': 5, 'junho': 6, 'jun': 6,
+    'julho': 7, 'jul': 7, 'agosto': 8, 'ago': 8, 'setembro': 9, 'set': 9,
+    'outubro': 10, 'out': 10, 'novembro': 11, 'nov': 11, 'dezembro': 12, 'dez': 12
+}
+
+PALAVRAS_SALARIO = frozenset(["salario", "salário", "pagamento", "remuneração", "remuneracao", "provento", "contracheque"])
+# Com a busca por palavra inteira, singular e plural entram separados ("filme" não casa "filmes")
+PALAVRAS_CONTEXTO_STREAMING = frozenset(["filme", "filmes", "série", "serie", "séries", "series", "assistir",
+                                         "video", "vídeo", "videos", "vídeos", "stream"])
+# Palavras usadas na classificação de assinaturas/mensalidades sem categoria
+PALAVRAS_ASSINATURA = ["assinatura", "mensalidade", "anuidade", "academia", "gym", "escola", "faculdade",
+                       "curso", "internet", "celular", "telefone"]
+
+# Tabelas do TextProcessor: imutáveis e montadas uma vez na importação,
+# compartilhadas por todas as instâncias e threads
+CATEGORIAS_PALAVRAS = MappingProxyType({
+    "alimentação": ("comida", "almoço", "jantar", "lanche", "restaurante", "mercado", 
+                   "supermercado", "ifood", "refeição", "café", "padaria", "café da manhã", 
+                   "cafeteria", "pizzaria", "bar", "lanchonete", "delivery", "fastfood", 
+                   "hamburguer", "hamburger", "sushi", "churrasco", "sorvete", "sorveteria", 
+                   "açaí", "acai", "feira", "pão", "padaria", "doce"),
+    
+    "transporte": ("uber", "99", "táxi", "taxi", "ônibus", "onibus", "metrô", "metro", 
+                  "combustível", "combustivel", "gasolina", "alcool", "etanol", "diesel",
+                  "passagem", "estacionamento", "pedágio", "pedágio", "transporte", 
+                  "mobilidade", "carro", "moto", "bicicleta", "bike", "scooter", "patinete", 
+                  "avião", "aéreo", "aereo", "voo", "gol", "latam", "azul", "tam", "viagem"),
+    
+    "moradia": ("aluguel", "condomínio", "condominio", "luz", "água", "agua", "gás", "gas", 
+               "internet", "iptu", "wifi", "apartamento", "casa", "energia", "conta de luz", 
+               "conta de água", "conta de gás", "seguro residencial", "reforma", "mobília", 
+               "móveis", "decoração", "decoracao", "manutenção", "manutencao", "conserto",
+               "encanador", "eletricista", "pintor", "pedreiro", "jardim", "jardineiro"),
+    
+    "lazer": ("cinema", "teatro", "show", "netflix", "spotify", "disney", "disney+", "hbo", 
+             "prime", "streaming", "viagem", "passeio", "bar", "balada", "festa", "ingresso", 
+             "museu", "parque", "clube", "academia", "esporte", "jogo", "livro", "revista", 
+             "música", "música", "hobby", "presente"),
+    
+    "saúde": ("remédio", "remedio", "consulta", "médico", "medico", "hospital", "farmácia", 
+             "farmacia", "exame", "plano de saúde", "dentista", "psicólogo", "terapia", 
+             "academia", "ginástica", "massagem", "fisioterapia", "nutricionista", "vitamina", 
+             "suplemento", "vacina", "seguro saúde", "clínica", "clinica", "laboratório", 
+             "oftalmologista", "pediatra", "dermatologista", "ortopedista", "cardiologista", 
+             "neurológista", "spa", "estética"),
+    
+    "educação": ("curso", "livro", "escola", "faculdade", "mensalidade", "material escolar", 
+                "universidade", "apostila", "matrícula", "pós-graduação", "mestrado", "doutorado", 
+                "ensino", "aula", "professor", "particular", "idioma", "inglês", "espanhol", 
+                "francês", "alemão", "licença", "certificação", "certificado", "diploma", 
+                "graduação", "especialização", "workshop", "seminário", "congresso", "palestra", 
+                "biblioteca", "assinatura", "revista", "jornal"),
+    
+    "vestuário": ("roupa", "calçado", "calcado", "sapato", "tênis", "tenis", "camisa", "calça", 
+                 "vestido", "bermuda", "meia", "cueca", "sutiã", "jaqueta", "casaco", "blusa", 
+                 "camiseta", "short", "saia", "pijama", "terno", "gravata", "moda", "acessório", 
+                 "bolsa", "mochila", "carteira", "relógio", "óculos", "brinco", "colar", "anel", 
+                 "pulseira", "chapéu", "boné", "loja"),
+    
+    "outros": ("diversos", "geral", "variados", "miscelânea", "outros")
+})
+
+# Serviços de streaming
+SERVICOS_STREAMING = (
+    "netflix", "spotify", "youtube premium", "youtube music", 
+    "disney", "disney+", "amazon prime", "prime video", 
+    "hbo", "hbo max", "deezer", "tidal", "apple music", 
+    "apple tv", "paramount+", "globoplay", "crunchyroll", 
+    "mubi", "telecine", "star+", "discovery+", "max", 
+    "play", "watch", "hulu", "starz", "showtime"
+)
+
+# Estabelecimentos comuns e suas categorias
+ESTABELECIMENTOS = MappingProxyType({
+    # Alimentação
+    "mcdonalds": "alimentação", "burger king": "alimentação", "subway": "alimentação",
+    "habib's": "alimentação", "pizza hut": "alimentação", "domino's": "alimentação",
+    "outback": "alimentação", "madero": "alimentação", "china in box": "alimentação",
+    "starbucks": "alimentação", "café": "alimentação", "cafeteria": "alimentação",
+    "restaurante": "alimentação", "lanchonete": "alimentação", "padaria": "alimentação",
+    "sorveteria": "alimentação", "pizzaria": "alimentação", "açougue": "alimentação",
+    "mercado": "alimentação", "supermercado": "alimentação", "hortifruti": "alimentação",
+    "confeitaria": "alimentação", "doceria": "alimentação", "pastelaria": "alimentação",
+    "bar": "alimentação", "pub": "alimentação", "choperia": "alimentação", 
+    "carrefour": "alimentação", "extra": "alimentação", "pão de açúcar": "alimentação",
+    "assai": "alimentação", "atacadão": "alimentação", "dia": "alimentação",
+    "sadia": "alimentação", "perdigão": "alimentação", "seara": "alimentação",
+    "outback": "alimentação", "kfc": "alimentação", "giraffas": "alimentação",
+    "ifood": "alimentação", "rappi": "alimentação", "james delivery": "alimentação",
+    "uber eats": "alimentação", "99 food": "alimentação", "spoofEats": "alimentação",
+    
+    # Transporte
+    "uber": "transporte", "99": "transporte", "cabify": "transporte",
+    "posto": "transporte", "combustível": "transporte", "ipva": "transporte",
+    "estacionamento": "transporte", "metrô": "transporte", "metro": "transporte",
+    "ônibus": "transporte", "onibus": "transporte", "trem": "transporte",
+    "brt": "transporte", "linha amarela": "transporte", "pedágio": "transporte",
+    "oficina": "transporte", "concessionária": "transporte", "locadora": "transporte",
+    "seguro auto": "transporte", "licenciamento": "transporte", "detran": "transporte",
+    "passagem": "transporte", "aérea": "transporte", "voo": "transporte",
+    "gol": "transporte", "latam": "transporte", "azul": "transporte",
+    "shell": "transporte", "ipiranga": "transporte", "petrobras": "transporte",
+    
+    # Moradia
+    "aluguel": "moradia", "condomínio": "moradia", "iptu": "moradia",
+    "agua": "moradia", "luz": "moradia", "energia": "moradia", 
+    "gás": "moradia", "internet": "moradia", "telefone": "moradia",
+    "tv": "moradia", "móveis": "moradia", "eletrodoméstico": "moradia",
+    "reforma": "moradia", "decoração": "moradia", "manutenção": "moradia",
+    "seguro residencial": "moradia", "material de construção": "moradia",
+    "leroy merlin": "moradia", "c&c": "moradia", "telhanorte": "moradia",
+    "casas bahia": "moradia", "magazine luiza": "moradia", "ponto frio": "moradia",
+    "tok&stok": "moradia", "etna": "moradia", "madeira madeira": "moradia",
+    
+    # Lazer
+    "cinema": "lazer", "teatro": "lazer", "show": "lazer", "festival": "lazer",
+    "ingresso": "lazer", "ingressos.com": "lazer", "ticketmaster": "lazer",
+    "sympla": "lazer", "eventim": "lazer", "clube": "lazer", "festa": "lazer",
+    "boate": "lazer", "balada": "lazer", "parque": "lazer", "museu": "lazer",
+    "exposição": "lazer", "hotel": "lazer", "airbnb": "lazer", "booking": "lazer",
+    "decolar": "lazer", "hospedagem": "lazer", "viagem": "lazer", "netflix": "lazer",
+    "spotify": "lazer", "youtube": "lazer", "amazon prime": "lazer", "disney": "lazer",
+    "globoplay": "lazer", "hbo": "lazer", "apple tv": "lazer", "jogo": "lazer",
+    "steam": "lazer", "playstation": "lazer", "xbox": "lazer", "nintendo": "lazer",
+    "livro": "lazer", "livraria": "lazer", "saraiva": "lazer", "cultura": "lazer",
+    
+    # Saúde
+    "farmácia": "saúde", "drogaria": "saúde", "remédio": "saúde",
+    "consulta": "saúde", "médico": "saúde", "hospital": "saúde",
+    "laboratório": "saúde", "exame": "saúde", "clínica": "saúde",
+    "dentista": "saúde", "psicólogo": "saúde", "fisioterapia": "saúde",
+    "nutricionista": "saúde", "academia": "saúde", "suplemento": "saúde",
+    "plano de saúde": "saúde", "convênio": "saúde", "seguro saúde": "saúde",
+    "drogasil": "saúde", "pacheco": "saúde", "raia": "saúde", "ultrafarma": "saúde",
+    "panvel": "saúde", "pague menos": "saúde", "amil": "saúde", "unimed": "saúde",
+    "sulamerica": "saúde", "bradesco saúde": "saúde",
+    
+    # Educação
+    "escola": "educação", "faculdade": "educação", "universidade": "educação",
+    "curso": "educação", "aula": "educação", "professor": "educação",
+    "material escolar": "educação", "livro didático": "educação", "apostila": "educação",
+    "matrícula": "educação", "mensalidade": "educação", "uniforme": "educação",
+    "estácio": "educação", "anhanguera": "educação", "laureate": "educação",
+    "unip": "educação", "uninove": "educação", "fgv": "educação", "insper": "educação",
+    "descomplica": "educação", "stoodi": "educação", "kultivi": "educação", 
+    "coursera": "educação", "udemy": "educação", "alura": "educação",
+    "inglês": "educação", "wizard": "educação", "fisk": "educação", "ccaa": "educação",
+    
+    # Vestuário
+    "roupa": "vestuário", "calçado": "vestuário", "sapato": "vestuário",
+    "tênis": "vestuário", "acessório": "vestuário", "bolsa": "vestuário",
+    "mochila": "vestuário", "óculos": "vestuário", "relógio": "vestuário",
+    "joia": "vestuário", "bijuteria": "vestuário", "malhar": "vestuário",
+    "c&a": "vestuário", "renner": "vestuário", "riachuelo": "vestuário",
+    "marisa": "vestuário", "zara": "vestuário", "hering": "vestuário",
+    "forever 21": "vestuário", "youcom": "vestuário", "calvin klein": "vestuário",
+    "nike": "vestuário", "adidas": "vestuário", "puma": "vestuário",
+    "centauro": "vestuário", "decathlon": "vestuário", "netshoes": "vestuário",
+    "dafiti": "vestuário", "chilli beans": "vestuário", "arezzo": "vestuário",
+    "melissa": "vestuário", "havaianas": "vestuário"
+})
+
+EMOJIS_CATEGORIA = MappingProxyType({
+    "alimentação": "🍽️",
+    "transporte": "🚗",
+    "moradia": "🏠",
+    "saúde": "⚕️",
+    "educação": "📚",
+    "lazer": "🎭",
+    "vestuário": "👕",
+    "salario": "💰",
+    "freelance": "💼",
+    "investimento": "📈",
+    "presente": "🎁",
+    "vendas": "🛒",
+    "serviços": "🔧",
+    "assinaturas": "📅",
+    "royalties": "📊",
+    "fornecedores": "🏭",
+    "salários": "👥",
+    "impostos": "📑",
+    "aluguel": "🏢",
+    "equipamentos": "⚙️",
+    "marketing": "📢",
+    "outros": "📦",
+    "outros_empresarial": "📦"
+})
+
+def _montar_busca():
+    """Monta o casador com todas as palavras-chave e as tabelas de prioridade"""
+    # Prioridade = posição na tabela (a primeira ocorrência vence, como nos laços antigos)
+    prioridade_estabelecimento = {}
+    for posicao, estabelecimento in enumerate(ESTABELECIMENTOS):
+        prioridade_estabelecimento.setdefault(estabelecimento, posicao)
+    
+    ordem_categorias = tuple(CATEGORIAS_PALAVRAS)
+    categoria_da_palavra = {}
+    for posicao, palavras_chave in enumerate(CATEGORIAS_PALAVRAS.values()):
+        for palavra in palavras_chave:
+            categoria_da_palavra.setdefault(palavra, posicao)
+    
+    casador = CasadorPalavras(
+        list(ESTABELECIMENTOS) + list(categoria_da_palavra) + list(SERVICOS_STREAMING) +
+        list(PALAVRAS_SALARIO) + list(PALAVRAS_CONTEXTO_STREAMING) + PALAVRAS_ASSINATURA
+    )
+    
+    # Os índices ficam como dict (só leitura por convenção): a consulta direta
+    # é bem mais rápida que via MappingProxyType nos min(..., key=...)
+    return (
+        casador,
+        frozenset(prioridade_estabelecimento), prioridade_estabelecimento,
+        frozenset(categoria_da_palavra), categoria_da_palavra, ordem_categorias,
+        frozenset(SERVICOS_STREAMING)
+    )
+
+# Categorização pelas formas de palavras-chave achadas (poucas combinações se repetem)
+_categorizacoes = {}
+LIMITE_CATEGORIZACOES = 10000
+
 class TextProcessor:
-    """Classe para processamento de texto e extração de informações de despesas"""
-    def __init__(self):
-        # Categorias e palavras-chave
-        self.categorias = {
-            "alimentação": ["comida", "almoço", "jantar", "lanche", "restaurante", "mercado", 
-                           "supermercado", "ifood", "refeição", "café", "padaria", "café da manhã", 
-                           "cafeteria", "pizzaria", "bar", "lanchonete", "delivery", "fastfood", 
-                           "hamburguer", "hamburger", "sushi", "churrasco", "sorvete", "sorveteria", 
-                           "açaí", "acai", "feira", "pão", "padaria", "doce"],
-            
-            "transporte": ["uber", "99", "táxi", "taxi", "ônibus", "onibus", "metrô", "metro", 
-                          "combustível", "combustivel", "gasolina", "alcool", "etanol", "diesel",
-                          "passagem", "estacionamento", "pedágio", "pedágio", "transporte", 
-                          "mobilidade", "carro", "moto", "bicicleta", "bike", "scooter", "patinete", 
-                          "avião", "aéreo", "aereo", "voo", "gol", "latam", "azul", "tam", "viagem"],
-            
-            "moradia": ["aluguel", "condomínio", "condominio", "luz", "água", "agua", "gás", "gas", 
-                       "internet", "iptu", "wifi", "apartamento", "casa", "energia", "conta de luz", 
-                       "conta de água", "conta de gás", "seguro residencial", "reforma", "mobília", 
-                       "móveis", "decoração", "decoracao", "manutenção", "manutencao", "conserto",
-                       "encanador", "eletricista", "pintor", "pedreiro", "jardim", "jardineiro"],
-            
-            "lazer": ["cinema", "teatro", "show", "netflix", "spotify", "disney", "disney+", "hbo", 
-                     "prime", "streaming", "viagem", "passeio", "bar", "balada", "festa", "ingresso", 
-                     "museu", "parque", "clube", "academia", "esporte", "jogo", "livro", "revista", 
-                     "música", "música", "hobby", "presente"],
-            
-            "saúde": ["remédio", "remedio", "consulta", "médico", "medico", "hospital", "farmácia", 
-                     "farmacia", "exame", "plano de saúde", "dentista", "psicólogo", "terapia", 
-                     "academia", "ginástica", "massagem", "fisioterapia", "nutricionista", "vitamina", 
-                     "suplemento", "vacina", "seguro saúde", "clínica", "clinica", "laboratório", 
-                     "oftalmologista", "pediatra", "dermatologista", "ortopedista", "cardiologista", 
-                     "neurológista", "spa", "estética"],
-            
-            "educação": ["curso", "livro", "escola", "faculdade", "mensalidade", "material escolar", 
-                        "universidade", "apostila", "matrícula", "pós-graduação", "mestrado", "doutorado", 
-                        "ensino", "aula", "professor", "particular", "idioma", "inglês", "espanhol", 
-                        "francês", "alemão", "licença", "certificação", "certificado", "diploma", 
-                        "graduação", "especialização", "workshop", "seminário", "congresso", "palestra", 
-                        "biblioteca", "assinatura", "revista", "jornal"],
-            
-            "vestuário": ["roupa", "calçado", "calcado", "sapato", "tênis", "tenis", "camisa", "calça", 
-                         "vestido", "bermuda", "meia", "cueca", "sutiã", "jaqueta", "casaco", "blusa", 
-                         "camiseta", "short", "saia", "pijama", "terno", "gravata", "moda", "acessório", 
-                         "bolsa", "mochila", "carteira", "relógio", "óculos", "brinco", "colar", "anel", 
-                         "pulseira", "chapéu", "boné", "loja"],
-            
-            "outros": ["diversos", "geral", "variados", "miscelânea", "outros"]
-        }
+    """Classe para processamento de texto e extração de informações de despesas.
+    
+    Não guarda estado por instância: as tabelas são as constantes do módulo e
+    o casador é montado na importação. Use a instância compartilhada
+    ``processador_texto`` em vez de criar uma por mensagem.
+    """
+    __slots__ = ()
+    
+    categorias = CATEGORIAS_PALAVRAS
+    servicos_streaming = SERVICOS_STREAMING
+    estabelecimentos = ESTABELECIMENTOS
+    
+    # Casador de palavras-chave e índices de prioridade
+    _busca = _montar_busca()
+    _formas = _busca[0].formas
+    
+    def _eh_streaming(self, achadas, servicos):
+        if not achadas.isdisjoint(servicos):
+            return True
+        # Verifica padrões comuns de serviços de streaming
+        return "assinatura" in achadas and not achadas.isdisjoint(PALAVRAS_CONTEXTO_STREAMING)
+    
+    def _primeiro_estabelecimento(self, achadas):
+        """Primeiro estabelecimento (na ordem da tabela) presente no texto"""
+        _, estabelecimentos, prioridade_estabelecimento = self._busca[:3]
+        encontrados = achadas & estabelecimentos
+        if not encontrados:
+            return None
+        return min(encontrados, key=prioridade_estabelecimento.__getitem__)
+    
+    def categorizar(self, texto):
+        """Categoria de um lançamento pela descrição (None se for um salário)"""
+        categorizacao = self._categorizar(texto.lower())
+        return categorizacao[0] if categorizacao else None
+    
+    def _categorizar(self, texto_lower):
+        """Retorna (categoria, estabelecimento) do texto, ou None se for um salário"""
+        # Formas de palavras-chave presentes no texto, em uma passada
+        formas = tuple(self._formas(texto_lower))
         
-        # Lista de serviços de streaming
-        self.servicos_streaming = [
-            "netflix", "spotify", "youtube premium", "youtube music", 
-            "disney", "disney+", "amazon prime", "prime video", 
-            "hbo", "hbo max", "deezer", "tidal", "apple music", 
-            "apple tv", "paramount+", "globoplay", "crunchyroll", 
-            "mubi", "telecine", "star+", "discovery+", "max", 
-            "play", "watch", "hulu", "starz", "showtime"
-        ]
+        # O resultado só depende das formas achadas: memorizado por elas
+        try:
+            return _categorizacoes[formas]
+        except KeyError:
+            pass
+        resultado = self._categorizar_palavras(self._busca[0].expandir(formas))
+        if len(_categorizacoes) >= LIMITE_CATEGORIZACOES:
+            _categorizacoes.clear()
+        _categorizacoes[formas] = resultado
+        return resultado
+    
+    def _categorizar_palavras(self, achadas):
+        (_, estabelecimentos, prioridade_estabelecimento,
+         palavras_categoria, categoria_da_palavra, ordem_categorias, servicos) = self._busca
         
-        # Lista de estabelecimentos comuns e suas categorias
-        self.estabelecimentos = {
-            # Alimentação
-            "mcdonalds": "alimentação", "burger king": "alimentação", "subway": "alimentação",
-            "habib's": "alimentação", "pizza hut": "alimentação", "domino's": "alimentação",
-            "outback": "alimentação", "madero": "alimentação", "china in box": "alimentação",
-            "starbucks": "alimentação", "café": "alimentação", "cafeteria": "alimentação",
-            "restaurante": "alimentação", "lanchonete": "alimentação", "padaria": "alimentação",
-            "sorveteria": "alimentação", "pizzaria": "alimentação", "açougue": "alimentação",
-            "mercado": "alimentação", "supermercado": "alimentação", "hortifruti": "alimentação",
-            "confeitaria": "alimentação", "doceria": "alimentação", "pastelaria": "alimentação",
-            "bar": "alimentação", "pub": "alimentação", "choperia": "alimentação", 
-            "carrefour": "alimentação", "extra": "alimentação", "pão de açúcar": "alimentação",
-            "assai": "alimentação", "atacadão": "alimentação", "dia": "alimentação",
-            "sadia": "alimentação", "perdigão": "alimentação", "seara": "alimentação",
-            "outback": "alimentação", "kfc": "alimentação", "giraffas": "alimentação",
-            "ifood": "alimentação", "rappi": "alimentação", "james delivery": "alimentação",
-            "uber eats": "alimentação", "99 food": "alimentação", "spoofEats": "alimentação",
-            
-            # Transporte
-            "uber": "transporte", "99": "transporte", "cabify": "transporte",
-            "posto": "transporte", "combustível": "transporte", "ipva": "transporte",
-            "estacionamento": "transporte", "metrô": "transporte", "metro": "transporte",
-            "ônibus": "transporte", "onibus": "transporte", "trem": "transporte",
-            "brt": "transporte", "linha amarela": "transporte", "pedágio": "transporte",
-            "oficina": "transporte", "concessionária": "transporte", "locadora": "transporte",
-            "seguro auto": "transporte", "licenciamento": "transporte", "detran": "transporte",
-            "passagem": "transporte", "aérea": "transporte", "voo": "transporte",
-            "gol": "transporte", "latam": "transporte", "azul": "transporte",
-            "shell": "transporte", "ipiranga": "transporte", "petrobras": "transporte",
-            
-            # Moradia
-            "aluguel": "moradia", "condomínio": "moradia", "iptu": "moradia",
-            "agua": "moradia", "luz": "moradia", "energia": "moradia", 
-            "gás": "moradia", "internet": "moradia", "telefone": "moradia",
-            "tv": "moradia", "móveis": "moradia", "eletrodoméstico": "moradia",
-            "reforma": "moradia", "decoração": "moradia", "manutenção": "moradia",
-            "seguro residencial": "moradia", "material de construção": "moradia",
-            "leroy merlin": "moradia", "c&c": "moradia", "telhanorte": "moradia",
-            "casas bahia": "moradia", "magazine luiza": "moradia", "ponto frio": "moradia",
-            "tok&stok": "moradia", "etna": "moradia", "madeira madeira": "moradia",
-            
-            # Lazer
-            "cinema": "lazer", "teatro": "lazer", "show": "lazer", "festival": "lazer",
-            "ingresso": "lazer", "ingressos.com": "lazer", "ticketmaster": "lazer",
-            "sympla": "lazer", "eventim": "lazer", "clube": "lazer", "festa": "lazer",
-            "boate": "lazer", "balada": "lazer", "parque": "lazer", "museu": "lazer",
-            "exposição": "lazer", "hotel": "lazer", "airbnb": "lazer", "booking": "lazer",
-            "decolar": "lazer", "hospedagem": "lazer", "viagem": "lazer", "netflix": "lazer",
-            "spotify": "lazer", "youtube": "lazer", "amazon prime": "lazer", "disney": "lazer",
-            "globoplay": "lazer", "hbo": "lazer", "apple tv": "lazer", "jogo": "lazer",
-            "steam": "lazer", "playstation": "lazer", "xbox": "lazer", "nintendo": "lazer",
-            "livro": "lazer", "livraria": "lazer", "saraiva": "lazer", "cultura": "lazer",
-            
-            # Saúde
-            "farmácia": "saúde", "drogaria": "saúde", "remédio": "saúde",
-            "consulta": "saúde", "médico": "saúde", "hospital": "saúde",
-            "laboratório": "saúde", "exame": "saúde", "clínica": "saúde",
-            "dentista": "saúde", "psicólogo": "saúde", "fisioterapia": "saúde",
-            "nutricionista": "saúde", "academia": "saúde", "suplemento": "saúde",
-            "plano de saúde": "saúde", "convênio": "saúde", "seguro saúde": "saúde",
-            "drogasil": "saúde", "pacheco": "saúde", "raia": "saúde", "ultrafarma": "saúde",
-            "panvel": "saúde", "pague menos": "saúde", "amil": "saúde", "unimed": "saúde",
-            "sulamerica": "saúde", "bradesco saúde": "saúde",
-            
-            # Educação
-            "escola": "educação", "faculdade": "educação", "universidade": "educação",
-            "curso": "educação", "aula": "educação", "professor": "educação",
-            "material escolar": "educação", "livro didático": "educação", "apostila": "educação",
-            "matrícula": "educação", "mensalidade": "educação", "uniforme": "educação",
-            "estácio": "educação", "anhanguera": "educação", "laureate": "educação",
-            "unip": "educação", "uninove": "educação", "fgv": "educação", "insper": "educação",
-            "descomplica": "educação", "stoodi": "educação", "kultivi": "educação", 
-            "coursera": "educação", "udemy": "educação", "alura": "educação",
-            "inglês": "educação", "wizard": "educação", "fisk": "educação", "ccaa": "educação",
-            
-            # Vestuário
-            "roupa": "vestuário", "calçado": "vestuário", "sapato": "vestuário",
-            "tênis": "vestuário", "acessório": "vestuário", "bolsa": "vestuário",
-            "mochila": "vestuário", "óculos": "vestuário", "relógio": "vestuário",
-            "joia": "vestuário", "bijuteria": "vestuário", "malhar": "vestuário",
-            "c&a": "vestuário", "renner": "vestuário", "riachuelo": "vestuário",
-            "marisa": "vestuário", "zara": "vestuário", "hering": "vestuário",
-            "forever 21": "vestuário", "youcom": "vestuário", "calvin klein": "vestuário",
-            "nike": "vestuário", "adidas": "vestuário", "puma": "vestuário",
-            "centauro": "vestuário", "decathlon": "vestuário", "netshoes": "vestuário",
-            "dafiti": "vestuário", "chilli beans": "vestuário", "arezzo": "vestuário",
-            "melissa": "vestuário", "havaianas": "vestuário"
-        }
+        # Verifica se é uma descrição de salário
+        if not achadas.isdisjoint(PALAVRAS_SALARIO):
+            return None
+        
+        # Reconhecimento de estabelecimentos conhecidos (prevalece sobre streaming)
+        encontrados = achadas & estabelecimentos
+        if encontrados:
+            estabelecimento = min(encontrados, key=prioridade_estabelecimento.__getitem__)
+            return self.estabelecimentos[estabelecimento], estabelecimento
+        
+        # Verifica se é um serviço de streaming
+        if self._eh_streaming(achadas, servicos):
+            return "lazer", None
+        
+        # Categoria baseada em palavras-chave (a primeira categoria da tabela vence)
+        palavras = achadas & palavras_categoria
+        if palavras:
+            return ordem_categorias[min(map(categoria_da_palavra.__getitem__, palavras))], None
+        
+        # Assinaturas (não streaming) geralmente são recorrentes (mensalidade, anuidade)
+        if "assinatura" in achadas or "mensalidade" in achadas or "anuidade" in achadas:
+            if "academia" in achadas or "gym" in achadas:
+                return "saúde", None
+            if "escola" in achadas or "faculdade" in achadas or "curso" in achadas:
+                return "educação", None
+            if "internet" in achadas or "celular" in achadas or "telefone" in achadas:
+                return "moradia", None
+        
+        # Se não encontrou categoria, usa "outros"
+        return "outros", None
     
     def detectar_servico_streaming(self, texto):
         """Detecta se o texto contém referência a serviços de streaming"""
-        texto_lower = texto.lower()
+        busca = self._busca
+        return self._eh_streaming(busca[0].encontrar(texto.lower()), busca[-1])
+    
+    def extrair_informacoes_despesa(self, texto, agora=None):
+        """Extrai informações de despesa a partir de um texto.
         
-        for servico in self.servicos_streaming:
-            if servico in texto_lower:
-                return True
-                
-        # Verifica padrões comuns de serviços de streaming
-        if "assinatura" in texto_lower and any(palavra in texto_lower for palavra in ["filme", "séries", "series", "assistir", "video", "vídeo", "stream"]):
-            return True
-            
-        return False
+        ``agora`` é a referência para "hoje"/"ontem" e para o ano das datas
+        sem ano (padrão: ``datetime.now()``).
+        """
+        agora = agora or datetime.now()
+        return self._extrair(texto, agora, agora.strftime("%Y-%m-%d"))
     
-    def extrair_informacoes_despesa(self, texto):
-        """Extrai informações de despesa a partir de um texto"""
-        from datetime import datetime, timedelta
-        import re
+    def _extrair(self, texto, agora, hoje):
+        """``extrair_informacoes_despesa`` com a data de ``agora`` já formatada (``hoje``),
+        calculada uma vez por lote no ``parse_many``"""
+        # Converte para minúsculas e remove caracteres especiais
+        texto_lower = texto.lower()
+        texto_processado = PADRAO_CARACTERES_ESPECIAIS.sub(' ', texto_lower)
+        
+        # Categoria e estabelecimento; None indica um salário, não uma despesa
+        categorizacao = self._categorizar(texto_lower)
+        if categorizacao is None:
+            return None
+        categoria, estabelecimento = categorizacao
         
         # Inicializa os dados da despesa
         dados_despesa = {
             "valor": None,
-            "categoria": None,
-            "descricao": texto,
-            "data": datetime.now().strftime("%Y-%m-%d"),
+            "categoria": categoria,
+            "descricao": estabelecimento.capitalize() if estabelecimento else texto,
+            "data": hoje,
             "forma_pagamento": None
         }
         
-        # Converte para minúsculas e remove caracteres especiais
-        texto_lower = texto.lower()
-        texto_processado = re.sub(r'[^\w\s.,/:;$%]', ' ', texto_lower)
-        
-        # Verificações especiais
-        
-        # Verifica se é um serviço de streaming
-        if self.detectar_servico_streaming(texto_lower):
-            dados_despesa["categoria"] = "lazer"
-        
-        # Verifica se é uma descrição de salário
-        if any(palavra in texto_lower for palavra in ["salario", "salário", "pagamento", "remuneração", "remuneracao", "provento", "contracheque"]):
-            # É um salário, não uma despesa
-            return None
-        
-        # Reconhecimento de estabelecimentos conhecidos
-        for estabelecimento, categoria in self.estabelecimentos.items():
-            if estabelecimento in texto_lower:
-                dados_despesa["categoria"] = categoria
-                if dados_despesa["descricao"] == texto:  # Se a descrição ainda não foi personalizada
-                    dados_despesa["descricao"] = estabelecimento.capitalize()
-                break
-        
         # Extrai o valor monetário - algoritmo melhorado
-        padroes_valor = [
-            # Formatos comuns de preços e valores
-            r'r\$\s*(\d+[.,]?\d*)',                    # R$ 50 ou R$50 ou R$ 50,90
-            r'(\d+[.,]?\d*)\s*(?:reais|real)',         # 50 reais ou 50,90 reais
-            r'(\d+[.,]?\d*)\s*(?:rs|r\$)',             # 50 rs ou 50,90 r$
-            
-            # Palavras-chave que indicam valores
-            r'(?:valor|custo|preço|preco|paguei|gastei|comprei por)\s*(?:de|:)?\s*(?:r\$)?\s*(\d+[.,]?\d*)', 
-            
-            # Valores com vírgulas ou pontos em formatos específicos
-            r'valor:?\s*(\d+[.,]\d{2})',               # valor: 50,90 ou valor 50.90
-            r'total:?\s*(\d+[.,]\d{2})',               # total: 50,90 ou total 50.90
-            
-            # Extração de valor do texto de recibos e notas fiscais
-            r'(?:total|valor total|vlr total|a pagar):?\s*(?:r\$)?\s*(\d+[.,]\d{2})',
-            
-            # Último recurso: qualquer número isolado que pareça um valor monetário
-            r'(?:^|\s)(\d+[.,]\d{2})(?:\s|$)',         # 50,90 ou 50.90 isolado
-            r'(?:^|\s)(\d+)(?:\s|$)'                   # Só um número isolado (50)
-        ]
-        
-        for padrao in padroes_valor:
-            matches = re.findall(padrao, texto_processado)
+        for padrao in PADROES_VALOR:
+            matches = padrao.findall(texto_processado)
             if matches:
-                try:
-                    # Pega o maior valor encontrado
-                    melhores_matches = []
-                    for match in matches:
-                        valor_str = match.replace(',', '.')
-                        try:
-                            melhores_matches.append(float(valor_str))
-                        except ValueError:
-                            continue
-                    
-                    if melhores_matches:
-                        dados_despesa["valor"] = max(melhores_matches)
-                        break
-                except (ValueError, IndexError):
-                    continue
+                # Pega o maior valor encontrado
+                melhores_matches = []
+                for match in matches:
+                    try:
+                        melhores_matches.append(float(match.replace(',', '.')))
+                    except ValueError:
+                        continue
+                
+                if melhores_matches:
+                    dados_despesa["valor"] = max(melhores_matches)
+                    break
         
         # Se não encontrou valor, retorna None
         if dados_despesa["valor"] is None:
             return None
         
-        # Se ainda não definiu categoria e não é streaming, extrai categoria baseada em palavras-chave
-        if not dados_despesa["categoria"]:
-            for categoria, palavras_chave in self.categorias.items():
-                for palavra in palavras_chave:
-                    if palavra in texto_lower:
-                        dados_despesa["categoria"] = categoria
-                        break
-                if dados_despesa["categoria"]:
-                    break
-        
-        # Se ainda não encontrou categoria, verifica padrões específicos
-        if not dados_despesa["categoria"]:
-            # Assinaturas (não streaming) geralmente são recorrentes (mensalidade, anuidade)
-            if "assinatura" in texto_lower or "mensalidade" in texto_lower or "anuidade" in texto_lower:
-                if "academia" in texto_lower or "gym" in texto_lower:
-                    dados_despesa["categoria"] = "saúde"
-                elif "escola" in texto_lower or "faculdade" in texto_lower or "curso" in texto_lower:
-                    dados_despesa["categoria"] = "educação"
-                elif "internet" in texto_lower or "celular" in texto_lower or "telefone" in texto_lower:
-                    dados_despesa["categoria"] = "moradia"
-                else:
-                    dados_despesa["categoria"] = "outros"
-        
-        # Se não encontrou categoria, usa "outros"
-        if not dados_despesa["categoria"]:
-            dados_despesa["categoria"] = "outros"
-        
         # Extrai data (melhorado para reconhecer mais formatos)
-        padroes_data = [
-            # Formatos de datas
-            r'(\d{1,2})[/-](\d{1,2})(?:[/-](\d{2,4}))?',  # 10/05 ou 10/05/2023 ou 10-05-2023
-            r'(\d{1,2})\s+(?:de\s+)?(\w+)(?:\s+(?:de\s+)?(\d{2,4}))?', # 10 de maio ou 10 maio de 2023
-            
-            # Palavras-chave temporais
-            r'(?:hoje|ontem|amanhã|amanha)',
-            
-            # Datas em contexto
-            r'(?:dia|data|em)\s+(\d{1,2})[/-](\d{1,2})',  # dia 10/05 ou data 10-05
-            r'(?:dia|data|em)\s+(\d{1,2})\s+(?:de\s+)?(\w+)' # dia 10 de maio
-        ]
-        
-        meses = {
-            'janeiro': 1, 'jan': 1, 'fevereiro': 2, 'fev': 2, 'março': 3, 'mar': 3,
-            'abril': 4, 'abr': 4, 'maio': 5, 'mai': 5, 'junho': 6, 'jun': 6,
-            'julho': 7, 'jul': 7, 'agosto': 8, 'ago': 8, 'setembro': 9, 'set': 9,
-            'outubro': 10, 'out': 10, 'novembro': 11, 'nov': 11, 'dezembro': 12, 'dez': 12
-        }
-        
-        for padrao in padroes_data:
-            matches = re.findall(padrao, texto_lower)
+        for padrao in PADROES_DATA:
+            matches = padrao.findall(texto_lower)
             if matches:
                 if isinstance(matches[0], tuple) and len(matches[0]) >= 2:
                     try:
@@ -2782,7 +2402,7 @@ class TextProcessor:
                         if matches[0][0].isdigit() and matches[0][1].isdigit():
                             dia = int(matches[0][0])
                             mes = int(matches[0][1])
-                            ano = datetime.now().year
+                            ano = agora.year
                             
                             if len(matches[0]) > 2 and matches[0][2]:
                                 ano_str = matches[0][2]
@@ -2798,7 +2418,7 @@ class TextProcessor:
                             
                             # Encontra o mês pelo nome
                             mes = None
-                            for nome, num in meses.items():
+                            for nome, num in MESES.items():
                                 if mes_nome.startswith(nome):
                                     mes = num
                                     break
@@ -2806,7 +2426,7 @@ class TextProcessor:
                             if not mes:
                                 continue  # Se não encontrou o mês, pula para o próximo padrão
                             
-                            ano = datetime.now().year
+                            ano = agora.year
                             if len(matches[0]) > 2 and matches[0][2]:
                                 ano_str = matches[0][2]
                                 if len(ano_str) == 2:
@@ -2826,35 +2446,22 @@ class TextProcessor:
                 elif isinstance(matches[0], str) or (isinstance(matches[0], tuple) and len(matches[0]) == 1):
                     data_palavra = matches[0] if isinstance(matches[0], str) else matches[0][0]
                     if data_palavra in ['hoje', 'today']:
-                        dados_despesa["data"] = datetime.now().strftime("%Y-%m-%d")
+                        dados_despesa["data"] = hoje
                     elif data_palavra in ['ontem', 'yesterday']:
-                        ontem = datetime.now() - timedelta(days=1)
+                        ontem = agora - timedelta(days=1)
                         dados_despesa["data"] = ontem.strftime("%Y-%m-%d")
                     elif data_palavra in ['amanhã', 'amanha', 'tomorrow']:
-                        amanha = datetime.now() + timedelta(days=1)
+                        amanha = agora + timedelta(days=1)
                         dados_despesa["data"] = amanha.strftime("%Y-%m-%d")
                     break
         
         # Se "hoje" estiver no texto, define a data como hoje
         if "hoje" in texto_lower:
-            dados_despesa["data"] = datetime.now().strftime("%Y-%m-%d")
+            dados_despesa["data"] = hoje
         
         # Extrai forma de pagamento (algoritmo melhorado)
-        padroes_pagamento = [
-            # Formas de pagamento explícitas
-            r'(?:pag(?:amento|uei|ar|o)|comprei)(?:\s+(?:com|no|usando|via|por|pelo))?\s+(cartão|cartao|crédito|credito|débito|debito|dinheiro|pix|boleto)',
-            r'(?:no|com|usando|via|por|pelo)\s+(cartão|cartao|crédito|credito|débito|debito|dinheiro|pix|boleto)',
-            
-            # Palavras-chave específicas
-            r'(?:visa|master(?:card)?|elo|american express|amex|nubank|banco)\b',
-            
-            # Formatos comuns em recibos
-            r'forma(?:\s+de)?\s+pagamento:?\s+([\w\s]+)',
-            r'(?:pago|pagamento):?\s+([\w\s]+)'
-        ]
-        
-        for padrao in padroes_pagamento:
-            matches = re.findall(padrao, texto_lower)
+        for padrao in PADROES_PAGAMENTO:
+            matches = padrao.findall(texto_lower)
             if matches:
                 forma = matches[0].lower() if isinstance(matches[0], str) else matches[0][0].lower()
                 
@@ -2875,64 +2482,92 @@ class TextProcessor:
                     dados_despesa["forma_pagamento"] = "Transferência"
                 break
         
-        # Se identificamos um estabelecimento, podemos usar como descrição se ainda não tiver uma específica
-        if dados_despesa["descricao"] == texto and "categoria" in dados_despesa:
-            # Tenta encontrar o estabelecimento que correspondeu à categoria
-            for estabelecimento, categoria in self.estabelecimentos.items():
-                if categoria == dados_despesa["categoria"] and estabelecimento in texto_lower:
-                    dados_despesa["descricao"] = estabelecimento.capitalize()
-                    break
-        
         return dados_despesa
     
     def get_categoria_emoji(self, categoria):
         """Retorna um emoji para cada categoria"""
-        emojis = {
-            "alimentação": "🍽️",
-            "transporte": "🚗",
-            "moradia": "🏠",
-            "saúde": "⚕️",
-            "educação": "📚",
-            "lazer": "🎭",
-            "vestuário": "👕",
-            "salario": "💰",
-            "freelance": "💼",
-            "investimento": "📈",
-            "presente": "🎁",
-            "vendas": "🛒",
-            "serviços": "🔧",
-            "assinaturas": "📅",
-            "royalties": "📊",
-            "fornecedores": "🏭",
-            "salários": "👥",
-            "impostos": "📑",
-            "aluguel": "🏢",
-            "equipamentos": "⚙️",
-            "marketing": "📢",
-            "outros": "📦",
-            "outros_empresarial": "📦"
-        }
+        return EMOJIS_CATEGORIA.get(categoria, "📦")
+    
+    def parse_many(self, textos, agora=None, processos=None):
+        """Extrai as despesas de várias mensagens de uma vez.
+        
+        Retorna uma lista na mesma ordem de ``textos`` com o dicionário de cada
+        mensagem (ou None, como ``extrair_informacoes_despesa``). Todas usam o
+        mesmo ``agora``, tirado e formatado uma vez por lote.
         
-        return emojis.get(categoria, "📦")
+        Com ``processos`` > 1 (padrão: ``Config.PARSER_PROCESSOS``), lotes a
+        partir de ``Config.PARSER_LOTE_MINIMO_PROCESSOS`` mensagens são
+        divididos entre processos; abaixo disso o custo de serializar as
+        mensagens supera o ganho. O pool é criado no primeiro uso e reutilizado
+        pelo processo (``_obter_pool_parser``).
+        """
+        textos = list(textos)
+        agora = agora or datetime.now()
+        if processos is None:
+            processos = Config.PARSER_PROCESSOS
+        
+        if processos and processos > 1 and len(textos) >= Config.PARSER_LOTE_MINIMO_PROCESSOS:
+            # Poucas partes por processo: cada uma vai e volta serializada uma vez só
+            tamanho_parte = -(-len(textos) // (processos * 4))
+            partes = [textos[i:i + tamanho_parte] for i in range(0, len(textos), tamanho_parte)]
+            resultados = []
+            pool = _obter_pool_parser(processos)
+            try:
+                for parte in pool.map(_extrair_lote, partes, [agora] * len(partes)):
+                    resultados.extend(parte)
+                return resultados
+            except BrokenProcessPool:
+                # Um processo morreu: o próximo lote cria outro pool; este segue aqui
+                _descartar_pool_parser(pool)
+        
+        # A data de referência é formatada uma vez por lote, não por mensagem
+        extrair = self._extrair
+        hoje = agora.strftime("%Y-%m-%d")
+        return [extrair(texto, agora, hoje) for texto in textos]
+    
+    def extrair_itens_despesa(self, texto, agora=None):
+        """Separa uma mensagem com várias despesas em itens.
+        
+        "almoço 35, uber 22 e mercado 140,50" vira três despesas. Só separa
+        quando todo trecho tem o seu valor (``_tem_valor``): em "comprei 3
+        camisas e 2 calças por 200" o 3 é quantidade e a mensagem é uma
+        despesa só, assim como "café e pão 12". A forma de pagamento é a de
+        cada trecho; uma data citada em um só item vale para os itens que
+        não têm a sua. Sem separação, retorna a mensagem inteira como uma
+        despesa (``[]`` se não houver valor).
+        """
+        agora = agora or datetime.now()
+        hoje = agora.strftime("%Y-%m-%d")
+        # partes alterna trecho, separador, trecho...
+        trechos = [trecho for trecho in PADRAO_ITENS.split(texto.strip())[::2] if trecho.strip()]
+        
+        itens = []
+        if len(trechos) > 1 and all(_tem_valor(trecho) for trecho in trechos):
+            itens = [(trecho, self._extrair(trecho, agora, hoje)) for trecho in trechos]
+        
+        # Algum trecho sem despesa (ex.: um salário): vale a mensagem inteira
+        if not itens or not all(dados for _, dados in itens):
+            dados = self._extrair(texto, agora, hoje)
+            return [dados] if dados else []
+        
+        datas = {dados['data'] for _, dados in itens if dados['data'] != hoje}
+        for trecho, dados in itens:
+            if len(datas) == 1 and dados['data'] == hoje and 'hoje' not in trecho.lower():
+                dados['data'] = next(iter(datas))
+        
+        return [dados for _, dados in itens]
     
     def extrair_info_de_texto_longo(self, texto):
         """Extrai todas as informações relevantes de um texto longo (como transcrição de áudio)"""
-        from datetime import datetime, timedelta
-        import re
+        agora = datetime.now()
         
-        # Divide o texto em sentenças
-        sentenças = re.split(r'[.!?]\s+', texto)
+        # Divide o texto em sentenças, ignorando as muito curtas
+        sentenças = [sentença for sentença in PADRAO_SENTENCAS.split(texto) if len(sentença) >= 5]
         
-        # Analisa cada sentença para extrair informações
+        # Analisa todas as sentenças em lote
         melhores_dados = None
         
-        for sentença in sentenças:
-            if len(sentença) < 5:  # Ignora sentenças muito curtas
-                continue
-            
-            # Extrai informações desta sentença
-            dados = self.extrair_informacoes_despesa(sentença)
-            
+        for dados in self.parse_many(sentenças, agora=agora, processos=0):
             # Se encontrou valor, pode ser uma transação
             if dados and dados.get('valor'):
                 if melhores_dados is None or (dados.get('valor') > melhores_dados.get('valor')):
@@ -2940,7 +2575,7 @@ class TextProcessor:
         
         # Se não encontrou nada analisando sentenças individuais, tenta o texto completo
         if melhores_dados is None:
-            melhores_dados = self.extrair_informacoes_despesa(texto)
+            melhores_dados = self.extrair_informacoes_despesa(texto, agora)
         
         return melhores_dados
     
@@ -3019,15 +2654,59 @@ class TextProcessor:
         
         # Tenta determinar a categoria com base no estabelecimento
         if dados["estabelecimento"]:
-            estabelecimento_lower = dados["estabelecimento"].lower()
-            
-            for nome, categoria in self.estabelecimentos.items():
-                if nome in estabelecimento_lower:
-                    dados["categoria"] = categoria
-                    break
+            achadas = self._busca[0].encontrar(dados["estabelecimento"].lower())
+            nome = self._primeiro_estabelecimento(achadas)
+            if nome is not None:
+                dados["categoria"] = self.estabelecimentos[nome]
         
         return dados
     
+def _tem_valor(trecho):
+    """O trecho tem um valor próprio: moeda, decimal ou número que não é uma quantidade"""
+    trecho = trecho.lower()
+    if PADRAO_VALOR_EXPLICITO.search(trecho):
+        return True
+    # "uber 20", "20 no pix": sim; "3 camisas": não
+    return any(not palavra or palavra in PALAVRAS_APOS_VALOR
+               for palavra in PADRAO_NUMERO_ITEM.findall(trecho))
+
+# Instância compartilhada (sem estado mutável; segura entre threads)
+processador_texto = TextProcessor()
+
+# Pool do parse_many, um por processo (cada worker do gunicorn cria o seu no
+# primeiro lote grande). 'spawn' em vez de fork: o worker já tem threads
+# (fila de escrita, processadores) e um fork copiaria locks em uso
+_pool_parser = None
+_pool_parser_chave = None
+_pool_parser_lock = threading.Lock()
+
+def _obter_pool_parser(processos):
+    global _pool_parser, _pool_parser_chave
+    chave = (os.getpid(), processos)
+    with _pool_parser_lock:
+        if _pool_parser is None or _pool_parser_chave != chave:
+            if _pool_parser is not None and _pool_parser_chave[0] == os.getpid():
+                _pool_parser.shutdown(wait=False)
+            _pool_parser = ProcessPoolExecutor(
+                max_workers=processos,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            _pool_parser_chave = chave
+        return _pool_parser
+
+def _descartar_pool_parser(pool):
+    global _pool_parser
+    with _pool_parser_lock:
+        if _pool_parser is pool:
+            _pool_parser = None
+    pool.shutdown(wait=False)
+
+def _extrair_lote(textos, agora):
+    """Executado nos processos do ``parse_many``"""
+    extrair = processador_texto._extrair
+    hoje = agora.strftime("%Y-%m-%d")
+    return [extrair(texto, agora, hoje) for texto in textos]
+
 class MetaFinanceira:
     """Classe para manipulação de metas financeiras"""
     def __init__(self, db_path):
@@ -3036,7 +2715,7 @@ class MetaFinanceira:
     def criar(self, usuario_id, titulo, valor_alvo, data_alvo, valor_atual=0, 
              icone=None, valor_automatico=0, periodicidade_contribuicao=None, tipo_perfil='pessoal'):
         """Cria uma nova meta financeira"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         data_criacao = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -3055,11 +2734,12 @@ class MetaFinanceira:
         meta_id = cursor.lastrowid
         conn.close()
         
+        invalidar_resumo(usuario_id)
         return meta_id
     
     def buscar(self, usuario_id, tipo_perfil=None, concluida=None):
         """Busca metas financeiras do usuário com filtros opcionais"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -3084,7 +2764,7 @@ class MetaFinanceira:
     
     def buscar_por_id(self, meta_id):
         """Busca uma meta financeira pelo ID"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -3097,7 +2777,7 @@ class MetaFinanceira:
     
     def atualizar(self, meta_id, **kwargs):
         """Atualiza os dados de uma meta financeira"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         campos_permitidos = [
@@ -3121,25 +2801,28 @@ class MetaFinanceira:
             query = f"UPDATE metas_financeiras SET {', '.join(campos)} WHERE id = ?"
             cursor.execute(query, tuple(valores))
             conn.commit()
+            invalidar_resumo(_usuario_do_registro(cursor, 'metas_financeiras', meta_id))
         
         conn.close()
     
     def excluir(self, meta_id):
         """Exclui uma meta financeira"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
+        usuario_id = _usuario_do_registro(cursor, 'metas_financeiras', meta_id)
         cursor.execute("DELETE FROM metas_financeiras WHERE id = ?", (meta_id,))
         
         conn.commit()
         rows_affected = cursor.rowcount
         conn.close()
         
+        invalidar_resumo(usuario_id)
         return rows_affected > 0
     
     def adicionar_contribuicao(self, meta_id, valor, observacao=None):
         """Adiciona uma contribuição a uma meta financeira"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         data = datetime.now().strftime("%Y-%m-%d")
@@ -3169,13 +2852,14 @@ class MetaFinanceira:
         conn.commit()
         
         contribuicao_id = cursor.lastrowid
+        invalidar_resumo(_usuario_do_registro(cursor, 'metas_financeiras', meta_id))
         conn.close()
         
         return contribuicao_id
     
     def listar_contribuicoes(self, meta_id):
         """Lista todas as contribuições de uma meta"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -3195,68 +2879,10 @@ class Divida:
     def __init__(self, db_path):
         self.db_path = db_path
     
-    def criar_tabela(self):
-        """Cria a tabela de dívidas se não existir"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS dividas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            usuario_id INTEGER NOT NULL,
-            nome TEXT NOT NULL,
-            valor_total REAL NOT NULL,
-            valor_pago REAL DEFAULT 0,
-            data_inicio TEXT,
-            data_fim TEXT,
-            taxa_juros REAL,
-            parcelas_total INTEGER,
-            parcelas_pagas INTEGER DEFAULT 0,
-            status TEXT DEFAULT 'em_dia',
-            credor TEXT,
-            tipo TEXT DEFAULT 'outros',
-            tipo_perfil TEXT DEFAULT 'pessoal',
-            data_criacao TEXT,
-            FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-        )
-        ''')
-        
-        # Verifica se a coluna 'tipo' existe, se não adiciona
-        cursor.execute("PRAGMA table_info(dividas)")
-        colunas = [row[1] for row in cursor.fetchall()]
-        
-        if 'tipo' not in colunas:
-            cursor.execute('ALTER TABLE dividas ADD COLUMN tipo TEXT DEFAULT "outros"')
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS divida_pagamentos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            divida_id INTEGER NOT NULL,
-            valor REAL NOT NULL,
-            data TEXT NOT NULL,
-            tipo TEXT DEFAULT 'parcela',
-            observacao TEXT,
-            data_criacao TEXT,
-            FOREIGN KEY (divida_id) REFERENCES dividas (id)
-        )
-        ''')
-        
-        # Verifica se a coluna 'tipo' existe na tabela de pagamentos
-        cursor.execute("PRAGMA table_info(divida_pagamentos)")
-        colunas_pagamentos = [row[1] for row in cursor.fetchall()]
-        
-        if 'tipo' not in colunas_pagamentos:
-            cursor.execute('ALTER TABLE divida_pagamentos ADD COLUMN tipo TEXT DEFAULT "parcela"')
-        
-        conn.commit()
-        conn.close()
-    
     def criar(self, usuario_id, nome, valor_total, data_inicio, data_fim=None, 
              taxa_juros=None, parcelas_total=None, credor=None, tipo_perfil='pessoal', tipo='outros'):
         """Cria uma nova dívida"""
-        self.criar_tabela()  # Garante que a tabela existe
-        
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         data_criacao = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -3275,13 +2901,12 @@ class Divida:
         divida_id = cursor.lastrowid
         conn.close()
         
+        invalidar_resumo(usuario_id)
         return divida_id
     
     def buscar(self, usuario_id, tipo_perfil=None, status=None, tipo=None):
         """Busca dívidas do usuário com filtros opcionais"""
-        self.criar_tabela()  # Garante que a tabela existe
-        
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -3310,9 +2935,7 @@ class Divida:
     
     def buscar_por_id(self, divida_id):
         """Busca uma dívida pelo ID"""
-        self.criar_tabela()  # Garante que a tabela existe
-        
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -3325,7 +2948,7 @@ class Divida:
     
     def atualizar(self, divida_id, **kwargs):
         """Atualiza os dados de uma dívida"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         campos_permitidos = [
@@ -3350,14 +2973,17 @@ class Divida:
             query = f"UPDATE dividas SET {', '.join(campos)} WHERE id = ?"
             cursor.execute(query, tuple(valores))
             conn.commit()
+            invalidar_resumo(_usuario_do_registro(cursor, 'dividas', divida_id))
         
         conn.close()
     
     def excluir(self, divida_id):
         """Exclui uma dívida"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
+        usuario_id = _usuario_do_registro(cursor, 'dividas', divida_id)
+        
         # Exclui os pagamentos associados
         cursor.execute("DELETE FROM divida_pagamentos WHERE divida_id = ?", (divida_id,))
         
@@ -3368,11 +2994,12 @@ class Divida:
         rows_affected = cursor.rowcount
         conn.close()
         
+        invalidar_resumo(usuario_id)
         return rows_affected > 0
     
     def registrar_pagamento(self, divida_id, valor, data=None, observacao=None, tipo='parcela'):
         """Registra um pagamento para uma dívida"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         if data is None:
@@ -3407,13 +3034,14 @@ class Divida:
         
         conn.commit()
         pagamento_id = cursor.lastrowid
+        invalidar_resumo(_usuario_do_registro(cursor, 'dividas', divida_id))
         conn.close()
         
         return pagamento_id
     
     def listar_pagamentos(self, divida_id):
         """Lista todos os pagamentos de uma dívida"""
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -3448,38 +3076,9 @@ class Notificacao:
         self.is_read = is_read
         self.created_at = created_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
-    def criar_tabela(self):
-        """Cria a tabela de notificações se não existir"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS notificacoes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            type TEXT NOT NULL,
-            title TEXT NOT NULL,
-            description TEXT,
-            icon TEXT,
-            icon_color TEXT,
-            icon_bg TEXT,
-            action_url TEXT,
-            action_text TEXT,
-            metadata TEXT DEFAULT '{}',
-            is_read INTEGER DEFAULT 0,
-            created_at TEXT NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES usuarios (id)
-        )
-        ''')
-        
-        conn.commit()
-        conn.close()
-    
     def save(self):
         """Salva a notificação no banco de dados"""
-        self.criar_tabela()
-        
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         try:
@@ -3537,7 +3136,7 @@ class Notificacao:
         if not self.id:
             return False
         
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         try:
@@ -3559,7 +3158,7 @@ class Notificacao:
         if not self.id:
             return False
         
-        conn = sqlite3.connect(self.db_path)
+        conn = conectar(self.db_path)
         cursor = conn.cursor()
         
         try:
@@ -3576,7 +3175,7 @@ class Notificacao:
     def get_by_id(cls, notification_id, user_id=None):
         """Busca uma notificação pelo ID"""
         db_path = Config.DATABASE
-        conn = sqlite3.connect(db_path)
+        conn = conectar(db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -3619,15 +3218,11 @@ class Notificacao:
     def get_for_user(cls, user_id, filter_type=None, is_read=None, page=1, per_page=10):
         """Busca notificações para um usuário com filtros e paginação"""
         db_path = Config.DATABASE
-        conn = sqlite3.connect(db_path)
+        conn = conectar(db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
         try:
-            # Cria a tabela se não existir
-            temp_instance = cls(db_path=db_path)
-            temp_instance.criar_tabela()
-            
             query = "SELECT * FROM notificacoes WHERE user_id = ?"
             params = [user_id]
             
@@ -3679,14 +3274,10 @@ class Notificacao:
     def count_for_user(cls, user_id, filter_type=None, is_read=None):
         """Conta notificações para um usuário com filtros"""
         db_path = Config.DATABASE
-        conn = sqlite3.connect(db_path)
+        conn = conectar(db_path)
         cursor = conn.cursor()
         
         try:
-            # Cria a tabela se não existir
-            temp_instance = cls(db_path=db_path)
-            temp_instance.criar_tabela()
-            
             query = "SELECT COUNT(*) FROM notificacoes WHERE user_id = ?"
             params = [user_id]
             
@@ -3710,7 +3301,7 @@ class Notificacao:
     def mark_all_as_read(cls, user_id, filter_type=None):
         """Marca todas as notificações de um usuário como lidas"""
         db_path = Config.DATABASE
-        conn = sqlite3.connect(db_path)
+        conn = conectar(db_path)
         cursor = conn.cursor()
         
         try:
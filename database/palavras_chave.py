@@ -0,0 +1,113 @@
+"""
+Busca de palavras-chave por palavra inteira, em uma única passada.
+
+``CasadorPalavras`` recebe todas as palavras-chave do ``TextProcessor``
+(estabelecimentos, categorias, serviços de streaming...) e responde quais
+delas aparecem no texto como palavras inteiras, isto é, delimitadas por
+início/fim do texto ou por um caractere que não é letra, dígito ou ``_``
+(como ``\\b`` nas expressões regulares): "bar" não casa com "barato" nem
+"gas" com "gastei".
+
+Como funciona:
+
+* As palavras-chave são organizadas em uma trie, que vira uma única
+  expressão regular (``(?<!\\w)(trie)(?!\\w)``). Um ``findall`` percorre o
+  texto uma vez, em C, e devolve em cada posição a forma mais longa que
+  casa ("uber eats" em vez de "uber").
+* Cada forma sabe quais palavras-chave contém ("conta de luz" contém
+  "luz"), então as que ficam dentro de uma ocorrência mais longa não se
+  perdem.
+* Quando duas palavras-chave podem se sobrepor em parte ("amazon prime" e
+  "prime video"), a junção das duas ("amazon prime video") entra como mais
+  uma forma. Assim o ``findall``, que não devolve ocorrências sobrepostas,
+  encontra exatamente as mesmas palavras-chave que uma busca por palavra.
+
+O resultado da busca pode ser memorizado pelas formas encontradas
+(``formas``): elas determinam as palavras-chave (``expandir``).
+"""
+import re
+
+PADRAO_PALAVRA = re.compile(r'\w+')
+_INICIO_PALAVRA = re.compile(r'(?<!\w)\w')
+
+
+def padrao_inteiro(palavra):
+    """Expressão que encontra ``palavra`` só como palavra inteira"""
+    return re.compile(r'(?<!\w)' + re.escape(palavra) + r'(?!\w)')
+
+
+def _expressao_trie(palavras):
+    """Expressão regular equivalente a uma trie das palavras (mais longa primeiro)"""
+    raiz = {}
+    for palavra in palavras:
+        no = raiz
+        for caractere in palavra:
+            no = no.setdefault(caractere, {})
+        no[''] = {}
+
+    def montar(no):
+        alternativas = [re.escape(caractere) + montar(filho)
+                        for caractere, filho in sorted(no.items()) if caractere]
+        if not alternativas:
+            return ''
+        corpo = alternativas[0] if len(alternativas) == 1 else '(?:' + '|'.join(alternativas) + ')'
+        # Fim de palavra no meio do caminho: a continuação é opcional (gulosa)
+        return '(?:' + corpo + ')?' if '' in no else corpo
+
+    return montar(raiz)
+
+
+class CasadorPalavras:
+    """Conjunto imutável de palavras-chave buscadas de uma só vez"""
+
+    def __init__(self, palavras):
+        palavras = tuple(dict.fromkeys(palavra for palavra in palavras if palavra))
+        self.palavras = frozenset(palavras)
+
+        # Palavras-chave indexadas pela primeira palavra, para as buscas abaixo
+        por_primeira = {}
+        for palavra in palavras:
+            partes = PADRAO_PALAVRA.findall(palavra)
+            if partes:
+                por_primeira.setdefault(partes[0], []).append(palavra)
+        padroes = {palavra: padrao_inteiro(palavra) for palavra in palavras}
+
+        def contidas(forma):
+            return frozenset(
+                palavra
+                for parte in set(PADRAO_PALAVRA.findall(forma))
+                for palavra in por_primeira.get(parte, ())
+                if padroes[palavra].search(forma)
+            )
+
+        # forma -> palavras-chave que ela contém
+        self._contidas = {palavra: contidas(palavra) for palavra in palavras}
+
+        # Sobreposições parciais: uma palavra-chave que começa dentro de uma
+        # forma e termina depois dela vira, junto com a forma, uma forma nova
+        pendentes = list(palavras)
+        while pendentes:
+            forma = pendentes.pop()
+            for inicio in _INICIO_PALAVRA.finditer(forma, 1):
+                sufixo = forma[inicio.start():]
+                primeira = PADRAO_PALAVRA.match(sufixo).group()
+                for palavra in por_primeira.get(primeira, ()):
+                    if (len(palavra) > len(sufixo) and palavra.startswith(sufixo)
+                            and not PADRAO_PALAVRA.match(palavra, len(sufixo))
+                            and palavra not in self._contidas[forma]):
+                        nova = forma[:inicio.start()] + palavra
+                        if nova not in self._contidas:
+                            self._contidas[nova] = contidas(nova)
+                            pendentes.append(nova)
+
+        self._padrao = re.compile(r'(?<!\w)(' + _expressao_trie(self._contidas) + r')(?!\w)')
+        # Formas presentes no texto, da esquerda para a direita (sem sobreposição)
+        self.formas = self._padrao.findall
+
+    def expandir(self, formas):
+        """Palavras-chave (frozenset) contidas nas formas devolvidas por ``formas``"""
+        return frozenset().union(*map(self._contidas.__getitem__, formas))
+
+    def encontrar(self, texto):
+        """Retorna o conjunto (frozenset) de palavras-chave presentes no texto"""
+        return self.expandir(self._padrao.findall(texto))
@@ -0,0 +1,76 @@
+"""
+Resolução dos períodos das rotas de análise.
+
+As rotas recebem ``?periodo=dia|semana|mes|ano|tudo|personalizado`` (ou,
+no comparativo, ``mes_atual|mes_anterior|ano_atual|ano_anterior``) e, no
+personalizado, ``data_inicio``/``data_fim``. ``resolver_periodo``
+transforma isso uma única vez em um ``Periodo`` com as datas e o texto
+exibido ao usuário. O planejador de consultas (``database.planejador``)
+trabalha só com o ``Periodo``.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class Periodo:
+    """Intervalo de datas ('YYYY-MM-DD', inclusive); None = sem limite"""
+    nome: str
+    data_inicio: Optional[str] = None
+    data_fim: Optional[str] = None
+    texto: str = ""
+
+
+TEXTOS = {
+    'dia': "hoje",
+    'semana': "na última semana",
+    'mes': "neste mês",
+    'ano': "neste ano",
+    'tudo': "em todos os tempos",
+    'personalizado': "no período selecionado",
+    'mes_atual': "neste mês",
+    'mes_anterior': "no mês anterior",
+    'ano_atual': "neste ano",
+    'ano_anterior': "no ano anterior",
+}
+
+PERIODOS = tuple(TEXTOS)
+
+
+def _datas(nome, hoje):
+    """(data_inicio, data_fim) dos períodos nomeados"""
+    fim = hoje.strftime("%Y-%m-%d")
+    if nome == 'dia':
+        return fim, fim
+    if nome == 'semana':
+        return (hoje - timedelta(days=7)).strftime("%Y-%m-%d"), fim
+    if nome in ('mes', 'mes_atual'):
+        return f"{hoje.year}-{hoje.month:02d}-01", fim
+    if nome in ('ano', 'ano_atual'):
+        return f"{hoje.year}-01-01", fim
+    if nome == 'mes_anterior':
+        ultimo = hoje.replace(day=1) - timedelta(days=1)
+        return ultimo.replace(day=1).strftime("%Y-%m-%d"), ultimo.strftime("%Y-%m-%d")
+    if nome == 'ano_anterior':
+        return f"{hoje.year - 1}-01-01", f"{hoje.year - 1}-12-31"
+    # 'tudo': sem início, até hoje
+    return None, fim
+
+
+def resolver_periodo(periodo, data_inicio=None, data_fim=None, padrao='tudo', nomes=None, hoje=None):
+    """Transforma o parâmetro ``periodo`` da requisição em um ``Periodo``.
+
+    Um nome desconhecido (ou nenhum, ou fora de ``nomes`` quando a rota só
+    aceita alguns) vale como ``padrao``. Os períodos nomeados calculam as
+    datas a partir de ``hoje``; 'personalizado' (ou ``padrao=None``) usa
+    ``data_inicio``/``data_fim`` como vieram, que podem faltar (sem limite).
+    """
+    if periodo not in TEXTOS or (nomes is not None and periodo not in nomes):
+        periodo = padrao
+
+    if periodo in (None, 'personalizado'):
+        return Periodo('personalizado', data_inicio or None, data_fim or None, TEXTOS['personalizado'])
+
+    inicio, fim = _datas(periodo, hoje or datetime.now())
+    return Periodo(periodo, inicio, fim, TEXTOS[periodo])
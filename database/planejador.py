@@ -0,0 +1,295 @@
+"""
+Planejamento das consultas analíticas (gráficos, resumo, top despesas).
+
+Uma ``Consulta`` descreve o que a rota precisa:
+
+* a tabela, ou as tabelas (despesas e/ou receitas);
+* o período (``database.periodos.Periodo``) e o perfil;
+* as dimensões (agrupamento) e as medidas;
+* ou, em vez disso, as colunas das linhas, com ordem e limite.
+
+``planejar`` escolhe a fonte mais barata que responde à consulta:
+
+* ``resumo``: os meses completos vêm do ``resumo_mensal``, e só as pontas
+  parciais do período vêm das tabelas originais. Vale quando as dimensões e
+  medidas existem no resumo e o período cobre ao menos um mês completo.
+* ``indice``: a consulta só usa colunas do índice de cobertura
+  ``(usuario_id, data, tipo_perfil, categoria, valor)``, e o SQLite responde
+  sem ler a tabela.
+* ``tabela``: o resto, ou seja, colunas fora do índice como descricao e
+  data_criacao.
+
+Com mais de uma tabela, todas as partes vão numa única consulta
+``UNION ALL``. As medidas saem com o nome da tabela
+(``total_despesas``/``total_receitas``).
+
+``executar_consultas`` roda consultas independentes na mesma conexão e
+conta, por fonte, quantas consultas rodaram e quanto tempo levaram (ver
+``estatisticas_consultas``). Consultas acima de ``CONSULTA_LENTA_MS`` vão
+para o log.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple, Union
+
+from config import Config
+from database.conexao import conectar
+from database.periodos import Periodo
+from database.resumos import dividir_periodo
+from log_estruturado import obter_logger
+
+log = obter_logger('consultas')
+
+# Colunas do índice (usuario_id, data, tipo_perfil, categoria, valor) de despesas e receitas
+COLUNAS_INDICE = frozenset(('usuario_id', 'data', 'tipo_perfil', 'categoria', 'valor'))
+
+# dimensão -> (expressão na tabela original, colunas usadas, expressão no resumo ou None)
+DIMENSOES = {
+    'categoria': ("categoria", ('categoria',), "NULLIF(categoria, '')"),
+    'mes': ("substr(data, 1, 7)", ('data',), "mes"),
+    'dia': ("data", ('data',), None),
+    'dia_semana': ("strftime('%w', data)", ('data',), None),
+    'hora': ("strftime('%H', data_criacao)", ('data_criacao',), None),
+}
+
+# medida -> (expressão na tabela original, agregação entre partes, expressão no resumo ou None)
+MEDIDAS = {
+    'total': ("SUM(valor)", "SUM", "SUM(total_{tabela})"),
+    'quantidade': ("COUNT(*)", "SUM", "SUM(qtd_{tabela})"),
+    'maior': ("MAX(valor)", "MAX", None),
+}
+
+TABELAS = ('despesas', 'receitas')
+
+_SEM_PERIODO = Periodo('tudo')
+
+
+@dataclass(frozen=True)
+class Consulta:
+    """Pedido de dados de uma rota de análise"""
+    tabela: Union[str, Tuple[str, ...]]
+    periodo: Periodo = _SEM_PERIODO
+    dimensoes: Tuple[str, ...] = ()
+    medidas: Tuple[str, ...] = ('total',)
+    tipo_perfil: Optional[str] = None
+    categoria: Optional[str] = None
+    # Linhas em vez de agregação: colunas ('*' = todas), ordenadas por ``ordem``
+    colunas: Optional[Tuple[str, ...]] = None
+    ordem: Optional[str] = None
+    limite: Optional[int] = None
+
+    @property
+    def tabelas(self):
+        return (self.tabela,) if isinstance(self.tabela, str) else tuple(self.tabela)
+
+
+@dataclass(frozen=True)
+class Plano:
+    """SQL escolhido para uma consulta e a fonte dos dados"""
+    fonte: str
+    sql: str
+    params: tuple
+    nomes: Tuple[str, ...]
+
+
+def _nomes_medidas(consulta):
+    """(medida, tabela, nome da coluna no resultado) de cada medida"""
+    tabelas = consulta.tabelas
+    return [
+        (medida, tabela, medida if len(tabelas) == 1 else f"{medida}_{tabela}")
+        for medida in consulta.medidas for tabela in tabelas
+    ]
+
+
+def _filtros_brutos(consulta, usuario_id, inicio, fim, params):
+    sql = " WHERE usuario_id = ?"
+    params.append(usuario_id)
+    if inicio:
+        sql += " AND data >= ?"
+        params.append(inicio)
+    if fim:
+        sql += " AND data <= ?"
+        params.append(fim)
+    if consulta.tipo_perfil:
+        sql += " AND (tipo_perfil = ? OR tipo_perfil IS NULL)"
+        params.append(consulta.tipo_perfil)
+    if consulta.categoria:
+        sql += " AND categoria = ?"
+        params.append(consulta.categoria)
+    return sql
+
+
+def _agrupar(sql, dimensoes):
+    if not dimensoes:
+        return sql
+    return sql + " GROUP BY " + ", ".join(str(i) for i in range(1, len(dimensoes) + 1))
+
+
+def _parte_bruta(consulta, tabela, usuario_id, inicio, fim, params):
+    colunas = [f"{DIMENSOES[d][0]} AS {d}" for d in consulta.dimensoes]
+    colunas += [
+        f"{MEDIDAS[medida][0] if origem == tabela else 0} AS {nome}"
+        for medida, origem, nome in _nomes_medidas(consulta)
+    ]
+    sql = f"SELECT {', '.join(colunas)} FROM {tabela}"
+    sql += _filtros_brutos(consulta, usuario_id, inicio, fim, params)
+    return _agrupar(sql, consulta.dimensoes)
+
+
+def _parte_resumo(consulta, usuario_id, meses, params):
+    colunas = [f"{DIMENSOES[d][2]} AS {d}" for d in consulta.dimensoes]
+    colunas += [
+        f"{MEDIDAS[medida][2].format(tabela=tabela)} AS {nome}"
+        for medida, tabela, nome in _nomes_medidas(consulta)
+    ]
+    com_lancamentos = " OR ".join(f"qtd_{tabela} > 0" for tabela in consulta.tabelas)
+    sql = f"SELECT {', '.join(colunas)} FROM resumo_mensal WHERE usuario_id = ? AND ({com_lancamentos})"
+    params.append(usuario_id)
+    if meses[0]:
+        sql += " AND mes >= ?"
+        params.append(meses[0])
+    if meses[1]:
+        sql += " AND mes <= ?"
+        params.append(meses[1])
+    if consulta.tipo_perfil:
+        sql += " AND tipo_perfil IN (?, '')"
+        params.append(consulta.tipo_perfil)
+    if consulta.categoria:
+        sql += " AND categoria = ?"
+        params.append(consulta.categoria)
+    return _agrupar(sql, consulta.dimensoes)
+
+
+def _planejar_linhas(consulta, usuario_id):
+    tabela, = consulta.tabelas
+    colunas = consulta.colunas
+    cobertas = '*' not in colunas and COLUNAS_INDICE.issuperset(colunas)
+    params = []
+    sql = f"SELECT {', '.join(colunas)} FROM {tabela}"
+    sql += _filtros_brutos(consulta, usuario_id, consulta.periodo.data_inicio, consulta.periodo.data_fim, params)
+    if consulta.ordem:
+        sql += f" ORDER BY {consulta.ordem}"
+    if consulta.limite:
+        sql += " LIMIT ?"
+        params.append(consulta.limite)
+    return Plano('indice' if cobertas else 'tabela', sql, tuple(params), ())
+
+
+def planejar(consulta, usuario_id):
+    """Escolhe a fonte e monta o SQL de uma ``Consulta``"""
+    for tabela in consulta.tabelas:
+        if tabela not in TABELAS:
+            raise ValueError(f"Tabela inválida: {tabela}")
+    if consulta.colunas:
+        return _planejar_linhas(consulta, usuario_id)
+
+    usadas = {'usuario_id', 'data', 'tipo_perfil', 'valor'}
+    if consulta.categoria:
+        usadas.add('categoria')
+    for dimensao in consulta.dimensoes:
+        usadas.update(DIMENSOES[dimensao][1])
+
+    inicio, fim = consulta.periodo.data_inicio, consulta.periodo.data_fim
+    no_resumo = (all(DIMENSOES[d][2] for d in consulta.dimensoes)
+                 and all(MEDIDAS[m][2] for m in consulta.medidas))
+    meses, parciais = dividir_periodo(inicio, fim) if no_resumo else (None, [(inicio, fim)])
+
+    params = []
+    partes = []
+    if meses is not None:
+        partes.append(_parte_resumo(consulta, usuario_id, meses, params))
+        fonte = 'resumo'
+    else:
+        fonte = 'indice' if COLUNAS_INDICE.issuperset(usadas) else 'tabela'
+    for parcial_inicio, parcial_fim in parciais:
+        for tabela in consulta.tabelas:
+            partes.append(_parte_bruta(consulta, tabela, usuario_id, parcial_inicio, parcial_fim, params))
+
+    nomes = tuple(consulta.dimensoes) + tuple(nome for _, _, nome in _nomes_medidas(consulta))
+    if len(partes) == 1:
+        sql = partes[0]
+    else:
+        # Junta as partes somando (ou tomando o máximo) por dimensão
+        colunas = list(consulta.dimensoes) + [
+            f"{MEDIDAS[medida][1]}({nome}) AS {nome}" for medida, _, nome in _nomes_medidas(consulta)
+        ]
+        sql = _agrupar(f"SELECT {', '.join(colunas)} FROM ({' UNION ALL '.join(partes)})", consulta.dimensoes)
+
+    if consulta.ordem:
+        sql += f" ORDER BY {consulta.ordem}"
+    if consulta.limite:
+        sql += " LIMIT ?"
+        params.append(consulta.limite)
+    return Plano(fonte, sql, tuple(params), nomes)
+
+
+class _Estatisticas:
+    """Quantidade e tempo das consultas por fonte, no processo atual"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fontes = {}
+
+    def registrar(self, fonte, ms):
+        with self._lock:
+            contadores = self._fontes.setdefault(fonte, {'consultas': 0, 'tempo_ms': 0.0, 'maior_ms': 0.0})
+            contadores['consultas'] += 1
+            contadores['tempo_ms'] += ms
+            contadores['maior_ms'] = max(contadores['maior_ms'], ms)
+
+    def resumo(self):
+        with self._lock:
+            return {
+                nome: dict(valores, tempo_ms=round(valores['tempo_ms'], 1), maior_ms=round(valores['maior_ms'], 1))
+                for nome, valores in self._fontes.items()
+            }
+
+
+_estatisticas = _Estatisticas()
+
+
+def estatisticas_consultas():
+    """Consultas analíticas por fonte (resumo, indice, tabela) no processo atual"""
+    return _estatisticas.resumo()
+
+
+def _executar(cursor, consulta, usuario_id):
+    plano = planejar(consulta, usuario_id)
+    inicio = time.perf_counter()
+    cursor.execute(plano.sql, plano.params)
+    linhas = cursor.fetchall()
+    ms = (time.perf_counter() - inicio) * 1000
+
+    _estatisticas.registrar(plano.fonte, ms)
+    if ms > Config.CONSULTA_LENTA_MS:
+        log.aviso('consulta_lenta', fonte=plano.fonte, tabela=consulta.tabelas,
+                  dimensoes=consulta.dimensoes, periodo=consulta.periodo.nome, ms=round(ms, 1))
+
+    if plano.nomes:
+        return [dict(zip(plano.nomes, linha)) for linha in linhas]
+    nomes = [descricao[0] for descricao in cursor.description]
+    return [dict(zip(nomes, linha)) for linha in linhas]
+
+
+def executar_consultas(db_path, usuario_id, consultas, cursor=None):
+    """Executa várias consultas na mesma conexão.
+
+    ``consultas`` é um dicionário nome -> ``Consulta``; o retorno tem os
+    mesmos nomes, cada um com a lista de linhas (dicionários). Se ``cursor``
+    for informado, as consultas usam essa conexão.
+    """
+    conn = None
+    if cursor is None:
+        conn = conectar(db_path)
+        cursor = conn.cursor()
+    try:
+        return {nome: _executar(cursor, consulta, usuario_id) for nome, consulta in consultas.items()}
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def executar_consulta(db_path, usuario_id, consulta, cursor=None):
+    """Atalho para uma consulta só"""
+    return executar_consultas(db_path, usuario_id, {'resultado': consulta}, cursor)['resultado']
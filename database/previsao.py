@@ -0,0 +1,224 @@
+"""
+Previsão de despesas e receitas com NumPy.
+
+As séries mensais saem do ``resumo_mensal`` em uma consulta do planejador
+(mês x categoria, despesas e receitas) e são montadas numa matriz com
+``np.add.at``. Uma linha por categoria de despesa e de receita, mais uma
+linha com o total de cada uma.
+
+Todas as séries são ajustadas de uma vez por mínimos quadrados
+(``np.linalg.lstsq`` com a matriz de séries no lado direito). O modelo tem
+intercepto e tendência linear. Com pelo menos ``MESES_SAZONALIDADE`` meses
+completos, entra também a sazonalidade anual (um par seno/cosseno de
+período 12). A faixa de confiança é o intervalo de predição de cada série:
+z * sigma * sqrt(1 + h), com a alavancagem h dos meses previstos calculada
+uma única vez para todas as séries.
+
+Os cenários reaproveitam o mesmo ajuste:
+
+* realista: a previsão;
+* otimista: despesas no limite inferior e receitas no superior da faixa;
+* pessimista: o contrário.
+
+O mês corrente ainda está incompleto. Ele aparece no histórico, mas fica
+fora do ajuste.
+"""
+import calendar
+from datetime import datetime
+
+import numpy as np
+
+from database.conexao import conectar
+from database.periodos import Periodo
+from database.planejador import Consulta, executar_consulta
+
+# Meses completos necessários para estimar a sazonalidade anual
+MESES_SAZONALIDADE = 24
+
+# Intervalo de predição de 95%
+Z_CONFIANCA = 1.96
+
+
+def indice_mes(mes):
+    """'2024-05' -> número absoluto do mês (ano * 12 + mês - 1)"""
+    return int(mes[:4]) * 12 + int(mes[5:7]) - 1
+
+
+def nome_mes(indice):
+    """Inverso de ``indice_mes``"""
+    return f"{indice // 12:04d}-{indice % 12 + 1:02d}"
+
+
+def carregar_series(cursor, usuario_id, mes_inicio, mes_fim, tipo_perfil=None):
+    """Linhas (mes, categoria, despesas, receitas) dos meses completos do intervalo"""
+    ultimo_dia = calendar.monthrange(int(mes_fim[:4]), int(mes_fim[5:7]))[1]
+    periodo = Periodo('personalizado', f"{mes_inicio}-01", f"{mes_fim}-{ultimo_dia:02d}")
+    # Meses inteiros: o planejador lê tudo do resumo mensal
+    linhas = executar_consulta(None, usuario_id, Consulta(
+        ('despesas', 'receitas'), periodo, dimensoes=('mes', 'categoria'), tipo_perfil=tipo_perfil
+    ), cursor)
+    return [
+        (linha['mes'], linha['categoria'], linha['total_despesas'], linha['total_receitas'])
+        for linha in linhas
+    ]
+
+
+def montar_matrizes(linhas, inicio, quantidade):
+    """Agrupa as linhas em matrizes categoria x mês.
+
+    Retorna ``(categorias_despesas, matriz_despesas, categorias_receitas,
+    matriz_receitas)``. Só entram as categorias com algum valor no
+    intervalo; os meses vão de ``inicio`` (índice absoluto) a
+    ``inicio + quantidade - 1``.
+    """
+    if not linhas:
+        vazio = np.zeros((0, quantidade))
+        return [], vazio, [], vazio.copy()
+
+    meses, categorias, despesas, receitas = zip(*linhas)
+    # Converte cada mês distinto uma vez só
+    meses_distintos, codigos_meses = np.unique(np.array(meses), return_inverse=True)
+    posicoes = np.array([indice_mes(mes) for mes in meses_distintos], dtype=np.int64)[codigos_meses] - inicio
+    nomes, codigos = np.unique(np.array([categoria or 'outros' for categoria in categorias]), return_inverse=True)
+    dentro = (posicoes >= 0) & (posicoes < quantidade)
+
+    resultado = []
+    for valores in (despesas, receitas):
+        matriz = np.zeros((len(nomes), quantidade))
+        np.add.at(matriz, (codigos[dentro], posicoes[dentro]), np.asarray(valores, dtype=float)[dentro])
+        usadas = np.abs(matriz).sum(axis=1) > 0
+        resultado.extend([[str(nome) for nome in nomes[usadas]], matriz[usadas]])
+    return tuple(resultado)
+
+
+def _regressores(indices, origem, centro, sazonal):
+    """Matriz de regressores (intercepto, tendência e, se sazonal, seno/cosseno anuais)"""
+    indices = np.asarray(indices, dtype=float)
+    colunas = [np.ones_like(indices), indices - origem - centro]
+    if sazonal:
+        angulo = 2 * np.pi * (indices % 12) / 12
+        colunas.extend([np.sin(angulo), np.cos(angulo)])
+    return np.column_stack(colunas)
+
+
+def ajustar(series, inicio, indices_previsao):
+    """Ajusta todas as séries (linhas de ``series``) e prevê os meses de ``indices_previsao``.
+
+    ``inicio`` é o índice absoluto do primeiro mês das séries. Retorna
+    ``(previsao, faixa, sazonal)``: ``previsao`` e ``faixa`` (meia largura do
+    intervalo) têm uma linha por série e uma coluna por mês previsto.
+    """
+    series = np.atleast_2d(np.asarray(series, dtype=float))
+    quantidade_series, n = series.shape
+    h = len(indices_previsao)
+    if n == 0:
+        return np.zeros((quantidade_series, h)), np.zeros((quantidade_series, h)), False
+
+    sazonal = n >= MESES_SAZONALIDADE
+    centro = (n - 1) / 2
+    historico = _regressores(np.arange(inicio, inicio + n), inicio, centro, sazonal)
+    futuro = _regressores(indices_previsao, inicio, centro, sazonal)
+
+    if n == 1:
+        # Um só mês: repete o valor, sem faixa
+        return np.repeat(series[:, :1], h, axis=1), np.zeros((quantidade_series, h)), False
+
+    # Uma fatoração para todas as séries: cada coluna de series.T é um lado direito
+    coeficientes, _, posto, _ = np.linalg.lstsq(historico, series.T, rcond=None)
+    previsao = (futuro @ coeficientes).T
+
+    graus_liberdade = n - posto
+    if graus_liberdade <= 0:
+        return previsao, np.zeros_like(previsao), sazonal
+    residuos = series.T - historico @ coeficientes
+    sigma = np.sqrt((residuos ** 2).sum(axis=0) / graus_liberdade)
+
+    # Alavancagem dos meses previstos: diag(F (X'X)^-1 F'), igual para todas as séries
+    alavancagem = np.einsum('ij,jk,ik->i', futuro, np.linalg.pinv(historico.T @ historico), futuro)
+    faixa = Z_CONFIANCA * sigma[:, None] * np.sqrt(1 + alavancagem)[None, :]
+    return previsao, faixa, sazonal
+
+
+def _listas(matriz):
+    return np.round(matriz, 2).tolist()
+
+
+def prever(db_path, usuario_id, meses_historico=3, meses_previsao=3, tipo_perfil=None, hoje=None):
+    """Histórico, previsão com faixa de confiança, categorias e cenários.
+
+    O histórico cobre os ``meses_historico`` meses anteriores ao corrente e
+    o próprio mês corrente. A previsão cobre os ``meses_previsao`` meses
+    seguintes.
+    """
+    hoje = hoje or datetime.now()
+    atual = hoje.year * 12 + hoje.month - 1
+    inicio = atual - meses_historico
+    quantidade = meses_historico + 1
+
+    conn = conectar(db_path)
+    try:
+        linhas = carregar_series(conn.cursor(), usuario_id, nome_mes(inicio), nome_mes(atual), tipo_perfil)
+    finally:
+        conn.close()
+
+    cat_despesas, despesas, cat_receitas, receitas = montar_matrizes(linhas, inicio, quantidade)
+
+    # Linhas das categorias e, no fim, os totais de despesas e de receitas
+    series = np.vstack([despesas, receitas, despesas.sum(axis=0), receitas.sum(axis=0)])
+    # O mês corrente está incompleto: fica fora do ajuste (a menos que seja o único)
+    meses_ajuste = quantidade - 1 if quantidade > 1 else quantidade
+    indices_previsao = np.arange(atual + 1, atual + 1 + meses_previsao)
+    previsao, faixa, sazonal = ajustar(series[:, :meses_ajuste], inicio, indices_previsao)
+
+    # Valores não ficam negativos
+    inferior = np.maximum(previsao - faixa, 0)
+    superior = np.maximum(previsao + faixa, 0)
+    previsao = np.maximum(previsao, 0)
+
+    n_despesas = len(cat_despesas)
+    n_receitas = len(cat_receitas)
+    i_total_despesas, i_total_receitas = n_despesas + n_receitas, n_despesas + n_receitas + 1
+
+    def serie(indice):
+        return {
+            'historico': _listas(series[indice]),
+            'previsao': _listas(previsao[indice]),
+            'inferior': _listas(inferior[indice]),
+            'superior': _listas(superior[indice]),
+        }
+
+    def por_categoria(categorias, deslocamento):
+        return {
+            categoria: {
+                'previsao': _listas(previsao[deslocamento + i]),
+                'inferior': _listas(inferior[deslocamento + i]),
+                'superior': _listas(superior[deslocamento + i]),
+            }
+            for i, categoria in enumerate(categorias)
+        }
+
+    # Cenários: combinações dos limites da mesma faixa (nenhum ajuste extra)
+    cenarios_despesas = {'otimista': inferior, 'realista': previsao, 'pessimista': superior}
+    cenarios_receitas = {'otimista': superior, 'realista': previsao, 'pessimista': inferior}
+    cenarios = {}
+    for nome in ('otimista', 'realista', 'pessimista'):
+        despesas_cenario = cenarios_despesas[nome][i_total_despesas]
+        receitas_cenario = cenarios_receitas[nome][i_total_receitas]
+        cenarios[nome] = {
+            'despesas': _listas(despesas_cenario),
+            'receitas': _listas(receitas_cenario),
+            'saldo': _listas(receitas_cenario - despesas_cenario),
+        }
+
+    return {
+        'meses_historico': [nome_mes(indice) for indice in range(inicio, atual + 1)],
+        'meses_previsao': [nome_mes(int(indice)) for indice in indices_previsao],
+        'despesas': dict(serie(i_total_despesas), categorias=por_categoria(cat_despesas, 0)),
+        'receitas': dict(serie(i_total_receitas), categorias=por_categoria(cat_receitas, n_despesas)),
+        'cenarios': cenarios,
+        'modelo': {
+            'meses_ajuste': meses_ajuste,
+            'sazonal': bool(sazonal),
+            'confianca': 0.95,
+        },
+    }
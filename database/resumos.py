@@ -0,0 +1,226 @@
+"""
+Resumo mensal materializado de despesas e receitas.
+
+A tabela ``resumo_mensal`` guarda, por (usuario_id, tipo_perfil, mes,
+categoria), o total e a quantidade de despesas e de receitas. Os métodos de
+escrita de ``Despesa`` e ``Receita`` ajustam o resumo na mesma transação do
+INSERT/UPDATE/DELETE. As consultas de totais leem o resumo para os meses
+completos do período e a tabela original só para os trechos parciais
+(o início e o fim do período que não cobrem um mês inteiro).
+
+Reconstrução manual:
+    python -m database.resumos [usuario_id]
+"""
+import calendar
+import sys
+from datetime import datetime, timedelta
+
+from database.cache import obter_cache
+from database.conexao import conectar
+from database.escrita import executar_escrita
+
+# tabela original -> (coluna de total, coluna de quantidade) no resumo
+COLUNAS_RESUMO = {
+    'despesas': ('total_despesas', 'qtd_despesas'),
+    'receitas': ('total_receitas', 'qtd_receitas'),
+}
+
+
+def _sql_ajuste(tabela):
+    total, quantidade = COLUNAS_RESUMO[tabela]
+    return f'''
+    INSERT INTO resumo_mensal (usuario_id, tipo_perfil, mes, categoria, {total}, {quantidade})
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (usuario_id, tipo_perfil, mes, categoria) DO UPDATE SET
+        {total} = ROUND({total} + excluded.{total}, 2),
+        {quantidade} = {quantidade} + excluded.{quantidade}
+    '''
+
+
+def ajustar_resumo(cursor, tabela, usuario_id, tipo_perfil, data, categoria, valor, sinal=1):
+    """Soma (sinal=1) ou subtrai (sinal=-1) um lançamento do resumo mensal"""
+    cursor.execute(_sql_ajuste(tabela), (
+        usuario_id, tipo_perfil or '', (data or '')[:7], categoria or '',
+        sinal * (valor or 0), sinal
+    ))
+
+
+def ajustar_resumo_lote(cursor, tabela, lancamentos):
+    """Soma vários lançamentos ao resumo mensal com um UPDATE por (usuário, perfil, mês, categoria)
+
+    ``lancamentos``: iterável de ``(usuario_id, tipo_perfil, data, categoria, valor)``.
+    """
+    grupos = {}
+    for usuario_id, tipo_perfil, data, categoria, valor in lancamentos:
+        chave = (usuario_id, tipo_perfil or '', (data or '')[:7], categoria or '')
+        grupo = grupos.get(chave)
+        if grupo is None:
+            grupos[chave] = [valor or 0, 1]
+        else:
+            grupo[0] += valor or 0
+            grupo[1] += 1
+
+    cursor.executemany(_sql_ajuste(tabela), [
+        (*chave, round(total, 2), quantidade) for chave, (total, quantidade) in grupos.items()
+    ])
+
+
+def ajustar_resumo_registro(cursor, tabela, registro_id, sinal):
+    """Ajusta o resumo a partir do registro gravado (usado em atualizar/excluir).
+
+    Retorna o usuario_id do registro ou None se ele não existe.
+    """
+    cursor.execute(
+        f"SELECT usuario_id, tipo_perfil, data, categoria, valor FROM {tabela} WHERE id = ?",
+        (registro_id,)
+    )
+    registro = cursor.fetchone()
+    if registro is None:
+        return None
+    ajustar_resumo(cursor, tabela, *registro, sinal=sinal)
+    return registro[0]
+
+
+def _reconstruir(cursor, usuario_id=None):
+    filtro = " WHERE usuario_id = ?" if usuario_id is not None else ""
+    params = (usuario_id,) if usuario_id is not None else ()
+
+    cursor.execute(f"DELETE FROM resumo_mensal{filtro}", params)
+
+    for tabela, (total, quantidade) in COLUNAS_RESUMO.items():
+        cursor.execute(f'''
+        INSERT INTO resumo_mensal (usuario_id, tipo_perfil, mes, categoria, {total}, {quantidade})
+        SELECT usuario_id, COALESCE(tipo_perfil, ''), COALESCE(substr(data, 1, 7), ''),
+               COALESCE(categoria, ''), ROUND(SUM(valor), 2), COUNT(*)
+        FROM {tabela}{filtro}
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (usuario_id, tipo_perfil, mes, categoria) DO UPDATE SET
+            {total} = excluded.{total},
+            {quantidade} = excluded.{quantidade}
+        ''', params)
+
+
+def reconstruir_resumo(db_path, usuario_id=None):
+    """Recalcula o resumo mensal a partir dos lançamentos (de um usuário ou de todos)"""
+    executar_escrita(db_path, _reconstruir, usuario_id)
+
+
+def _ultimo_dia(data):
+    return data.replace(day=calendar.monthrange(data.year, data.month)[1])
+
+
+def dividir_periodo(data_inicio=None, data_fim=None):
+    """Separa o período em meses completos e trechos parciais.
+
+    Retorna ``(meses, parciais)``: ``meses`` é ``(mes_inicio, mes_fim)``
+    (extremos podem ser None = sem limite) ou None se nenhum mês completo
+    cabe no período; ``parciais`` é a lista de ``(data_inicio, data_fim)``
+    que precisam ser lidos da tabela original.
+    """
+    try:
+        inicio = datetime.strptime(data_inicio, "%Y-%m-%d") if data_inicio else None
+        fim = datetime.strptime(data_fim, "%Y-%m-%d") if data_fim else None
+    except (TypeError, ValueError):
+        # Formato inesperado: lê tudo da tabela original
+        return None, [(data_inicio, data_fim)]
+
+    mes_inicio = mes_fim = None
+    parciais = []
+
+    if inicio is not None:
+        if inicio.day == 1:
+            primeiro = inicio
+        else:
+            primeiro = _ultimo_dia(inicio) + timedelta(days=1)
+        mes_inicio = primeiro.strftime("%Y-%m")
+
+    if fim is not None:
+        if fim == _ultimo_dia(fim):
+            ultimo = fim
+        else:
+            ultimo = fim.replace(day=1) - timedelta(days=1)
+        mes_fim = ultimo.strftime("%Y-%m")
+
+    if mes_inicio is not None and mes_fim is not None and mes_inicio > mes_fim:
+        # Nenhum mês completo: o período inteiro vem da tabela original
+        return None, [(data_inicio, data_fim)]
+
+    if inicio is not None and inicio.day != 1:
+        parciais.append((data_inicio, min(_ultimo_dia(inicio), fim or _ultimo_dia(inicio)).strftime("%Y-%m-%d")))
+    if fim is not None and fim != _ultimo_dia(fim):
+        parciais.append((fim.replace(day=1).strftime("%Y-%m-%d"), data_fim))
+
+    return (mes_inicio, mes_fim), parciais
+
+
+def consultar_totais(cursor, tabela, usuario_id, data_inicio=None, data_fim=None,
+                     tipo_perfil=None, agrupar=None):
+    """Totais de despesas/receitas combinando resumo mensal e lançamentos.
+
+    ``agrupar`` pode ser None (total do período), 'categoria' ou 'mes'.
+    Retorna a lista de linhas ``(chave, total)``. O SQL sai do planejador de
+    consultas (``database.planejador``), o mesmo das rotas de análise.
+    """
+    from database.periodos import Periodo
+    from database.planejador import Consulta, executar_consulta
+
+    if agrupar not in (None, 'categoria', 'mes'):
+        raise ValueError(f"Agrupamento inválido: {agrupar}")
+    consulta = Consulta(
+        tabela,
+        Periodo('personalizado', data_inicio, data_fim),
+        dimensoes=(agrupar,) if agrupar else (),
+        tipo_perfil=tipo_perfil,
+        ordem={None: None, 'categoria': "total DESC", 'mes': "mes"}[agrupar]
+    )
+    linhas = executar_consulta(None, usuario_id, consulta, cursor)
+    return [(linha.get(agrupar), linha['total']) for linha in linhas]
+
+
+def resumo_financeiro(db_path, usuario_id, data_inicio=None, data_fim=None, tipo_perfil=None, cursor=None):
+    """Totais de despesas/receitas e despesas por categoria do período (com cache).
+
+    Retorna ``{'total_despesas', 'total_receitas', 'despesas_por_categoria'}``;
+    ``despesas_por_categoria`` é a lista de ``{'categoria', 'total'}``.
+    Se ``cursor`` for informado, um cálculo necessário usa essa conexão.
+    """
+    def calcular():
+        conn = None
+        cur = cursor
+        if cur is None:
+            conn = conectar(db_path)
+            cur = conn.cursor()
+        try:
+            categorias = consultar_totais(cur, 'despesas', usuario_id, data_inicio, data_fim,
+                                          tipo_perfil, agrupar='categoria')
+            receitas = consultar_totais(cur, 'receitas', usuario_id, data_inicio, data_fim, tipo_perfil)
+        finally:
+            if conn is not None:
+                conn.close()
+
+        return {
+            'total_despesas': sum(total for _, total in categorias),
+            'total_receitas': (receitas[0][1] or 0) if receitas else 0,
+            'despesas_por_categoria': [
+                {'categoria': categoria, 'total': total} for categoria, total in categorias
+            ]
+        }
+
+    periodo = f"{data_inicio or ''}:{data_fim or ''}"
+    return obter_cache().obter_ou_calcular(usuario_id, periodo, tipo_perfil, calcular)
+
+
+def main(argv=None):
+    from config import Config
+
+    argv = sys.argv[1:] if argv is None else argv
+    usuario_id = int(argv[0]) if argv else None
+
+    reconstruir_resumo(Config.DATABASE, usuario_id)
+    alvo = f"usuário {usuario_id}" if usuario_id is not None else "todos os usuários"
+    print(f"Resumo mensal reconstruído para {alvo}.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Séries temporais de despesas e receitas para os gráficos.
+
+``serie_temporal`` devolve, para um período, um índice denso de dias,
+semanas ou meses (sem buracos: períodos sem lançamento valem 0). Para cada
+posição vêm despesas, receitas, saldo (receitas - despesas) e o saldo
+acumulado, todos como arrays NumPy.
+
+Despesas e receitas saem de uma única consulta do planejador
+(``database.planejador``). Na frequência diária ou semanal, ela lê por dia
+o índice de cobertura das duas tabelas. Na mensal, os meses completos vêm
+do ``resumo_mensal`` e só os trechos parciais vêm das tabelas originais.
+As linhas são distribuídas no índice com ``np.add.at`` e o acumulado é um
+``np.cumsum``.
+"""
+import numpy as np
+
+from database.periodos import Periodo
+from database.planejador import Consulta, executar_consulta
+
+# frequência -> unidade do datetime64 das chaves vindas do banco
+FREQUENCIAS = {'dia': 'D', 'semana': 'D', 'mes': 'M'}
+
+TABELAS = ('despesas', 'receitas')
+
+
+# 1970-01-01 (dia 0 do datetime64) foi uma quinta-feira: os dias da semana
+# saem do número de dias desde então, módulo 7
+def dia_semana(datas):
+    """Dia da semana de datas datetime64[D] no padrão do strftime('%w') (0 = domingo)"""
+    return (datas.astype('datetime64[D]').astype(np.int64) + 4) % 7
+
+
+def _converter_chaves(chaves, unidade):
+    """Chaves de texto -> datetime64; datas malformadas viram NaT"""
+    try:
+        return np.array(chaves, dtype=f'datetime64[{unidade}]')
+    except ValueError:
+        convertidas = []
+        for chave in chaves:
+            try:
+                convertidas.append(np.datetime64(chave, unidade))
+            except ValueError:
+                convertidas.append(np.datetime64('NaT', unidade))
+        return np.array(convertidas, dtype=f'datetime64[{unidade}]')
+
+
+def indice_denso(data_inicio, data_fim, frequencia='dia'):
+    """Início de cada período (datetime64) entre as duas datas, inclusive"""
+    inicio = np.datetime64(data_inicio, 'D')
+    fim = np.datetime64(data_fim, 'D')
+    if frequencia == 'mes':
+        return np.arange(inicio.astype('datetime64[M]'), fim.astype('datetime64[M]') + 1)
+    if frequencia == 'semana':
+        # Semanas começando na segunda-feira; a primeira é cortada no início do período
+        segundas = np.arange(_segunda(inicio), fim + 1, 7)
+        return np.maximum(segundas, inicio)
+    return np.arange(inicio, fim + 1)
+
+
+def _segunda(data):
+    """Segunda-feira da semana de uma data datetime64[D]"""
+    return data - (data.astype(np.int64) + 3) % 7
+
+
+def serie_temporal(db_path, usuario_id, data_inicio, data_fim, tipo_perfil=None, frequencia='dia', cursor=None):
+    """Série densa de despesas/receitas do período.
+
+    Retorna ``{'periodos', 'despesas', 'receitas', 'saldo', 'acumulado'}``:
+    ``periodos`` é o array datetime64 com o início de cada dia/semana/mês e
+    os demais são arrays float do mesmo tamanho.
+    """
+    if frequencia not in FREQUENCIAS:
+        raise ValueError(f"Frequência inválida: {frequencia}")
+    if not data_inicio or not data_fim:
+        raise ValueError("A série temporal precisa de data inicial e final")
+
+    dimensao = 'mes' if frequencia == 'mes' else 'dia'
+    linhas = executar_consulta(db_path, usuario_id, Consulta(
+        TABELAS,
+        Periodo('personalizado', data_inicio, data_fim),
+        dimensoes=(dimensao,),
+        tipo_perfil=tipo_perfil
+    ), cursor)
+
+    periodos = indice_denso(data_inicio, data_fim, frequencia)
+    valores = np.zeros((len(periodos), 2))
+
+    if linhas:
+        chaves = [linha[dimensao] for linha in linhas]
+        despesas = [linha['total_despesas'] for linha in linhas]
+        receitas = [linha['total_receitas'] for linha in linhas]
+        datas = _converter_chaves(chaves, FREQUENCIAS[frequencia])
+        if frequencia == 'semana':
+            posicoes = (datas - _segunda(np.datetime64(data_inicio, 'D'))).astype(np.int64) // 7
+        else:
+            posicoes = (datas - periodos[0]).astype(np.int64)
+        validas = ~np.isnat(datas) & (posicoes >= 0) & (posicoes < len(periodos))
+        linhas_valores = np.column_stack([
+            np.asarray(despesas, dtype=float), np.asarray(receitas, dtype=float)
+        ])
+        np.add.at(valores, posicoes[validas], np.nan_to_num(linhas_valores[validas]))
+
+    saldo = valores[:, 1] - valores[:, 0]
+    return {
+        'periodos': periodos,
+        'despesas': valores[:, 0],
+        'receitas': valores[:, 1],
+        'saldo': saldo,
+        'acumulado': np.cumsum(saldo),
+    }
+
+
+def formatar_periodos(periodos, formato="%Y-%m-%d"):
+    """Rótulos de texto para os períodos (datetime64) de uma série"""
+    return [periodo.strftime(formato) for periodo in periodos.astype('datetime64[D]').astype(object)]
+
+
+def para_lista(array):
+    """Array float -> lista arredondada em centavos, pronta para o JSON"""
+    return np.round(array, 2).tolist()
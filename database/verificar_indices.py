@@ -0,0 +1,271 @@
+"""
+Verificação dos planos de consulta dos modelos.
+
+Cria um banco temporário, executa os métodos de leitura/escrita dos modelos
+registrando todo SQL emitido e roda ``EXPLAIN QUERY PLAN`` em cada consulta.
+Termina com código 1 se alguma delas fizer varredura completa de tabela.
+
+Uso:
+    python -m database.verificar_indices
+"""
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+from config import Config
+from database import conexao
+
+# "SCAN despesas" (ou "SCAN TABLE despesas" em versões antigas do SQLite),
+# sem "USING INDEX", indica leitura da tabela inteira
+SCAN_TABELA = re.compile(r'^SCAN (TABLE )?(\w+)( AS \w+)?$')
+COMANDOS_VERIFICADOS = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+
+
+def exercitar_modelos(db_path):
+    """Chama os métodos dos modelos com dados de exemplo"""
+    from database.models import (
+        init_db, Usuario, Despesa, Receita, Orcamento, PagamentoFixo, Membro,
+        CategoriaPersonalizada, Lembrete, MetaFinanceira, Divida, Notificacao
+    )
+    from database.dashboard import carregar_dashboard
+    from database.fila_webhook import FilaWebhook, RespostasWebhook
+    from database.cache_usuarios import aquecer_cache_usuarios, obter_cache_usuarios, sincronizar_revisoes
+    from database.importacao import ImportacaoExtrato
+    from database.exportacao import exportar_csv, iterar_lotes
+    from database.fila_exportacao import FilaExportacao
+    from database.previsao import prever
+    from database.series_temporais import serie_temporal
+    from database.periodos import resolver_periodo, PERIODOS
+    from database.planejador import Consulta, executar_consultas
+
+    init_db(db_path)
+    hoje = datetime.now()
+    inicio = (hoje - timedelta(days=30)).strftime("%Y-%m-%d")
+    fim = hoje.strftime("%Y-%m-%d")
+
+    usuario = Usuario(db_path)
+    usuario_id = usuario.criar('+5511900000000', 'Verificação', 'verificacao@despezap.com', 'senha')
+    usuario.buscar_por_celular('+5511900000000')
+    # Acerto no cache: não vai ao banco
+    usuario.buscar_por_celular('+5511900000000')
+    usuario.buscar_por_id(usuario_id)
+    usuario.buscar_por_email('verificacao@despezap.com')
+    usuario.atualizar(usuario_id, nome='Verificação 2')
+    # Gravações de outros workers: cadastros com revisão maior que a vista
+    cache = obter_cache_usuarios()
+    intervalo, cache.intervalo_revisao = cache.intervalo_revisao, 0
+    sincronizar_revisoes(db_path)
+    sincronizar_revisoes(db_path)
+    cache.intervalo_revisao = intervalo
+    usuario.registrar_acesso(usuario_id)
+    usuario.validar_credenciais('verificacao@despezap.com', 'senha')
+    usuario.criar_sessao(usuario_id)
+    usuario.definir_admin(usuario_id)
+    usuario.listar_admins()
+    usuario.eh_admin(usuario_id)
+    usuario.definir_renda(usuario_id, 5000)
+    usuario.obter_renda(usuario_id)
+
+    for modelo in (Despesa(db_path), Receita(db_path)):
+        registro_id = modelo.criar(usuario_id, 10.0, 'alimentação', 'Teste', fim)
+        modelo.buscar(usuario_id, inicio, fim)
+        modelo.buscar(usuario_id, inicio, fim, categoria='alimentação', limit=10)
+        modelo.buscar_por_id(registro_id)
+        modelo.total_por_categoria(usuario_id, inicio, fim, 'pessoal')
+        modelo.total_por_dia(usuario_id, inicio, fim, 'pessoal')
+        modelo.total_periodo(usuario_id, inicio, fim, 'pessoal')
+        modelo.total_por_mes(usuario_id, inicio, fim, 'pessoal')
+        modelo.atualizar(registro_id, valor=12.0)
+        modelo.excluir(registro_id)
+        modelo.criar(usuario_id, 10.0, 'alimentação', 'Teste', fim)
+        modelo.criar_em_lote([{'usuario_id': usuario_id, 'valor': 5.0, 'categoria': 'transporte', 'data': fim}])
+
+    # Mensagem da fila do webhook processada de novo: a despesa não é duplicada
+    despesa = Despesa(db_path)
+    despesa.criar(usuario_id, 10.0, 'alimentação', 'Teste', fim, webhook_mensagem_id=1)
+    despesa.criar_em_lote([{'usuario_id': usuario_id, 'valor': 5.0, 'webhook_mensagem_id': 1}])
+
+    aquecer_cache_usuarios(db_path)
+
+    orcamento = Orcamento(db_path)
+    orcamento_id = orcamento.criar(usuario_id, 'alimentação', 500)
+    orcamento.buscar(usuario_id, 'pessoal')
+    orcamento.calcular_gasto_atual(orcamento_id)
+    orcamento.criar(usuario_id, 'transporte', 200, periodicidade='semanal')
+    orcamento.criar(usuario_id, 'moradia', 2000, periodicidade='anual')
+
+    pagamento = PagamentoFixo(db_path)
+    pagamento_id = pagamento.criar(usuario_id, 'Aluguel', 1000, hoje.day)
+    pagamento.buscar(usuario_id, 'pessoal')
+    pagamento.buscar_vencimentos_proximos(usuario_id)
+    pagamento.atualizar(pagamento_id, valor=1100)
+    pagamento.gerar_lembretes(usuario_id)
+    pagamento.excluir(pagamento_id)
+
+    membro = Membro(db_path)
+    membro_id = membro.criar(usuario_id, 'Membro', 'membro@despezap.com', 'familia')
+    membro.buscar(usuario_id, 'familia')
+    membro.buscar_por_id(membro_id)
+    membro.buscar_por_email('membro@despezap.com', 'familia')
+    membro.atualizar(membro_id, nome='Membro 2')
+    membro.excluir(membro_id)
+
+    categoria = CategoriaPersonalizada(db_path)
+    categoria_id = categoria.criar(usuario_id, 'Pets', 'despesa')
+    categoria.buscar(usuario_id, 'despesa', 'pessoal')
+    categoria.buscar_por_id(categoria_id)
+    categoria.atualizar(categoria_id, cor='#000000')
+    categoria.excluir(categoria_id)
+
+    lembrete = Lembrete(db_path)
+    lembrete_id = lembrete.criar(usuario_id, 'Conta de luz', fim, notificacao=1)
+    lembrete.buscar(usuario_id, inicio, fim, 'pessoal', 0)
+    lembrete.buscar_por_id(lembrete_id)
+    lembrete.lembretes_vencidos_hoje(usuario_id)
+    lembrete.lembretes_vencidos_hoje()
+    lembrete.criar_notificacoes()
+    lembrete.marcar_como_concluido(lembrete_id)
+    lembrete.excluir(lembrete_id)
+
+    meta = MetaFinanceira(db_path)
+    meta_id = meta.criar(usuario_id, 'Viagem', 5000, fim)
+    meta.buscar(usuario_id, 'pessoal', 0)
+    meta.buscar_por_id(meta_id)
+    meta.adicionar_contribuicao(meta_id, 100)
+    meta.listar_contribuicoes(meta_id)
+    meta.excluir(meta_id)
+
+    divida = Divida(db_path)
+    divida_id = divida.criar(usuario_id, 'Cartão', 1000, inicio, fim)
+    divida.buscar(usuario_id, 'pessoal')
+    divida.buscar_por_id(divida_id)
+    divida.registrar_pagamento(divida_id, 100)
+    divida.listar_pagamentos(divida_id)
+    divida.excluir(divida_id)
+
+    notificacao = Notificacao(db_path, user_id=usuario_id, type='sistema', title='Teste')
+    notificacao.save()
+    Notificacao.get_by_id(notificacao.id, usuario_id)
+    Notificacao.get_for_user(usuario_id)
+    Notificacao.get_for_user(usuario_id, filter_type='sistema', is_read=0)
+    Notificacao.count_for_user(usuario_id, is_read=0)
+    Notificacao.mark_all_as_read(usuario_id)
+
+    carregar_dashboard(db_path, usuario_id)
+
+    fila = FilaWebhook(db_path)
+    mensagem_id = fila.enfileirar('whatsapp:+5500000000000', 'almoço 25', 'Teste', 'SM0001')
+    fila.enfileirar('whatsapp:+5500000000000', 'uber 15')
+    for mensagem in fila.reservar(4):
+        fila.registrar_resposta(mensagem['id'], 'ok')
+        fila.falhar(mensagem['id'], 'falha de envio')
+    fila.reservar(4)
+    fila.concluir(mensagem_id)
+    fila.limpar()
+    fila.estatisticas()
+
+    respostas = RespostasWebhook(db_path)
+    respostas.reservar('SM0001')
+    respostas.reservar('SM0001')
+    respostas.concluir('SM0001', 'ok')
+    respostas.aguardar_resposta('SM0001')
+    respostas.reservar('SM0002')
+    respostas.liberar('SM0002')
+    respostas.limpar()
+
+    extrato = os.path.join(os.path.dirname(db_path), 'extrato.csv')
+    with open(extrato, 'w', encoding='utf-8') as arquivo:
+        arquivo.write(f"Data;Descrição;Valor\n{hoje.strftime('%d/%m/%Y')};Uber;-15,00\n")
+    importacoes = ImportacaoExtrato(db_path)
+    importacao_id = importacoes.criar(usuario_id, extrato, 'csv', 'extrato.csv')
+    importacoes.executar(importacao_id)
+    importacoes.listar(usuario_id)
+
+    for tabela in ('despesas', 'receitas'):
+        list(exportar_csv(db_path, tabela, usuario_id) or ())
+        list(exportar_csv(db_path, tabela, usuario_id, inicio, fim) or ())
+    for tabela in ('dividas', 'metas_financeiras'):
+        list(iterar_lotes(db_path, tabela, usuario_id))
+
+    prever(db_path, usuario_id, 12, 3)
+    prever(db_path, usuario_id, 36, 6, 'pessoal')
+    for frequencia in ('dia', 'semana', 'mes'):
+        serie_temporal(db_path, usuario_id, inicio, fim, None, frequencia)
+        serie_temporal(db_path, usuario_id, f"{hoje.year - 1}-03-15", fim, 'empresarial', frequencia)
+
+    for nome in PERIODOS:
+        periodo = resolver_periodo(nome, inicio, fim)
+        executar_consultas(db_path, usuario_id, {
+            'categorias': Consulta('despesas', periodo, dimensoes=('categoria',), ordem="total DESC"),
+            'dias': Consulta('receitas', periodo, dimensoes=('dia',), medidas=('total', 'quantidade', 'maior')),
+            'horas': Consulta('despesas', periodo, dimensoes=('hora',), tipo_perfil='pessoal'),
+            'semana': Consulta(('despesas', 'receitas'), periodo, dimensoes=('dia_semana',)),
+            'meses': Consulta(('despesas', 'receitas'), periodo, dimensoes=('mes', 'categoria'), categoria='lazer'),
+            'linhas': Consulta('despesas', periodo, colunas=('*',), ordem="data DESC", limite=5),
+            'top': Consulta('despesas', periodo, colunas=('descricao', 'valor'), ordem="valor DESC", limite=5),
+        })
+
+    exportacoes = FilaExportacao(db_path, os.path.join(os.path.dirname(db_path), 'exportacoes'))
+    exportacao_id, _ = exportacoes.enfileirar(usuario_id, 'despesas', 'csv', inicio, fim)
+    exportacoes.enfileirar(usuario_id, 'despesas', 'csv', inicio, fim)
+    for exportacao in exportacoes.reservar(2):
+        exportacoes.gerar(exportacao)
+    exportacoes.falhar(exportacao_id, 'verificação')
+    exportacoes.buscar_por_id(exportacao_id)
+    exportacoes.listar(usuario_id)
+    exportacoes.expirar()
+    exportacoes.estatisticas()
+
+
+def verificar(db_path=None, saida=sys.stdout):
+    """Retorna a lista de (sql, detalhe) com varredura completa de tabela"""
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(), 'verificacao.db')
+
+    consultas = []
+    lock = threading.Lock()
+
+    def registrar(sql):
+        with lock:
+            consultas.append(sql)
+
+    database_original = Config.DATABASE
+    Config.DATABASE = db_path
+    conexao.definir_rastreador_sql(registrar)
+    try:
+        exercitar_modelos(db_path)
+    finally:
+        conexao.definir_rastreador_sql(None)
+        Config.DATABASE = database_original
+
+    conn = sqlite3.connect(db_path)
+    problemas = []
+    verificadas = set()
+
+    for sql in consultas:
+        sql = sql.strip()
+        if not sql.upper().startswith(COMANDOS_VERIFICADOS) or sql in verificadas:
+            continue
+        verificadas.add(sql)
+
+        for linha in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+            detalhe = linha[-1]
+            if SCAN_TABELA.match(detalhe):
+                problemas.append((sql, detalhe))
+
+    conn.close()
+
+    print(f"{len(verificadas)} consultas verificadas", file=saida)
+    for sql, detalhe in problemas:
+        consulta = ' '.join(sql.split())
+        print(f"  {detalhe}: {consulta}", file=saida)
+
+    return problemas
+
+
+if __name__ == '__main__':
+    sys.exit(1 if verificar() else 0)
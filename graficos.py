@@ -0,0 +1,314 @@
+"""
+Imagens dos gráficos (PNG/SVG) e o cache em disco das imagens renderizadas.
+
+Um gráfico é descrito por uma *especificação* — um dicionário só com dados
+serializáveis (tipo, título, rótulos, valores, cores). ``renderizar`` monta a
+figura do plotly a partir dela e gera a imagem (kaleido);
+``renderizar_svg_simples`` desenha uma versão simplificada em SVG sem
+dependências, usada quando o renderizador está ocupado ou indisponível.
+
+``CacheImagens`` guarda as imagens endereçadas pelo conteúdo: a chave é o
+SHA-256 da especificação (que já contém os totais agregados, o tipo e o
+período) e do formato. Quando os lançamentos do usuário no período mudam,
+os totais mudam e a chave também; a imagem antiga deixa de ser pedida e sai
+pelo LRU. A mesma chave serve de ETag, então um cliente que já tem a imagem
+recebe 304 sem renderização nem leitura de disco.
+
+O cache é limitado em bytes (``GRAFICOS_CACHE_MAX_BYTES``): cada acerto
+atualiza o mtime do arquivo e, quando o total passa do limite, os arquivos
+menos usados são apagados até sobrar ``GRAFICOS_CACHE_FRACAO_APOS_LIMPEZA``
+do limite. A pasta é compartilhada entre os workers do gunicorn; a gravação
+é atômica (arquivo temporário + ``os.replace``).
+"""
+import hashlib
+import html
+import json
+import math
+import os
+import tempfile
+import threading
+
+from config import Config
+
+# Mude quando o layout das figuras mudar: invalida todas as imagens em cache
+VERSAO_LAYOUT = 1
+
+FORMATOS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+CORES_CATEGORIAS = {
+    'alimentação': '#FFA726',
+    'transporte': '#42A5F5',
+    'moradia': '#66BB6A',
+    'saúde': '#EC407A',
+    'educação': '#AB47BC',
+    'lazer': '#26C6DA',
+    'vestuário': '#8D6E63',
+    'outros': '#78909C'
+}
+
+
+def spec_categorias(categorias, periodo_texto):
+    """Especificação do gráfico de rosca das despesas por categoria"""
+    rotulos = [item['categoria'] for item in categorias]
+    valores = [round(item['total'], 2) for item in categorias]
+    return {
+        'tipo': 'categoria',
+        'titulo': f"Despesas por categoria {periodo_texto}<br>Total: R$ {sum(valores):.2f}",
+        'rotulos': rotulos,
+        'valores': valores,
+        'cores': [CORES_CATEGORIAS.get(rotulo, '#78909C') for rotulo in rotulos],
+    }
+
+
+def spec_tempo(despesas_por_dia, periodo_texto):
+    """Especificação do gráfico de linha das despesas por dia"""
+    return {
+        'tipo': 'tempo',
+        'titulo': f"Despesas ao longo do tempo {periodo_texto}",
+        # '2024-05-10' -> '10/05'
+        'rotulos': [f"{item['data'][8:10]}/{item['data'][5:7]}" for item in despesas_por_dia],
+        'valores': [round(item['total'], 2) for item in despesas_por_dia],
+    }
+
+
+def chave_imagem(spec, formato):
+    """SHA-256 da especificação e do formato (também usado como ETag)"""
+    conteudo = json.dumps([VERSAO_LAYOUT, formato, spec], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+def montar_figura(spec):
+    """Figura do plotly para a especificação"""
+    import plotly.graph_objects as go
+
+    if spec['tipo'] == 'categoria':
+        fig = go.Figure(data=[go.Pie(
+            labels=spec['rotulos'],
+            values=spec['valores'],
+            hole=0.6,
+            textinfo='percent',
+            marker_colors=spec['cores']
+        )])
+        fig.update_layout(
+            title_text=spec['titulo'],
+            font=dict(size=14),
+            width=800,
+            height=600,
+            showlegend=True
+        )
+    else:
+        fig = go.Figure(data=[go.Scatter(
+            x=spec['rotulos'],
+            y=spec['valores'],
+            mode='lines+markers',
+            line=dict(color='#28a745', width=3),
+            marker=dict(color='#28a745', size=8)
+        )])
+        fig.update_layout(
+            title_text=spec['titulo'],
+            font=dict(size=14),
+            width=800,
+            height=600,
+            xaxis=dict(title='Data'),
+            yaxis=dict(title='Valor (R$)')
+        )
+    return fig
+
+
+def renderizar(spec, formato='png'):
+    """Bytes da imagem (requer plotly e kaleido)"""
+    import plotly.io as pio
+    return pio.to_image(montar_figura(spec), format=formato)
+
+
+def _escapar(texto):
+    return html.escape(str(texto), quote=True)
+
+
+def renderizar_svg_simples(spec, largura=800, altura=600):
+    """SVG gerado em Python puro, sem plotly: reserva para quando o renderizador está ocupado"""
+    linhas_titulo = spec['titulo'].split('<br>')
+    partes = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{largura}" height="{altura}" '
+        f'viewBox="0 0 {largura} {altura}" font-family="sans-serif">',
+        f'<rect width="{largura}" height="{altura}" fill="#ffffff"/>',
+    ]
+    for i, linha in enumerate(linhas_titulo):
+        partes.append(f'<text x="{largura / 2}" y="{36 + i * 22}" text-anchor="middle" '
+                      f'font-size="{18 if i == 0 else 14}">{_escapar(linha)}</text>')
+
+    valores = spec['valores']
+    rotulos = spec['rotulos']
+    total = sum(valor for valor in valores if valor > 0)
+
+    if spec['tipo'] == 'categoria':
+        # Rosca: um arco por categoria e a legenda à direita
+        cx, cy, raio, furo = largura * 0.38, altura * 0.55, min(largura, altura) * 0.33, 0.6
+        angulo = -math.pi / 2
+        for i, (rotulo, valor, cor) in enumerate(zip(rotulos, valores, spec['cores'])):
+            fracao = valor / total if total and valor > 0 else 0
+            if fracao >= 0.9999:
+                partes.append(f'<circle cx="{cx:.1f}" cy="{cy:.1f}" r="{raio * (1 + furo) / 2:.1f}" fill="none" '
+                              f'stroke="{cor}" stroke-width="{raio * (1 - furo):.1f}"/>')
+            elif fracao > 0:
+                fim = angulo + fracao * 2 * math.pi
+                grande = 1 if fracao > 0.5 else 0
+                pontos = [
+                    (cx + raio * math.cos(angulo), cy + raio * math.sin(angulo)),
+                    (cx + raio * math.cos(fim), cy + raio * math.sin(fim)),
+                    (cx + raio * furo * math.cos(fim), cy + raio * furo * math.sin(fim)),
+                    (cx + raio * furo * math.cos(angulo), cy + raio * furo * math.sin(angulo)),
+                ]
+                partes.append(
+                    f'<path fill="{cor}" d="M {pontos[0][0]:.1f} {pontos[0][1]:.1f} '
+                    f'A {raio:.1f} {raio:.1f} 0 {grande} 1 {pontos[1][0]:.1f} {pontos[1][1]:.1f} '
+                    f'L {pontos[2][0]:.1f} {pontos[2][1]:.1f} '
+                    f'A {raio * furo:.1f} {raio * furo:.1f} 0 {grande} 0 {pontos[3][0]:.1f} {pontos[3][1]:.1f} Z"/>'
+                )
+                angulo = fim
+            y = 110 + i * 26
+            partes.append(f'<rect x="{largura * 0.75:.0f}" y="{y - 12}" width="14" height="14" fill="{cor}"/>')
+            partes.append(f'<text x="{largura * 0.75 + 22:.0f}" y="{y}" font-size="14">'
+                          f'{_escapar(rotulo)} ({fracao * 100:.0f}%)</text>')
+    elif valores:
+        # Linha: eixo y de 0 ao maior valor
+        esquerda, direita, topo, base = 80, largura - 40, 100, altura - 70
+        maximo = max(max(valores), 0) or 1
+        passo = (direita - esquerda) / max(len(valores) - 1, 1)
+        pontos = [(esquerda + i * passo, base - (max(valor, 0) / maximo) * (base - topo))
+                  for i, valor in enumerate(valores)]
+        partes.append(f'<line x1="{esquerda}" y1="{base}" x2="{direita}" y2="{base}" stroke="#999"/>')
+        partes.append(f'<line x1="{esquerda}" y1="{topo}" x2="{esquerda}" y2="{base}" stroke="#999"/>')
+        partes.append(f'<text x="{esquerda - 8}" y="{topo + 5}" text-anchor="end" font-size="12">'
+                      f'R$ {maximo:.2f}</text>')
+        partes.append('<polyline fill="none" stroke="#28a745" stroke-width="3" points="'
+                      + ' '.join(f'{x:.1f},{y:.1f}' for x, y in pontos) + '"/>')
+        # No máximo ~12 rótulos no eixo x
+        intervalo = max(1, math.ceil(len(rotulos) / 12))
+        for i, ((x, y), rotulo) in enumerate(zip(pontos, rotulos)):
+            partes.append(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="4" fill="#28a745"/>')
+            if i % intervalo == 0:
+                partes.append(f'<text x="{x:.1f}" y="{base + 20}" text-anchor="middle" font-size="12">'
+                              f'{_escapar(rotulo)}</text>')
+
+    partes.append('</svg>')
+    return '\n'.join(partes).encode('utf-8')
+
+
+class CacheImagens:
+    """Imagens renderizadas em disco, por chave de conteúdo, com LRU por tamanho"""
+
+    def __init__(self, pasta, max_bytes, fracao_apos_limpeza=0.8):
+        self.pasta = pasta
+        self.max_bytes = max_bytes
+        self.fracao_apos_limpeza = fracao_apos_limpeza
+        self._lock = threading.Lock()
+        self._tamanho = None  # estimativa do processo; recalculada a cada limpeza
+
+        # Métricas
+        self.acertos = 0
+        self.falhas = 0
+        self.removidos_lru = 0
+
+    def caminho(self, chave, formato):
+        return os.path.join(self.pasta, f"{chave}.{formato}")
+
+    def obter(self, chave, formato):
+        """Caminho da imagem em cache (marcada como usada agora) ou None"""
+        caminho = self.caminho(chave, formato)
+        try:
+            os.utime(caminho)
+        except OSError:
+            self.falhas += 1
+            return None
+        self.acertos += 1
+        return caminho
+
+    def gravar(self, chave, formato, imagem):
+        """Grava a imagem e retorna o caminho; limpa o cache se passar do limite"""
+        os.makedirs(self.pasta, exist_ok=True)
+        caminho = self.caminho(chave, formato)
+        descritor, temporario = tempfile.mkstemp(dir=self.pasta, suffix='.tmp')
+        try:
+            with os.fdopen(descritor, 'wb') as arquivo:
+                arquivo.write(imagem)
+            os.replace(temporario, caminho)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+        with self._lock:
+            if self._tamanho is None:
+                self._tamanho = self._medir()
+            else:
+                self._tamanho += len(imagem)
+            if self._tamanho > self.max_bytes:
+                self._limpar()
+        return caminho
+
+    def _arquivos(self):
+        """(mtime, tamanho, caminho) das imagens da pasta"""
+        arquivos = []
+        try:
+            entradas = os.scandir(self.pasta)
+        except FileNotFoundError:
+            return arquivos
+        with entradas:
+            for entrada in entradas:
+                if entrada.name.endswith('.tmp'):
+                    continue
+                try:
+                    info = entrada.stat()
+                except FileNotFoundError:
+                    continue  # apagado por outro worker
+                arquivos.append((info.st_mtime, info.st_size, entrada.path))
+        return arquivos
+
+    def _medir(self):
+        return sum(tamanho for _, tamanho, _ in self._arquivos())
+
+    def _limpar(self):
+        arquivos = sorted(self._arquivos())
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        alvo = self.max_bytes * self.fracao_apos_limpeza
+        for _, tamanho, caminho in arquivos:
+            if total <= alvo:
+                break
+            try:
+                os.remove(caminho)
+                self.removidos_lru += 1
+            except FileNotFoundError:
+                pass
+            total -= tamanho
+        self._tamanho = total
+
+    def estatisticas(self):
+        return {
+            'acertos': self.acertos,
+            'falhas': self.falhas,
+            'removidos_lru': self.removidos_lru,
+            'bytes_estimados': self._tamanho,
+            'max_bytes': self.max_bytes
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def obter_cache_imagens():
+    """Retorna o cache de imagens do processo (criado conforme o Config)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CacheImagens(
+                    Config.GRAFICOS_CACHE_PASTA,
+                    Config.GRAFICOS_CACHE_MAX_BYTES,
+                    Config.GRAFICOS_CACHE_FRACAO_APOS_LIMPEZA
+                )
+    return _cache
@@ -0,0 +1,268 @@
+"""
+Logs estruturados (JSON por linha), assíncronos e com dados pessoais mascarados.
+
+Uso nas rotas::
+
+    from log_estruturado import obter_logger
+    log = obter_logger('webhook')
+
+    log.info('mensagem_recebida', remetente=remetente, mensagem=mensagem)
+    log.excecao('erro_processamento', message_sid=message_sid)
+
+* Cada chamada vira um ``LogRecord`` com os campos em ``record.campos``. O
+  ``QueueHandler`` só coloca o registro numa fila em memória; a formatação,
+  o mascaramento e a escrita em stderr acontecem na thread do
+  ``QueueListener``. A fila é limitada: se encher, o registro é descartado
+  (e contado) em vez de bloquear a requisição.
+* Amostragem por rota (``LOG_AMOSTRAGEM``, ex.: ``webhook:0.05,api:1``):
+  vale para DEBUG/INFO; avisos e erros são sempre registrados.
+* Mascaramento (``LOG_MASCARAR``): números de telefone ficam só com os
+  últimos 4 dígitos e campos de conteúdo (``mensagem``, ``resposta``...)
+  viram apenas o tamanho.
+
+O listener é iniciado na primeira chamada de cada processo (cada worker do
+gunicorn tem o seu).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from datetime import datetime
+
+from config import Config
+
+NOME_RAIZ = 'despezap'
+
+# Campos cujo conteúdo nunca vai para o log, só o tamanho
+CAMPOS_CONTEUDO = frozenset({'mensagem', 'body', 'texto', 'resposta', 'descricao', 'form', 'senha', 'token'})
+
+# whatsapp:+5511999998888, +55 11 99999-8888, (11) 3333-4444, 11999998888...
+# Formato de telefone (DDI opcional, DDD, 8 ou 9 dígitos, separadores só entre
+# os blocos): datas e horários ("2026-10-18 11:57:00") não casam
+PADRAO_TELEFONE = re.compile(
+    r'(?<![\w:/.-])(?:whatsapp:)?(?:\+?\d{2,3}[\s.-]?)?(?:\(\d{2}\)|\d{2})[\s.-]?'
+    r'9?\d{4}[\s.-]?\d{4}(?![\w:/-])'
+)
+
+# (texto, mascarado): conferidos por ``python -m log_estruturado``
+CASOS_MASCARAMENTO = (
+    ('whatsapp:+5511999998888', '***8888'),
+    ('remetente +55 11 99999-8888 enviou', 'remetente ***8888 enviou'),
+    ('+55 (11) 99999-8888', '***8888'),
+    ('(11) 3333-4444', '***4444'),
+    ('11999998888', '***8888'),
+    ('5511999998888', '***8888'),
+    ('2026-10-18 11:57:00', '2026-10-18 11:57:00'),
+    ('2026-10-18T11:57:00.123', '2026-10-18T11:57:00.123'),
+    ('18/10/2026 11:57', '18/10/2026 11:57'),
+    ('valor 1234.56 em 2026-10-18', 'valor 1234.56 em 2026-10-18'),
+    ('despesa_id=123456789', 'despesa_id=123456789'),
+)
+
+
+def mascarar_telefone(texto):
+    """Troca os números de telefone do texto por ``***`` + últimos 4 dígitos"""
+    def substituir(encontrado):
+        digitos = re.sub(r'\D', '', encontrado.group(0))
+        if len(digitos) < 10:
+            return encontrado.group(0)
+        return f"***{digitos[-4:]}"
+    return PADRAO_TELEFONE.sub(substituir, texto)
+
+
+def mascarar_campo(nome, valor):
+    if valor is None or isinstance(valor, (bool, int, float)):
+        return valor
+    if nome.lower() in CAMPOS_CONTEUDO:
+        return f"<{len(str(valor))} caracteres>"
+    return mascarar_telefone(str(valor))
+
+
+class FormatadorJSON(logging.Formatter):
+    """Uma linha JSON por registro, com os campos estruturados"""
+
+    def __init__(self, mascarar=True):
+        super().__init__()
+        self.mascarar = mascarar
+
+    def format(self, record):
+        campos = getattr(record, 'campos', None) or {}
+        mensagem = record.getMessage()
+        if self.mascarar:
+            mensagem = mascarar_telefone(mensagem)
+            campos = {nome: mascarar_campo(nome, valor) for nome, valor in campos.items()}
+
+        linha = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'evento': mensagem,
+            'pid': record.process,
+        }
+        linha.update(campos)
+        if record.exc_info:
+            excecao = self.formatException(record.exc_info)
+            linha['excecao'] = mascarar_telefone(excecao) if self.mascarar else excecao
+        return json.dumps(linha, ensure_ascii=False, default=str)
+
+
+class FiltroAmostragem(logging.Filter):
+    """Deixa passar só uma fração dos registros DEBUG/INFO de cada rota"""
+
+    def __init__(self, taxas):
+        super().__init__()
+        self.taxas = taxas
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        taxa = self.taxas.get(record.name.rsplit('.', 1)[-1], 1.0)
+        return taxa >= 1.0 or random.random() < taxa
+
+
+class HandlerFila(logging.handlers.QueueHandler):
+    """QueueHandler que nunca bloqueia: com a fila cheia o registro é descartado"""
+
+    def __init__(self, fila):
+        super().__init__(fila)
+        self.descartados = 0
+
+    def prepare(self, record):
+        # O listener está no mesmo processo: a formatação (e o traceback) fica
+        # para a thread dele; aqui só se resolve a mensagem
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+def carregar_taxas(texto):
+    """``"webhook:0.05,api:1"`` -> ``{'webhook': 0.05, 'api': 1.0}``"""
+    taxas = {}
+    for item in (texto or '').split(','):
+        if ':' in item:
+            rota, taxa = item.split(':', 1)
+            try:
+                taxas[rota.strip()] = max(0.0, min(1.0, float(taxa)))
+            except ValueError:
+                print(f"Taxa de amostragem de log inválida: {item}")
+    return taxas
+
+
+class LoggerEstruturado:
+    """Fachada sobre ``logging.Logger``: ``log.info('evento', campo=valor)``"""
+
+    __slots__ = ('logger',)
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    def _registrar(self, nivel, evento, campos, exc_info=None):
+        _iniciar()
+        if self.logger.isEnabledFor(nivel):
+            self.logger.log(nivel, evento, exc_info=exc_info, extra={'campos': campos})
+
+    def debug(self, evento, **campos):
+        self._registrar(logging.DEBUG, evento, campos)
+
+    def info(self, evento, **campos):
+        self._registrar(logging.INFO, evento, campos)
+
+    def aviso(self, evento, **campos):
+        self._registrar(logging.WARNING, evento, campos)
+
+    def erro(self, evento, **campos):
+        self._registrar(logging.ERROR, evento, campos)
+
+    def excecao(self, evento, **campos):
+        """Registra um erro com o traceback da exceção em tratamento"""
+        self._registrar(logging.ERROR, evento, campos, exc_info=True)
+
+
+_handler = None
+_listener = None
+_pid = None
+_lock = threading.Lock()
+
+
+def _iniciar():
+    """Configura o logger raiz e inicia o listener neste processo (uma vez)"""
+    global _handler, _listener, _pid
+    if _pid == os.getpid():
+        return
+    with _lock:
+        if _pid == os.getpid():
+            return
+
+        raiz = logging.getLogger(NOME_RAIZ)
+        raiz.setLevel(getattr(logging, Config.LOG_NIVEL.upper(), logging.INFO))
+        raiz.propagate = False
+        if _handler is not None:
+            # Processo filho (fork): a thread do listener não veio junto
+            raiz.removeHandler(_handler)
+
+        saida = logging.StreamHandler(sys.stderr)
+        saida.setFormatter(FormatadorJSON(mascarar=Config.LOG_MASCARAR))
+
+        _handler = HandlerFila(queue.Queue(maxsize=Config.LOG_FILA_MAXIMA))
+        _handler.addFilter(FiltroAmostragem(carregar_taxas(Config.LOG_AMOSTRAGEM)))
+        raiz.addHandler(_handler)
+
+        _listener = logging.handlers.QueueListener(_handler.queue, saida, respect_handler_level=True)
+        _listener.start()
+        _pid = os.getpid()
+
+
+def parar_logs():
+    """Esvazia a fila e encerra o listener (chamado na saída do processo)"""
+    global _pid
+    with _lock:
+        if _listener is not None and _pid == os.getpid():
+            _listener.stop()
+            _pid = None
+
+
+atexit.register(parar_logs)
+
+
+def obter_logger(rota):
+    """Logger estruturado da rota (``'webhook'``, ``'api'``, ``'web'``...)"""
+    return LoggerEstruturado(logging.getLogger(f"{NOME_RAIZ}.{rota}"))
+
+
+def estatisticas_logs():
+    """Tamanho da fila e registros descartados no processo atual"""
+    if _handler is None:
+        return {'iniciado': False}
+    return {
+        'iniciado': _pid == os.getpid(),
+        'fila': _handler.queue.qsize(),
+        'fila_maxima': _handler.queue.maxsize,
+        'descartados': _handler.descartados
+    }
+
+
+def conferir_mascaramento():
+    """Casos de ``CASOS_MASCARAMENTO`` em que o mascaramento diverge: [(texto, esperado, obtido)]"""
+    return [(texto, esperado, mascarar_telefone(texto))
+            for texto, esperado in CASOS_MASCARAMENTO
+            if mascarar_telefone(texto) != esperado]
+
+
+if __name__ == '__main__':
+    divergencias = conferir_mascaramento()
+    print(f"Mascaramento de telefones: {len(CASOS_MASCARAMENTO)} casos, {len(divergencias)} divergências")
+    for texto, esperado, obtido in divergencias:
+        print(f"  {texto!r}: esperado {esperado!r}, obtido {obtido!r}")
+    sys.exit(1 if divergencias else 0)
@@ -1,19 +1,44 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, Response
 from datetime import datetime, timedelta
-from database.models import Usuario, Despesa, Receita, Divida, Orcamento, PagamentoFixo, Membro, CategoriaPersonalizada, Lembrete, TextProcessor, MetaFinanceira
+from database.models import Usuario, Despesa, Receita, Divida, Orcamento, PagamentoFixo, Membro, CategoriaPersonalizada, Lembrete, processador_texto, MetaFinanceira
+from database.conexao import conectar, estatisticas_pool
+from database.escrita import estatisticas_escrita
+from database.resumos import resumo_financeiro
+from database.previsao import prever
+from database.periodos import resolver_periodo
+from database.planejador import Consulta, executar_consulta, executar_consultas, estatisticas_consultas
+from database.series_temporais import FREQUENCIAS, serie_temporal, formatar_periodos, dia_semana, para_lista
+from database.cache import estatisticas_cache
+from database.cache_usuarios import estatisticas_cache_usuarios
+from database.exportacao import (
+    exportar_csv, exportar_xlsx, ENTIDADES as ENTIDADES_EXPORTACAO, MIMETYPE_XLSX
+)
+from database.fila_exportacao import (
+    FilaExportacao, ProcessadorExportacoes, MIMETYPES as MIMETYPES_EXPORTACAO
+)
+from database.importacao import (
+    ImportacaoExtrato, ProcessadorImportacoes, FORMATOS as FORMATOS_IMPORTACAO, detectar_formato,
+    salvar_arquivo as salvar_arquivo_importacao
+)
 from config import Config
+from graficos import (
+    FORMATOS as FORMATOS_GRAFICO, chave_imagem, obter_cache_imagens, spec_categorias, spec_tempo
+)
+from log_estruturado import obter_logger
+from servico_graficos import renderizar_grafico, obter_servico_graficos
 import pandas as pd
+import numpy as np
 import json
 import io
 import os
 import tempfile
 from werkzeug.utils import secure_filename
-import sqlite3
+import threading
 from functools import wraps
-import traceback
 
 # Criação do blueprint
 api_bp = Blueprint('api', __name__)
+log = obter_logger('api')
 
 # Middleware para verificar API
 def api_login_required(f):
@@ -26,6 +51,19 @@ def api_login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Período da requisição: ?periodo=dia|semana|mes|ano|tudo|personalizado (+ data_inicio/data_fim)
+def _periodo_requisicao(ausente='mes', padrao='tudo', nomes=None, parametro='periodo', parametros=None):
+    """``ausente``: período sem o parâmetro; ``padrao``: período de nomes desconhecidos ou fora de ``nomes``"""
+    if parametros is None:
+        parametros = request.args
+    return resolver_periodo(
+        parametros.get(parametro, ausente),
+        parametros.get('data_inicio'),
+        parametros.get('data_fim'),
+        padrao,
+        nomes
+    )
+
 # Rota para obter despesas
 @api_bp.route('/despesas')
 @api_login_required
@@ -34,38 +72,13 @@ def get_despesas():
     usuario_id = session.get('usuario_id')
     
     # Parâmetros de filtro
-    periodo = request.args.get('periodo', 'mes')
+    periodo = _periodo_requisicao()
     categoria = request.args.get('categoria')
     
-    # Define o período
-    hoje = datetime.now()
-    
-    if periodo == 'dia':
-        data_inicio = hoje.strftime("%Y-%m-%d")
-    elif periodo == 'semana':
-        data_inicio = (hoje - timedelta(days=7)).strftime("%Y-%m-%d")
-    elif periodo == 'mes':
-        data_inicio = f"{hoje.year}-{hoje.month:02d}-01"
-    elif periodo == 'ano':
-        data_inicio = f"{hoje.year}-01-01"
-    elif periodo == 'personalizado':
-        data_inicio = request.args.get('data_inicio')
-        data_fim = request.args.get('data_fim')
-    else:
-        data_inicio = None
-    
-    # Se não for período personalizado, data_fim é hoje
-    if periodo != 'personalizado':
-        data_fim = hoje.strftime("%Y-%m-%d")
-    
-    # Busca as despesas
-    despesa_model = Despesa(Config.DATABASE)
-    despesas = despesa_model.buscar(
-        usuario_id, 
-        data_inicio=data_inicio, 
-        data_fim=data_fim,
-        categoria=categoria
-    )
+    # Busca as despesas, mais recentes primeiro
+    despesas = executar_consulta(Config.DATABASE, usuario_id, Consulta(
+        'despesas', periodo, categoria=categoria, colunas=('*',), ordem="data DESC"
+    ))
     
     return jsonify(despesas)
 
@@ -211,7 +224,7 @@ def debug_usuario():
 def debug_tabelas():
     """Debug: Verifica se as tabelas existem no banco"""
     try:
-        conn = sqlite3.connect(Config.DATABASE)
+        conn = conectar(Config.DATABASE)
         cursor = conn.cursor()
         
         # Lista todas as tabelas
@@ -239,7 +252,32 @@ def debug_tabelas():
         
     except Exception as e:
         return jsonify({"error": str(e), "status": "ERROR"}), 500
-    
+
+@api_bp.route('/debug/pool')
+@api_login_required
+def debug_pool():
+    """Debug: Métricas do pool de conexões e da fila de escrita do worker atual"""
+    return jsonify({
+        "pid": os.getpid(),
+        "pools": estatisticas_pool(),
+        "filas_escrita": estatisticas_escrita(),
+        "status": "OK"
+    })
+
+@api_bp.route('/debug/cache')
+@api_login_required
+def debug_cache():
+    """Debug: Acertos/falhas dos caches e consultas analíticas por fonte do worker atual"""
+    return jsonify({
+        "pid": os.getpid(),
+        "cache_resumo": estatisticas_cache(),
+        "cache_usuarios": estatisticas_cache_usuarios(),
+        "cache_graficos": obter_cache_imagens().estatisticas(),
+        "renderizacao_graficos": obter_servico_graficos().estatisticas(),
+        "consultas": estatisticas_consultas(),
+        "status": "OK"
+    })
+
 # Rota para obter receitas
 @api_bp.route('/receitas')
 @api_login_required
@@ -248,38 +286,13 @@ def get_receitas():
     usuario_id = session.get('usuario_id')
     
     # Parâmetros de filtro
-    periodo = request.args.get('periodo', 'mes')
+    periodo = _periodo_requisicao()
     categoria = request.args.get('categoria')
     
-    # Define o período
-    hoje = datetime.now()
-    
-    if periodo == 'dia':
-        data_inicio = hoje.strftime("%Y-%m-%d")
-    elif periodo == 'semana':
-        data_inicio = (hoje - timedelta(days=7)).strftime("%Y-%m-%d")
-    elif periodo == 'mes':
-        data_inicio = f"{hoje.year}-{hoje.month:02d}-01"
-    elif periodo == 'ano':
-        data_inicio = f"{hoje.year}-01-01"
-    elif periodo == 'personalizado':
-        data_inicio = request.args.get('data_inicio')
-        data_fim = request.args.get('data_fim')
-    else:
-        data_inicio = None
-    
-    # Se não for período personalizado, data_fim é hoje
-    if periodo != 'personalizado':
-        data_fim = hoje.strftime("%Y-%m-%d")
-    
-    # Busca as receitas
-    receita_model = Receita(Config.DATABASE)
-    receitas = receita_model.buscar(
-        usuario_id, 
-        data_inicio=data_inicio, 
-        data_fim=data_fim,
-        categoria=categoria
-    )
+    # Busca as receitas, mais recentes primeiro
+    receitas = executar_consulta(Config.DATABASE, usuario_id, Consulta(
+        'receitas', periodo, categoria=categoria, colunas=('*',), ordem="data DESC"
+    ))
     
     return jsonify(receitas)
 
@@ -469,9 +482,7 @@ def upload_audio():
         resultado_texto = "Compra no supermercado 157 reais"
         
         # Processa o texto para extrair informações da despesa
-        from database.models import TextProcessor
-        processador = TextProcessor()
-        dados_despesa = processador.extrair_informacoes_despesa(resultado_texto)
+        dados_despesa = processador_texto.extrair_informacoes_despesa(resultado_texto)
         
         return jsonify({
             "success": True, 
@@ -491,36 +502,12 @@ def get_grafico_por_categoria():
     usuario_id = session.get('usuario_id')
     
     # Parâmetros de filtro
-    periodo = request.args.get('periodo', 'mes')
-    
-    # Define o período
-    hoje = datetime.now()
+    periodo = _periodo_requisicao()
     
-    if periodo == 'dia':
-        data_inicio = hoje.strftime("%Y-%m-%d")
-    elif periodo == 'semana':
-        data_inicio = (hoje - timedelta(days=7)).strftime("%Y-%m-%d")
-    elif periodo == 'mes':
-        data_inicio = f"{hoje.year}-{hoje.month:02d}-01"
-    elif periodo == 'ano':
-        data_inicio = f"{hoje.year}-01-01"
-    elif periodo == 'personalizado':
-        data_inicio = request.args.get('data_inicio')
-        data_fim = request.args.get('data_fim')
-    else:
-        data_inicio = None
-    
-    # Se não for período personalizado, data_fim é hoje
-    if periodo != 'personalizado':
-        data_fim = hoje.strftime("%Y-%m-%d")
-    
-    # Busca as despesas por categoria
-    despesa_model = Despesa(Config.DATABASE)
-    categorias = despesa_model.total_por_categoria(
-        usuario_id, 
-        data_inicio=data_inicio, 
-        data_fim=data_fim
-    )
+    # Busca as despesas por categoria (meses completos saem do resumo mensal)
+    categorias = executar_consulta(Config.DATABASE, usuario_id, Consulta(
+        'despesas', periodo, dimensoes=('categoria',), ordem="total DESC"
+    ))
     
     if not categorias:
         # Dados de exemplo para quando não há despesas
@@ -590,36 +577,16 @@ def get_grafico_por_tempo():
     usuario_id = session.get('usuario_id')
     
     # Parâmetros de filtro
-    periodo = request.args.get('periodo', 'mes')
-    
-    # Define o período
+    periodo = _periodo_requisicao()
     hoje = datetime.now()
     
-    if periodo == 'dia':
-        data_inicio = hoje.strftime("%Y-%m-%d")
-    elif periodo == 'semana':
-        data_inicio = (hoje - timedelta(days=7)).strftime("%Y-%m-%d")
-    elif periodo == 'mes':
-        data_inicio = f"{hoje.year}-{hoje.month:02d}-01"
-    elif periodo == 'ano':
-        data_inicio = f"{hoje.year}-01-01"
-    elif periodo == 'personalizado':
-        data_inicio = request.args.get('data_inicio')
-        data_fim = request.args.get('data_fim')
-    else:
-        data_inicio = None
-    
-    # Se não for período personalizado, data_fim é hoje
-    if periodo != 'personalizado':
-        data_fim = hoje.strftime("%Y-%m-%d")
-    
-    # Busca as despesas por dia
-    despesa_model = Despesa(Config.DATABASE)
-    despesas_por_dia = despesa_model.total_por_dia(
-        usuario_id, 
-        data_inicio=data_inicio, 
-        data_fim=data_fim
-    )
+    # Busca as despesas por dia (somente o índice de cobertura)
+    despesas_por_dia = [
+        {'data': linha['dia'], 'total': linha['total']}
+        for linha in executar_consulta(Config.DATABASE, usuario_id, Consulta(
+            'despesas', periodo, dimensoes=('dia',), ordem="dia"
+        ))
+    ]
     
     if not despesas_por_dia:
         # Dados de exemplo para quando não há despesas
@@ -655,79 +622,30 @@ def get_grafico_por_tempo():
     
     return jsonify({'data': dados_grafico, 'layout': layout_grafico})
 
+# Período das exportações: ?periodo=dia|semana|mes|ano ou ?data_inicio=&data_fim=
+def _periodo_exportacao(parametros=None):
+    periodo = _periodo_requisicao(ausente=None, padrao=None, nomes=('dia', 'semana', 'mes', 'ano'),
+                                  parametros=parametros)
+    return periodo.data_inicio, periodo.data_fim
+
 # Rota para exportar despesas em CSV
 @api_bp.route('/exportar/despesas')
 @api_login_required
 def exportar_despesas():
     """API para exportar despesas em CSV"""
-    from flask import send_file
-    
     usuario_id = session.get('usuario_id')
+    data_inicio, data_fim = _periodo_exportacao()
     
-    # Parâmetros de filtro
-    periodo = request.args.get('periodo')
-    data_inicio = request.args.get('data_inicio')
-    data_fim = request.args.get('data_fim')
-    
-    # Define o período se não fornecido explicitamente
-    hoje = datetime.now()
-    
-    if periodo == 'dia':
-        data_inicio = hoje.strftime("%Y-%m-%d")
-        data_fim = hoje.strftime("%Y-%m-%d")
-    elif periodo == 'semana':
-        data_inicio = (hoje - timedelta(days=7)).strftime("%Y-%m-%d")
-        data_fim = hoje.strftime("%Y-%m-%d")
-    elif periodo == 'mes':
-        data_inicio = f"{hoje.year}-{hoje.month:02d}-01"
-        data_fim = hoje.strftime("%Y-%m-%d")
-    elif periodo == 'ano':
-        data_inicio = f"{hoje.year}-01-01"
-        data_fim = hoje.strftime("%Y-%m-%d")
-    
-    # Busca as despesas
-    despesa_model = Despesa(Config.DATABASE)
-    despesas = despesa_model.buscar(
-        usuario_id, 
-        data_inicio=data_inicio, 
-        data_fim=data_fim
-    )
+    # Gera o CSV em blocos a partir do cursor, sem carregar tudo na memória
+    blocos = exportar_csv(Config.DATABASE, 'despesas', usuario_id, data_inicio, data_fim)
     
-    if not despesas:
+    if blocos is None:
         return jsonify({"error": "Não há despesas para exportar"}), 404
     
-    # Converte para DataFrame
-    df = pd.DataFrame(despesas)
-    
-    # Reformata colunas para melhor legibilidade
-    df['data'] = pd.to_datetime(df['data']).dt.strftime('%d/%m/%Y')
-    df['data_criacao'] = pd.to_datetime(df['data_criacao']).dt.strftime('%d/%m/%Y %H:%M:%S')
-    
-    # Traduz nomes das colunas
-    colunas = {
-        'id': 'ID',
-        'usuario_id': 'ID do Usuário',
-        'valor': 'Valor',
-        'categoria': 'Categoria',
-        'descricao': 'Descrição',
-        'data': 'Data',
-        'forma_pagamento': 'Forma de Pagamento',
-        'parcelado': 'Parcelado',
-        'num_parcelas': 'Número de Parcelas',
-        'data_criacao': 'Data de Criação',
-        'mensagem_original': 'Mensagem Original'
-    }
-    df = df.rename(columns=colunas)
-    
-    # Cria o CSV em memória
-    csv_data = df.to_csv(index=False)
-    
-    # Envia o arquivo
-    return send_file(
-        io.BytesIO(csv_data.encode()),
+    return Response(
+        blocos,
         mimetype='text/csv',
-        download_name='despesas.csv',
-        as_attachment=True
+        headers={'Content-Disposition': 'attachment; filename=despesas.csv'}
     )
 
 # Rota para exportar receitas em CSV
@@ -735,71 +653,225 @@ def exportar_despesas():
 @api_login_required
 def exportar_receitas():
     """API para exportar receitas em CSV"""
-    from flask import send_file
+    usuario_id = session.get('usuario_id')
+    data_inicio, data_fim = _periodo_exportacao()
+    
+    # Gera o CSV em blocos a partir do cursor, sem carregar tudo na memória
+    blocos = exportar_csv(Config.DATABASE, 'receitas', usuario_id, data_inicio, data_fim)
+    
+    if blocos is None:
+        return jsonify({"error": "Não há receitas para exportar"}), 404
+    
+    return Response(
+        blocos,
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=receitas.csv'}
+    )
+
+# Rota para exportar em Excel: despesas, receitas, dividas, metas ou completo (uma aba por entidade)
+@api_bp.route('/exportar/<entidade>.xlsx')
+@api_login_required
+def exportar_excel(entidade):
+    """API para exportar em XLSX"""
+    if entidade not in ENTIDADES_EXPORTACAO:
+        return jsonify({"error": "Entidade inválida", "entidades": sorted(ENTIDADES_EXPORTACAO)}), 404
     
     usuario_id = session.get('usuario_id')
+    data_inicio, data_fim = _periodo_exportacao()
     
-    # Parâmetros de filtro
-    periodo = request.args.get('periodo')
-    data_inicio = request.args.get('data_inicio')
-    data_fim = request.args.get('data_fim')
+    try:
+        resultado = exportar_xlsx(Config.DATABASE, entidade, usuario_id, data_inicio, data_fim)
+    except ImportError:
+        log.excecao('erro_exportacao_xlsx', entidade=entidade)
+        return jsonify({"error": "Exportação em Excel indisponível"}), 501
+    
+    if resultado is None:
+        return jsonify({"error": "Não há dados para exportar"}), 404
+    
+    blocos, tamanho = resultado
+    return Response(
+        blocos,
+        mimetype=MIMETYPE_XLSX,
+        headers={
+            'Content-Disposition': f'attachment; filename={entidade}.xlsx',
+            'Content-Length': str(tamanho)
+        }
+    )
+
+# Importação de extratos bancários (CSV/OFX), executada em segundo plano pelo
+# processador do worker (iniciado no boot: retoma as importações interrompidas)
+_processador_importacoes = None
+_processador_importacoes_pid = None
+_processador_importacoes_lock = threading.Lock()
+
+def obter_processador_importacoes():
+    """Retorna o ProcessadorImportacoes do processo atual, iniciando-o se preciso"""
+    global _processador_importacoes, _processador_importacoes_pid
+    if _processador_importacoes is None or _processador_importacoes_pid != os.getpid():
+        with _processador_importacoes_lock:
+            if _processador_importacoes is None or _processador_importacoes_pid != os.getpid():
+                _processador_importacoes = ProcessadorImportacoes(
+                    ImportacaoExtrato(Config.DATABASE),
+                    trabalhadores=Config.IMPORTACAO_TRABALHADORES
+                )
+                _processador_importacoes_pid = os.getpid()
+                _processador_importacoes.iniciar()
+    return _processador_importacoes
+
+@api_bp.route('/importar', methods=['POST'])
+@api_login_required
+def importar_extrato():
+    """API para importar um extrato bancário (CSV ou OFX)"""
+    usuario_id = session.get('usuario_id')
     
-    # Define o período se não fornecido explicitamente
-    hoje = datetime.now()
+    arquivo = request.files.get('arquivo')
+    if not arquivo or not arquivo.filename:
+        return jsonify({"error": "Nenhum arquivo enviado"}), 400
     
-    if periodo == 'dia':
-        data_inicio = hoje.strftime("%Y-%m-%d")
-        data_fim = hoje.strftime("%Y-%m-%d")
-    elif periodo == 'semana':
-        data_inicio = (hoje - timedelta(days=7)).strftime("%Y-%m-%d")
-        data_fim = hoje.strftime("%Y-%m-%d")
-    elif periodo == 'mes':
-        data_inicio = f"{hoje.year}-{hoje.month:02d}-01"
-        data_fim = hoje.strftime("%Y-%m-%d")
-    elif periodo == 'ano':
-        data_inicio = f"{hoje.year}-01-01"
-        data_fim = hoje.strftime("%Y-%m-%d")
-    
-    # Busca as receitas
-    receita_model = Receita(Config.DATABASE)
-    receitas = receita_model.buscar(
-        usuario_id, 
-        data_inicio=data_inicio, 
-        data_fim=data_fim
+    formato = request.form.get('formato')
+    if formato and formato not in FORMATOS_IMPORTACAO:
+        return jsonify({"error": f"Formato não suportado: {formato}"}), 400
+    
+    try:
+        caminho = salvar_arquivo_importacao(arquivo.stream, arquivo.filename, usuario_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 413
+    
+    importacao_id = ImportacaoExtrato(Config.DATABASE).criar(
+        usuario_id,
+        caminho,
+        formato or detectar_formato(caminho, arquivo.filename),
+        nome_original=secure_filename(arquivo.filename),
+        tipo_perfil=request.form.get('tipo_perfil', 'pessoal'),
+        inverter_sinal=request.form.get('cartao') in ('1', 'true', 'on')
     )
+    obter_processador_importacoes().notificar()
     
-    if not receitas:
-        return jsonify({"error": "Não há receitas para exportar"}), 404
+    return jsonify({"success": True, "importacao_id": importacao_id, "status": "pendente"}), 202
+
+@api_bp.route('/importacoes')
+@api_login_required
+def listar_importacoes():
+    """API para listar as importações do usuário"""
+    importacoes = ImportacaoExtrato(Config.DATABASE).listar(session.get('usuario_id'))
+    for importacao in importacoes:
+        importacao.pop('arquivo', None)
+    return jsonify(importacoes)
+
+@api_bp.route('/importar/<int:importacao_id>')
+@api_login_required
+def obter_importacao(importacao_id):
+    """API para acompanhar o progresso de uma importação"""
+    importacao = ImportacaoExtrato(Config.DATABASE).buscar_por_id(importacao_id)
+    if not importacao or importacao['usuario_id'] != session.get('usuario_id'):
+        return jsonify({"error": "Importação não encontrada"}), 404
+    importacao.pop('arquivo', None)
+    return jsonify(importacao)
+
+@api_bp.route('/importar/<int:importacao_id>/retomar', methods=['POST'])
+@api_login_required
+def retomar_importacao(importacao_id):
+    """API para retomar uma importação interrompida"""
+    importacao = ImportacaoExtrato(Config.DATABASE).buscar_por_id(importacao_id)
+    if not importacao or importacao['usuario_id'] != session.get('usuario_id'):
+        return jsonify({"error": "Importação não encontrada"}), 404
+    if importacao['status'] == 'concluida':
+        return jsonify({"error": "Importação já concluída"}), 409
+    
+    # Com erro: volta para a fila. Pendentes e interrompidas (reserva expirada)
+    # são reservadas pelo processador sem precisar reabrir
+    ImportacaoExtrato(Config.DATABASE).reabrir(importacao_id)
+    obter_processador_importacoes().notificar()
+    return jsonify({"success": True, "importacao_id": importacao_id}), 202
+
+# Exportações em segundo plano: processador da fila criado no primeiro uso do worker
+_processador_exportacoes = None
+_processador_exportacoes_pid = None
+_processador_exportacoes_lock = threading.Lock()
+
+def obter_processador_exportacoes():
+    """Retorna o ProcessadorExportacoes do processo atual, iniciando-o se preciso"""
+    global _processador_exportacoes, _processador_exportacoes_pid
+    if _processador_exportacoes is None or _processador_exportacoes_pid != os.getpid():
+        with _processador_exportacoes_lock:
+            if _processador_exportacoes is None or _processador_exportacoes_pid != os.getpid():
+                _processador_exportacoes = ProcessadorExportacoes(
+                    FilaExportacao(Config.DATABASE),
+                    trabalhadores=Config.EXPORTACAO_TRABALHADORES
+                )
+                _processador_exportacoes_pid = os.getpid()
+                _processador_exportacoes.iniciar()
+    return _processador_exportacoes
+
+def _exportacao_publica(exportacao):
+    exportacao.pop('arquivo', None)
+    exportacao.pop('chave', None)
+    exportacao.pop('reservado_em', None)
+    return exportacao
+
+@api_bp.route('/exportacoes', methods=['POST'])
+@api_login_required
+def criar_exportacao():
+    """API para pedir uma exportação (CSV, XLSX ou Parquet) gerada em segundo plano"""
+    usuario_id = session.get('usuario_id')
+    dados = request.get_json(silent=True) or request.form
+    data_inicio, data_fim = _periodo_exportacao(dados)
     
-    # Converte para DataFrame
-    df = pd.DataFrame(receitas)
-    
-    # Reformata colunas para melhor legibilidade
-    df['data'] = pd.to_datetime(df['data']).dt.strftime('%d/%m/%Y')
-    df['data_criacao'] = pd.to_datetime(df['data_criacao']).dt.strftime('%d/%m/%Y %H:%M:%S')
-    
-    # Traduz nomes das colunas
-    colunas = {
-        'id': 'ID',
-        'usuario_id': 'ID do Usuário',
-        'valor': 'Valor',
-        'categoria': 'Categoria',
-        'descricao': 'Descrição',
-        'data': 'Data',
-        'recorrente': 'Recorrente',
-        'periodicidade': 'Periodicidade',
-        'data_criacao': 'Data de Criação'
-    }
-    df = df.rename(columns=colunas)
+    try:
+        exportacao_id, nova = FilaExportacao(Config.DATABASE).enfileirar(
+            usuario_id,
+            str(dados.get('entidade') or 'despesas'),
+            str(dados.get('formato') or 'csv').lower(),
+            data_inicio,
+            data_fim
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    # Cria o CSV em memória
-    csv_data = df.to_csv(index=False)
+    if Config.EXPORTACAO_PROCESSAR_NA_WEB:
+        obter_processador_exportacoes().notificar()
+    
+    log.info('exportacao_pedida', usuario_id=usuario_id, exportacao_id=exportacao_id, agrupada=not nova)
+    return jsonify({"success": True, "exportacao_id": exportacao_id, "agrupada": not nova}), 202
+
+@api_bp.route('/exportacoes')
+@api_login_required
+def listar_exportacoes():
+    """API para listar as exportações do usuário"""
+    exportacoes = FilaExportacao(Config.DATABASE).listar(session.get('usuario_id'))
+    return jsonify([_exportacao_publica(exportacao) for exportacao in exportacoes])
+
+@api_bp.route('/exportacoes/<int:exportacao_id>')
+@api_login_required
+def obter_exportacao(exportacao_id):
+    """API para acompanhar uma exportação"""
+    exportacao = FilaExportacao(Config.DATABASE).buscar_por_id(exportacao_id)
+    if not exportacao or exportacao['usuario_id'] != session.get('usuario_id'):
+        return jsonify({"error": "Exportação não encontrada"}), 404
+    
+    # Pedido feito em outro worker (ou antes de um reinício): garante o processador
+    if exportacao['status'] in ('pendente', 'processando') and Config.EXPORTACAO_PROCESSAR_NA_WEB:
+        obter_processador_exportacoes()
+    return jsonify(_exportacao_publica(exportacao))
+
+@api_bp.route('/exportacoes/<int:exportacao_id>/download')
+@api_login_required
+def baixar_exportacao(exportacao_id):
+    """API para baixar o arquivo de uma exportação concluída"""
+    from flask import send_file
+    
+    exportacao = FilaExportacao(Config.DATABASE).buscar_por_id(exportacao_id)
+    if not exportacao or exportacao['usuario_id'] != session.get('usuario_id'):
+        return jsonify({"error": "Exportação não encontrada"}), 404
+    if exportacao['status'] == 'expirada':
+        return jsonify({"error": "Exportação expirada, peça uma nova"}), 410
+    if exportacao['status'] != 'concluida' or not exportacao['arquivo'] or not os.path.exists(exportacao['arquivo']):
+        return jsonify({"error": "Exportação ainda não concluída", "status": exportacao['status']}), 409
     
-    # Envia o arquivo
     return send_file(
-        io.BytesIO(csv_data.encode()),
-        mimetype='text/csv',
-        download_name='receitas.csv',
+        exportacao['arquivo'],
+        mimetype=MIMETYPES_EXPORTACAO[exportacao['formato']],
+        download_name=f"{exportacao['entidade']}.{exportacao['formato']}",
         as_attachment=True
     )
 
@@ -809,103 +881,45 @@ def exportar_receitas():
 def get_grafico_imagem():
     """Gera uma imagem do gráfico para envio pelo WhatsApp"""
     from flask import send_file
-    import plotly.graph_objects as go
-    import plotly.io as pio
     
     usuario_id = session.get('usuario_id')
     
     # Parâmetros
     tipo = request.args.get('tipo', 'categoria')  # categoria ou tempo
-    periodo = request.args.get('periodo', 'mes')
+    periodo = _periodo_requisicao(nomes=('dia', 'semana', 'mes', 'ano', 'tudo'))
+    formato = request.args.get('formato', 'png')  # png ou svg
+    if formato not in FORMATOS_GRAFICO:
+        return jsonify({"error": "Formato inválido", "formatos": sorted(FORMATOS_GRAFICO)}), 400
     
-    # Define o período
     hoje = datetime.now()
     
-    if periodo == 'dia':
-        data_inicio = hoje.strftime("%Y-%m-%d")
-        periodo_texto = "hoje"
-    elif periodo == 'semana':
-        data_inicio = (hoje - timedelta(days=7)).strftime("%Y-%m-%d")
-        periodo_texto = "na última semana"
-    elif periodo == 'mes':
-        data_inicio = f"{hoje.year}-{hoje.month:02d}-01"
-        periodo_texto = "neste mês"
-    elif periodo == 'ano':
-        data_inicio = f"{hoje.year}-01-01"
-        periodo_texto = "neste ano"
-    else:
-        data_inicio = None
-        periodo_texto = "em todos os tempos"
-    
-    data_fim = hoje.strftime("%Y-%m-%d")
-    
-    # Cria o gráfico de acordo com o tipo
-    despesa_model = Despesa(Config.DATABASE)
-    
+    # Busca os totais do gráfico de acordo com o tipo
     if tipo == 'categoria':
-        # Busca despesas por categoria
-        categorias = despesa_model.total_por_categoria(
-            usuario_id, 
-            data_inicio=data_inicio, 
-            data_fim=data_fim
-        )
+        # Busca despesas por categoria (meses completos saem do resumo mensal)
+        categorias = executar_consulta(Config.DATABASE, usuario_id, Consulta(
+            'despesas', periodo, dimensoes=('categoria',), ordem="total DESC"
+        ))
         
         if not categorias:
             # Dados de exemplo para quando não há despesas
-            dados_exemplo = [
+            categorias = [
                 {"categoria": "alimentação", "total": 540.25},
                 {"categoria": "transporte", "total": 320.40},
                 {"categoria": "moradia", "total": 150.00},
                 {"categoria": "lazer", "total": 180.50},
                 {"categoria": "saúde", "total": 59.50}
             ]
-            categorias = dados_exemplo
-        
-        # Converte para DataFrame
-        df = pd.DataFrame(categorias)
-        
-        # Define cores para as categorias
-        cores = {
-            'alimentação': '#FFA726',
-            'transporte': '#42A5F5',
-            'moradia': '#66BB6A',
-            'saúde': '#EC407A',
-            'educação': '#AB47BC',
-            'lazer': '#26C6DA',
-            'vestuário': '#8D6E63',
-            'outros': '#78909C'
-        }
         
-        # Cores para as categorias presentes no dataset
-        cores_categorias = [cores.get(cat, '#78909C') for cat in df['categoria']]
-        
-        # Calcula o total
-        total = df['total'].sum()
-        
-        # Cria a figura
-        fig = go.Figure(data=[go.Pie(
-            labels=df['categoria'],
-            values=df['total'],
-            hole=0.6,
-            textinfo='percent',
-            marker_colors=cores_categorias
-        )])
-        
-        fig.update_layout(
-            title_text=f"Despesas por categoria {periodo_texto}<br>Total: R$ {total:.2f}",
-            font=dict(size=14),
-            width=800,
-            height=600,
-            showlegend=True
-        )
+        spec = spec_categorias(categorias, periodo.texto)
         
     else:  # tipo == 'tempo'
-        # Busca despesas por dia
-        despesas_por_dia = despesa_model.total_por_dia(
-            usuario_id, 
-            data_inicio=data_inicio, 
-            data_fim=data_fim
-        )
+        # Busca despesas por dia (somente o índice de cobertura)
+        despesas_por_dia = [
+            {'data': linha['dia'], 'total': linha['total']}
+            for linha in executar_consulta(Config.DATABASE, usuario_id, Consulta(
+                'despesas', periodo, dimensoes=('dia',), ordem="dia"
+            ))
+        ]
         
         if not despesas_por_dia:
             # Dados de exemplo
@@ -913,51 +927,39 @@ def get_grafico_imagem():
             valores_exemplo = [120.35, 85.50, 200.80, 150.20, 79.96]
             despesas_por_dia = [{"data": d, "total": v} for d, v in zip(datas_exemplo, valores_exemplo)]
         
-        # Converte para DataFrame
-        df = pd.DataFrame(despesas_por_dia)
-        
-        # Formata as datas
-        df['data_formatada'] = pd.to_datetime(df['data']).dt.strftime('%d/%m')
-        
-        # Cria a figura
-        fig = go.Figure(data=[go.Scatter(
-            x=df['data_formatada'],
-            y=df['total'],
-            mode='lines+markers',
-            line=dict(color='#28a745', width=3),
-            marker=dict(color='#28a745', size=8)
-        )])
-        
-        fig.update_layout(
-            title_text=f"Despesas ao longo do tempo {periodo_texto}",
-            font=dict(size=14),
-            width=800,
-            height=600,
-            xaxis=dict(title='Data'),
-            yaxis=dict(title='Valor (R$)')
-        )
+        spec = spec_tempo(despesas_por_dia, periodo.texto)
     
-    # Gera a imagem
-    img_bytes = io.BytesIO()
-    
-    try:
-        pio.write_image(fig, img_bytes, format='png')
-        img_bytes.seek(0)
-        
-        # Envia a imagem
-        return send_file(
-            img_bytes, 
-            mimetype='image/png',
-            download_name=f'grafico_{tipo}_{periodo}.png',
-            as_attachment=False
+    # A chave muda junto com os totais: o cliente que já tem esta imagem recebe 304
+    chave = chave_imagem(spec, formato)
+    if chave in request.if_none_match:
+        resposta = Response(status=304)
+        resposta.set_etag(chave)
+    else:
+        cache = obter_cache_imagens() if Config.GRAFICOS_CACHE_ATIVO else None
+        caminho = cache.obter(chave, formato) if cache else None
+        
+        if caminho is None:
+            # Renderizado no pool de processos; saturado ou com erro, volta um SVG simples
+            imagem, formato_gerado, completa = renderizar_grafico(spec, formato)
+            if not completa:
+                resposta = Response(imagem, mimetype=FORMATOS_GRAFICO[formato_gerado])
+                resposta.cache_control.no_store = True
+                return resposta
+            caminho = cache.gravar(chave, formato, imagem) if cache else io.BytesIO(imagem)
+        
+        resposta = send_file(
+            caminho,
+            mimetype=FORMATOS_GRAFICO[formato],
+            download_name=f'grafico_{tipo}_{periodo.nome}.{formato}',
+            as_attachment=False,
+            etag=chave,
+            max_age=0
         )
-    except Exception as e:
-        # Caso ocorra erro ao gerar imagem, retorna JSON com mensagem
-        return jsonify({
-            "error": "Não foi possível gerar a imagem", 
-            "details": str(e),
-            "message": "É necessário instalar o pacote kaleido para gerar imagens: pip install kaleido"
-        }), 500
+    
+    # Dados do usuário: só o navegador guarda, sempre revalidando pela ETag
+    resposta.cache_control.private = True
+    resposta.cache_control.no_cache = True
+    return resposta
 
 # Rota para obter resumo
 @api_bp.route('/resumo')
@@ -967,44 +969,21 @@ def get_resumo():
     usuario_id = session.get('usuario_id')
     
     # Parâmetros
-    periodo = request.args.get('periodo', 'mes')
-    
-    # Define o período
-    hoje = datetime.now()
-    
-    if periodo == 'dia':
-        data_inicio = hoje.strftime("%Y-%m-%d")
-        periodo_texto = "hoje"
-    elif periodo == 'semana':
-        data_inicio = (hoje - timedelta(days=7)).strftime("%Y-%m-%d")
-        periodo_texto = "na última semana"
-    elif periodo == 'mes':
-        data_inicio = f"{hoje.year}-{hoje.month:02d}-01"
-        periodo_texto = "neste mês"
-    elif periodo == 'ano':
-        data_inicio = f"{hoje.year}-01-01"
-        periodo_texto = "neste ano"
-    else:
-        data_inicio = None
-        periodo_texto = "em todos os tempos"
-    
-    data_fim = hoje.strftime("%Y-%m-%d")
-    
-    # Busca os totais
-    despesa_model = Despesa(Config.DATABASE)
-    receita_model = Receita(Config.DATABASE)
+    periodo = _periodo_requisicao(nomes=('dia', 'semana', 'mes', 'ano', 'tudo'))
     
-    total_despesas = despesa_model.total_periodo(
-        usuario_id, 
-        data_inicio=data_inicio, 
-        data_fim=data_fim
-    )
+    # Totais (cache de resumos por usuário/período) e últimas despesas na mesma conexão
+    conn = conectar(Config.DATABASE)
+    cursor = conn.cursor()
+    try:
+        totais = resumo_financeiro(Config.DATABASE, usuario_id, periodo.data_inicio, periodo.data_fim, cursor=cursor)
+        ultimas_despesas = executar_consulta(Config.DATABASE, usuario_id, Consulta(
+            'despesas', periodo, colunas=('*',), ordem="data DESC", limite=5
+        ), cursor)
+    finally:
+        conn.close()
     
-    total_receitas = receita_model.total_periodo(
-        usuario_id, 
-        data_inicio=data_inicio, 
-        data_fim=data_fim
-    )
+    total_despesas = totais['total_despesas']
+    total_receitas = totais['total_receitas']
     
     # Calcula o saldo e percentual de economia
     saldo = total_receitas - total_despesas
@@ -1013,24 +992,12 @@ def get_resumo():
     if total_receitas > 0:
         economia_percentual = (saldo / total_receitas) * 100
     
-    # Busca as despesas por categoria
-    categorias = despesa_model.total_por_categoria(
-        usuario_id, 
-        data_inicio=data_inicio, 
-        data_fim=data_fim
-    )
-    
-    # Busca as últimas despesas
-    ultimas_despesas = despesa_model.buscar(
-        usuario_id, 
-        data_inicio=data_inicio, 
-        data_fim=data_fim,
-        limit=5
-    )
+    # Despesas por categoria
+    categorias = totais['despesas_por_categoria']
     
     # Cria o objeto de resposta
     resumo = {
-        'periodo': periodo_texto,
+        'periodo': periodo.texto,
         'total_despesas': round(total_despesas, 2),
         'total_receitas': round(total_receitas, 2),
         'saldo': round(saldo, 2),
@@ -1179,7 +1146,7 @@ def get_lembretes():
         return jsonify(lembretes)
         
     except Exception as e:
-        print(f"Erro em get_lembretes: {str(e)}")
+        log.excecao('erro_listar_lembretes')
         return jsonify({"error": str(e), "lembretes": []}), 500
 
 # Rota para adicionar um lembrete
@@ -1656,63 +1623,15 @@ def get_top_despesas():
     usuario_id = session.get('usuario_id')
     
     # Parâmetros de filtro
-    periodo = request.args.get('periodo', 'mes')
+    periodo = _periodo_requisicao()
     tipo_perfil = request.args.get('tipo_perfil')
     limit = int(request.args.get('limit', 5))
     
-    # Define o período
-    hoje = datetime.now()
-    
-    if periodo == 'dia':
-        data_inicio = hoje.strftime("%Y-%m-%d")
-    elif periodo == 'semana':
-        data_inicio = (hoje - timedelta(days=7)).strftime("%Y-%m-%d")
-    elif periodo == 'mes':
-        data_inicio = f"{hoje.year}-{hoje.month:02d}-01"
-    elif periodo == 'ano':
-        data_inicio = f"{hoje.year}-01-01"
-    elif periodo == 'personalizado':
-        data_inicio = request.args.get('data_inicio')
-        data_fim = request.args.get('data_fim')
-    else:
-        data_inicio = None
-    
-    # Se não for período personalizado, data_fim é hoje
-    if periodo != 'personalizado':
-        data_fim = hoje.strftime("%Y-%m-%d")
-    
-    conn = sqlite3.connect(Config.DATABASE)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    # Busca as top despesas
-    query = """
-    SELECT descricao, valor, categoria, data
-    FROM despesas 
-    WHERE usuario_id = ?
-    """
-    params = [usuario_id]
-    
-    if data_inicio:
-        query += " AND data >= ?"
-        params.append(data_inicio)
-    
-    if data_fim:
-        query += " AND data <= ?"
-        params.append(data_fim)
-    
-    # Filtro por tipo de perfil
-    if tipo_perfil:
-        query += " AND (tipo_perfil = ? OR tipo_perfil IS NULL)"
-        params.append(tipo_perfil)
-    
-    query += " ORDER BY valor DESC LIMIT ?"
-    params.append(limit)
-    
-    cursor.execute(query, params)
-    despesas = [dict(row) for row in cursor.fetchall()]
-    
-    conn.close()
+    # Busca as top despesas (descricao fica fora do índice: lê a tabela)
+    despesas = executar_consulta(Config.DATABASE, usuario_id, Consulta(
+        'despesas', periodo, tipo_perfil=tipo_perfil,
+        colunas=('descricao', 'valor', 'categoria', 'data'), ordem="valor DESC", limite=limit
+    ))
     
     return jsonify(despesas)
 
@@ -1724,77 +1643,19 @@ def get_grafico_evolucao_saldo():
     usuario_id = session.get('usuario_id')
     
     # Parâmetros de filtro
-    periodo = request.args.get('periodo', 'mes')
+    periodo = _periodo_requisicao(padrao='mes', nomes=('dia', 'semana', 'mes', 'ano'))
     tipo_perfil = request.args.get('tipo_perfil')
+    frequencia = request.args.get('frequencia', 'dia')
+    if frequencia not in FREQUENCIAS:
+        frequencia = 'dia'
     
-    # Define o período
-    hoje = datetime.now()
-    
-    if periodo == 'dia':
-        dias = 1
-        data_inicio = hoje.strftime("%Y-%m-%d")
-    elif periodo == 'semana':
-        dias = 7
-        data_inicio = (hoje - timedelta(days=7)).strftime("%Y-%m-%d")
-    elif periodo == 'mes':
-        dias = 30
-        data_inicio = f"{hoje.year}-{hoje.month:02d}-01"
-    elif periodo == 'ano':
-        dias = 365
-        data_inicio = f"{hoje.year}-01-01"
-    else:
-        dias = 30
-        data_inicio = f"{hoje.year}-{hoje.month:02d}-01"
-    
-    data_fim = hoje.strftime("%Y-%m-%d")
-    
-    # Busca as despesas diárias
-    despesa_model = Despesa(Config.DATABASE)
-    despesas_diarias = despesa_model.total_por_dia(
-        usuario_id, 
-        data_inicio=data_inicio, 
-        data_fim=data_fim,
-        tipo_perfil=tipo_perfil
-    )
-    
-    # Busca as receitas diárias
-    receita_model = Receita(Config.DATABASE)
-    receitas_diarias = receita_model.total_por_dia(
-        usuario_id, 
-        data_inicio=data_inicio, 
-        data_fim=data_fim,
-        tipo_perfil=tipo_perfil
-    )
-    
-    # Converte para dicionários para facilitar o acesso
-    despesas_dict = {item['data']: item['total'] for item in despesas_diarias}
-    receitas_dict = {item['data']: item['total'] for item in receitas_diarias}
-    
-    # Gera o intervalo de datas
-    datas = []
-    data_atual = datetime.strptime(data_inicio, "%Y-%m-%d")
-    while data_atual <= datetime.strptime(data_fim, "%Y-%m-%d"):
-        datas.append(data_atual.strftime("%Y-%m-%d"))
-        data_atual += timedelta(days=1)
-    
-    # Calcula o saldo acumulado
-    saldo_acumulado = 0
-    dados_grafico = []
-    
-    for data in datas:
-        despesa_dia = despesas_dict.get(data, 0)
-        receita_dia = receitas_dict.get(data, 0)
-        saldo_dia = receita_dia - despesa_dia
-        saldo_acumulado += saldo_dia
-        
-        dados_grafico.append({
-            'data': data,
-            'saldo': saldo_acumulado
-        })
+    # Despesas e receitas em uma consulta, com os dias sem lançamento zerados
+    serie = serie_temporal(Config.DATABASE, usuario_id, periodo.data_inicio, periodo.data_fim,
+                           tipo_perfil, frequencia)
     
     # Formata para o Plotly
-    x = [item['data'] for item in dados_grafico]
-    y = [item['saldo'] for item in dados_grafico]
+    x = formatar_periodos(serie['periodos'])
+    y = para_lista(serie['acumulado'])
     
     # Cria o gráfico
     dados_plotly = [{
@@ -1829,78 +1690,19 @@ def get_grafico_evolucao_lucro():
     usuario_id = session.get('usuario_id')
     
     # Parâmetros de filtro
-    periodo = request.args.get('periodo', 'mes')
-    
-    # Define o período
-    hoje = datetime.now()
-    
-    if periodo == 'dia':
-        dias = 1
-        data_inicio = hoje.strftime("%Y-%m-%d")
-    elif periodo == 'semana':
-        dias = 7
-        data_inicio = (hoje - timedelta(days=7)).strftime("%Y-%m-%d")
-    elif periodo == 'mes':
-        dias = 30
-        data_inicio = f"{hoje.year}-{hoje.month:02d}-01"
-    elif periodo == 'ano':
-        dias = 365
-        data_inicio = f"{hoje.year}-01-01"
-    else:
-        dias = 30
-        data_inicio = f"{hoje.year}-{hoje.month:02d}-01"
+    periodo = _periodo_requisicao(padrao='mes', nomes=('dia', 'semana', 'mes', 'ano'))
+    frequencia = request.args.get('frequencia', 'dia')
+    if frequencia not in FREQUENCIAS:
+        frequencia = 'dia'
     
-    data_fim = hoje.strftime("%Y-%m-%d")
-    
-    # Busca as despesas diárias para o perfil empresarial
-    despesa_model = Despesa(Config.DATABASE)
-    despesas_diarias = despesa_model.total_por_dia(
-        usuario_id, 
-        data_inicio=data_inicio, 
-        data_fim=data_fim,
-        tipo_perfil='empresarial'
-    )
-    
-    # Busca as receitas diárias para o perfil empresarial
-    receita_model = Receita(Config.DATABASE)
-    receitas_diarias = receita_model.total_por_dia(
-        usuario_id, 
-        data_inicio=data_inicio, 
-        data_fim=data_fim,
-        tipo_perfil='empresarial'
-    )
-    
-    # Converte para dicionários para facilitar o acesso
-    despesas_dict = {item['data']: item['total'] for item in despesas_diarias}
-    receitas_dict = {item['data']: item['total'] for item in receitas_diarias}
-    
-    # Gera o intervalo de datas
-    datas = []
-    data_atual = datetime.strptime(data_inicio, "%Y-%m-%d")
-    while data_atual <= datetime.strptime(data_fim, "%Y-%m-%d"):
-        datas.append(data_atual.strftime("%Y-%m-%d"))
-        data_atual += timedelta(days=1)
-    
-    # Calcula o lucro diário e acumulado
-    lucro_acumulado = 0
-    dados_grafico = []
-    
-    for data in datas:
-        despesa_dia = despesas_dict.get(data, 0)
-        receita_dia = receitas_dict.get(data, 0)
-        lucro_dia = receita_dia - despesa_dia
-        lucro_acumulado += lucro_dia
-        
-        dados_grafico.append({
-            'data': data,
-            'lucro_dia': lucro_dia,
-            'lucro_acumulado': lucro_acumulado
-        })
+    # Lucro do perfil empresarial: saldo de cada período e o acumulado
+    serie = serie_temporal(Config.DATABASE, usuario_id, periodo.data_inicio, periodo.data_fim,
+                           'empresarial', frequencia)
     
     # Formata para o Plotly
-    x = [item['data'] for item in dados_grafico]
-    y_lucro_dia = [item['lucro_dia'] for item in dados_grafico]
-    y_lucro_acumulado = [item['lucro_acumulado'] for item in dados_grafico]
+    x = formatar_periodos(serie['periodos'])
+    y_lucro_dia = para_lista(serie['saldo'])
+    y_lucro_acumulado = para_lista(serie['acumulado'])
     
     # Cria o gráfico
     dados_plotly = [
@@ -1960,189 +1762,36 @@ def get_grafico_previsao():
         }), 403
     
     # Parâmetros de filtro
-    periodo = request.args.get('periodo', 'mes')
+    periodo = _periodo_requisicao(padrao='mes', nomes=('mes', 'ano'))
     tipo_perfil = request.args.get('tipo_perfil', 'pessoal')
-    meses_previsao = int(request.args.get('meses', 3))
-    
-    # Define o período para análise de histórico
-    hoje = datetime.now()
-    
-    # Para previsão, usamos 3x o período solicitado como histórico
-    if periodo == 'mes':
-        # Analisa os últimos 3 meses para prever os próximos 3
-        meses_historico = 3
-        data_inicio = (hoje - timedelta(days=meses_historico*30)).strftime("%Y-%m-%d")
-    elif periodo == 'ano':
-        # Analisa os últimos 12 meses para prever os próximos 3
-        data_inicio = (hoje - timedelta(days=365)).strftime("%Y-%m-%d")
-    else:
-        # Para outros períodos, usa 90 dias
-        data_inicio = (hoje - timedelta(days=90)).strftime("%Y-%m-%d")
-    
-    data_fim = hoje.strftime("%Y-%m-%d")
+    meses_previsao = min(max(request.args.get('meses', 3, type=int), 1), 24)
     
-    # Busca o histórico de despesas mensais
-    conn = sqlite3.connect(Config.DATABASE)
-    cursor = conn.cursor()
+    # Meses completos de histórico: 'mes' analisa os últimos 3, 'ano' os últimos 12.
+    # 'historico' permite séries longas (a sazonalidade entra a partir de 24 meses)
+    meses_historico = 12 if periodo.nome == 'ano' else 3
+    meses_historico = min(max(request.args.get('historico', meses_historico, type=int), 1), 120)
     
-    query = """
-    SELECT strftime('%Y-%m', data) AS mes, SUM(valor) as total
-    FROM despesas
-    WHERE usuario_id = ? AND data >= ? AND data <= ?
-    """
-    params = [usuario_id, data_inicio, data_fim]
-    
-    if tipo_perfil:
-        query += " AND (tipo_perfil = ? OR tipo_perfil IS NULL)"
-        params.append(tipo_perfil)
-    
-    query += " GROUP BY mes ORDER BY mes"
-    
-    cursor.execute(query, params)
-    despesas_mensais = cursor.fetchall()
-    
-    # Busca o histórico de receitas mensais
-    query = """
-    SELECT strftime('%Y-%m', data) AS mes, SUM(valor) as total
-    FROM receitas
-    WHERE usuario_id = ? AND data >= ? AND data <= ?
-    """
-    params = [usuario_id, data_inicio, data_fim]
-    
-    if tipo_perfil:
-        query += " AND (tipo_perfil = ? OR tipo_perfil IS NULL)"
-        params.append(tipo_perfil)
-    
-    query += " GROUP BY mes ORDER BY mes"
-    
-    cursor.execute(query, params)
-    receitas_mensais = cursor.fetchall()
-    
-    conn.close()
-    
-    # Prepara os dados para análise
-    meses = []
-    despesas = []
-    receitas = []
-    
-    # Meses do histórico
-    mes_atual = datetime.strptime(data_inicio, "%Y-%m-%d").replace(day=1)
-    ultimo_mes = datetime.strptime(data_fim, "%Y-%m-%d").replace(day=1)
-    
-    while mes_atual <= ultimo_mes:
-        mes_str = mes_atual.strftime("%Y-%m")
-        meses.append(mes_str)
-        
-        # Busca despesa para este mês
-        despesa_valor = 0
-        for mes, total in despesas_mensais:
-            if mes == mes_str:
-                despesa_valor = total
-                break
-        despesas.append(despesa_valor)
-        
-        # Busca receita para este mês
-        receita_valor = 0
-        for mes, total in receitas_mensais:
-            if mes == mes_str:
-                receita_valor = total
-                break
-        receitas.append(receita_valor)
-        
-        # Avança para o próximo mês
-        if mes_atual.month == 12:
-            mes_atual = mes_atual.replace(year=mes_atual.year+1, month=1)
-        else:
-            mes_atual = mes_atual.replace(month=mes_atual.month+1)
-    
-    # Calcula médias para previsão
-    if len(despesas) > 0:
-        media_despesas = sum(despesas) / len(despesas)
-        # Aplica tendência (exemplo: aumento médio de 5% ao mês)
-        if len(despesas) > 1:
-            # Calcula tendência com regressão linear básica
-            soma_x = sum(range(len(despesas)))
-            soma_y = sum(despesas)
-            soma_xy = sum(i * despesas[i] for i in range(len(despesas)))
-            soma_x2 = sum(i**2 for i in range(len(despesas)))
-            n = len(despesas)
-            
-            if soma_x2 * n - soma_x**2 != 0:  # Evita divisão por zero
-                b = (soma_xy * n - soma_x * soma_y) / (soma_x2 * n - soma_x**2)
-            else:
-                b = 0
-        else:
-            b = 0
-    else:
-        media_despesas = 0
-        b = 0
-    
-    if len(receitas) > 0:
-        media_receitas = sum(receitas) / len(receitas)
-        # Semelhante para receitas
-        if len(receitas) > 1:
-            soma_x = sum(range(len(receitas)))
-            soma_y = sum(receitas)
-            soma_xy = sum(i * receitas[i] for i in range(len(receitas)))
-            soma_x2 = sum(i**2 for i in range(len(receitas)))
-            n = len(receitas)
-            
-            if soma_x2 * n - soma_x**2 != 0:
-                b_receitas = (soma_xy * n - soma_x * soma_y) / (soma_x2 * n - soma_x**2)
-            else:
-                b_receitas = 0
-        else:
-            b_receitas = 0
-    else:
-        media_receitas = 0
-        b_receitas = 0
-    
-    # Gera previsão para meses futuros
-    meses_previsao_list = []
-    despesas_previsao = []
-    receitas_previsao = []
-    saldo_previsao = []
-    
-    for i in range(1, meses_previsao + 1):
-        if ultimo_mes.month + i > 12:
-            ano = ultimo_mes.year + (ultimo_mes.month + i - 1) // 12
-            mes = (ultimo_mes.month + i - 1) % 12 + 1
-        else:
-            ano = ultimo_mes.year
-            mes = ultimo_mes.month + i
-        
-        mes_prev = datetime(ano, mes, 1)
-        mes_prev_str = mes_prev.strftime("%Y-%m")
-        meses_previsao_list.append(mes_prev_str)
-        
-        despesa_prevista = media_despesas + b * (len(despesas) + i - 1)
-        receita_prevista = media_receitas + b_receitas * (len(receitas) + i - 1)
-        
-        # Garante valores positivos
-        despesa_prevista = max(0, despesa_prevista)
-        receita_prevista = max(0, receita_prevista)
-        
-        despesas_previsao.append(despesa_prevista)
-        receitas_previsao.append(receita_prevista)
-        saldo_previsao.append(receita_prevista - despesa_prevista)
+    previsao = prever(Config.DATABASE, usuario_id, meses_historico, meses_previsao, tipo_perfil)
+    despesas = previsao['despesas']
+    receitas = previsao['receitas']
     
     # Formata meses para exibição
-    meses_exibicao = [datetime.strptime(m, "%Y-%m").strftime("%b/%Y") for m in meses]
-    meses_previsao_exibicao = [datetime.strptime(m, "%Y-%m").strftime("%b/%Y") for m in meses_previsao_list]
+    meses_exibicao = [datetime.strptime(m, "%Y-%m").strftime("%b/%Y") for m in previsao['meses_historico']]
+    meses_previsao_exibicao = [datetime.strptime(m, "%Y-%m").strftime("%b/%Y") for m in previsao['meses_previsao']]
     
     # Dados do gráfico
     dados_historico = {
         'x': meses_exibicao,
-        'despesas': despesas,
-        'receitas': receitas,
-        'saldo': [r - d for r, d in zip(receitas, despesas)]
+        'despesas': despesas['historico'],
+        'receitas': receitas['historico'],
+        'saldo': [round(r - d, 2) for r, d in zip(receitas['historico'], despesas['historico'])]
     }
     
     dados_previsao = {
         'x': meses_previsao_exibicao,
-        'despesas': despesas_previsao,
-        'receitas': receitas_previsao,
-        'saldo': saldo_previsao
+        'despesas': despesas['previsao'],
+        'receitas': receitas['previsao'],
+        'saldo': previsao['cenarios']['realista']['saldo']
     }
     
     # Cria o gráfico com Plotly
@@ -2205,6 +1854,32 @@ def get_grafico_previsao():
         }
     ]
     
+    # Faixas de confiança da previsão (limite superior, depois o inferior preenchendo até ele)
+    for nome, serie, cor in (('Despesas', despesas, 'rgba(231, 76, 60, 0.15)'),
+                             ('Receitas', receitas, 'rgba(40, 167, 69, 0.15)')):
+        dados_plotly.extend([
+            {
+                'x': dados_previsao['x'],
+                'y': serie['superior'],
+                'type': 'scatter',
+                'mode': 'lines',
+                'name': f'{nome} (faixa de 95%)',
+                'line': {'width': 0},
+                'showlegend': False,
+                'hoverinfo': 'skip'
+            },
+            {
+                'x': dados_previsao['x'],
+                'y': serie['inferior'],
+                'type': 'scatter',
+                'mode': 'lines',
+                'name': f'{nome} (faixa de 95%)',
+                'line': {'width': 0},
+                'fill': 'tonexty',
+                'fillcolor': cor
+            }
+        ])
+    
     layout_plotly = {
         'margin': {'l': 40, 'r': 10, 't': 30, 'b': 40},
         'title': 'Previsão Financeira',
@@ -2251,7 +1926,16 @@ def get_grafico_previsao():
         ]
     }
     
-    return jsonify({'data': dados_plotly, 'layout': layout_plotly})
+    return jsonify({
+        'data': dados_plotly,
+        'layout': layout_plotly,
+        'cenarios': previsao['cenarios'],
+        'categorias': {
+            'despesas': despesas['categorias'],
+            'receitas': receitas['categorias']
+        },
+        'modelo': previsao['modelo']
+    })
 
 # Rota para obter distribuição de gastos ao longo do tempo
 @api_bp.route('/grafico/distribuicao_tempo')
@@ -2261,159 +1945,44 @@ def get_grafico_distribuicao_tempo():
     usuario_id = session.get('usuario_id')
     
     # Parâmetros de filtro
-    periodo = request.args.get('periodo', 'mes')
+    periodo = _periodo_requisicao(padrao='ano', nomes=('dia', 'semana', 'mes', 'ano'))
     tipo_perfil = request.args.get('tipo_perfil')
     
-    # Define o período
-    hoje = datetime.now()
-    
-    if periodo == 'dia':
-        # Para um dia, analisamos as horas
-        data_inicio = hoje.strftime("%Y-%m-%d")
-        data_fim = hoje.strftime("%Y-%m-%d")
-        tipo_agrupamento = 'hora'
-    elif periodo == 'semana':
-        # Para uma semana, analisamos os dias da semana
-        data_inicio = (hoje - timedelta(days=7)).strftime("%Y-%m-%d")
-        data_fim = hoje.strftime("%Y-%m-%d")
-        tipo_agrupamento = 'dia_semana'
-    elif periodo == 'mes':
-        # Para um mês, analisamos dias do mês
-        data_inicio = f"{hoje.year}-{hoje.month:02d}-01"
-        data_fim = hoje.strftime("%Y-%m-%d")
-        tipo_agrupamento = 'dia'
-    elif periodo == 'ano':
-        # Para um ano, analisamos meses
-        data_inicio = f"{hoje.year}-01-01"
-        data_fim = hoje.strftime("%Y-%m-%d")
-        tipo_agrupamento = 'mes'
-    else:
-        data_inicio = None
-        data_fim = None
-        tipo_agrupamento = 'mes'
-    
-    # Consulta SQL para obter dados agrupados por tempo
-    conn = sqlite3.connect(Config.DATABASE)
-    cursor = conn.cursor()
-    
-    if tipo_agrupamento == 'hora':
-        # Agrupa por hora do dia
-        query = """
-        SELECT strftime('%H', data_criacao) as periodo, SUM(valor) as total
-        FROM despesas
-        WHERE usuario_id = ? AND DATE(data_criacao) = ?
-        """
-        params = [usuario_id, data_inicio]
-        
-        if tipo_perfil:
-            query += " AND (tipo_perfil = ? OR tipo_perfil IS NULL)"
-            params.append(tipo_perfil)
-        
-        query += " GROUP BY periodo ORDER BY periodo"
-        
-    elif tipo_agrupamento == 'dia_semana':
-        # Agrupa por dia da semana (0=Domingo, 1=Segunda, ...)
-        query = """
-        SELECT strftime('%w', data) as periodo, SUM(valor) as total
-        FROM despesas
-        WHERE usuario_id = ? AND data BETWEEN ? AND ?
-        """
-        params = [usuario_id, data_inicio, data_fim]
-        
-        if tipo_perfil:
-            query += " AND (tipo_perfil = ? OR tipo_perfil IS NULL)"
-            params.append(tipo_perfil)
-        
-        query += " GROUP BY periodo ORDER BY periodo"
-        
-    elif tipo_agrupamento == 'dia':
-        # Agrupa por dia do mês
-        query = """
-        SELECT strftime('%d', data) as periodo, SUM(valor) as total
-        FROM despesas
-        WHERE usuario_id = ? AND data BETWEEN ? AND ?
-        """
-        params = [usuario_id, data_inicio, data_fim]
-        
-        if tipo_perfil:
-            query += " AND (tipo_perfil = ? OR tipo_perfil IS NULL)"
-            params.append(tipo_perfil)
-        
-        query += " GROUP BY periodo ORDER BY periodo"
-        
-    else:  # tipo_agrupamento == 'mes'
-        # Agrupa por mês
-        query = """
-        SELECT strftime('%m', data) as periodo, SUM(valor) as total
-        FROM despesas
-        WHERE usuario_id = ? AND data BETWEEN ? AND ?
-        """
-        params = [usuario_id, data_inicio, data_fim]
-        
-        if tipo_perfil:
-            query += " AND (tipo_perfil = ? OR tipo_perfil IS NULL)"
-            params.append(tipo_perfil)
-        
-        query += " GROUP BY periodo ORDER BY periodo"
-    
-    cursor.execute(query, params)
-    resultados = cursor.fetchall()
-    
-    conn.close()
+    # Dia: por hora; semana: por dia da semana; mês: por dia do mês; ano: por mês
+    tipo_agrupamento = {'dia': 'hora', 'semana': 'dia_semana', 'mes': 'dia', 'ano': 'mes'}[periodo.nome]
+    data_inicio, data_fim = periodo.data_inicio, periodo.data_fim
     
     # Prepara os dados para o gráfico
-    nomes_periodos = []
-    valores = []
-    
     if tipo_agrupamento == 'hora':
-        # Para completar todas as 24 horas
+        # Despesas do dia agrupadas pela hora do lançamento (data_criacao)
         horas = {f"{h:02d}": 0 for h in range(24)}
-        for periodo, total in resultados:
-            horas[periodo] = total
+        for linha in executar_consulta(Config.DATABASE, usuario_id, Consulta(
+            'despesas', periodo, dimensoes=('hora',), tipo_perfil=tipo_perfil
+        )):
+            if linha['hora'] is not None:
+                horas[linha['hora']] = linha['total']
         
-        # Adiciona os dados no gráfico
-        for hora, valor in horas.items():
-            nomes_periodos.append(f"{hora}h")
-            valores.append(valor)
+        nomes_periodos = [f"{hora}h" for hora in horas]
+        valores_periodos = list(horas.values())
         
         titulo = "Distribuição de gastos por hora do dia"
         
     elif tipo_agrupamento == 'dia_semana':
-        # Nomes dos dias da semana
-        dias_semana = {
-            "0": "Domingo",
-            "1": "Segunda",
-            "2": "Terça",
-            "3": "Quarta",
-            "4": "Quinta",
-            "5": "Sexta",
-            "6": "Sábado"
-        }
-        
-        # Para completar todos os 7 dias da semana
-        dias = {str(d): 0 for d in range(7)}
-        for periodo, total in resultados:
-            dias[periodo] = total
+        # Série diária do período somada por dia da semana (0=Domingo, 1=Segunda, ...)
+        serie = serie_temporal(Config.DATABASE, usuario_id, data_inicio, data_fim, tipo_perfil)
+        por_dia_semana = np.bincount(dia_semana(serie['periodos']), weights=serie['despesas'], minlength=7)
         
-        # Adiciona os dados no gráfico
-        for dia, valor in dias.items():
-            nomes_periodos.append(dias_semana[dia])
-            valores.append(valor)
+        nomes_periodos = ["Domingo", "Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado"]
+        valores_periodos = para_lista(por_dia_semana)
         
         titulo = "Distribuição de gastos por dia da semana"
         
     elif tipo_agrupamento == 'dia':
-        # Para completar todos os dias do mês
-        ultimo_dia = datetime.strptime(data_fim, "%Y-%m-%d").day
-        dias = {f"{d:02d}": 0 for d in range(1, ultimo_dia + 1)}
+        # Todos os dias do mês até hoje
+        serie = serie_temporal(Config.DATABASE, usuario_id, data_inicio, data_fim, tipo_perfil)
         
-        for periodo, total in resultados:
-            dias[periodo] = total
-        
-        # Adiciona os dados no gráfico
-        for dia, valor in dias.items():
-            nomes_periodos.append(f"Dia {dia}")
-            valores.append(valor)
+        nomes_periodos = [f"Dia {dia}" for dia in formatar_periodos(serie['periodos'], "%d")]
+        valores_periodos = para_lista(serie['despesas'])
         
         titulo = "Distribuição de gastos por dia do mês"
         
@@ -2424,23 +1993,11 @@ def get_grafico_distribuicao_tempo():
             "07": "Jul", "08": "Ago", "09": "Set", "10": "Out", "11": "Nov", "12": "Dez"
         }
         
-        # Determina quais meses incluir com base nas datas
-        mes_inicio = int(data_inicio.split('-')[1])
-        mes_fim = int(data_fim.split('-')[1])
-        
-        if hoje.year == int(data_inicio.split('-')[0]):
-            meses_periodo = {f"{m:02d}": 0 for m in range(mes_inicio, mes_fim + 1)}
-        else:
-            # Se o ano inicial for diferente, inclui todos os meses
-            meses_periodo = {f"{m:02d}": 0 for m in range(1, 13)}
-        
-        for periodo, total in resultados:
-            meses_periodo[periodo] = total
+        # Meses do ano até o atual (meses completos saem do resumo mensal)
+        serie = serie_temporal(Config.DATABASE, usuario_id, data_inicio, data_fim, tipo_perfil, 'mes')
         
-        # Adiciona os dados no gráfico
-        for mes, valor in meses_periodo.items():
-            nomes_periodos.append(meses[mes])
-            valores.append(valor)
+        nomes_periodos = [meses[mes] for mes in formatar_periodos(serie['periodos'], "%m")]
+        valores_periodos = para_lista(serie['despesas'])
         
         titulo = "Distribuição de gastos por mês"
     
@@ -2448,7 +2005,7 @@ def get_grafico_distribuicao_tempo():
     dados_plotly = [
         {
             'x': nomes_periodos,
-            'y': valores,
+            'y': valores_periodos,
             'type': 'bar',
             'marker': {
                 'color': '#28a745'
@@ -2492,115 +2049,18 @@ def get_grafico_fluxo_caixa():
         }), 403
     
     # Parâmetros de filtro
-    periodo = request.args.get('periodo', 'mes')
-    
-    # Define o período
-    hoje = datetime.now()
+    periodo = _periodo_requisicao(padrao='ano', nomes=('semana', 'mes', 'ano'))
+    tipo_agrupamento = 'mes' if periodo.nome == 'ano' else 'dia'
     
-    if periodo == 'semana':
-        data_inicio = (hoje - timedelta(days=7)).strftime("%Y-%m-%d")
-        data_fim = hoje.strftime("%Y-%m-%d")
-        tipo_agrupamento = 'dia'
-    elif periodo == 'mes':
-        data_inicio = f"{hoje.year}-{hoje.month:02d}-01"
-        data_fim = hoje.strftime("%Y-%m-%d")
-        tipo_agrupamento = 'dia'
-    elif periodo == 'ano':
-        data_inicio = f"{hoje.year}-01-01"
-        data_fim = hoje.strftime("%Y-%m-%d")
-        tipo_agrupamento = 'mes'
-    else:
-        data_inicio = f"{hoje.year}-01-01"
-        data_fim = hoje.strftime("%Y-%m-%d")
-        tipo_agrupamento = 'mes'
+    # Receitas e despesas do perfil empresarial em uma consulta, com os períodos vazios zerados
+    serie = serie_temporal(Config.DATABASE, usuario_id, periodo.data_inicio, periodo.data_fim, 'empresarial',
+                           tipo_agrupamento)
     
-    # Consulta SQL para obter receitas no período
-    conn = sqlite3.connect(Config.DATABASE)
-    cursor = conn.cursor()
-    
-    if tipo_agrupamento == 'dia':
-        query_receitas = """
-        SELECT data, SUM(valor) as total
-        FROM receitas
-        WHERE usuario_id = ? AND tipo_perfil = 'empresarial' AND data BETWEEN ? AND ?
-        GROUP BY data
-        ORDER BY data
-        """
-        
-        query_despesas = """
-        SELECT data, SUM(valor) as total
-        FROM despesas
-        WHERE usuario_id = ? AND tipo_perfil = 'empresarial' AND data BETWEEN ? AND ?
-        GROUP BY data
-        ORDER BY data
-        """
-    else:  # tipo_agrupamento == 'mes'
-        query_receitas = """
-        SELECT strftime('%Y-%m', data) as mes, SUM(valor) as total
-        FROM receitas
-        WHERE usuario_id = ? AND tipo_perfil = 'empresarial' AND data BETWEEN ? AND ?
-        GROUP BY mes
-        ORDER BY mes
-        """
-        
-        query_despesas = """
-        SELECT strftime('%Y-%m', data) as mes, SUM(valor) as total
-        FROM despesas
-        WHERE usuario_id = ? AND tipo_perfil = 'empresarial' AND data BETWEEN ? AND ?
-        GROUP BY mes
-        ORDER BY mes
-        """
-    
-    cursor.execute(query_receitas, [usuario_id, data_inicio, data_fim])
-    receitas_dados = cursor.fetchall()
-    
-    cursor.execute(query_despesas, [usuario_id, data_inicio, data_fim])
-    despesas_dados = cursor.fetchall()
-    
-    conn.close()
-    
-    # Prepara dados do gráfico
-    if tipo_agrupamento == 'dia':
-        # Cria dicionários para facilitar acesso
-        receitas_dict = {r[0]: r[1] for r in receitas_dados}
-        despesas_dict = {d[0]: d[1] for d in despesas_dados}
-        
-        # Gera lista de todas as datas no período
-        datas = []
-        data_atual = datetime.strptime(data_inicio, "%Y-%m-%d")
-        data_final = datetime.strptime(data_fim, "%Y-%m-%d")
-        
-        while data_atual <= data_final:
-            datas.append(data_atual.strftime("%Y-%m-%d"))
-            data_atual += timedelta(days=1)
-        
-        # Prepara os dados formatados
-        x = [datetime.strptime(d, "%Y-%m-%d").strftime("%d/%m") for d in datas]
-        y_receitas = [receitas_dict.get(d, 0) for d in datas]
-        y_despesas = [despesas_dict.get(d, 0) for d in datas]
-        y_saldo = [r - d for r, d in zip(y_receitas, y_despesas)]
-    else:  # tipo_agrupamento == 'mes'
-        # Cria dicionários para facilitar acesso
-        receitas_dict = {r[0]: r[1] for r in receitas_dados}
-        despesas_dict = {d[0]: d[1] for d in despesas_dados}
-        
-        # Gera lista de todos os meses no período
-        meses = []
-        data_atual = datetime.strptime(data_inicio, "%Y-%m-%d").replace(day=1)
-        data_final = datetime.strptime(data_fim, "%Y-%m-%d").replace(day=1)
-        
-        while data_atual <= data_final:
-            meses.append(data_atual.strftime("%Y-%m"))
-            if data_atual.month == 12:
-                data_atual = data_atual.replace(year=data_atual.year+1, month=1)
-            else:
-                data_atual = data_atual.replace(month=data_atual.month+1)
-        
-        # Prepara os dados formatados
-        x = [datetime.strptime(m, "%Y-%m").strftime("%b/%Y") for m in meses]
-        y_receitas = [receitas_dict.get(m, 0) for m in meses]
-        y_despesas = [despesas_dict.get(m, 0) for m in meses]
-        y_saldo = [r - d for r, d in zip(y_receitas, y_despesas)]
+    # Prepara os dados formatados
+    x = formatar_periodos(serie['periodos'], "%d/%m" if tipo_agrupamento == 'dia' else "%b/%Y")
+    y_receitas = para_lista(serie['receitas'])
+    y_despesas = para_lista(serie['despesas'])
+    y_saldo = para_lista(serie['saldo'])
     
     # Cria o gráfico com Plotly
     dados_plotly = [
@@ -2653,93 +2113,29 @@ def get_grafico_comparativo():
     usuario_id = session.get('usuario_id')
     
     # Parâmetros de filtro
-    periodo1 = request.args.get('periodo1', 'mes_atual')
-    periodo2 = request.args.get('periodo2', 'mes_anterior')
+    nomes = ('mes_atual', 'mes_anterior', 'ano_atual', 'ano_anterior')
+    periodo1 = _periodo_requisicao('mes_atual', 'mes_atual', nomes, parametro='periodo1')
+    periodo2 = _periodo_requisicao('mes_anterior', 'mes_anterior', nomes, parametro='periodo2')
     tipo_perfil = request.args.get('tipo_perfil')
     
-    # Define os períodos
-    hoje = datetime.now()
-    
-    # Período 1
-    if periodo1 == 'mes_atual':
-        data_inicio1 = f"{hoje.year}-{hoje.month:02d}-01"
-        data_fim1 = hoje.strftime("%Y-%m-%d")
-        titulo_periodo1 = "Mês Atual"
-    elif periodo1 == 'mes_anterior':
-        # Calcula o mês anterior
-        if hoje.month == 1:
-            mes_anterior = 12
-            ano_anterior = hoje.year - 1
-        else:
-            mes_anterior = hoje.month - 1
-            ano_anterior = hoje.year
-        
-        data_inicio1 = f"{ano_anterior}-{mes_anterior:02d}-01"
-        
-        # Último dia do mês anterior
-        ultimo_dia = (datetime(hoje.year, hoje.month, 1) - timedelta(days=1)).day
-        data_fim1 = f"{ano_anterior}-{mes_anterior:02d}-{ultimo_dia:02d}"
-        
-        titulo_periodo1 = "Mês Anterior"
-    elif periodo1 == 'ano_atual':
-        data_inicio1 = f"{hoje.year}-01-01"
-        data_fim1 = hoje.strftime("%Y-%m-%d")
-        titulo_periodo1 = "Ano Atual"
-    elif periodo1 == 'ano_anterior':
-        data_inicio1 = f"{hoje.year-1}-01-01"
-        data_fim1 = f"{hoje.year-1}-12-31"
-        titulo_periodo1 = "Ano Anterior"
-    
-    # Período 2
-    if periodo2 == 'mes_atual':
-        data_inicio2 = f"{hoje.year}-{hoje.month:02d}-01"
-        data_fim2 = hoje.strftime("%Y-%m-%d")
-        titulo_periodo2 = "Mês Atual"
-    elif periodo2 == 'mes_anterior':
-        # Calcula o mês anterior
-        if hoje.month == 1:
-            mes_anterior = 12
-            ano_anterior = hoje.year - 1
-        else:
-            mes_anterior = hoje.month - 1
-            ano_anterior = hoje.year
-        
-        data_inicio2 = f"{ano_anterior}-{mes_anterior:02d}-01"
-        
-        # Último dia do mês anterior
-        ultimo_dia = (datetime(hoje.year, hoje.month, 1) - timedelta(days=1)).day
-        data_fim2 = f"{ano_anterior}-{mes_anterior:02d}-{ultimo_dia:02d}"
-        
-        titulo_periodo2 = "Mês Anterior"
-    elif periodo2 == 'ano_atual':
-        data_inicio2 = f"{hoje.year}-01-01"
-        data_fim2 = hoje.strftime("%Y-%m-%d")
-        titulo_periodo2 = "Ano Atual"
-    elif periodo2 == 'ano_anterior':
-        data_inicio2 = f"{hoje.year-1}-01-01"
-        data_fim2 = f"{hoje.year-1}-12-31"
-        titulo_periodo2 = "Ano Anterior"
-    
-    # Busca as despesas por categoria para o período 1
-    despesa_model = Despesa(Config.DATABASE)
-    categorias1 = despesa_model.total_por_categoria(
-        usuario_id, 
-        data_inicio=data_inicio1, 
-        data_fim=data_fim1,
-        tipo_perfil=tipo_perfil
-    )
+    titulos = {
+        'mes_atual': "Mês Atual",
+        'mes_anterior': "Mês Anterior",
+        'ano_atual': "Ano Atual",
+        'ano_anterior': "Ano Anterior"
+    }
+    titulo_periodo1 = titulos[periodo1.nome]
+    titulo_periodo2 = titulos[periodo2.nome]
     
-    # Busca as despesas por categoria para o período 2
-    categorias2 = despesa_model.total_por_categoria(
-        usuario_id, 
-        data_inicio=data_inicio2, 
-        data_fim=data_fim2,
-        tipo_perfil=tipo_perfil
-    )
+    # Despesas por categoria dos dois períodos, na mesma conexão
+    resultados = executar_consultas(Config.DATABASE, usuario_id, {
+        'periodo1': Consulta('despesas', periodo1, dimensoes=('categoria',), tipo_perfil=tipo_perfil),
+        'periodo2': Consulta('despesas', periodo2, dimensoes=('categoria',), tipo_perfil=tipo_perfil)
+    })
     
     # Converte para dicionários para facilitar o acesso
-    categorias_dict1 = {item['categoria']: item['total'] for item in categorias1}
-    categorias_dict2 = {item['categoria']: item['total'] for item in categorias2}
+    categorias_dict1 = {item['categoria'] or 'outros': item['total'] for item in resultados['periodo1']}
+    categorias_dict2 = {item['categoria'] or 'outros': item['total'] for item in resultados['periodo2']}
     
     # Obtém todas as categorias únicas
     todas_categorias = sorted(set(list(categorias_dict1.keys()) + list(categorias_dict2.keys())))
@@ -2810,9 +2206,8 @@ def listar_dividas():
         
         return jsonify(dividas), 200
         
-    except Exception as e:
-        print(f"Erro ao listar dívidas: {str(e)}")
-        print(traceback.format_exc())
+    except Exception:
+        log.excecao('erro_listar_dividas')
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
 @api_bp.route('/dividas', methods=['POST'])
@@ -2876,8 +2271,7 @@ def criar_divida():
         return jsonify({'id': divida_id, 'message': 'Dívida criada com sucesso'}), 201
         
     except Exception as e:
-        print(f"Erro ao criar dívida: {str(e)}")
-        print(traceback.format_exc())
+        log.excecao('erro_criar_divida')
         return jsonify({'error': str(e) or 'Erro interno do servidor'}), 500
 
 @api_bp.route('/dividas/<int:divida_id>', methods=['GET'])
@@ -2899,9 +2293,8 @@ def obter_divida(divida_id):
         
         return jsonify(divida), 200
         
-    except Exception as e:
-        print(f"Erro ao obter dívida: {str(e)}")
-        print(traceback.format_exc())
+    except Exception:
+        log.excecao('erro_obter_divida')
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
 @api_bp.route('/dividas/<int:divida_id>', methods=['PUT'])
@@ -2962,8 +2355,7 @@ def atualizar_divida(divida_id):
         return jsonify(divida_atualizada), 200
         
     except Exception as e:
-        print(f"Erro ao atualizar dívida: {str(e)}")
-        print(traceback.format_exc())
+        log.excecao('erro_atualizar_divida')
         return jsonify({'error': str(e) or 'Erro interno do servidor'}), 500
 
 @api_bp.route('/dividas/<int:divida_id>', methods=['DELETE'])
@@ -2992,8 +2384,7 @@ def excluir_divida(divida_id):
             return jsonify({'error': 'Erro ao excluir dívida'}), 500
         
     except Exception as e:
-        print(f"Erro ao excluir dívida: {str(e)}")
-        print(traceback.format_exc())
+        log.excecao('erro_excluir_divida')
         return jsonify({'error': str(e) or 'Erro interno do servidor'}), 500
 
 @api_bp.route('/dividas/pagamento', methods=['POST'])
@@ -3045,8 +2436,7 @@ def registrar_pagamento():
         }), 201
         
     except Exception as e:
-        print(f"Erro ao registrar pagamento: {str(e)}")
-        print(traceback.format_exc())
+        log.excecao('erro_registrar_pagamento')
         return jsonify({'error': str(e) or 'Erro interno do servidor'}), 500
 
 @api_bp.route('/usuario/renda', methods=['GET'])
@@ -3071,7 +2461,6 @@ def obter_renda_usuario():
         }), 200
         
     except Exception as e:
-        print(f"Erro ao obter renda do usuário: {str(e)}")
-        print(traceback.format_exc())
+        log.excecao('erro_obter_renda')
         return jsonify({'error': str(e) or 'Erro interno do servidor'}), 500
 
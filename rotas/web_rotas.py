@@ -1,13 +1,16 @@
 from flask import Blueprint, render_template, redirect, url_for, request, flash, session, jsonify, send_file
-from database.models import Usuario, Despesa, Receita, Lembrete, CategoriaPersonalizada, Membro, TextProcessor, MetaFinanceira, Divida, Orcamento, Notificacao
+from database.models import Usuario, Despesa, Receita, Lembrete, CategoriaPersonalizada, Membro, processador_texto, Divida, Notificacao
+from database.conexao import conectar
+from database.dashboard import carregar_dashboard
+from database.cache_usuarios import invalidar_usuario
+from database.resumos import resumo_financeiro
 from functools import wraps
 import os
-import sqlite3
 from datetime import datetime, timedelta
 import json
 from werkzeug.utils import secure_filename
-import traceback
 from config import Config
+from log_estruturado import obter_logger
 
 # Diretório para salvar os arquivos enviados
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'static', 'uploads')
@@ -15,6 +18,7 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 # Criação do blueprint
 web_bp = Blueprint('web', __name__)
+log = obter_logger('web')
 
 # Middleware para verificar login
 def login_required(f):
@@ -86,142 +90,10 @@ def dashboard():
     
     usuario_id = session.get('usuario_id')
     
-    # Busca dados do usuário
-    usuario_model = Usuario(Config.DATABASE)
-    usuario = usuario_model.buscar_por_id(usuario_id)
-    
-    # Busca lembretes próximos
-    lembrete_model = Lembrete(Config.DATABASE)
-    lembretes = lembrete_model.buscar(
-        usuario_id=usuario_id,
-        concluido=0
-    )
-    # Ordena por data e pega os 3 próximos
-    if lembretes:
-        from datetime import datetime
-        lembretes = sorted(lembretes, key=lambda x: x['data'])[:3]
-    
-    # Busca orçamentos
-    orcamento_model = Orcamento(Config.DATABASE)
-    orcamentos = orcamento_model.buscar(
-        usuario_id=usuario_id,
-        tipo_perfil='pessoal'
-    )
-    
-    # Adiciona gastos atuais para orçamentos
-    for orcamento in orcamentos:
-        try:
-            orcamento['gasto_atual'] = orcamento_model.calcular_gasto_atual(
-                orcamento_id=orcamento['id']
-            )
-            # Calcula percentual
-            if orcamento['valor_limite'] > 0:
-                orcamento['percentual'] = (orcamento['gasto_atual'] / orcamento['valor_limite']) * 100
-            else:
-                orcamento['percentual'] = 0
-        except:
-            orcamento['gasto_atual'] = 0
-            orcamento['percentual'] = 0
-    
-    # Busca metas financeiras
-    meta_model = MetaFinanceira(Config.DATABASE)
-    metas = meta_model.buscar(
-        usuario_id=usuario_id,
-        tipo_perfil='pessoal'
-    )
-    
-    # Calcula percentual das metas
-    for meta in metas:
-        if meta['valor_alvo'] > 0:
-            meta['percentual'] = (meta['valor_atual'] / meta['valor_alvo']) * 100
-        else:
-            meta['percentual'] = 0
-    
-    # Busca dívidas
-    divida_model = Divida(Config.DATABASE)
-    dividas = divida_model.buscar(
-        usuario_id=usuario_id,
-        tipo_perfil='pessoal'
-    )
-    
-    # Calcula percentual pago das dívidas
-    for divida in dividas:
-        if divida['valor_total'] > 0:
-            divida['percentual_pago'] = (divida['valor_pago'] / divida['valor_total']) * 100
-        else:
-            divida['percentual_pago'] = 0
-    
-    # Busca últimas transações
-    despesa_model = Despesa(Config.DATABASE)
-    receita_model = Receita(Config.DATABASE)
-    
-    # Define período (últimos 30 dias)
-    from datetime import datetime, timedelta
-    hoje = datetime.now()
-    data_inicio = (hoje - timedelta(days=30)).strftime("%Y-%m-%d")
-    data_fim = hoje.strftime("%Y-%m-%d")
-    
-    # Busca despesas e receitas recentes
-    despesas_recentes = despesa_model.buscar(
-        usuario_id=usuario_id,
-        data_inicio=data_inicio,
-        data_fim=data_fim,
-        limit=10
-    )
-    
-    receitas_recentes = receita_model.buscar(
-        usuario_id=usuario_id,
-        data_inicio=data_inicio,
-        data_fim=data_fim,
-        limit=10
-    )
-    
-    # Combina e ordena transações por data
-    transacoes = []
-    
-    for despesa in despesas_recentes:
-        transacoes.append({
-            'id': despesa['id'],
-            'tipo': 'despesa',
-            'valor': despesa['valor'],
-            'descricao': despesa['descricao'],
-            'categoria': despesa['categoria'],
-            'data': despesa['data'],
-            'data_criacao': despesa['data_criacao']
-        })
-    
-    for receita in receitas_recentes:
-        transacoes.append({
-            'id': receita['id'],
-            'tipo': 'receita',
-            'valor': receita['valor'],
-            'descricao': receita['descricao'],
-            'categoria': receita['categoria'],
-            'data': receita['data'],
-            'data_criacao': receita['data_criacao']
-        })
-    
-    # Ordena por data de criação (mais recentes primeiro)
-    transacoes = sorted(transacoes, key=lambda x: x['data_criacao'], reverse=True)[:10]
-    
-    # Calcula totais do mês atual
-    data_inicio_mes = f"{hoje.year}-{hoje.month:02d}-01"
-    
-    total_despesas_mes = despesa_model.total_periodo(
-        usuario_id=usuario_id,
-        data_inicio=data_inicio_mes,
-        data_fim=data_fim,
-        tipo_perfil='pessoal'
-    )
-    
-    total_receitas_mes = receita_model.total_periodo(
-        usuario_id=usuario_id,
-        data_inicio=data_inicio_mes,
-        data_fim=data_fim,
-        tipo_perfil='pessoal'
-    )
-    
-    saldo_mes = total_receitas_mes - total_despesas_mes
+    # Usuário, lembretes, orçamentos com gasto atual, metas, dívidas,
+    # últimas transações e totais do mês em uma única conexão
+    snapshot = carregar_dashboard(Config.DATABASE, usuario_id, tipo_perfil='pessoal')
+    usuario = snapshot.usuario
     
     # Determina quais funcionalidades o usuário pode acessar com base no plano
     plano = usuario.get('plano', 'gratuito')
@@ -233,14 +105,14 @@ def dashboard():
         'dashboard.html',
         app_name=Config.APP_NAME,
         usuario=usuario,
-        lembretes=lembretes,
-        orcamentos=orcamentos,
-        metas=metas,
-        dividas=dividas,
-        transacoes=transacoes,
-        total_despesas_mes=total_despesas_mes,
-        total_receitas_mes=total_receitas_mes,
-        saldo_mes=saldo_mes,
+        lembretes=snapshot.lembretes,
+        orcamentos=snapshot.orcamentos,
+        metas=snapshot.metas,
+        dividas=snapshot.dividas,
+        transacoes=snapshot.transacoes,
+        total_despesas_mes=snapshot.total_despesas_mes,
+        total_receitas_mes=snapshot.total_receitas_mes,
+        saldo_mes=snapshot.saldo_mes,
         plano=plano,
         pode_acesso_empresarial=pode_acesso_empresarial
     )
@@ -386,7 +258,7 @@ def cadastro():
         
         if usuario_id:
             try:
-                conn = sqlite3.connect(Config.DATABASE)
+                conn = conectar(Config.DATABASE)
                 cursor = conn.cursor()
                 
                 # Registra a origem (referral)
@@ -427,6 +299,7 @@ def cadastro():
                 
                 conn.commit()
                 conn.close()
+                invalidar_usuario(Config.DATABASE, usuario_id)
                 
                 # Aplica cupom se fornecido
                 if cupom and hasattr(Config, 'APLICAR_CUPOM_FUNC'):
@@ -1342,44 +1215,19 @@ def relatorios():
         flash('Relatórios detalhados estão disponíveis apenas para os planos Premium, Família e Empresarial.', 'info')
         return redirect(url_for('web.planos'))
     
-    # Obtém dados para relatórios
-    despesa_model = Despesa(Config.DATABASE)
-    receita_model = Receita(Config.DATABASE)
-    
     # Define o período (últimos 30 dias por padrão)
     hoje = datetime.now()
     data_fim = hoje.strftime("%Y-%m-%d")
     data_inicio = (hoje - timedelta(days=30)).strftime("%Y-%m-%d")
     
-    # Obtém totais para perfil pessoal
-    total_despesas_pessoal = despesa_model.total_periodo(
-        usuario_id=usuario_id,
-        data_inicio=data_inicio,
-        data_fim=data_fim,
-        tipo_perfil='pessoal'
-    )
-    
-    total_receitas_pessoal = receita_model.total_periodo(
-        usuario_id=usuario_id,
-        data_inicio=data_inicio,
-        data_fim=data_fim,
-        tipo_perfil='pessoal'
-    )
+    # Totais por perfil (cache de resumos por usuário/período)
+    resumo_pessoal = resumo_financeiro(Config.DATABASE, usuario_id, data_inicio, data_fim, 'pessoal')
+    resumo_empresarial = resumo_financeiro(Config.DATABASE, usuario_id, data_inicio, data_fim, 'empresarial')
     
-    # Obtém totais para perfil empresarial
-    total_despesas_empresarial = despesa_model.total_periodo(
-        usuario_id=usuario_id,
-        data_inicio=data_inicio,
-        data_fim=data_fim,
-        tipo_perfil='empresarial'
-    )
-    
-    total_receitas_empresarial = receita_model.total_periodo(
-        usuario_id=usuario_id,
-        data_inicio=data_inicio,
-        data_fim=data_fim,
-        tipo_perfil='empresarial'
-    )
+    total_despesas_pessoal = resumo_pessoal['total_despesas']
+    total_receitas_pessoal = resumo_pessoal['total_receitas']
+    total_despesas_empresarial = resumo_empresarial['total_despesas']
+    total_receitas_empresarial = resumo_empresarial['total_receitas']
     
     # Calcula saldos
     saldo_pessoal = total_receitas_pessoal - total_despesas_pessoal
@@ -1451,7 +1299,7 @@ def processar_imagem():
         })
         
     except Exception as e:
-        traceback.print_exc()
+        log.excecao('erro_processar_imagem')
         return jsonify({"error": str(e)}), 500
 
 # Rota para processamento de áudio
@@ -1471,9 +1319,8 @@ def processar_audio():
         # Simula transcrição
         texto_transcrito = "Compra no mercado de 78 reais e 90 centavos"
 
-        # Extrai informações usando seu TextProcessor
-        processor = TextProcessor()
-        dados = processor.extrair_informacoes_despesa(texto_transcrito)
+        # Extrai informações usando o TextProcessor compartilhado
+        dados = processador_texto.extrair_informacoes_despesa(texto_transcrito)
 
         return jsonify({
             "success": True,
@@ -1483,7 +1330,7 @@ def processar_audio():
         })
 
     except Exception as e:
-        traceback.print_exc()
+        log.excecao('erro_processar_audio')
         return jsonify({"error": str(e)}), 500
 
 @web_bp.route('/configuracoes')
@@ -1607,8 +1454,8 @@ def adicionar_divida():
         
         flash('Dívida adicionada com sucesso!', 'success')
         
-    except Exception as e:
-        print(f"Erro ao adicionar dívida: {str(e)}")
+    except Exception:
+        log.excecao('erro_adicionar_divida')
         flash('Erro ao adicionar dívida. Por favor, tente novamente.', 'danger')
     
     return redirect(url_for('web.dividas'))
@@ -1678,8 +1525,8 @@ def editar_divida(divida_id):
         
         flash('Dívida atualizada com sucesso!', 'success')
         
-    except Exception as e:
-        print(f"Erro ao editar dívida: {str(e)}")
+    except Exception:
+        log.excecao('erro_editar_divida')
         flash('Erro ao atualizar dívida. Por favor, tente novamente.', 'danger')
     
     return redirect(url_for('web.dividas'))
@@ -1715,8 +1562,8 @@ def excluir_divida(divida_id):
         else:
             flash('Erro ao excluir dívida', 'danger')
         
-    except Exception as e:
-        print(f"Erro ao excluir dívida: {str(e)}")
+    except Exception:
+        log.excecao('erro_excluir_divida')
         flash('Erro ao excluir dívida. Por favor, tente novamente.', 'danger')
     
     return redirect(url_for('web.dividas'))
@@ -1766,8 +1613,8 @@ def registrar_pagamento_divida(divida_id):
         
         flash('Pagamento registrado com sucesso!', 'success')
         
-    except Exception as e:
-        print(f"Erro ao registrar pagamento: {str(e)}")
+    except Exception:
+        log.excecao('erro_registrar_pagamento')
         flash('Erro ao registrar pagamento. Por favor, tente novamente.', 'danger')
     
     return redirect(url_for('web.dividas'))
@@ -1798,8 +1645,8 @@ def obter_perfil_usuario():
         
         return jsonify(resposta), 200
         
-    except Exception as e:
-        print(f"Erro ao obter perfil do usuário: {str(e)}")
+    except Exception:
+        log.excecao('erro_obter_perfil')
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
 # Rota para Financiamentos
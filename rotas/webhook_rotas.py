@@ -1,12 +1,15 @@
 from flask import Blueprint, request, url_for
 from twilio.twiml.messaging_response import MessagingResponse
 from twilio.request_validator import RequestValidator
-from database.models import Usuario, Despesa, Receita, TextProcessor
+from database.models import Usuario, Despesa, Receita, processador_texto
+from database.resumos import resumo_financeiro
+from database.fila_webhook import FilaWebhook, RespostasWebhook, ProcessadorWebhook, criar_enviador
 from config import Config
+from log_estruturado import obter_logger
 from datetime import datetime, timedelta
 import re
 import requests
-import traceback
+import threading
 import os
 import requests
 from datetime import datetime, timedelta
@@ -17,16 +20,33 @@ import tempfile
 
 # Criação do blueprint
 webhook_bp = Blueprint('webhook', __name__)
+log = obter_logger('webhook')
+
+# Processador da fila do webhook (modo assíncrono): iniciado pelo app.py na
+# subida do worker ou, se o processo mudou (fork), na primeira mensagem
+_processador_fila = None
+_processador_fila_pid = None
+_processador_fila_lock = threading.Lock()
+
+def obter_processador_fila():
+    """Retorna o ProcessadorWebhook do processo atual, iniciando-o se preciso"""
+    global _processador_fila, _processador_fila_pid
+    if _processador_fila is None or _processador_fila_pid != os.getpid():
+        with _processador_fila_lock:
+            if _processador_fila is None or _processador_fila_pid != os.getpid():
+                _processador_fila = ProcessadorWebhook(
+                    FilaWebhook(Config.DATABASE),
+                    processar_mensagem,
+                    criar_enviador(),
+                    trabalhadores=Config.WEBHOOK_TRABALHADORES
+                )
+                _processador_fila_pid = os.getpid()
+                _processador_fila.iniciar()
+    return _processador_fila
 
 @webhook_bp.route('/webhook', methods=['POST'])
 def webhook():
     """Webhook para receber mensagens do WhatsApp via Twilio"""
-    # Log para debug
-    print("\n===== WEBHOOK RECEBIDO =====")
-    print("Headers:", dict(request.headers))
-    print("Form data:", dict(request.form))
-    print("============================\n")
-    
     # Validação da assinatura da Twilio (segurança adicional)
     validator = RequestValidator(Config.TWILIO_AUTH_TOKEN)
     request_valid = validator.validate(
@@ -37,7 +57,7 @@ def webhook():
     
     # Em ambiente de desenvolvimento, você pode desativar essa validação
     if not Config.DEBUG and not request_valid:
-        print("ERRO: Assinatura Twilio inválida!")
+        log.aviso('assinatura_invalida', remetente=request.values.get('From', ''))
         return "Assinatura inválida", 403
     
     # Extrai informações da requisição
@@ -45,17 +65,50 @@ def webhook():
     remetente = request.values.get('From', '')
     profile_name = request.values.get('ProfileName', '')
     
+    message_sid = request.values.get('MessageSid')
+    log.debug('mensagem_recebida', message_sid=message_sid, remetente=remetente, mensagem=mensagem)
+    
     # Inicializa a resposta
     resposta = MessagingResponse()
     
+    # Reentrega da Twilio (mesmo MessageSid): devolve a resposta já gerada
+    # sem processar nem gravar a despesa de novo
+    respostas = RespostasWebhook(Config.DATABASE)
+    if message_sid:
+        nova, resposta_anterior = respostas.reservar(message_sid)
+        if not nova:
+            log.info('reentrega_ignorada', message_sid=message_sid)
+            if resposta_anterior is None and not Config.WEBHOOK_ASSINCRONO:
+                resposta_anterior = respostas.aguardar_resposta(message_sid)
+            if resposta_anterior:
+                resposta.message(resposta_anterior)
+            return str(resposta)
+    
+    if Config.WEBHOOK_ASSINCRONO:
+        # Grava na fila e confirma na hora; a resposta sai pela API REST
+        try:
+            FilaWebhook(Config.DATABASE).enfileirar(remetente, mensagem, profile_name, message_sid)
+        except Exception:
+            if message_sid:
+                respostas.liberar(message_sid)
+            raise
+        if message_sid:
+            respostas.concluir(message_sid)
+        obter_processador_fila().notificar()
+        return str(resposta)
+    
     try:
         # Processa a mensagem
         resposta_texto = processar_mensagem(mensagem, remetente, profile_name)
         resposta.message(resposta_texto)
-    except Exception as e:
-        # Log do erro para debug
-        print(f"ERRO: {e}")
-        traceback.print_exc()
+        if message_sid:
+            respostas.concluir(message_sid, resposta_texto)
+    except Exception:
+        log.excecao('erro_processamento', message_sid=message_sid, remetente=remetente)
+        
+        # A reentrega poderá tentar de novo
+        if message_sid:
+            respostas.liberar(message_sid)
         
         # Em caso de erro, envia uma mensagem amigável
         resposta.message(
@@ -106,12 +159,16 @@ def enviar_notificacoes_vencimentos():
             
             mensagens_enviadas += 1
         except Exception as e:
-            print(f"Erro ao enviar notificação: {e}")
+            log.erro('erro_envio_notificacao', usuario_id=usuario['id'], erro=str(e))
     
     return mensagens_enviadas
 
-def processar_mensagem(mensagem, remetente, profile_name=None):
-    """Processa a mensagem recebida e retorna uma resposta"""
+def processar_mensagem(mensagem, remetente, profile_name=None, mensagem_id=None):
+    """Processa a mensagem recebida e retorna uma resposta
+
+    ``mensagem_id``: id na fila do webhook (modo assíncrono). Gravado nas
+    despesas, evita duplicá-las se a mensagem for processada de novo.
+    """
     # Remove o prefixo 'whatsapp:' do número do remetente
     if remetente.startswith('whatsapp:'):
         remetente = remetente[9:]
@@ -167,7 +224,7 @@ def processar_mensagem(mensagem, remetente, profile_name=None):
     
     else:
         # Processa como uma despesa
-        return processar_despesa(mensagem, usuario_id)
+        return processar_despesa(mensagem, usuario_id, mensagem_id)
 
 def get_mensagem_boas_vindas(usuario):
     """Retorna uma mensagem de boas-vindas personalizada"""
@@ -238,37 +295,33 @@ def get_relatorio(usuario_id, periodo):
     
     # Obtém as despesas
     despesa_model = Despesa(Config.DATABASE)
-    despesas = despesa_model.buscar(usuario_id, data_inicio, data_fim)
+    despesas = despesa_model.buscar(usuario_id, data_inicio, data_fim, limit=3)
     
     if not despesas:
         return f"📊 Não há despesas registradas {periodo_texto}."
     
-    # Calcula o total
-    total = despesa_model.total_periodo(usuario_id, data_inicio, data_fim)
-    
-    # Obtém as despesas por categoria
-    categorias = despesa_model.total_por_categoria(usuario_id, data_inicio, data_fim)
+    # Total e despesas por categoria (cache de resumos por usuário/período)
+    totais = resumo_financeiro(Config.DATABASE, usuario_id, data_inicio, data_fim)
+    total = totais['total_despesas']
+    categorias = totais['despesas_por_categoria']
     
     # Cria uma mensagem com o relatório e emojis
     report = f"📊 *Relatório de despesas {periodo_texto}*\n\n"
     report += f"💰 Total gasto: *R$ {total:.2f}*\n\n"
     report += "🔍 *Detalhes por categoria:*\n"
     
-    # Instancia o processador de texto para obter emojis
-    text_processor = TextProcessor()
-    
     for categoria in categorias:
         nome_categoria = categoria['categoria']
         valor = categoria['total']
         percent = (valor / total) * 100
-        emoji = text_processor.get_categoria_emoji(nome_categoria)
+        emoji = processador_texto.get_categoria_emoji(nome_categoria)
         report += f"- {emoji} {nome_categoria.capitalize()}: R$ {valor:.2f} ({percent:.1f}%)\n"
     
     # Adiciona as últimas despesas (máximo 3)
     report += "\n📝 *Últimas transações:*\n"
     for i, despesa in enumerate(despesas[:3]):
         data = datetime.strptime(despesa['data'], "%Y-%m-%d").strftime("%d/%m")
-        categoria_emoji = text_processor.get_categoria_emoji(despesa['categoria'])
+        categoria_emoji = processador_texto.get_categoria_emoji(despesa['categoria'])
         report += f"{i+1}. {data}: R$ {despesa['valor']:.2f} - {categoria_emoji} {despesa['descricao'][:20]}\n"
     
     report += f"\n🔍 Acesse {Config.WEBHOOK_BASE_URL}/ para análises detalhadas!"
@@ -453,8 +506,7 @@ def corrigir_ultima_categoria(usuario_id, nova_categoria):
     despesa_model.atualizar(ultima_despesa['id'], categoria=nova_categoria)
     
     # Obtém emoji para a nova categoria
-    processador = TextProcessor()
-    emoji = processador.get_categoria_emoji(nova_categoria)
+    emoji = processador_texto.get_categoria_emoji(nova_categoria)
     
     return (
         f"✅ Categoria atualizada com sucesso!\n\n"
@@ -464,11 +516,15 @@ def corrigir_ultima_categoria(usuario_id, nova_categoria):
         f"Nova categoria: {emoji} {nova_categoria.capitalize()}"
     )
 
-def processar_despesa(mensagem, usuario_id):
-    """Processa uma mensagem de texto para extrair e salvar uma despesa"""
-    # Extrai informações da despesa
-    processador = TextProcessor()
-    dados_despesa = processador.extrair_informacoes_despesa(mensagem)
+def processar_despesa(mensagem, usuario_id, mensagem_id=None):
+    """Processa uma mensagem de texto para extrair e salvar uma ou mais despesas"""
+    # Extrai as despesas ("almoço 35, uber 22 e mercado 140,50" gera três)
+    itens = processador_texto.extrair_itens_despesa(mensagem)
+    
+    if len(itens) > 1:
+        return processar_varias_despesas(mensagem, usuario_id, itens, mensagem_id)
+    
+    dados_despesa = itens[0] if itens else None
     
     if not dados_despesa or not dados_despesa["valor"]:
         return (
@@ -490,11 +546,12 @@ def processar_despesa(mensagem, usuario_id):
             descricao=dados_despesa["descricao"],
             data=dados_despesa["data"],
             forma_pagamento=dados_despesa.get("forma_pagamento"),
-            mensagem_original=mensagem
+            mensagem_original=mensagem,
+            webhook_mensagem_id=mensagem_id
         )
         
         # Emoji da categoria
-        emoji = processador.get_categoria_emoji(dados_despesa["categoria"])
+        emoji = processador_texto.get_categoria_emoji(dados_despesa["categoria"])
         
         # Formata a resposta
         resposta = (
@@ -515,5 +572,43 @@ def processar_despesa(mensagem, usuario_id):
         
     except Exception as e:
         # Log do erro
-        print(f"Erro ao salvar despesa: {e}")
-        return f"Erro ao salvar despesa: {str(e)}"
\ No newline at end of file
+        log.excecao('erro_salvar_despesa', usuario_id=usuario_id)
+        return f"Erro ao salvar despesa: {str(e)}"
+
+def processar_varias_despesas(mensagem, usuario_id, itens, mensagem_id=None):
+    """Salva as despesas de uma mensagem numa única transação e responde com um resumo"""
+    try:
+        despesa_model = Despesa(Config.DATABASE)
+        despesa_model.criar_em_lote([
+            {
+                "usuario_id": usuario_id,
+                "valor": dados["valor"],
+                "categoria": dados["categoria"],
+                "descricao": dados["descricao"],
+                "data": dados["data"],
+                "forma_pagamento": dados.get("forma_pagamento"),
+                "mensagem_original": mensagem,
+                "webhook_mensagem_id": mensagem_id
+            }
+            for dados in itens
+        ])
+        
+        resposta = f"✅ {len(itens)} despesas registradas!\n\n"
+        for dados in itens:
+            emoji = processador_texto.get_categoria_emoji(dados["categoria"])
+            data = datetime.strptime(dados['data'], '%Y-%m-%d').strftime('%d/%m')
+            resposta += f"{emoji} {dados['descricao']}: R$ {dados['valor']:.2f} ({dados['categoria'].capitalize()}, {data})\n"
+        
+        resposta += f"\n💰 Total: R$ {sum(dados['valor'] for dados in itens):.2f}\n"
+        
+        formas = {dados.get("forma_pagamento") for dados in itens} - {None}
+        if len(formas) == 1:
+            resposta += f"💳 Forma de pagamento: {formas.pop()}\n"
+        
+        resposta += f"\nAcesse {Config.WEBHOOK_BASE_URL}/dashboard para corrigir categorias e ver seus gastos detalhados!"
+        
+        return resposta
+        
+    except Exception as e:
+        log.excecao('erro_salvar_despesas', usuario_id=usuario_id, itens=len(itens))
+        return f"Erro ao salvar despesas: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,194 @@
+"""
+Renderização dos gráficos fora da thread da requisição.
+
+O plotly/kaleido gasta centenas de milissegundos de CPU por imagem. Em vez
+de renderizar no worker web, ``ServicoGraficos`` mantém um pool de processos
+(``GRAFICOS_PROCESSOS``) iniciados com ``spawn`` e já aquecidos: cada
+processo importa o plotly e renderiza uma figura vazia na partida, o que
+também sobe o processo do kaleido. As especificações (ver ``graficos``)
+seguem pela fila do ``ProcessPoolExecutor`` e voltam como bytes.
+
+* Limite de concorrência: no máximo ``GRAFICOS_MAX_PENDENTES`` pedidos em
+  andamento ou na fila por worker web. Acima disso o pedido não espera.
+* Tempo limite: quem pede espera no máximo ``GRAFICOS_TIMEOUT`` segundos.
+  A renderização continua no pool e só libera a vaga ao terminar.
+* Reserva: com o pool saturado, estourando o tempo ou falhando (ex.: kaleido
+  ausente), a imagem sai do ``renderizar_svg_simples``, em Python puro. Essa
+  versão não vai para o cache de imagens.
+
+Com ``GRAFICOS_PROCESSOS = 0`` a renderização volta a ser feita na própria
+thread da requisição.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as TempoEsgotado
+from concurrent.futures.process import BrokenProcessPool
+
+from config import Config
+from graficos import FORMATOS, renderizar, renderizar_svg_simples
+from log_estruturado import obter_logger
+
+log = obter_logger('graficos')
+
+
+def _aquecer():
+    """Inicializador dos processos do pool: importa o plotly e sobe o kaleido"""
+    try:
+        import plotly.graph_objects as go
+        import plotly.io as pio
+        pio.to_image(go.Figure(), format='png', width=10, height=10)
+    except Exception:
+        # Sem plotly/kaleido cada pedido falha e cai na reserva em SVG
+        pass
+
+
+class ServicoGraficos:
+    """Pool de processos renderizadores com limite de pedidos e tempo limite"""
+
+    def __init__(self, processos=2, max_pendentes=4, timeout=10.0):
+        self.processos = processos
+        self.max_pendentes = max_pendentes
+        self.timeout = timeout
+
+        self._pool = None
+        self._lock = threading.Lock()
+        self._vagas = threading.BoundedSemaphore(max_pendentes)
+
+        # Métricas
+        self.renderizadas = 0
+        self.saturado = 0
+        self.tempo_esgotado = 0
+        self.falhas = 0
+
+    def _obter_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processos,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_aquecer
+                )
+            return self._pool
+
+    def _descartar_pool(self, pool):
+        """Um processo morreu (ex.: sem memória): o próximo pedido cria outro pool"""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    def aquecer(self):
+        """Sobe os processos do pool antes do primeiro pedido"""
+        pool = self._obter_pool()
+        for _ in range(self.processos):
+            pool.submit(os.getpid)
+
+    def renderizar(self, spec, formato='png'):
+        """Retorna (bytes, formato, completa); completa=False para a imagem de reserva em SVG"""
+        if not self._vagas.acquire(blocking=False):
+            self.saturado += 1
+            log.aviso('grafico_pool_saturado', tipo=spec['tipo'])
+            return self._reserva(spec)
+
+        pool = self._obter_pool()
+        try:
+            futuro = pool.submit(renderizar, spec, formato)
+        except Exception:
+            self._vagas.release()
+            self._descartar_pool(pool)
+            self.falhas += 1
+            log.excecao('erro_grafico_pool', tipo=spec['tipo'])
+            return self._reserva(spec)
+        # A vaga só volta quando o processo termina, mesmo que ninguém espere mais
+        futuro.add_done_callback(lambda _: self._vagas.release())
+
+        try:
+            imagem = futuro.result(timeout=self.timeout)
+        except TempoEsgotado:
+            self.tempo_esgotado += 1
+            log.aviso('grafico_tempo_esgotado', tipo=spec['tipo'], timeout=self.timeout)
+            return self._reserva(spec)
+        except BrokenProcessPool:
+            self._descartar_pool(pool)
+            self.falhas += 1
+            log.excecao('erro_grafico_pool', tipo=spec['tipo'])
+            return self._reserva(spec)
+        except Exception:
+            self.falhas += 1
+            log.excecao('erro_grafico', tipo=spec['tipo'], formato=formato)
+            return self._reserva(spec)
+
+        self.renderizadas += 1
+        return imagem, formato, True
+
+    @staticmethod
+    def _reserva(spec):
+        return renderizar_svg_simples(spec), 'svg', False
+
+    def parar(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def estatisticas(self):
+        return {
+            'processos': self.processos,
+            'max_pendentes': self.max_pendentes,
+            'renderizadas': self.renderizadas,
+            'saturado': self.saturado,
+            'tempo_esgotado': self.tempo_esgotado,
+            'falhas': self.falhas
+        }
+
+
+class _RenderizacaoLocal:
+    """Renderiza na própria thread (``GRAFICOS_PROCESSOS = 0``); falhas também caem no SVG simples"""
+    processos = 0
+
+    def renderizar(self, spec, formato='png'):
+        try:
+            return renderizar(spec, formato), formato, True
+        except Exception:
+            log.excecao('erro_grafico', tipo=spec['tipo'], formato=formato)
+            return renderizar_svg_simples(spec), 'svg', False
+
+    def aquecer(self):
+        pass
+
+    def parar(self):
+        pass
+
+    def estatisticas(self):
+        return {'processos': 0}
+
+
+_servico = None
+_servico_pid = None
+_servico_lock = threading.Lock()
+
+
+def obter_servico_graficos():
+    """Retorna o serviço de renderização do processo atual (criado conforme o Config)"""
+    global _servico, _servico_pid
+    if _servico is None or _servico_pid != os.getpid():
+        with _servico_lock:
+            if _servico is None or _servico_pid != os.getpid():
+                if Config.GRAFICOS_PROCESSOS > 0:
+                    _servico = ServicoGraficos(
+                        processos=Config.GRAFICOS_PROCESSOS,
+                        max_pendentes=Config.GRAFICOS_MAX_PENDENTES,
+                        timeout=Config.GRAFICOS_TIMEOUT
+                    )
+                else:
+                    _servico = _RenderizacaoLocal()
+                _servico_pid = os.getpid()
+    return _servico
+
+
+def renderizar_grafico(spec, formato='png'):
+    """Atalho: (bytes, formato, completa) pelo serviço do processo"""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: {formato}")
+    return obter_servico_graficos().renderizar(spec, formato)